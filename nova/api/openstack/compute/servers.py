@@ -41,6 +41,7 @@ from nova import exception
 from nova.i18n import _
 from nova.i18n import _LW
 from nova.image import glance
+from nova.network.security_group import openstack_driver
 from nova import objects
 from nova import utils
 
@@ -395,18 +396,27 @@ class ServersController(wsgi.Controller):
         limit, marker = common.get_limit_and_marker(req)
         sort_keys, sort_dirs = common.get_sort_params(req.params)
 
-        expected_attrs = ['pci_devices']
         if is_detail:
             # merge our expected attrs with what the view builder needs for
-            # showing details
+            # showing details, and only load the joined columns rendered by
+            # the view and its extensions: the PCI devices, and the security
+            # groups unless they are the neutron ones
+            extra_attrs = ['pci_devices']
+            if not openstack_driver.is_neutron_security_groups():
+                extra_attrs.append('security_groups')
             expected_attrs = self._view_builder.get_show_expected_attrs(
-                                                                expected_attrs)
+                                                            extra_attrs)
+        else:
+            # The index view only renders the uuid and name of the instances,
+            # so don't load any of their joined columns
+            expected_attrs = []
 
         try:
             instance_list = self.compute_api.get_all(elevated or context,
                     search_opts=search_opts, limit=limit, marker=marker,
                     want_objects=True, expected_attrs=expected_attrs,
-                    sort_keys=sort_keys, sort_dirs=sort_dirs)
+                    sort_keys=sort_keys, sort_dirs=sort_dirs,
+                    only_expected_attrs=True)
         except exception.MarkerNotFound:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
@@ -102,7 +102,7 @@ class SimpleTenantUsageController(wsgi.Controller):
 
         instances = objects.InstanceList.get_active_by_window_joined(
                         context, period_start, period_stop, tenant_id,
-                        expected_attrs=['flavor'])
+                        expected_attrs=['flavor'], use_slave=True)
         rval = {}
         flavors = {}
 
@@ -74,6 +74,7 @@ from nova import availability_zones
 from nova import config
 from nova import context
 from nova import db
+from nova.db import archive as db_archive
 from nova.db import migration
 from nova import exception
 from nova.i18n import _
@@ -944,10 +945,31 @@ class DbCommands(object):
         print(migration.db_version())
 
     @args('--max_rows', metavar='<number>',
-            help='Maximum number of deleted rows to archive')
+            help='Maximum number of deleted rows to archive, or the number '
+                 'of rows archived per batch with --until-complete')
     @args('--verbose', action='store_true', dest='verbose', default=False,
           help='Print how many rows were archived per table.')
-    def archive_deleted_rows(self, max_rows, verbose=False):
+    @args('--until-complete', action='store_true', dest='until_complete',
+          default=False,
+          help='Archive the deleted rows in batches of max_rows rows until '
+               'there are none left. The options below only apply to this '
+               'mode.')
+    @args('--workers', metavar='<number>', type=int, default=1,
+          help='Number of tables archived concurrently')
+    @args('--max-rows-per-second', metavar='<number>', type=int,
+          dest='max_rows_per_second',
+          help='Maximum number of rows archived per second')
+    @args('--max-replication-lag', metavar='<seconds>', type=int,
+          dest='max_replication_lag',
+          help='Pause the archiving while the slave database is more than '
+               'this number of seconds behind the master database')
+    @args('--checkpoint', metavar='<path>',
+          help='File where the progress is saved, which resumes the '
+               'archiving where it was interrupted')
+    def archive_deleted_rows(self, max_rows, verbose=False,
+                             until_complete=False, workers=1,
+                             max_rows_per_second=None,
+                             max_replication_lag=None, checkpoint=None):
         """Move up to max_rows deleted rows from production tables to shadow
         tables.
         """
@@ -960,13 +982,39 @@ class DbCommands(object):
                 print(_('max rows must be <= %(max_value)d') %
                       {'max_value': db.MAX_INT})
                 return(1)
-        table_to_rows_archived = db.archive_deleted_rows(max_rows)
+        blocked = {}
+        if until_complete:
+            if workers < 1:
+                print(_("Must supply a positive value for workers"))
+                return(1)
+
+            def progress(tablename, rows, rate):
+                if verbose:
+                    print(_('Archived %(rows)d rows from %(table)s, '
+                            '%(rate).1f rows/s') %
+                          {'rows': rows, 'table': tablename, 'rate': rate})
+
+            archiver = db_archive.DeletedRowsArchiver(
+                batch_size=max_rows or 1000, workers=workers,
+                max_rows_per_second=max_rows_per_second,
+                max_replication_lag=max_replication_lag,
+                checkpoint_path=checkpoint, progress=progress)
+            table_to_rows_archived = archiver.run()
+            blocked = archiver.blocked
+        else:
+            table_to_rows_archived = db.archive_deleted_rows(max_rows)
         if verbose:
             if table_to_rows_archived:
                 cliutils.print_dict(table_to_rows_archived, _('Table'),
                                     dict_value=_('Number of Rows Archived'))
             else:
                 print(_('Nothing was archived.'))
+        if blocked:
+            for tablename, error in sorted(blocked.items()):
+                print(_('The archiving of %(table)s is incomplete, some of '
+                        'its deleted rows are still referenced: %(error)s') %
+                      {'table': tablename, 'error': error})
+            return(1)
 
     @args('--delete', action='store_true', dest='delete',
           help='If specified, automatically delete any records found where '
@@ -93,6 +93,8 @@ CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
 MAX_USERDATA_SIZE = 65535
 RO_SECURITY_GROUPS = ['default']
 VIDEO_RAM = 'hw_video:ram_max_mb'
+# Minimum number of instances fetched at once when filtering them by IP
+IP_FILTER_PAGE_SIZE = 100
 
 AGGREGATE_ACTION_UPDATE = 'Update'
 AGGREGATE_ACTION_UPDATE_META = 'UpdateMeta'
@@ -2024,7 +2026,7 @@ class API(base.Base):
 
     def get_all(self, context, search_opts=None, limit=None, marker=None,
                 want_objects=False, expected_attrs=None, sort_keys=None,
-                sort_dirs=None):
+                sort_dirs=None, only_expected_attrs=False):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -2038,6 +2040,11 @@ class API(base.Base):
         secondary sort ket, etc.). For each sort key, the associated sort
         direction is based on the list of sort directions in the 'sort_dirs'
         parameter.
+
+        The metadata, system metadata, info cache and security groups of the
+        instances are loaded along with the 'expected_attrs' ones, unless the
+        'only_expected_attrs' parameter is True, in which case only the
+        'expected_attrs' ones are, the others being lazy-loaded.
         """
 
         # TODO(bcwaldon): determine the best argument for target here
@@ -2109,20 +2116,20 @@ class API(base.Base):
                         else:
                             return []
 
-        # IP address filtering cannot be applied at the DB layer, remove any DB
-        # limit so that it can be applied after the IP filter.
-        filter_ip = 'ip6' in filters or 'ip' in filters
-        orig_limit = limit
-        if filter_ip and limit:
-            LOG.debug('Removing limit for DB query due to IP filter')
-            limit = None
-
-        inst_models = self._get_instances_by_filters(context, filters,
-                limit=limit, marker=marker, expected_attrs=expected_attrs,
-                sort_keys=sort_keys, sort_dirs=sort_dirs)
-
-        if filter_ip:
-            inst_models = self._ip_filter(inst_models, filters, orig_limit)
+        if 'ip6' in filters or 'ip' in filters:
+            if only_expected_attrs and (
+                    'info_cache' not in (expected_attrs or [])):
+                # The IP filter is applied on the network info
+                expected_attrs = (expected_attrs or []) + ['info_cache']
+            inst_models = self._get_instances_by_ip_filters(context, filters,
+                    limit=limit, marker=marker, expected_attrs=expected_attrs,
+                    sort_keys=sort_keys, sort_dirs=sort_dirs,
+                    only_expected_attrs=only_expected_attrs)
+        else:
+            inst_models = self._get_instances_by_filters(context, filters,
+                    limit=limit, marker=marker, expected_attrs=expected_attrs,
+                    sort_keys=sort_keys, sort_dirs=sort_dirs,
+                    only_expected_attrs=only_expected_attrs)
 
         if want_objects:
             return inst_models
@@ -2160,16 +2167,52 @@ class API(base.Base):
                     break
         return objects.InstanceList(objects=result_objs)
 
+    def _get_instances_by_ip_filters(self, context, filters,
+                                     limit=None, marker=None,
+                                     expected_attrs=None, sort_keys=None,
+                                     sort_dirs=None,
+                                     only_expected_attrs=False):
+        # IP address filtering can only be coarsely applied at the DB layer,
+        # so fetch the instances one page at a time until enough of them
+        # pass the IP filter.
+        if not limit:
+            inst_models = self._get_instances_by_filters(context, filters,
+                    marker=marker, expected_attrs=expected_attrs,
+                    sort_keys=sort_keys, sort_dirs=sort_dirs,
+                    only_expected_attrs=only_expected_attrs)
+            return self._ip_filter(inst_models, filters, None)
+
+        page_size = max(limit, IP_FILTER_PAGE_SIZE)
+        result_objs = []
+        while True:
+            inst_models = self._get_instances_by_filters(context, filters,
+                    limit=page_size, marker=marker,
+                    expected_attrs=expected_attrs, sort_keys=sort_keys,
+                    sort_dirs=sort_dirs,
+                    only_expected_attrs=only_expected_attrs)
+            result_objs.extend(self._ip_filter(inst_models, filters,
+                                               limit - len(result_objs)))
+            if len(result_objs) == limit or len(inst_models) < page_size:
+                return objects.InstanceList(objects=result_objs)
+            marker = inst_models[-1].uuid
+
     def _get_instances_by_filters(self, context, filters,
                                   limit=None, marker=None, expected_attrs=None,
-                                  sort_keys=None, sort_dirs=None):
-        fields = ['metadata', 'system_metadata', 'info_cache',
-                  'security_groups']
+                                  sort_keys=None, sort_dirs=None,
+                                  only_expected_attrs=False):
+        if only_expected_attrs:
+            fields = []
+        else:
+            fields = ['metadata', 'system_metadata', 'info_cache',
+                      'security_groups']
         if expected_attrs:
             fields.extend(expected_attrs)
+        # NOTE: The listings can lag behind the instances changes for up to
+        # db_slave_max_staleness seconds
         return objects.InstanceList.get_by_filters(
             context, filters=filters, limit=limit, marker=marker,
-            expected_attrs=fields, sort_keys=sort_keys, sort_dirs=sort_dirs)
+            expected_attrs=fields, use_slave=True, sort_keys=sort_keys,
+            sort_dirs=sort_dirs)
 
     # NOTE(melwitt): We don't check instance lock for backup because lock is
     #                intended to prevent accidental change/delete of instances
@@ -3728,7 +3771,7 @@ class HostAPI(base.Base):
                                                          hypervisor_match)
 
     def compute_node_statistics(self, context):
-        return self.db.compute_node_statistics(context)
+        return self.db.compute_node_statistics(context, use_slave=True)
 
 
 class InstanceActionAPI(base.Base):
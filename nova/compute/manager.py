@@ -60,6 +60,7 @@ from nova import compute
 from nova.compute import build_results
 from nova.compute import claims
 from nova.compute import power_state
+from nova.compute import power_state_tracker
 from nova.compute import resource_tracker
 from nova.compute import rpcapi as compute_rpcapi
 from nova.compute import task_states
@@ -148,7 +149,16 @@ compute_opts = [
                     'Starting with Liberty, Cinder can use image volume '
                     'cache. This may help with block device allocation '
                     'performance. Look at the cinder '
-                    'image_volume_cache_enabled configuration option.')
+                    'image_volume_cache_enabled configuration option.'),
+    cfg.BoolOpt('track_power_states_from_events',
+                default=False,
+                help='Keep the power states of the instances of the host in '
+                     'memory, up to date from the lifecycle events of the '
+                     'compute driver, so that the power state sync only '
+                     'queries the hypervisor every power_state_audit_interval '
+                     'seconds or after events were lost. Requires a compute '
+                     'driver emitting lifecycle events, such as libvirt, and '
+                     'the handle_virt_lifecycle_events workaround enabled.'),
     ]
 
 interval_opts = [
@@ -162,6 +172,16 @@ interval_opts = [
                help='Interval to sync power states between the database and '
                     'the hypervisor. Set to -1 to disable. '
                     'Setting this to 0 will run at the default rate.'),
+    cfg.IntOpt('power_state_audit_interval',
+               min=0,
+               default=3600,
+               help='Interval in seconds between the queries of the power '
+                    'states of all the instances from the hypervisor when '
+                    'they are tracked from the lifecycle events, see '
+                    'track_power_states_from_events. The power state syncs '
+                    'in between only compare the tracked power states with '
+                    'the database. Set to 0 to only query them again after '
+                    'events were lost.'),
     cfg.IntOpt("heal_instance_info_cache_interval",
                default=60,
                help="Number of seconds between instance network information "
@@ -704,6 +724,7 @@ class ComputeManager(manager.Manager):
         self.instance_events = InstanceEvents()
         self._sync_power_pool = eventlet.GreenPool()
         self._syncs_in_progress = {}
+        self._power_state_tracker = None
         self.send_instance_updates = CONF.scheduler_tracks_instance_changes
         if CONF.max_concurrent_builds != 0:
             self._build_semaphore = eventlet.semaphore.Semaphore(
@@ -780,11 +801,12 @@ class ComputeManager(manager.Manager):
             LOG.debug('Instance has been destroyed from under us while '
                       'trying to set it to ERROR', instance=instance)
 
-    def _get_instances_on_driver(self, context, filters=None):
+    def _get_instances_on_driver(self, context, filters=None, columns=None):
         """Return a list of instance records for the instances found
         on the hypervisor which satisfy the specified filters. If filters=None
         return a list of instance records for all the instances found on the
-        hypervisor.
+        hypervisor. If columns is given, only these columns of the instances
+        are loaded, the others being loaded on demand.
         """
         if not filters:
             filters = {}
@@ -795,7 +817,7 @@ class ComputeManager(manager.Manager):
                 return objects.InstanceList()
             filters['uuid'] = driver_uuids
             local_instances = objects.InstanceList.get_by_filters(
-                context, filters, use_slave=True)
+                context, filters, use_slave=True, columns=columns)
             return local_instances
         except NotImplementedError:
             pass
@@ -804,7 +826,8 @@ class ComputeManager(manager.Manager):
         # to brute force.
         driver_instances = self.driver.list_instances()
         instances = objects.InstanceList.get_by_filters(context, filters,
-                                                        use_slave=True)
+                                                        use_slave=True,
+                                                        columns=columns)
         name_map = {instance.name: instance for instance in instances}
         local_instances = []
         for driver_instance in driver_instances:
@@ -1259,7 +1282,12 @@ class ComputeManager(manager.Manager):
 
         # Note(lpetrut): The event may be delayed, thus not reflecting
         # the current instance power state. In that case, ignore the event.
+        tracker = self._power_state_tracker
+        if tracker is not None:
+            seq = tracker.begin_query()
         current_power_state = self._get_power_state(context, instance)
+        if tracker is not None:
+            tracker.update(instance.uuid, current_power_state, seq)
         if current_power_state == vm_power_state:
             LOG.debug('Synchronizing instance power state after lifecycle '
                       'event "%(event)s"; current vm_state: %(vm_state)s, '
@@ -1283,11 +1311,20 @@ class ComputeManager(manager.Manager):
             except exception.InstanceNotFound:
                 LOG.debug("Event %s arrived for non-existent instance. The "
                           "instance was probably deleted.", event)
+        elif isinstance(event, virtevent.EventsLostEvent):
+            if self._power_state_tracker is not None:
+                LOG.info(_LI("Lifecycle events may have been lost, the power "
+                             "states of the instances will be queried from "
+                             "the hypervisor at the next sync."))
+                self._power_state_tracker.events_lost()
         else:
             LOG.debug("Ignoring event %s", event)
 
     def init_virt_events(self):
         if CONF.workarounds.handle_virt_lifecycle_events:
+            if CONF.track_power_states_from_events:
+                self._power_state_tracker = (
+                    power_state_tracker.PowerStateTracker())
             self.driver.register_event_listener(self.handle_events)
         else:
             # NOTE(mriedem): If the _sync_power_states periodic task is
@@ -1803,8 +1840,8 @@ class ComputeManager(manager.Manager):
             return
         context = context.elevated()
         instances = objects.InstanceList.get_by_host(context, self.host,
-                                                     expected_attrs=[],
-                                                     use_slave=True)
+                                                     use_slave=True,
+                                                     columns=[])
         uuids = [instance.uuid for instance in instances]
         self.scheduler_client.sync_instance_info(context, self.host, uuids)
 
@@ -5425,6 +5462,7 @@ class ComputeManager(manager.Manager):
         """
         LOG.info(_LI('_post_live_migration() is started..'),
                  instance=instance)
+        source_node = instance.node
 
         bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
                 ctxt, instance.uuid)
@@ -5497,6 +5535,12 @@ class ComputeManager(manager.Manager):
 
         self.instance_events.clear_events_for_instance(instance)
 
+        # NOTE: The instance has no claim to drop on the source host, so
+        # release its usage now, the update below may not audit the resources
+        if self.driver.node_is_available(source_node):
+            rt = self._get_resource_tracker(source_node)
+            rt.release_instance_usage(ctxt, instance)
+
         # NOTE(timello): make sure we update available resources on source
         # host even before next periodic task.
         self.update_available_resource(ctxt)
@@ -5594,6 +5638,7 @@ class ComputeManager(manager.Manager):
                 instance.node = node_name
                 instance.progress = 0
                 instance.save(expected_task_state=task_states.MIGRATING)
+        self._update_resource_tracker(context, instance)
 
         # NOTE(tr3buchet): tear down networks on source host
         self.network_api.setup_networks_on_host(context, instance,
@@ -6164,12 +6209,26 @@ class ComputeManager(manager.Manager):
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
-        """
-        db_instances = objects.InstanceList.get_by_host(context, self.host,
-                                                        expected_attrs=[],
-                                                        use_slave=True)
 
-        num_vm_instances = self.driver.get_num_instances()
+        If the driver can get the power states of all the virtual machines at
+        once, only the instances whose power state needs to be synchronized
+        are checked again, one at a time. When the power states are tracked
+        from the lifecycle events, the hypervisor is not queried at all
+        unless the tracked power states need to be audited, see
+        _get_vm_power_states().
+        """
+        # NOTE: The instances are refreshed before their power state is
+        # synchronized, so only load the columns needed to find them on the
+        # hypervisor and to skip the ones with a pending task.
+        db_instances = objects.InstanceList.get_by_host(
+            context, self.host, use_slave=True,
+            columns=['host', 'node', 'vm_state', 'power_state', 'task_state'])
+
+        vm_power_states = self._get_vm_power_states()
+        if vm_power_states is None:
+            num_vm_instances = self.driver.get_num_instances()
+        else:
+            num_vm_instances = len(vm_power_states)
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -6201,6 +6260,11 @@ class ComputeManager(manager.Manager):
             # process syncs asynchronously - don't want instance locking to
             # block entire periodic task thread
             uuid = db_instance.uuid
+            if (vm_power_states is not None and
+                    not self._power_state_needs_sync(
+                        db_instance,
+                        vm_power_states.get(uuid, power_state.NOSTATE))):
+                continue
             if uuid in self._syncs_in_progress:
                 LOG.debug('Sync already in progress for %s' % uuid)
             else:
@@ -6208,6 +6272,64 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
+    def _get_vm_power_states(self):
+        """Return the power states of all the virtual machines by instance
+        uuid, or None if the driver can only get them one at a time.
+
+        When the power states are tracked from the lifecycle events, they are
+        only queried from the hypervisor the first time, after events were
+        lost or every power_state_audit_interval seconds.
+        """
+        tracker = self._power_state_tracker
+        if tracker is None:
+            try:
+                return self.driver.get_power_states()
+            except NotImplementedError:
+                return None
+
+        if not tracker.needs_resync(CONF.power_state_audit_interval):
+            return tracker.get_power_states()
+
+        seq = tracker.begin_query()
+        try:
+            vm_power_states = self.driver.get_power_states()
+        except NotImplementedError:
+            LOG.warning(_LW("The compute driver cannot query the power "
+                            "states of all the instances at once, they will "
+                            "not be tracked from the lifecycle events."))
+            self._power_state_tracker = None
+            return None
+        tracker.resync(seq, vm_power_states)
+        LOG.debug("Resynchronized the power states of %d instances tracked "
+                  "from the lifecycle events", len(vm_power_states))
+        return tracker.get_power_states()
+
+    @staticmethod
+    def _power_state_needs_sync(db_instance, vm_power_state):
+        """Return whether _sync_instance_power_state would update the
+        instance or act on it, given its power state on the hypervisor.
+
+        The power state is queried again from the hypervisor, under the
+        instance lock, for the instances which need to be synchronized.
+        """
+        if vm_power_state != db_instance.power_state:
+            return True
+        vm_state = db_instance.vm_state
+        if vm_state == vm_states.ACTIVE:
+            return vm_power_state != power_state.RUNNING
+        elif vm_state == vm_states.STOPPED:
+            return vm_power_state not in (power_state.NOSTATE,
+                                          power_state.SHUTDOWN,
+                                          power_state.CRASHED)
+        elif vm_state == vm_states.PAUSED:
+            return vm_power_state in (power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+        elif vm_state in (vm_states.SOFT_DELETED,
+                          vm_states.DELETED):
+            return vm_power_state not in (power_state.NOSTATE,
+                                          power_state.SHUTDOWN)
+        return False
+
     def _query_driver_power_state_and_sync(self, context, db_instance):
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
@@ -6215,11 +6337,16 @@ class ComputeManager(manager.Manager):
                      {'task': db_instance.task_state}, instance=db_instance)
             return
         # No pending tasks. Now try to figure out the real vm_power_state.
+        tracker = self._power_state_tracker
+        if tracker is not None:
+            seq = tracker.begin_query()
         try:
             vm_instance = self.driver.get_info(db_instance)
             vm_power_state = vm_instance.state
         except exception.InstanceNotFound:
             vm_power_state = power_state.NOSTATE
+        if tracker is not None:
+            tracker.update(db_instance.uuid, vm_power_state, seq)
         # Note(maoy): the above get_info call might take a long time,
         # for example, because of a broken libvirt driver.
         try:
@@ -6568,7 +6695,8 @@ class ComputeManager(manager.Manager):
         filters = {'deleted': True,
                    'soft_deleted': False,
                    'host': self.host}
-        instances = self._get_instances_on_driver(context, filters)
+        instances = self._get_instances_on_driver(
+            context, filters, columns=['host', 'deleted', 'deleted_at'])
         return [i for i in instances if self._deleted_old_enough(i, timeout)]
 
     def _deleted_old_enough(self, instance, timeout):
@@ -0,0 +1,114 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Tracking of the power states of the instances of a host from the lifecycle
+events of the virt driver.
+"""
+
+import time
+
+from nova.compute import power_state
+
+
+class PowerStateTracker(object):
+    """In-memory table of the power states of the guests of a host.
+
+    The table is filled by a bulk query of the hypervisor, a resync, and kept
+    up to date by the lifecycle events. Each entry records the sequence
+    number taken before its power state was queried, so that a query does
+    not overwrite the entries updated by the queries started after it, e.g.
+    the ones of the events received while the hypervisor was queried.
+
+    The table is invalid until the first resync and after the driver
+    reported that events may have been lost.
+    """
+
+    def __init__(self):
+        # Power state and sequence number by instance uuid
+        self._states = {}
+        self._seq = 0
+        # Sequence number of the last resync, which removed the guests
+        # missing from the table
+        self._states_seq = 0
+        # Sequence number at which events were last lost
+        self._lost_seq = 0
+        # Sequence number and time of the last resync
+        self._resync_seq = None
+        self._resync_time = None
+
+    def begin_query(self):
+        """Return the sequence number to pass to update() or resync() along
+        with the power states queried from the hypervisor after this call.
+        """
+        self._seq += 1
+        return self._seq
+
+    def update(self, uuid, vm_power_state, seq=None):
+        """Record the power state of a guest, unless a query started later
+        already updated it.
+
+        :param seq: sequence number returned by begin_query() before
+                    querying the power state, a new one by default
+        """
+        if seq is None:
+            seq = self.begin_query()
+        state = self._states.get(uuid)
+        last_seq = state[1] if state is not None else self._states_seq
+        if seq > last_seq:
+            self._states[uuid] = (vm_power_state, seq)
+
+    def events_lost(self):
+        """Invalidate the table, some events may have been missed."""
+        self._seq += 1
+        self._lost_seq = self._seq
+
+    def resync(self, seq, vm_power_states):
+        """Replace the table with the power states queried from the
+        hypervisor, except the entries updated by later events.
+
+        :param seq: sequence number returned by begin_query() before
+                    querying the hypervisor
+        :param vm_power_states: dict of the power states by instance uuid
+        """
+        states = {uuid: (vm_power_state, seq)
+                  for uuid, vm_power_state in vm_power_states.items()}
+        for uuid, (vm_power_state, update_seq) in self._states.items():
+            if update_seq > seq:
+                states[uuid] = (vm_power_state, update_seq)
+        self._states = states
+        self._states_seq = seq
+        if seq > self._lost_seq:
+            self._resync_seq = seq
+            self._resync_time = time.time()
+
+    def needs_resync(self, max_age=None):
+        """Return whether the table must be filled again from the hypervisor:
+        it was never filled, events were lost since the last resync or the
+        last resync is more than max_age seconds old.
+        """
+        if self._resync_seq is None or self._lost_seq > self._resync_seq:
+            return True
+        if max_age:
+            return time.time() - self._resync_time >= max_age
+        return False
+
+    def get_power_states(self):
+        """Return a dict of the power states of the guests on the hypervisor
+        by instance uuid.
+        """
+        # A guest which is no longer on the hypervisor stays in the table
+        # until the next resync, so the events received while it was queried
+        # do not make it reappear.
+        return {uuid: vm_power_state
+                for uuid, (vm_power_state, seq) in self._states.items()
+                if vm_power_state != power_state.NOSTATE}
@@ -24,12 +24,14 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 
 from nova.compute import claims
 from nova.compute import monitors
 from nova.compute import resources as ext_resources
 from nova.compute import task_states
 from nova.compute import vm_states
+from nova import conductor
 from nova import exception
 from nova.i18n import _, _LE, _LI, _LW
 from nova import objects
@@ -62,6 +64,16 @@ resource_tracker_opts = [
                      'openstack-dev mailing list. There is no future planned '
                      'support for the tracking of custom resources.',
                 deprecated_for_removal=True),
+    cfg.IntOpt('resource_audit_interval', default=0, min=0,
+               help='Interval in seconds between the audits of the '
+                    'resources of the compute nodes, which query the '
+                    'hypervisor and recompute the resource usage from all '
+                    'the instances and migrations of the node. In between, '
+                    'the periodic resource update only reports the usage '
+                    'changes applied by the claims and the instance updates '
+                    'as they happened, and the audits log any drift of that '
+                    'usage. Setting this to 0 audits the resources at every '
+                    'update_resources_interval.'),
 ]
 
 allocation_ratio_opts = [
@@ -151,9 +163,11 @@ class ResourceTracker(object):
             ext_resources.ResourceHandler(CONF.compute_resources)
         self.old_resources = objects.ComputeNode()
         self.scheduler_client = scheduler_client.SchedulerClient()
+        self.conductor_api = conductor.API()
         self.ram_allocation_ratio = CONF.ram_allocation_ratio
         self.cpu_allocation_ratio = CONF.cpu_allocation_ratio
         self.disk_allocation_ratio = CONF.disk_allocation_ratio
+        self.last_audit = None
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def instance_claim(self, context, instance_ref, limits=None):
@@ -401,6 +415,25 @@ class ResourceTracker(object):
         if uuid in self.tracked_instances:
             self._update_usage_from_instance(context, instance)
             self._update(context.elevated())
+        elif (CONF.resource_audit_interval and
+                uuid not in self.tracked_migrations and
+                instance['node'] == self.nodename and
+                instance['vm_state'] not in vm_states.ALLOW_RESOURCE_REMOVAL):
+            # The instance moved to this node without a claim, e.g. it was
+            # live migrated here, count it now rather than at the next audit
+            self._update_usage_from_instance(context, instance)
+            self._update(context.elevated())
+
+    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    def release_instance_usage(self, context, instance):
+        """Remove the usage of an instance which left this node without a
+        claim to drop, e.g. which was live migrated away.
+        """
+        if self.disabled or instance['uuid'] not in self.tracked_instances:
+            return
+
+        self._update_usage_from_instance(context, instance, is_removed=True)
+        self._update(context.elevated())
 
     @property
     def disabled(self):
@@ -493,7 +526,15 @@ class ResourceTracker(object):
         Add in resource claims in progress to account for operations that have
         declared a need for resources, but not necessarily retrieved them from
         the hypervisor layer yet.
+
+        The resources are only audited every resource_audit_interval seconds,
+        in between only the usage changes applied by the claims and instance
+        updates are reported.
         """
+        if not self._audit_due():
+            self._update_between_audits(context)
+            return
+
         LOG.info(_LI("Auditing locally available compute resources for "
                      "node %(node)s"),
                  {'node': self.nodename})
@@ -519,6 +560,48 @@ class ResourceTracker(object):
 
         self._update_available_resource(context, resources)
 
+    def _audit_due(self):
+        if (self.disabled or self.last_audit is None or
+                not CONF.resource_audit_interval):
+            return True
+        return timeutils.is_older_than(self.last_audit,
+                                       CONF.resource_audit_interval)
+
+    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    def _update_between_audits(self, context):
+        if self.disabled:
+            return
+        metrics = self._get_host_metrics(context, self.nodename)
+        self.compute_node.metrics = jsonutils.dumps(metrics)
+        self._update(context, batched=True)
+
+    def _get_tracked_usage(self):
+        """Return the usage of the compute node tracked since the last
+        audit, or None if the compute node is not tracked yet.
+        """
+        if self.compute_node is None:
+            return None
+        return {field: self.compute_node[field] for field in
+                ('vcpus_used', 'memory_mb_used', 'local_gb_used',
+                 'running_vms')
+                if self.compute_node.obj_attr_is_set(field)}
+
+    def _report_usage_drift(self, tracked_usage):
+        """Log the difference between the usage tracked since the last
+        audit and the audited usage.
+        """
+        if not tracked_usage:
+            return
+        drift = {field: self.compute_node[field] - value
+                 for field, value in tracked_usage.items()
+                 if self.compute_node[field] != value}
+        if drift:
+            LOG.info(_LI("The resource usage of %(host)s:%(node)s tracked "
+                         "since the last audit differed from the audited "
+                         "usage by %(drift)s"),
+                     {'host': self.host, 'node': self.nodename,
+                      'drift': drift})
+
     def _pair_instances_to_migrations(self, migrations, instances):
         instance_by_uuid = {inst.uuid: inst for inst in instances}
         for migration in migrations:
@@ -535,6 +618,7 @@ class ResourceTracker(object):
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def _update_available_resource(self, context, resources):
+        tracked_usage = self._get_tracked_usage()
 
         # initialise the compute node object, creating it
         # if it does not already exist.
@@ -588,6 +672,7 @@ class ResourceTracker(object):
             self.compute_node.pci_device_pools = objects.PciDevicePoolList()
 
         self._report_final_resource_view()
+        self._report_usage_drift(tracked_usage)
 
         metrics = self._get_host_metrics(context, self.nodename)
         # TODO(pmurray): metrics should not be a json string in ComputeNode,
@@ -595,7 +680,8 @@ class ResourceTracker(object):
         self.compute_node.metrics = jsonutils.dumps(metrics)
 
         # update the compute_node
-        self._update(context)
+        self._update(context, batched=True)
+        self.last_audit = timeutils.utcnow()
         LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
                      {'host': self.host, 'node': self.nodename})
 
@@ -697,13 +783,21 @@ class ResourceTracker(object):
             return True
         return False
 
-    def _update(self, context):
-        """Update partial stats locally and populate them to Scheduler."""
+    def _update(self, context, batched=False):
+        """Update partial stats locally and populate them to Scheduler.
+
+        The batched updates may be written later by the conductor, so only
+        the periodic updates are batched, the ones made by the claims must be
+        visible to the scheduler right away.
+        """
         self._write_ext_resources(self.compute_node)
         if not self._resource_change():
             return
-        # Persist the stats to the Scheduler
-        self.scheduler_client.update_resource_stats(self.compute_node)
+        if batched and CONF.conductor.batch_heartbeats:
+            self.conductor_api.update_compute_node(context, self.compute_node)
+        else:
+            # Persist the stats to the Scheduler
+            self.scheduler_client.update_resource_stats(self.compute_node)
         if self.pci_tracker:
             self.pci_tracker.save(context)
 
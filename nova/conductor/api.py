@@ -55,6 +55,17 @@ class LocalAPI(object):
         return self._manager.object_backport_versions(context, objinst,
                                                       object_versions)
 
+    def report_service_state(self, context, service):
+        """Record a state report of a service."""
+        service.report_count += 1
+        service.save()
+
+    def update_compute_node(self, context, compute_node):
+        """Save the changes of a compute node which don't need to be written
+        right away, like the ones of the periodic resources audit.
+        """
+        compute_node.save()
+
 
 class LocalComputeTaskAPI(object):
     def __init__(self):
@@ -127,6 +138,26 @@ class API(LocalAPI):
         self._manager = rpcapi.ConductorAPI()
         self.base_rpcapi = baserpc.BaseAPI(topic=CONF.conductor.topic)
 
+    def _batch_heartbeats(self):
+        return (CONF.conductor.batch_heartbeats and
+                self._manager.can_batch_heartbeats())
+
+    def report_service_state(self, context, service):
+        if not self._batch_heartbeats():
+            return super(API, self).report_service_state(context, service)
+        # NOTE: The conductor writes the state report in its next batch of
+        # writes, and is_up() checks the time the report was received.
+        self._manager.report_service_state(context, service.id)
+
+    def update_compute_node(self, context, compute_node):
+        if not self._batch_heartbeats():
+            return super(API, self).update_compute_node(context, compute_node)
+        # NOTE: The changes are left set so that they are also saved by the
+        # next compute_node.save(), if it happens before the conductor
+        # writes them, as the conductor doesn't overwrite the more recent
+        # updates of the compute node.
+        self._manager.update_compute_node(context, compute_node)
+
     def wait_until_ready(self, context, early_timeout=10, early_attempts=10):
         '''Wait until a conductor service is up and running.
 
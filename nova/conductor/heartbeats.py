@@ -0,0 +1,86 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Batching of the service state reports and compute node updates.
+"""
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from nova import db
+from nova.i18n import _LE
+
+LOG = logging.getLogger(__name__)
+
+
+class HeartbeatBatcher(object):
+    """Coalesce the service state reports and compute node updates received
+    by a conductor until they are written to the database by flush().
+
+    The state reports of a service are counted and recorded with the time
+    the last one was received, which is what is_up() of the servicegroup
+    driver checks. The updates of a compute node are merged so that only the
+    last value of each changed column is written.
+    """
+
+    def __init__(self):
+        self._services = {}
+        self._compute_nodes = {}
+
+    def report_service_state(self, service_id):
+        report = self._services.setdefault(service_id, {'count': 0})
+        report['count'] += 1
+        report['last_seen_up'] = timeutils.utcnow()
+
+    def update_compute_node(self, compute_id, values):
+        update = self._compute_nodes.setdefault(compute_id, {'values': {}})
+        update['values'].update(values)
+        update['reported_at'] = timeutils.utcnow()
+
+    def _requeue_services(self, services):
+        for service_id, report in services.items():
+            pending = self._services.get(service_id)
+            if pending is None:
+                self._services[service_id] = report
+            else:
+                pending['count'] += report['count']
+
+    def _requeue_compute_nodes(self, compute_nodes):
+        for compute_id, update in compute_nodes.items():
+            pending = self._compute_nodes.get(compute_id)
+            if pending is None:
+                self._compute_nodes[compute_id] = update
+            else:
+                pending['values'] = dict(update['values'],
+                                         **pending['values'])
+
+    def flush(self, context):
+        """Write the state reports and updates received since the last
+        flush. They are kept for the next flush if the database writes fail.
+        """
+        services, self._services = self._services, {}
+        compute_nodes, self._compute_nodes = self._compute_nodes, {}
+        if services:
+            try:
+                db.service_report_state_batch(context, services)
+            except Exception:
+                LOG.exception(_LE('Unable to write %d service state '
+                                  'reports'), len(services))
+                self._requeue_services(services)
+        if compute_nodes:
+            try:
+                db.compute_node_update_batch(context, compute_nodes)
+            except Exception:
+                LOG.exception(_LE('Unable to write %d compute node '
+                                  'updates'), len(compute_nodes))
+                self._requeue_compute_nodes(compute_nodes)
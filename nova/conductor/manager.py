@@ -16,9 +16,9 @@
 
 import copy
 
-from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_service import periodic_task
 from oslo_utils import excutils
 import six
 
@@ -26,8 +26,11 @@ from nova.compute import rpcapi as compute_rpcapi
 from nova.compute import task_states
 from nova.compute import utils as compute_utils
 from nova.compute import vm_states
+from nova.conductor import heartbeats
 from nova.conductor.tasks import live_migrate
 from nova.conductor.tasks import migrate
+import nova.conf
+from nova import context as nova_context
 from nova.db import base
 from nova import exception
 from nova.i18n import _, _LE, _LI, _LW
@@ -43,7 +46,7 @@ from nova import servicegroup
 from nova import utils
 
 LOG = logging.getLogger(__name__)
-CONF = cfg.CONF
+CONF = nova.conf.CONF
 
 
 class ConductorManager(manager.Manager):
@@ -59,13 +62,14 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='3.0')
+    target = messaging.Target(version='3.1')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
                                                *args, **kwargs)
         self.compute_task_mgr = ComputeTaskManager()
         self.additional_endpoints.append(self.compute_task_mgr)
+        self.heartbeats = heartbeats.HeartbeatBatcher()
 
     # NOTE(hanlind): This can be removed in version 4.0 of the RPC API
     def provider_fw_rule_get_all(self, context):
@@ -131,6 +135,21 @@ class ConductorManager(manager.Manager):
         return objinst.obj_to_primitive(target_version=target,
                                         version_manifest=object_versions)
 
+    def report_service_state(self, context, service_id):
+        self.heartbeats.report_service_state(service_id)
+
+    def update_compute_node(self, context, compute_node):
+        self.heartbeats.update_compute_node(compute_node.id,
+                                            compute_node.get_db_updates())
+
+    @periodic_task.periodic_task(
+        spacing=CONF.conductor.heartbeat_flush_interval)
+    def _flush_heartbeats(self, context):
+        self.heartbeats.flush(context)
+
+    def cleanup_host(self):
+        self.heartbeats.flush(nova_context.get_admin_context())
+
     def reset(self):
         objects.Service.clear_min_version_cache()
 
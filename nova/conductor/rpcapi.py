@@ -198,6 +198,8 @@ class ConductorAPI(object):
     that they can handle the version_cap being set to 3.0.
 
     * Remove provider_fw_rule_get_all()
+
+    * 3.1  - Add report_service_state() and update_compute_node()
     """
 
     VERSION_ALIASES = {
@@ -250,6 +252,17 @@ class ConductorAPI(object):
         return cctxt.call(context, 'object_backport_versions', objinst=objinst,
                           object_versions=object_versions)
 
+    def can_batch_heartbeats(self):
+        return self.client.can_send_version('3.1')
+
+    def report_service_state(self, context, service_id):
+        cctxt = self.client.prepare(version='3.1')
+        cctxt.cast(context, 'report_service_state', service_id=service_id)
+
+    def update_compute_node(self, context, compute_node):
+        cctxt = self.client.prepare(version='3.1')
+        cctxt.cast(context, 'update_compute_node', compute_node=compute_node)
+
 
 class ComputeTaskAPI(object):
     """Client side of the conductor 'compute' namespaced RPC API
@@ -46,11 +46,34 @@ workers = cfg.IntOpt(
     help='Number of workers for OpenStack Conductor service. '
          'The default will be the number of CPUs available.')
 
+batch_heartbeats = cfg.BoolOpt(
+    'batch_heartbeats',
+    default=False,
+    help='Send the service state reports and the periodic compute node '
+         'updates of the compute services to nova-conductor, which writes '
+         'them to the database in batches every heartbeat_flush_interval '
+         'seconds, instead of writing each of them in its own transaction. '
+         'This must be set on the compute services, their conductor '
+         'services must support it.')
+
+heartbeat_flush_interval = cfg.IntOpt(
+    'heartbeat_flush_interval',
+    default=5,
+    min=1,
+    help='Number of seconds between the batched writes of the service '
+         'state reports and compute node updates received by a conductor '
+         'service when batch_heartbeats is set on the compute services. '
+         'The state reports are delayed by up to this interval, so '
+         'report_interval plus this interval must stay well below '
+         'service_down_time.')
+
 ALL_OPTS = [
     use_local,
     topic,
     manager,
-    workers]
+    workers,
+    batch_heartbeats,
+    heartbeat_flush_interval]
 
 
 def register_opts(conf):
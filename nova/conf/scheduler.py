@@ -48,6 +48,33 @@ a different scheduler, this option has no effect.
     None
 """)
 
+batch_placement_opt = cfg.BoolOpt("scheduler_batch_placement",
+        default=False,
+        help="""
+If enabled, requests for multiple instances are placed in a single pass: the
+hosts are filtered and weighed once for the first instance, then only the host
+chosen for the previous instance, whose resources were consumed, is filtered
+and weighed again for the next one. The hosts are kept ordered by weight in a
+heap instead of being sorted again for each instance, which greatly reduces
+the time needed to schedule large multi-create requests.
+
+As the other hosts are not weighed again, the weights of the chosen hosts are
+normalized using the minimum and maximum values found when weighing all the
+hosts for the first instance. Requests for instances belonging to a server
+group are always scheduled one instance at a time.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_host_subset_size
+""")
+
 bm_default_filter_opt = cfg.ListOpt("baremetal_scheduler_default_filters",
         default=[
             "RetryFilter",
@@ -208,6 +235,118 @@ a different scheduler, this option has no effect.
     None
 """)
 
+host_mgr_full_refresh_interval_opt = cfg.IntOpt(
+        "scheduler_host_state_full_refresh_interval",
+        default=0,
+        min=0,
+        help="""
+By default the scheduler reads all the compute nodes and nova-compute services
+from the database for every scheduling request in order to refresh its view of
+the hosts. On large deployments this full read can become the biggest part of
+the scheduling time.
+
+When this option is set to a positive value, the scheduler keeps its host
+states between requests and only fetches the compute nodes and services which
+were created, updated or deleted since the previous refresh, so that the cost
+of a refresh depends on how many hosts changed rather than on the total number
+of hosts. A full refresh is still done at least every N seconds, where N is
+the value of this option, in order to recover from any missed change. The
+default value of 0 disables the incremental refresh, and a full refresh is done
+for every request.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    None
+""")
+
+host_mgr_vectorized_opt = cfg.BoolOpt("scheduler_use_vectorized_filters",
+        default=False,
+        help="""
+If enabled, the scheduler runs the filters and weighers which support it on
+all the hosts at once, using NumPy arrays built from the host states, instead
+of calling them for each host. This reduces the time spent filtering and
+weighing on deployments with many hosts. Filters and weighers without a
+vectorized implementation are run for each host as usual.
+
+This requires the NumPy library to be installed; if it is not available, this
+option has no effect.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_default_filters
+    scheduler_weight_classes
+""")
+
+host_mgr_cache_filter_results_opt = cfg.BoolOpt(
+        "scheduler_cache_filter_results",
+        default=False,
+        help="""
+If enabled, the scheduler caches the result of the filters which only depend on
+static attributes of the request, like its flavor extra specs, image properties
+or availability zone, and on the capabilities and aggregates of the hosts, so
+that they are not run again for a host when another request with the same
+attributes is scheduled. These are the AvailabilityZoneFilter,
+ComputeCapabilitiesFilter, ImagePropertiesFilter,
+AggregateInstanceExtraSpecsFilter and AggregateImagePropertiesIsolation
+filters.
+
+The cached results of a host are dropped when its capabilities change, and all
+the cached results are dropped when an aggregate is updated or deleted. The
+number of cache hits and misses is logged at the debug level.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_default_filters
+""")
+
+host_mgr_filter_workers_opt = cfg.IntOpt("scheduler_filter_workers",
+        default=0,
+        min=0,
+        help="""
+Number of processes each scheduler worker starts for running the CPU intensive
+filters, like the NUMATopologyFilter, PciPassthroughFilter and JsonFilter, on
+shards of the hosts in parallel. This lowers the time needed to schedule the
+requests using these filters on deployments with many hosts. Each process
+keeps a copy of the states of its hosts, only the states which changed since
+the previous request are sent to it. The filters are only run in these
+processes when there are enough hosts to filter.
+
+The default value of 0 disables this, all the filters being run by the
+scheduler worker itself.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_default_filters
+""")
+
 rpc_sched_topic_opt = cfg.StrOpt("scheduler_topic",
         default="scheduler",
         help="""
@@ -322,6 +461,93 @@ be sure to test this with your selected scheduler.
     ``nova-service service_down_time``
 """)
 
+shared_claims_file_opt = cfg.StrOpt("scheduler_shared_claims_file",
+        help="""
+Path of a file used by the CachingScheduler workers running on the same node
+to share the resources they consume from their cached host states.
+
+Each worker of the CachingScheduler keeps its own cache of the host states,
+which is only refreshed from the database periodically. When this option is
+set, each worker appends the hosts it selects to this file, and consumes the
+resources selected by the other workers from its own cache before scheduling
+a request, which reduces the number of retries caused by the workers selecting
+the same hosts when running several of them. The file is protected by an
+external lock created in the same directory, which should be on a local
+filesystem.
+
+This option is only used by the CachingScheduler; if you use a different
+scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_driver
+    scheduler_driver_task_period
+""")
+
+stats_interval_opt = cfg.IntOpt("scheduler_stats_interval",
+        default=0,
+        min=0,
+        help="""
+Interval, in seconds, at which the scheduler logs the statistics it collects
+about its filters, weighers and the loading of the host states from the
+database, before resetting them.
+
+For each filter and weigher, the statistics are the number of times it was
+run, the total and maximum time it took and, for the filters, the number of
+hosts it was given and removed. This allows finding which filters dominate the
+time needed to schedule the requests.
+
+The default value of 0 disables the collection of these statistics, unless the
+scheduler_statsd_address option is set.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_statsd_address
+""")
+
+statsd_address_opt = cfg.StrOpt("scheduler_statsd_address",
+        help="""
+Address, as ``host:port``, of a statsd compatible daemon to which the
+scheduler sends the time taken by each of its filters and weighers, the number
+of hosts removed by each filter and the time taken to load the host states
+from the database, for each request.
+
+The metrics are sent over UDP and are named after the
+scheduler_statsd_prefix option, like ``<prefix>.filter.RamFilter.time``. They
+are not sent when this option is not set.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_statsd_prefix
+    scheduler_stats_interval
+""")
+
+statsd_prefix_opt = cfg.StrOpt("scheduler_statsd_prefix",
+        default="nova.scheduler",
+        help="""
+Prefix of the names of the metrics sent to the statsd compatible daemon.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_statsd_address
+""")
+
 isolated_img_opt = cfg.ListOpt("isolated_images",
         default=[],
         help="""
@@ -914,16 +1140,25 @@ soft_anti_affinity_weight_opt = cfg.FloatOpt(
 
 
 default_opts = [host_subset_size_opt,
+               batch_placement_opt,
                bm_default_filter_opt,
                use_bm_filters_opt,
                host_mgr_avail_filt_opt,
                host_mgr_default_filt_opt,
                host_mgr_sched_wgt_cls_opt,
                host_mgr_tracks_inst_chg_opt,
+               host_mgr_full_refresh_interval_opt,
+               host_mgr_vectorized_opt,
+               host_mgr_cache_filter_results_opt,
+               host_mgr_filter_workers_opt,
                rpc_sched_topic_opt,
                sched_driver_host_mgr_opt,
                driver_opt,
                driver_period_opt,
+               shared_claims_file_opt,
+               stats_interval_opt,
+               statsd_address_opt,
+               statsd_prefix_opt,
                scheduler_json_config_location_opt,
                isolated_img_opt,
                isolated_host_opt,
@@ -141,13 +141,18 @@ def service_get_all_by_topic(context, topic):
     return IMPL.service_get_all_by_topic(context, topic)
 
 
-def service_get_all_by_binary(context, binary, include_disabled=False):
+def service_get_all_by_binary(context, binary, include_disabled=False,
+                              changed_since=None):
     """Get services for a given binary.
 
-    Includes disabled services if 'include_disabled' parameter is True
+    Includes disabled services if 'include_disabled' parameter is True.
+    Only returns services created, updated or deleted at or after
+    'changed_since' if that parameter is provided, including the deleted
+    ones.
     """
     return IMPL.service_get_all_by_binary(context, binary,
-                                          include_disabled=include_disabled)
+                                          include_disabled=include_disabled,
+                                          changed_since=changed_since)
 
 
 def service_get_all_by_host(context, host):
@@ -177,6 +182,18 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_report_state_batch(context, reports):
+    """Record the state reports of several services.
+
+    :param context: The security context
+    :param reports: Dictionary mapping the ID of each service to a dictionary
+                    with the number of state reports received from the
+                    service as 'count' and the time the last one was
+                    received as 'last_seen_up'
+    """
+    return IMPL.service_report_state_batch(context, reports)
+
+
 ###################
 
 
@@ -248,6 +265,19 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_changed_since(context, changed_since):
+    """Get compute nodes created, updated or deleted since a given time.
+
+    :param context: The security context
+    :param changed_since: datetime (naive, UTC) to compare the created_at,
+                          updated_at and deleted_at columns against
+
+    :returns: List of dictionaries each containing compute node properties,
+              soft-deleted compute nodes included
+    """
+    return IMPL.compute_node_get_all_changed_since(context, changed_since)
+
+
 def compute_node_get_all_by_host(context, host):
     """Get compute nodes by host name
 
@@ -298,6 +328,19 @@ def compute_node_update(context, compute_id, values):
     return IMPL.compute_node_update(context, compute_id, values)
 
 
+def compute_node_update_batch(context, updates):
+    """Set the given properties on several compute nodes.
+
+    :param context: The security context
+    :param updates: Dictionary mapping the ID of each compute node to a
+                    dictionary with the properties to be updated as 'values'
+                    and the time they were received as 'reported_at', which
+                    is stored as their 'updated_at'. The compute nodes
+                    updated after that time are left unchanged.
+    """
+    return IMPL.compute_node_update_batch(context, updates)
+
+
 def compute_node_delete(context, compute_id):
     """Delete a compute node from the database.
 
@@ -309,15 +352,17 @@ def compute_node_delete(context, compute_id):
     return IMPL.compute_node_delete(context, compute_id)
 
 
-def compute_node_statistics(context):
+def compute_node_statistics(context, use_slave=False):
     """Get aggregate statistics over all compute nodes.
 
     :param context: The security context
+    :param use_slave: Whether the statistics can be read from the slave
+                      database
 
     :returns: Dictionary containing compute node characteristics summed up
               over all the compute nodes, e.g. 'vcpus', 'free_ram_mb' etc.
     """
-    return IMPL.compute_node_statistics(context)
+    return IMPL.compute_node_statistics(context, use_slave=use_slave)
 
 
 ###################
@@ -723,15 +768,17 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
 
 def instance_get_all_by_filters_sort(context, filters, limit=None,
                                      marker=None, columns_to_join=None,
-                                     sort_keys=None, sort_dirs=None):
+                                     sort_keys=None, sort_dirs=None,
+                                     columns=None):
     """Get all instances that match all filters sorted by multiple keys.
 
-    sort_keys and sort_dirs must be a list of strings.
+    sort_keys and sort_dirs must be a list of strings. If columns is given,
+    only these columns of the instances are returned.
     """
     return IMPL.instance_get_all_by_filters_sort(
         context, filters, limit=limit, marker=marker,
         columns_to_join=columns_to_join, sort_keys=sort_keys,
-        sort_dirs=sort_dirs)
+        sort_dirs=sort_dirs, columns=columns)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
@@ -747,9 +794,14 @@ def instance_get_active_by_window_joined(context, begin, end=None,
                                               columns_to_join=columns_to_join)
 
 
-def instance_get_all_by_host(context, host, columns_to_join=None):
-    """Get all instances belonging to a host."""
-    return IMPL.instance_get_all_by_host(context, host, columns_to_join)
+def instance_get_all_by_host(context, host, columns_to_join=None,
+                             columns=None):
+    """Get all instances belonging to a host.
+
+    If columns is given, only these columns of the instances are returned.
+    """
+    return IMPL.instance_get_all_by_host(context, host, columns_to_join,
+                                         columns=columns)
 
 
 def instance_get_all_by_host_and_node(context, host, node,
@@ -1157,6 +1209,25 @@ def quota_reserve(context, resources, quotas, user_quotas, deltas, expire,
                               project_id=project_id, user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None):
+    """Check quotas and create appropriate reservations without locking the
+    quota usages.
+    """
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
+def quota_usage_reconcile(context, resources, until_refresh, limit=None):
+    """Resync the quota usages which are out of sync or due for a refresh."""
+    return IMPL.quota_usage_reconcile(context, resources, until_refresh,
+                                      limit=limit)
+
+
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
@@ -1973,6 +2044,31 @@ def archive_deleted_rows(max_rows=None):
     return IMPL.archive_deleted_rows(max_rows=max_rows)
 
 
+def archive_deleted_rows_for_table(tablename, max_rows):
+    """Move up to max_rows deleted rows from one table to the corresponding
+    shadow table.
+
+    :returns: number of rows archived
+    :raises: DBReferenceError if a foreign key keeps some of the rows from
+             being deleted
+    """
+    return IMPL.archive_deleted_rows_for_table(tablename, max_rows)
+
+
+def archive_deleted_rows_table_levels():
+    """Return the names of the tables to archive, grouped in levels which
+    must be archived in order.
+    """
+    return IMPL.archive_deleted_rows_table_levels()
+
+
+def get_replication_lag():
+    """Return the number of seconds the slave database is behind the master
+    database, or None if it is unknown.
+    """
+    return IMPL.get_replication_lag()
+
+
 def pcidevice_online_data_migration(context, max_count):
     return IMPL.pcidevice_online_data_migration(context, max_count)
 
@@ -0,0 +1,175 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Archiving of the deleted rows in batches, until there are none left.
+"""
+
+import os
+import time
+
+from eventlet import greenpool
+from eventlet import greenthread
+from oslo_db import exception as db_exc
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+import six
+
+from nova import db
+from nova.i18n import _LI
+from nova.i18n import _LW
+
+LOG = logging.getLogger(__name__)
+
+# Number of seconds to wait before checking the replication lag again when
+# it is too high
+REPLICATION_LAG_POLL_INTERVAL = 5
+
+
+class ArchiveCheckpoint(object):
+    """The tables fully archived and the number of rows archived from each
+    table, saved to a file after each batch so that an interrupted archiving
+    can be resumed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = set()
+        self.archived = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                state = jsonutils.load(f)
+            self.done = set(state['done'])
+            self.archived = state['archived']
+
+    def record(self, tablename, rows, done=False):
+        if rows:
+            self.archived[tablename] = self.archived.get(tablename, 0) + rows
+        if done:
+            self.done.add(tablename)
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            jsonutils.dump({'done': sorted(self.done),
+                            'archived': self.archived}, f)
+        os.rename(tmp_path, self.path)
+
+    def remove(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DeletedRowsArchiver(object):
+    """Move all the deleted rows to the shadow tables, batch_size rows of a
+    table at a time.
+
+    The tables are archived in the order of their foreign keys, and the
+    tables which don't depend on each other are archived by up to workers
+    concurrent greenthreads. The archiving is slowed down to archive at most
+    max_rows_per_second rows per second, and paused while the slave database
+    is more than max_replication_lag seconds behind the master database.
+
+    A table whose deleted rows are still referenced by the rows of another
+    table is left incomplete, and reported in the blocked attribute once the
+    archiving ran.
+    """
+
+    def __init__(self, batch_size=1000, workers=1, max_rows_per_second=None,
+                 max_replication_lag=None, checkpoint_path=None,
+                 progress=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_rows_per_second = max_rows_per_second
+        self.max_replication_lag = max_replication_lag
+        self.checkpoint = ArchiveCheckpoint(checkpoint_path)
+        # Called with the table name, the number of rows archived from the
+        # table so far and the rate of archiving after each batch
+        self.progress = progress
+        # Error which stopped the archiving of a table, by table name
+        self.blocked = {}
+        self._start = None
+        self._rows = 0
+
+    def _wait_for_replication(self):
+        if self.max_replication_lag is None:
+            return
+        while True:
+            lag = db.get_replication_lag()
+            if lag is None or lag <= self.max_replication_lag:
+                return
+            LOG.info(_LI("The slave database is %(lag)s seconds behind, "
+                         "pausing the archiving"), {'lag': lag})
+            greenthread.sleep(REPLICATION_LAG_POLL_INTERVAL)
+
+    def _throttle(self, rows):
+        self._rows += rows
+        if rows and self.max_rows_per_second:
+            delay = (float(self._rows) / self.max_rows_per_second -
+                     (time.time() - self._start))
+            if delay > 0:
+                greenthread.sleep(delay)
+
+    def _rate(self):
+        elapsed = time.time() - self._start
+        return self._rows / elapsed if elapsed else 0.0
+
+    def _archive_table(self, tablename):
+        while True:
+            self._wait_for_replication()
+            try:
+                rows = db.archive_deleted_rows_for_table(tablename,
+                                                         self.batch_size)
+            except db_exc.DBReferenceError as e:
+                # NOTE: The rows are archived in the order of their id, so
+                # the next batches would be blocked by the same rows. The
+                # table is not marked done so that a resumed run retries it.
+                LOG.warning(_LW("Foreign key constraint failure when "
+                                "archiving table %(table)s, skipping the "
+                                "table: %(error)s"),
+                            {'table': tablename, 'error': e})
+                self.blocked[tablename] = six.text_type(e)
+                return
+            done = rows < self.batch_size
+            self.checkpoint.record(tablename, rows, done=done)
+            self._throttle(rows)
+            if rows and self.progress is not None:
+                self.progress(tablename, self.checkpoint.archived[tablename],
+                              self._rate())
+            if done:
+                return
+
+    def run(self):
+        """Archive the deleted rows of all the tables.
+
+        :returns: dict that maps table name to number of rows archived from
+                  that table, including the rows archived by the runs
+                  resumed from the checkpoint. The checkpoint is kept when
+                  some tables are blocked, see the blocked attribute.
+        """
+        self._start = time.time()
+        pool = greenpool.GreenPool(self.workers)
+        for level in db.archive_deleted_rows_table_levels():
+            threads = [pool.spawn(self._archive_table, tablename)
+                       for tablename in level
+                       if tablename not in self.checkpoint.done]
+            # Let the other tables of the level complete before raising the
+            # error of a table, if any
+            pool.waitall()
+            for thread in threads:
+                thread.wait()
+        if not self.blocked:
+            self.checkpoint.remove()
+        return dict(self.checkpoint.archived)
@@ -23,6 +23,7 @@ import datetime
 import functools
 import inspect
 import sys
+import time
 import uuid
 
 from oslo_config import cfg
@@ -62,6 +63,7 @@ from nova import block_device
 from nova.compute import task_states
 from nova.compute import vm_states
 import nova.context
+from nova.db.sqlalchemy import instrumentation
 from nova.db.sqlalchemy import models
 from nova import exception
 from nova.i18n import _, _LI, _LE, _LW
@@ -75,6 +77,29 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.IntOpt('db_slave_max_staleness',
+               default=30,
+               min=0,
+               help='Maximum number of seconds the MySQL slave database can '
+                    'lag behind the master database for the reads allowed '
+                    'to use the slave database. While the slave database '
+                    'lags more, or its replication is stopped, these reads '
+                    'use the master database. The callers can declare '
+                    'their own staleness instead. 0 disables the check.'),
+    cfg.BoolOpt('db_instrumentation',
+                default=False,
+                help='Record the number of calls, latencies, rows returned '
+                     'and SQL statements executed of each DB API function, '
+                     'and the connection pool checkout waits and statements '
+                     'per transaction of the database engines. The '
+                     'statistics are added to the Guru Meditation Report '
+                     'of the services.'),
+    cfg.IntOpt('db_instrumentation_log_interval',
+               default=600,
+               min=0,
+               help='Number of seconds between the logs of the statistics '
+                    'recorded when db_instrumentation is enabled. 0 '
+                    'disables the logs.'),
 ]
 
 api_db_opts = [
@@ -137,6 +162,16 @@ main_context_manager = enginefacade.transaction_context()
 api_context_manager = enginefacade.transaction_context()
 
 
+def _instrument_engine(engine):
+    if CONF.db_instrumentation:
+        instrumentation.STATS.instrument_engine(engine)
+        instrumentation.STATS.start(CONF.db_instrumentation_log_interval)
+
+
+main_context_manager.append_on_engine_create(_instrument_engine)
+api_context_manager.append_on_engine_create(_instrument_engine)
+
+
 def _get_db_conf(conf_group, connection=None):
     kw = dict(
         connection=connection or conf_group.connection,
@@ -177,6 +212,7 @@ def create_context_manager(connection=None):
     """
     ctxt_mgr = enginefacade.transaction_context()
     ctxt_mgr.configure(**_get_db_conf(CONF.database, connection=connection))
+    ctxt_mgr.append_on_engine_create(_instrument_engine)
     return ctxt_mgr
 
 
@@ -208,7 +244,12 @@ PER_PROJECT_QUOTAS = ['fixed_ips', 'floating_ips', 'networks']
 
 
 def get_backend():
-    """The backend is this module itself."""
+    """The backend is this module itself, instrumented if db_instrumentation
+    is enabled.
+    """
+    if CONF.db_instrumentation:
+        return instrumentation.InstrumentedBackend(sys.modules[__name__],
+                                                   instrumentation.STATS)
     return sys.modules[__name__]
 
 
@@ -258,6 +299,50 @@ def require_aggregate_exists(f):
     return wrapper
 
 
+# Number of seconds the replication lag of the slave database is cached for
+SLAVE_LAG_CHECK_INTERVAL = 5
+
+_slave_lag = {'lag': None, 'checked_at': None}
+
+
+def _get_slave_lag():
+    """Return the replication lag of the slave database, checked at most
+    every SLAVE_LAG_CHECK_INTERVAL seconds.
+    """
+    now = time.time()
+    checked_at = _slave_lag['checked_at']
+    if checked_at is None or now - checked_at >= SLAVE_LAG_CHECK_INTERVAL:
+        _slave_lag['checked_at'] = now
+        try:
+            _slave_lag['lag'] = get_replication_lag()
+        except db_exc.DBError as e:
+            # The reads using the slave database will report the error if it
+            # is unreachable
+            LOG.debug('Unable to get the slave database replication lag: %s',
+                      e)
+            _slave_lag['lag'] = None
+    return _slave_lag['lag']
+
+
+def _slave_is_fresh(max_staleness):
+    """Return whether the slave database, if any, lags at most max_staleness
+    seconds behind the master database.
+    """
+    if not CONF.database.slave_connection or not max_staleness:
+        return True
+    lag = _get_slave_lag()
+    if lag is not None:
+        # NOTE: The lag may have grown by up to SLAVE_LAG_CHECK_INTERVAL
+        # seconds since it was checked, so account for the age of the check
+        lag += time.time() - _slave_lag['checked_at']
+    if lag is not None and lag > max_staleness:
+        LOG.debug('The slave database is %(lag)s seconds behind, more than '
+                  '%(max_staleness)d seconds, using the master database',
+                  {'lag': lag, 'max_staleness': max_staleness})
+        return False
+    return True
+
+
 def select_db_reader_mode(f):
     """Decorator to select synchronous or asynchronous reader mode.
 
@@ -265,6 +350,10 @@ def select_db_reader_mode(f):
     will be used if 'use_slave' is True and synchronous reader otherwise.
     If 'use_slave' is not specified default value 'False' will be used.
 
+    'use_slave' can also be the number of seconds of staleness accepted by
+    the caller, instead of the db_slave_max_staleness option. The
+    synchronous reader is used while the slave database lags more.
+
     Wrapped function must have a context in the arguments.
     """
 
@@ -276,10 +365,15 @@ def select_db_reader_mode(f):
         context = keyed_args['context']
         use_slave = keyed_args.get('use_slave', False)
 
-        if use_slave:
-            reader_mode = main_context_manager.async
+        if use_slave is True:
+            max_staleness = CONF.db_slave_max_staleness
+        else:
+            max_staleness = use_slave
+        ctxt_mgr = get_context_manager(context)
+        if use_slave and _slave_is_fresh(max_staleness):
+            reader_mode = ctxt_mgr.async
         else:
-            reader_mode = main_context_manager.reader
+            reader_mode = ctxt_mgr.reader
 
         with reader_mode.using(context):
             return f(*args, **kwargs)
@@ -544,12 +638,20 @@ def service_get_by_host_and_topic(context, host, topic):
                 first()
 
 
-@pick_context_manager_reader
-def service_get_all_by_binary(context, binary, include_disabled=False):
-    query = model_query(context, models.Service, read_deleted="no").\
+@pick_context_manager_reader_allow_async
+def service_get_all_by_binary(context, binary, include_disabled=False,
+                              changed_since=None):
+    # NOTE: The services deleted since changed_since are returned too, so
+    # that the callers refreshing their services can drop them
+    read_deleted = "no" if changed_since is None else "yes"
+    query = model_query(context, models.Service, read_deleted=read_deleted).\
                     filter_by(binary=binary)
     if not include_disabled:
         query = query.filter_by(disabled=False)
+    if changed_since is not None:
+        query = query.filter(or_(models.Service.created_at >= changed_since,
+                                 models.Service.updated_at >= changed_since,
+                                 models.Service.deleted_at >= changed_since))
     return query.all()
 
 
@@ -618,6 +720,24 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def service_report_state_batch(context, reports):
+    """Record the state reports of several services in a single
+    transaction.
+    """
+    table = models.Service.__table__
+    update = table.update().\
+        where(table.c.id == sql.bindparam('_id')).\
+        where(table.c.deleted == 0).\
+        values(report_count=table.c.report_count + sql.bindparam('_count'),
+               last_seen_up=sql.bindparam('_last_seen_up'))
+    context.session.execute(update, [
+        {'_id': service_id, '_count': report['count'],
+         '_last_seen_up': report['last_seen_up']}
+        for service_id, report in reports.items()])
+
+
 ###################
 
 
@@ -770,7 +890,10 @@ def _compute_node_select(context, filters=None):
 
     select = sa.select(cols_in_output).select_from(disk_join)
 
-    if context.read_deleted == "no":
+    # NOTE: Deleted compute nodes are always returned when asking for the
+    # changed ones so that callers keeping a local copy of the compute nodes
+    # know which ones they need to drop.
+    if context.read_deleted == "no" and "changed_since" not in filters:
         select = select.where(cn_tbl.c.deleted == 0)
     if "compute_id" in filters:
         select = select.where(cn_tbl.c.id == filters["compute_id"])
@@ -781,6 +904,11 @@ def _compute_node_select(context, filters=None):
     if "hypervisor_hostname" in filters:
         hyp_hostname = filters["hypervisor_hostname"]
         select = select.where(cn_tbl.c.hypervisor_hostname == hyp_hostname)
+    if "changed_since" in filters:
+        changed_since = filters["changed_since"]
+        select = select.where(sql.or_(cn_tbl.c.created_at >= changed_since,
+                                      cn_tbl.c.updated_at >= changed_since,
+                                      cn_tbl.c.deleted_at >= changed_since))
 
     engine = get_engine(context)
     conn = engine.connect()
@@ -838,11 +966,16 @@ def compute_node_get_all_by_host(context, host):
     return results
 
 
-@pick_context_manager_reader
+@pick_context_manager_reader_allow_async
 def compute_node_get_all(context):
     return _compute_node_select(context)
 
 
+@pick_context_manager_reader_allow_async
+def compute_node_get_all_changed_since(context, changed_since):
+    return _compute_node_select(context, {"changed_since": changed_since})
+
+
 @pick_context_manager_reader
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -881,6 +1014,37 @@ def compute_node_update(context, compute_id, values):
     return compute_ref
 
 
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def compute_node_update_batch(context, updates):
+    """Update several ComputeNode records in a single transaction."""
+    table = models.ComputeNode.__table__
+    params_by_columns = collections.defaultdict(list)
+    for compute_id, update in updates.items():
+        values = dict(update['values'])
+        convert_objects_related_datetimes(values)
+        params = {'_' + key: value for key, value in values.items()}
+        params.update(_id=compute_id, _reported_at=update['reported_at'])
+        params_by_columns[tuple(sorted(values))].append(params)
+
+    for columns, params in params_by_columns.items():
+        values = {column: sql.bindparam('_' + column) for column in columns}
+        # NOTE: The compute nodes are stamped with the reception time of the
+        # update rather than the flush time, which can be later than the
+        # reception of a newer update and make the check below discard it
+        values['updated_at'] = sql.bindparam('_reported_at')
+        # NOTE: Leave the compute nodes updated since the reception of the
+        # update alone, by compute_node_update() or by another conductor,
+        # as they are more recent than the update
+        update = table.update().\
+            where(table.c.id == sql.bindparam('_id')).\
+            where(table.c.deleted == 0).\
+            where(or_(table.c.updated_at == null(),
+                      table.c.updated_at <= sql.bindparam('_reported_at'))).\
+            values(values)
+        context.session.execute(update, params)
+
+
 @pick_context_manager_writer
 def compute_node_delete(context, compute_id):
     """Delete a ComputeNode record."""
@@ -892,8 +1056,8 @@ def compute_node_delete(context, compute_id):
         raise exception.ComputeHostNotFound(host=compute_id)
 
 
-@pick_context_manager_reader
-def compute_node_statistics(context):
+@select_db_reader_mode
+def compute_node_statistics(context, use_slave=False):
     """Compute statistics over all compute nodes."""
 
     # TODO(sbauza): Remove the service_id filter in a later release
@@ -2015,35 +2179,81 @@ def _build_instance_get(context, columns_to_join=None):
     return query
 
 
+# The number of instances whose manually-joined tables are read by each side
+# query of _instances_fill_metadata()
+_INSTANCE_FILL_CHUNK_SIZE = 250
+
+# The joined columns of the instances which instance_get_all_by_filters_sort()
+# reads with side queries too, on top of the _manual_join_columns() ones
+_INSTANCE_SIDE_JOINS = ('info_cache', 'security_groups', 'extra')
+
+
 def _instances_fill_metadata(context, instances, manual_joins=None):
     """Selectively fill instances with manually-joined metadata. Note that
     instance will be converted to a dict.
 
+    The manually-joined tables are read by side queries over chunks of
+    _INSTANCE_FILL_CHUNK_SIZE instances.
+
     :param context: security context
     :param instances: list of instances to fill
     :param manual_joins: list of tables to manually join (can be any
-                         combination of 'metadata' and 'system_metadata' or
-                         None to take the default of both)
+                         combination of 'metadata', 'system_metadata',
+                         'pci_devices', 'info_cache', 'security_groups',
+                         'extra' and 'extra.<column>' or None to take the
+                         default of 'metadata' and 'system_metadata')
     """
     uuids = [inst['uuid'] for inst in instances]
 
     if manual_joins is None:
         manual_joins = ['metadata', 'system_metadata']
 
+    queries = 0
     meta = collections.defaultdict(list)
-    if 'metadata' in manual_joins:
-        for row in _instance_metadata_get_multi(context, uuids):
-            meta[row['instance_uuid']].append(row)
-
     sys_meta = collections.defaultdict(list)
-    if 'system_metadata' in manual_joins:
-        for row in _instance_system_metadata_get_multi(context, uuids):
-            sys_meta[row['instance_uuid']].append(row)
-
+    meta_by_kind = {'metadata': meta, 'system_metadata': sys_meta}
+    kinds = [kind for kind in ('metadata', 'system_metadata')
+             if kind in manual_joins]
     pcidevs = collections.defaultdict(list)
-    if 'pci_devices' in manual_joins:
-        for row in _instance_pcidevs_get_multi(context, uuids):
-            pcidevs[row['instance_uuid']].append(row)
+    info_caches = {}
+    sec_groups = collections.defaultdict(list)
+    extras = {}
+    extra_columns = [column.split('.', 1)[1] for column in manual_joins
+                     if column.startswith('extra.')]
+    join_extra = 'extra' in manual_joins or bool(extra_columns)
+
+    for start in range(0, len(uuids), _INSTANCE_FILL_CHUNK_SIZE):
+        chunk = uuids[start:start + _INSTANCE_FILL_CHUNK_SIZE]
+        if kinds:
+            queries += 1
+            for row in _instance_all_metadata_get_multi(context, chunk,
+                                                        kinds):
+                meta_by_kind[row.kind][row.instance_uuid].append(
+                    {'key': row.key, 'value': row.value,
+                     'deleted': row.deleted})
+        if 'pci_devices' in manual_joins:
+            queries += 1
+            for row in _instance_pcidevs_get_multi(context, chunk):
+                pcidevs[row['instance_uuid']].append(row)
+        if 'info_cache' in manual_joins:
+            queries += 1
+            for info_cache in _instance_info_cache_get_multi(context,
+                                                             chunk):
+                info_caches[info_cache['instance_uuid']] = info_cache
+        if 'security_groups' in manual_joins:
+            queries += 1
+            for instance_uuid, sec_group in (
+                    _instance_security_groups_get_multi(context, chunk)):
+                sec_groups[instance_uuid].append(sec_group)
+        if join_extra:
+            queries += 1
+            for extra in _instance_extra_get_multi(context, chunk,
+                                                   extra_columns):
+                extras[extra['instance_uuid']] = extra
+
+    LOG.debug('Filled %(instances)d instances with %(joins)s in %(queries)d '
+              'queries', {'instances': len(uuids), 'joins': manual_joins,
+                          'queries': queries})
 
     filled_instances = []
     for inst in instances:
@@ -2052,6 +2262,15 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
         inst['metadata'] = meta[inst['uuid']]
         if 'pci_devices' in manual_joins:
             inst['pci_devices'] = pcidevs[inst['uuid']]
+        if 'info_cache' in manual_joins:
+            inst['info_cache'] = info_caches.get(inst['uuid'])
+        if 'security_groups' in manual_joins:
+            # NOTE: Like the Instance.security_groups relationship, the
+            # deleted instances have no security groups
+            inst['security_groups'] = (sec_groups[inst['uuid']]
+                                       if not inst['deleted'] else [])
+        if join_extra:
+            inst['extra'] = extras.get(inst['uuid'])
         filled_instances.append(inst)
 
     return filled_instances
@@ -2119,15 +2338,36 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                             sort_dirs=[sort_dir])
 
 
+def _instance_columns(columns):
+    """Return the Instance model columns to select for a list of column
+    names, which always includes the id and the uuid.
+    """
+    names = ['id', 'uuid'] + [name for name in columns
+                              if name not in ('id', 'uuid')]
+    for name in names:
+        if name not in models.Instance.__table__.c:
+            raise exception.InvalidInput(
+                reason=_('Invalid instance column: %s') % name)
+    return [getattr(models.Instance, name) for name in names]
+
+
+def _instance_columns_to_dicts(rows):
+    return [dict(zip(row.keys(), row)) for row in rows]
+
+
 @require_context
 @pick_context_manager_reader_allow_async
 def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                      columns_to_join=None, sort_keys=None,
-                                     sort_dirs=None):
+                                     sort_dirs=None, columns=None):
     """Return instances that match all filters sorted by the given keys.
     Deleted instances will be returned by default, unless there's a filter that
     says otherwise.
 
+    When a list of columns is given, only these columns of the instances are
+    selected, along with their id and uuid, and the instances are returned
+    as dicts without any joined column.
+
     Depending on the name of a filter, matching for that filter is
     performed using either exact matching or as regular expression
     matching. Exact matching is applied for the following filters::
@@ -2184,14 +2424,28 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                                sort_dirs,
                                                default_dir='desc')
 
-    if columns_to_join is None:
-        columns_to_join_new = ['info_cache', 'security_groups']
-        manual_joins = ['metadata', 'system_metadata']
+    if columns is not None:
+        columns_to_join_new = []
+        manual_joins = []
+        query_prefix = context.session.query(*_instance_columns(columns))
+    elif columns_to_join is None:
+        columns_to_join_new = []
+        manual_joins = ['metadata', 'system_metadata', 'info_cache',
+                        'security_groups']
+        query_prefix = context.session.query(models.Instance)
     else:
         manual_joins, columns_to_join_new = (
             _manual_join_columns(columns_to_join))
+        # NOTE: The other joined columns are read by side queries too,
+        # rather than joined to the page of instances
+        side_joins = [column for column in columns_to_join_new
+                      if column in _INSTANCE_SIDE_JOINS or
+                      column.startswith('extra.')]
+        manual_joins.extend(side_joins)
+        columns_to_join_new = [column for column in columns_to_join_new
+                               if column not in side_joins]
+        query_prefix = context.session.query(models.Instance)
 
-    query_prefix = context.session.query(models.Instance)
     for column in columns_to_join_new:
         if 'extra.' in column:
             query_prefix = query_prefix.options(undefer(column))
@@ -2284,27 +2538,147 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     if query_prefix is None:
         return []
     query_prefix = _regex_instance_filter(query_prefix, filters)
+    query_prefix = _ip_instance_filter(query_prefix, filters)
     query_prefix = _tag_instance_filter(context, query_prefix, filters)
 
     # paginate query
+    marker_values = None
     if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(
-                    context.elevated(read_deleted='yes'), marker)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
+        marker_values = _instance_get_marker_values(context, marker,
+                                                    sort_keys)
     try:
-        query_prefix = sqlalchemyutils.paginate_query(query_prefix,
+        query_prefix = _keyset_paginate_query(query_prefix,
                                models.Instance, limit,
-                               sort_keys,
-                               marker=marker,
-                               sort_dirs=sort_dirs)
+                               sort_keys, sort_dirs,
+                               marker_values=marker_values)
     except db_exc.InvalidSortKey:
         raise exception.InvalidSortKey()
 
+    if columns is not None:
+        return _instance_columns_to_dicts(query_prefix.all())
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+def _instance_get_marker_values(context, marker, sort_keys):
+    """Return the values of the sort keys of the marker instance.
+
+    Only the sort key columns of the marker are loaded, through the unique
+    index on uuid, rather than the whole instance with its joined columns.
+    """
+    try:
+        columns = [getattr(models.Instance, key) for key in sort_keys]
+    except AttributeError:
+        raise exception.InvalidSortKey()
+    values = model_query(context, models.Instance, columns,
+                         read_deleted='yes').\
+                filter_by(uuid=marker).\
+                first()
+    if values is None:
+        raise exception.MarkerNotFound(marker=marker)
+    return list(values)
+
+
+def _keyset_paginate_query(query, model, limit, sort_keys, sort_dirs,
+                           marker_values=None):
+    """Returns a query with sorting and keyset pagination criteria added.
+
+    Like sqlalchemyutils.paginate_query(), the rows following the marker are
+    selected with the lexicographical criteria on the sort keys::
+
+    |   (k1 > X1) or (k1 == X1 and k2 > X2) or ...
+
+    but the criteria are given the values of the sort keys of the marker
+    instead of the marker row, and are additionally bound by (k1 >= X1), so
+    that the database seeks through an index on the leading sort key instead
+    of evaluating the criteria on each row preceding the marker.
+
+    :param query: the query object to which we should add paging/sorting
+    :param model: the ORM model class
+    :param limit: maximum number of items to return
+    :param sort_keys: array of attributes by which results should be sorted,
+                      ending with a unique key
+    :param sort_dirs: per-column array of sort directions, asc or desc
+    :param marker_values: values of the sort keys of the last item of the
+                          previous page
+    """
+    if marker_values is not None:
+        criteria_list = []
+        for i, sort_key in enumerate(sort_keys):
+            crit_attrs = [getattr(model, sort_keys[j]) == marker_values[j]
+                          for j in range(i)]
+            model_attr = getattr(model, sort_key)
+            if sort_dirs[i] == 'desc':
+                crit_attrs.append(model_attr < marker_values[i])
+            else:
+                crit_attrs.append(model_attr > marker_values[i])
+            criteria_list.append(and_(*crit_attrs))
+        criteria = or_(*criteria_list)
+
+        # NOTE: The rows with a NULL leading sort key are never selected by
+        # the criteria above, so the bound can't be applied to them
+        if marker_values[0] is not None:
+            model_attr = getattr(model, sort_keys[0])
+            if sort_dirs[0] == 'desc':
+                bound = model_attr <= marker_values[0]
+            else:
+                bound = model_attr >= marker_values[0]
+            criteria = and_(bound, criteria)
+        query = query.filter(criteria)
+
+    return sqlalchemyutils.paginate_query(query, model, limit, sort_keys,
+                                          sort_dirs=sort_dirs)
+
+
+def _get_ip_like_pattern(regex):
+    """Return a LIKE pattern matching the JSON encoded IP addresses which
+    the regular expression matches, or None if the expression is not a plain
+    address or prefix of an address.
+    """
+    if not isinstance(regex, six.string_types):
+        return None
+    exact = regex.endswith('$') and not regex.endswith('\\$')
+    regex = regex[1 if regex.startswith('^') else 0:-1 if exact else None]
+    pattern = ''
+    i = 0
+    while i < len(regex):
+        char = regex[i]
+        if regex.startswith('\\.', i):
+            pattern += '.'
+            i += 1
+        elif char == '.':
+            pattern += '_'
+        elif char == ':' or char.isalnum():
+            pattern += char
+        else:
+            return None
+        i += 1
+    return '%%"%s%s' % (pattern, '"%' if exact else '%')
+
+
+def _ip_instance_filter(query, filters):
+    """Applies a coarse IP address filtering to an Instance query.
+
+    The IP addresses are only known from the network info cache of the
+    instances, and the regular expressions of the 'ip' and 'ip6' filters are
+    matched exactly against them by the compute API. This discards in SQL
+    the instances whose network info can't match the filters, when they are
+    plain addresses or prefixes of addresses like the ones built from the
+    fixed_ip search option.
+
+    Returns the updated query.
+
+    :param query: query to apply filters to
+    :param filters: dictionary of filters
+    """
+    patterns = [_get_ip_like_pattern(filters[key])
+                for key in ('ip', 'ip6') if key in filters]
+    if not patterns or None in patterns:
+        return query
+    network_info = models.InstanceInfoCache.network_info
+    return query.filter(models.Instance.info_cache.has(
+        or_(*[network_info.like(pattern) for pattern in patterns])))
+
+
 def _tag_instance_filter(context, query, filters):
     """Applies tag filtering to an Instance query.
 
@@ -2578,7 +2952,12 @@ def _instance_get_all_query(context, project_only=False, joins=None):
 
 
 @pick_context_manager_reader_allow_async
-def instance_get_all_by_host(context, host, columns_to_join=None):
+def instance_get_all_by_host(context, host, columns_to_join=None,
+                             columns=None):
+    if columns is not None:
+        return _instance_columns_to_dicts(
+            model_query(context, models.Instance, _instance_columns(columns)).
+            filter_by(host=host).all())
     return _instances_fill_metadata(context,
       _instance_get_all_query(context).filter_by(host=host).all(),
                               manual_joins=columns_to_join)
@@ -2892,6 +3271,14 @@ def instance_info_cache_get(context, instance_uuid):
                          first()
 
 
+def _instance_info_cache_get_multi(context, instance_uuids):
+    # NOTE: Like the Instance.info_cache relationship, the deleted info
+    # caches are returned too
+    return model_query(context, models.InstanceInfoCache,
+                       read_deleted='yes').\
+        filter(models.InstanceInfoCache.instance_uuid.in_(instance_uuids))
+
+
 @require_context
 @pick_context_manager_writer
 def instance_info_cache_update(context, instance_uuid, values):
@@ -2981,6 +3368,17 @@ def instance_extra_get_by_instance_uuid(context, instance_uuid,
     return instance_extra
 
 
+def _instance_extra_get_multi(context, instance_uuids, columns):
+    """Return the instance_extra records of the instances with the given
+    deferred columns loaded.
+    """
+    query = model_query(context, models.InstanceExtra, read_deleted='yes').\
+        filter(models.InstanceExtra.instance_uuid.in_(instance_uuids))
+    for column in columns:
+        query = query.options(undefer(column))
+    return query
+
+
 ###################
 
 
@@ -3776,6 +4174,36 @@ def _calculate_overquota(project_quotas, user_quotas, deltas,
     return overs
 
 
+def _raise_over_quota(project_quotas, user_quotas, deltas, overs,
+                      project_usages, user_usages):
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        # NOTE(mriedem): user_usages is a dict of resource keys to
+        # QuotaUsage sqlalchemy dict-like objects and doen't log well
+        # so convert the user_usages values to something useful for
+        # logging. Remove this if we ever change how
+        # _get_project_user_quota_usages returns the user_usages values.
+        user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
+                               total=v['total'])
+                  for k, v in user_usages.items()}
+        usages = user_usages
+    usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
+              for k, v in usages.items()}
+    LOG.debug('Raise OverQuota exception because: '
+              'project_quotas: %(project_quotas)s, '
+              'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
+              'overs: %(overs)s, project_usages: %(project_usages)s, '
+              'user_usages: %(user_usages)s',
+              {'project_quotas': project_quotas,
+               'user_quotas': user_quotas,
+               'overs': overs, 'deltas': deltas,
+               'project_usages': project_usages,
+               'user_usages': user_usages})
+    raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                              usages=usages)
+
+
 @require_context
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @main_context_manager.writer
@@ -3895,36 +4323,260 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                         "resources: %s"), unders)
 
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            # NOTE(mriedem): user_usages is a dict of resource keys to
-            # QuotaUsage sqlalchemy dict-like objects and doen't log well
-            # so convert the user_usages values to something useful for
-            # logging. Remove this if we ever change how
-            # _get_project_user_quota_usages returns the user_usages values.
-            user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
-                                   total=v['total'])
-                      for k, v in user_usages.items()}
-            usages = user_usages
-        usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
-                  for k, v in usages.items()}
-        LOG.debug('Raise OverQuota exception because: '
-                  'project_quotas: %(project_quotas)s, '
-                  'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
-                  'overs: %(overs)s, project_usages: %(project_usages)s, '
-                  'user_usages: %(user_usages)s',
-                  {'project_quotas': project_quotas,
-                   'user_quotas': user_quotas,
-                   'overs': overs, 'deltas': deltas,
-                   'project_usages': project_usages,
-                   'user_usages': user_usages})
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages)
+        _raise_over_quota(project_quotas, user_quotas, deltas, overs,
+                          project_usages, user_usages)
 
     return reservations
 
 
+# NOTE: The number of times an optimistic reservation is attempted when the
+# usages it was checked against change concurrently, before falling back to
+# the locking reservation.
+QUOTA_RESERVE_CAS_RETRIES = 3
+
+
+class _QuotaUsagesChanged(Exception):
+    """The quota usages changed since they were read."""
+
+
+class _QuotaUsagesRefreshRequired(Exception):
+    """The quota usages must be created or refreshed before reserving."""
+
+
+def _get_project_user_quota_usages_unlocked(context, project_id, user_id):
+    """Return the quota usages like _get_project_user_quota_usages() does,
+    without locking them, and with the usages of the user as dicts which
+    also hold the id and the refresh state of the rows.
+
+    The usages of the other users are returned too, keyed by resource, so
+    that the caller can check that they didn't change either.
+    """
+    rows = model_query(context, models.QuotaUsage,
+                       (models.QuotaUsage.id, models.QuotaUsage.user_id,
+                        models.QuotaUsage.resource, models.QuotaUsage.in_use,
+                        models.QuotaUsage.reserved,
+                        models.QuotaUsage.until_refresh,
+                        models.QuotaUsage.created_at,
+                        models.QuotaUsage.updated_at),
+                       read_deleted="no").\
+        filter_by(project_id=project_id).\
+        all()
+    proj_result = dict()
+    user_result = dict()
+    other_rows = collections.defaultdict(list)
+    for row in rows:
+        proj_result.setdefault(row.resource,
+                               dict(in_use=0, reserved=0, total=0))
+        proj_result[row.resource]['in_use'] += row.in_use
+        proj_result[row.resource]['reserved'] += row.reserved
+        proj_result[row.resource]['total'] += (row.in_use + row.reserved)
+        usage = dict(id=row.id, in_use=row.in_use, reserved=row.reserved,
+                     total=row.in_use + row.reserved,
+                     until_refresh=row.until_refresh,
+                     updated_at=row.updated_at or row.created_at)
+        if row.user_id is None or row.user_id == user_id:
+            user_result[row.resource] = usage
+        else:
+            other_rows[row.resource].append(usage)
+    return proj_result, user_result, other_rows
+
+
+def _usage_unchanged(usage):
+    """Return the condition matching a quota usage row which wasn't changed
+    since it was read.
+    """
+    return and_(models.QuotaUsage.id == usage['id'],
+                models.QuotaUsage.in_use == usage['in_use'],
+                models.QuotaUsage.reserved == usage['reserved'],
+                models.QuotaUsage.until_refresh == usage['until_refresh'])
+
+
+@oslo_db_api.wrap_db_retry(
+    max_retries=QUOTA_RESERVE_CAS_RETRIES, retry_interval=0,
+    inc_retry_interval=False, retry_on_deadlock=True,
+    exception_checker=lambda exc: isinstance(exc, _QuotaUsagesChanged))
+@main_context_manager.writer
+def _quota_reserve_optimistic(context, project_quotas, user_quotas, deltas,
+                              expire, max_age, project_id, user_id):
+    if not deltas:
+        return []
+
+    project_usages, user_usages, other_usages = \
+        _get_project_user_quota_usages_unlocked(context, project_id, user_id)
+
+    # The usages which are missing or known to be out of sync are synced by
+    # the locking reservation, the periodic refreshes are left to
+    # quota_usage_reconcile()
+    for res in deltas:
+        if res not in user_usages or user_usages[res]['in_use'] < 0:
+            raise _QuotaUsagesRefreshRequired()
+
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and
+              delta + user_usages[res]['in_use'] < 0]
+
+    for key, value in user_usages.items():
+        if key not in project_usages:
+            project_usages[key] = value
+
+    overs = _calculate_overquota(project_quotas, user_quotas, deltas,
+                                 project_usages, user_usages)
+    if overs:
+        _raise_over_quota(project_quotas, user_quotas, deltas, overs,
+                          project_usages, user_usages)
+
+    now = timeutils.utcnow()
+    reserved = {}
+    until_refresh = {}
+    checked = []
+    for res, delta in deltas.items():
+        usage = user_usages[res]
+        checked.append(usage)
+        # NOTE: The usages of the other users count in the project usage
+        # the reservation was checked against, so they must not change
+        # either.
+        if delta >= 0 and project_quotas[res] >= 0:
+            checked.extend(other_usages[res])
+        # NOTE(Vek): Only the positive deltas are reserved, see
+        #            quota_reserve().
+        reserved[usage['id']] = usage['reserved'] + max(delta, 0)
+        if usage['until_refresh'] is not None:
+            until_refresh[usage['id']] = max(usage['until_refresh'] - 1, 0)
+        elif (max_age and
+                (now - usage['updated_at']).total_seconds() >= max_age):
+            # Flag the usage to be refreshed by the reconciler
+            until_refresh[usage['id']] = 0
+
+    # Update all the usages at once, provided that none of the usages the
+    # reservation was checked against changed in the meantime
+    updates = {
+        'reserved': sa.case(reserved, value=models.QuotaUsage.id,
+                            else_=models.QuotaUsage.reserved),
+        'updated_at': sa.case({usage_id: now for usage_id in reserved},
+                              value=models.QuotaUsage.id,
+                              else_=models.QuotaUsage.updated_at),
+    }
+    if until_refresh:
+        updates['until_refresh'] = sa.case(
+            until_refresh, value=models.QuotaUsage.id,
+            else_=models.QuotaUsage.until_refresh)
+    result = model_query(context, models.QuotaUsage, read_deleted="no").\
+        filter(or_(*[_usage_unchanged(checked_usage)
+                   for checked_usage in checked])).\
+        update(updates, synchronize_session=False)
+    if result != len(checked):
+        LOG.debug('Quota usages of project %(project_id)s changed while '
+                  'reserving %(deltas)s, retrying',
+                  {'project_id': project_id, 'deltas': deltas})
+        raise _QuotaUsagesChanged()
+
+    reservations = [dict(uuid=str(uuid.uuid4()),
+                         usage_id=user_usages[res]['id'],
+                         project_id=project_id, user_id=user_id,
+                         resource=res, delta=delta, expire=expire)
+                    for res, delta in deltas.items()]
+    context.session.execute(models.Reservation.__table__.insert(),
+                            reservations)
+
+    if unders:
+        LOG.warning(_LW("Change will make usage less than 0 for the following "
+                        "resources: %s"), unders)
+
+    return [reservation['uuid'] for reservation in reservations]
+
+
+@require_context
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None):
+    """Check quotas and create the reservations like quota_reserve() does,
+    without locking the quota usages.
+
+    The usages are read, checked and updated with a single statement which
+    only matches if they didn't change since they were read, which is
+    retried a few times when they did. The usages which need to be created
+    or resynced, or which keep changing, are reserved by quota_reserve()
+    instead. The refreshes of the usages after until_refresh reservations
+    or max_age seconds are left to quota_usage_reconcile().
+    """
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    try:
+        return _quota_reserve_optimistic(context, project_quotas,
+                                         user_quotas, deltas, expire,
+                                         max_age, project_id, user_id)
+    except _QuotaUsagesRefreshRequired:
+        LOG.debug('Quota usages of project %(project_id)s and user '
+                  '%(user_id)s must be refreshed, locking them',
+                  {'project_id': project_id, 'user_id': user_id})
+    except _QuotaUsagesChanged:
+        LOG.debug('Quota usages of project %(project_id)s keep changing, '
+                  'locking them', {'project_id': project_id})
+    return quota_reserve(context, resources, project_quotas, user_quotas,
+                         deltas, expire, until_refresh, max_age,
+                         project_id=project_id, user_id=user_id)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def _quota_usage_reconcile(context, resources, until_refresh, project_id,
+                           user_id):
+    _project_usages, user_usages = _get_project_user_quota_usages(
+            context, project_id, user_id)
+    work = set(res for res, usage in user_usages.items()
+               if res in resources and
+               (usage.in_use < 0 or (usage.until_refresh is not None and
+                                     usage.until_refresh <= 0)))
+    refreshed = 0
+    while work:
+        resource = work.pop()
+        sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
+        updates = sync(context.elevated(), project_id, user_id)
+        for res, in_use in updates.items():
+            if res in user_usages:
+                _refresh_quota_usages(user_usages[res], until_refresh,
+                                      in_use)
+                context.session.add(user_usages[res])
+                refreshed += 1
+            work.discard(res)
+    return refreshed
+
+
+@main_context_manager.reader
+def _quota_usage_get_out_of_sync(context, resources, limit):
+    query = model_query(context, models.QuotaUsage,
+                        (models.QuotaUsage.project_id,
+                         models.QuotaUsage.user_id),
+                        read_deleted="no").\
+        filter(models.QuotaUsage.resource.in_(list(resources))).\
+        filter(or_(models.QuotaUsage.in_use < 0,
+                   models.QuotaUsage.until_refresh <= 0)).\
+        distinct()
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+@require_context
+def quota_usage_reconcile(context, resources, until_refresh, limit=None):
+    """Resync the quota usages flagged as out of sync or due for a refresh
+    by quota_reserve_optimistic(), and return the number of usages which
+    were resynced.
+
+    The usages are resynced one project and user at a time, so that they
+    are only locked for the time of their own resync.
+    """
+    refreshed = 0
+    for project_id, user_id in _quota_usage_get_out_of_sync(
+            context, resources, limit):
+        refreshed += _quota_usage_reconcile(context, resources, until_refresh,
+                                            project_id, user_id)
+    return refreshed
+
+
 def _quota_reservations_query(context, reservations):
     """Return the relevant reservations."""
 
@@ -4383,6 +5035,17 @@ def security_group_get_by_instance(context, instance_uuid):
                    all()
 
 
+def _instance_security_groups_get_multi(context, instance_uuids):
+    """Return the (instance uuid, security group) pairs of the instances."""
+    assoc = models.SecurityGroupInstanceAssociation
+    return model_query(context, models.SecurityGroup,
+                       args=(assoc.instance_uuid, models.SecurityGroup),
+                       read_deleted='no').\
+        join(assoc, and_(assoc.security_group_id == models.SecurityGroup.id,
+                         assoc.deleted == 0)).\
+        filter(assoc.instance_uuid.in_(instance_uuids))
+
+
 @require_context
 @main_context_manager.reader
 def security_group_in_use(context, group_id):
@@ -5355,6 +6018,30 @@ def _instance_system_metadata_get_multi(context, instance_uuids):
         models.InstanceSystemMetadata.instance_uuid.in_(instance_uuids))
 
 
+def _instance_all_metadata_get_multi(context, instance_uuids, kinds):
+    """Return the metadata and/or system metadata items of the instances in
+    a single query, with their kind, 'metadata' or 'system_metadata'.
+    """
+    queries = []
+    if 'metadata' in kinds:
+        model = models.InstanceMetadata
+        queries.append(model_query(
+            context, model,
+            args=(model.instance_uuid, model.key, model.value, model.deleted,
+                  sql.literal('metadata').label('kind'))).
+            filter(model.instance_uuid.in_(instance_uuids)))
+    if 'system_metadata' in kinds:
+        model = models.InstanceSystemMetadata
+        queries.append(model_query(
+            context, model, read_deleted='yes',
+            args=(model.instance_uuid, model.key, model.value, model.deleted,
+                  sql.literal('system_metadata').label('kind'))).
+            filter(model.instance_uuid.in_(instance_uuids)))
+    if len(queries) == 1:
+        return queries[0]
+    return queries[0].union_all(*queries[1:])
+
+
 def _instance_system_metadata_get_query(context, instance_uuid):
     return model_query(context, models.InstanceSystemMetadata).\
                     filter_by(instance_uuid=instance_uuid)
@@ -6282,10 +6969,14 @@ def task_log_end_task(context, task_name, period_beginning, period_ending,
 ##################
 
 
-def _archive_deleted_rows_for_table(tablename, max_rows):
+def _archive_deleted_rows_for_table(tablename, max_rows,
+                                    skip_referenced=True):
     """Move up to max_rows rows from one tables to the corresponding
     shadow table.
 
+    :param skip_referenced: whether to archive no rows rather than raise
+                            DBReferenceError when a foreign key keeps some
+                            of the rows from being deleted
     :returns: number of rows archived
     """
     # NOTE(guochbo): There is a circular import, nova.db.sqlalchemy.utils
@@ -6336,6 +7027,8 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
             conn.execute(insert)
             result_delete = conn.execute(delete_statement)
     except db_exc.DBReferenceError as ex:
+        if not skip_referenced:
+            raise
         # A foreign key constraint keeps us from deleting some of
         # these rows until we clean up a dependent table.  Just
         # skip this table for now; we'll come back to it later.
@@ -6388,6 +7081,83 @@ def archive_deleted_rows(max_rows=None):
     return table_to_rows_archived
 
 
+def archive_deleted_rows_for_table(tablename, max_rows):
+    """Move up to max_rows deleted rows from one table to the corresponding
+    shadow table.
+
+    :returns: number of rows archived
+    :raises: DBReferenceError if a foreign key keeps some of the rows from
+             being deleted
+    """
+    return _archive_deleted_rows_for_table(tablename, max_rows,
+                                           skip_referenced=False)
+
+
+def archive_deleted_rows_table_levels():
+    """Return the names of the tables to archive, grouped in levels.
+
+    The tables of a level don't reference each other, and are only referenced
+    by the tables of the previous levels, so that the levels must be archived
+    in order but the tables of a level can be archived concurrently.
+
+    :returns: list of lists of table names, for example:
+
+    ::
+
+        [
+            ['block_device_mapping', 'consoles', 'instance_extra'],
+            ['console_pools', 'instances'],
+        ]
+
+    """
+    meta = MetaData(get_engine(use_slave=True))
+    meta.reflect()
+    referencing = collections.defaultdict(set)
+    for table in meta.sorted_tables:
+        for fk in table.foreign_keys:
+            if fk.column.table is not table:
+                referencing[fk.column.table.name].add(table.name)
+
+    table_levels = {}
+    # The referencing tables come after the tables they reference
+    for table in reversed(meta.sorted_tables):
+        table_levels[table.name] = max(
+            [table_levels[name] + 1 for name in referencing[table.name]] or
+            [0])
+
+    levels = collections.defaultdict(list)
+    for tablename, level in table_levels.items():
+        # skip the special sqlalchemy-migrate migrate_version table and any
+        # shadow tables
+        if (tablename == 'migrate_version' or
+                tablename.startswith(_SHADOW_TABLE_PREFIX)):
+            continue
+        levels[level].append(tablename)
+    return [sorted(levels[level]) for level in sorted(levels)]
+
+
+def get_replication_lag():
+    """Return the number of seconds the slave database is behind the master
+    database, infinity if the replication is stopped, or None if it is
+    unknown.
+
+    The replication lag is only known for a MySQL slave database.
+    """
+    if not CONF.database.slave_connection:
+        return None
+    engine = get_engine(use_slave=True)
+    if engine.name != 'mysql':
+        return None
+    status = engine.execute('SHOW SLAVE STATUS').first()
+    if status is None:
+        return None
+    lag = status['Seconds_Behind_Master']
+    if lag is None:
+        # The replication is stopped
+        return float('inf')
+    return lag
+
+
 @main_context_manager.writer
 def pcidevice_online_data_migration(context, max_count):
     from nova.objects import pci_device as pci_dev_obj
@@ -6750,7 +7520,7 @@ def pci_device_get_all_by_instance_uuid(context, instance_uuid):
                        all()
 
 
-@pick_context_manager_reader
+@pick_context_manager_reader_allow_async
 def _instance_pcidevs_get_multi(context, instance_uuids):
     if not instance_uuids:
         return []
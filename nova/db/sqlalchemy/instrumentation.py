@@ -0,0 +1,323 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Instrumentation of the DB API calls and of the database connection pools.
+
+The statistics of each DB API function are the number of calls and errors,
+a histogram of the latencies, the number of rows returned and the number of
+SQL statements executed by the calls. A function executing many statements
+per call which each return few rows is an N+1 query pattern, a function
+executing few statements per call with a high latency runs slow queries.
+
+The statistics of the engines are the number of connections checked out of
+the pools, the time spent waiting for them and a histogram of the number of
+statements executed while a connection is checked out, which is the number
+of statements of a transaction.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+from oslo_log import log as logging
+from oslo_reports import guru_meditation_report as gmr
+from oslo_reports.models import with_default_views
+from oslo_service import loopingcall
+import six
+from sqlalchemy import event
+
+from nova.i18n import _LI
+
+LOG = logging.getLogger(__name__)
+
+# Upper bounds of the buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+# Upper bounds of the buckets of the statements per transaction histogram
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram(object):
+    """Counts of the values recorded in each bucket. The last bucket counts
+    the values greater than the last bound.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def _labels(self):
+        labels = ['<=%s' % bound for bound in self.bounds]
+        labels.append('>%s' % self.bounds[-1])
+        return labels
+
+    def to_dict(self):
+        return dict(zip(self._labels(), self.counts))
+
+    def format(self):
+        return ' '.join('%s:%d' % (label, count)
+                        for label, count in zip(self._labels(), self.counts)
+                        if count)
+
+
+class _CallStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.time = 0.0
+        self.rows = 0
+        self.statements = 0
+        self.max_statements = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'time': self.time,
+                'rows': self.rows,
+                'statements': self.statements,
+                'max_statements': self.max_statements,
+                'latency': self.latency.to_dict()}
+
+
+class _PoolStats(object):
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait = 0.0
+        self.max_checkout_wait = 0.0
+        self.checkout_latency = Histogram(LATENCY_BUCKETS)
+        self.transactions = 0
+        self.statements = 0
+        self.statements_per_transaction = Histogram(STATEMENT_BUCKETS)
+
+    def to_dict(self):
+        return {'checkouts': self.checkouts,
+                'checkout_wait': self.checkout_wait,
+                'max_checkout_wait': self.max_checkout_wait,
+                'checkout_latency': self.checkout_latency.to_dict(),
+                'transactions': self.transactions,
+                'statements': self.statements,
+                'statements_per_transaction':
+                    self.statements_per_transaction.to_dict()}
+
+
+def _count_rows(result):
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+class DBStats(object):
+    """Statistics of the DB API calls and of the engines of a service."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._calls = {}
+        self._pools = {}
+        self._started = False
+        self._timer = None
+
+    def _call_stats(self, name):
+        stats = self._calls.get(name)
+        if stats is None:
+            stats = self._calls.setdefault(name, _CallStats())
+        return stats
+
+    def _pool_stats(self, name):
+        stats = self._pools.get(name)
+        if stats is None:
+            stats = self._pools.setdefault(name, _PoolStats())
+        return stats
+
+    def wrap(self, name, f):
+        """Decorate a DB API function to record the statistics of its calls
+        under name.
+        """
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            frames = getattr(self._local, 'frames', None)
+            if frames is None:
+                frames = self._local.frames = []
+            # Number of statements executed by the call
+            frames.append(0)
+            start = time.time()
+            failed = True
+            try:
+                result = f(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.time() - start
+                statements = frames.pop()
+                if frames:
+                    # The statements of the nested calls are statements of
+                    # the calling function too
+                    frames[-1] += statements
+                with self._lock:
+                    stats = self._call_stats(name)
+                    stats.calls += 1
+                    stats.time += elapsed
+                    stats.latency.add(elapsed)
+                    stats.statements += statements
+                    stats.max_statements = max(stats.max_statements,
+                                               statements)
+                    if failed:
+                        stats.errors += 1
+                    else:
+                        stats.rows += _count_rows(result)
+        return wrapper
+
+    def instrument_engine(self, engine):
+        """Record the connection checkouts and the statements executed by an
+        engine.
+        """
+        name = repr(engine.url)
+        pool = engine.pool
+
+        def timed(pool_connect):
+            @functools.wraps(pool_connect)
+            def connect():
+                start = time.time()
+                try:
+                    return pool_connect()
+                finally:
+                    wait = time.time() - start
+                    with self._lock:
+                        stats = self._pool_stats(name)
+                        stats.checkouts += 1
+                        stats.checkout_wait += wait
+                        stats.max_checkout_wait = max(
+                            stats.max_checkout_wait, wait)
+                        stats.checkout_latency.add(wait)
+            return connect
+
+        # The sessions check the connections out with connect(), the
+        # Engine.connect() callers with unique_connection()
+        pool.connect = timed(pool.connect)
+        pool.unique_connection = timed(pool.unique_connection)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            frames = getattr(self._local, 'frames', None)
+            if frames:
+                frames[-1] += 1
+            conn.info['nova_statements'] = (
+                conn.info.get('nova_statements', 0) + 1)
+
+        @event.listens_for(pool, 'checkin')
+        def checkin(dbapi_connection, connection_record):
+            if connection_record is None:
+                return
+            statements = connection_record.info.pop('nova_statements', 0)
+            if not statements:
+                return
+            with self._lock:
+                stats = self._pool_stats(name)
+                stats.transactions += 1
+                stats.statements += statements
+                stats.statements_per_transaction.add(statements)
+
+    def start(self, log_interval):
+        """Report the statistics in the Guru Meditation Report and log them
+        every log_interval seconds, if not 0.
+        """
+        if self._started:
+            return
+        self._started = True
+        gmr.TextGuruMeditation.register_section('DB API', self.report_model)
+        if log_interval:
+            self._timer = loopingcall.FixedIntervalLoopingCall(
+                self.log_report)
+            self._timer.start(interval=log_interval,
+                              initial_delay=log_interval)
+
+    def report(self):
+        """Return a snapshot of the statistics, as a dict with the 'calls'
+        statistics by DB API function and the 'pools' statistics by engine.
+        """
+        with self._lock:
+            return {'calls': {name: stats.to_dict()
+                              for name, stats in self._calls.items()},
+                    'pools': {name: stats.to_dict()
+                              for name, stats in self._pools.items()}}
+
+    def format_report(self):
+        """Return the lines of a readable report of the statistics, with the
+        DB API functions sorted by their total time.
+        """
+        with self._lock:
+            lines = []
+            for name, stats in sorted(six.iteritems(self._pools)):
+                lines.append(
+                    '%s: %d checkouts, %.3fs waited (max %.3fs), '
+                    '%d transactions, %.1f statements/transaction [%s]' %
+                    (name, stats.checkouts, stats.checkout_wait,
+                     stats.max_checkout_wait, stats.transactions,
+                     float(stats.statements) / (stats.transactions or 1),
+                     stats.statements_per_transaction.format()))
+            for name, stats in sorted(six.iteritems(self._calls),
+                                      key=lambda item: -item[1].time):
+                lines.append(
+                    '%s: %d calls, %d errors, %.3fs, %.1fms/call, '
+                    '%.1f statements/call (max %d), %.1f rows/call [%s]' %
+                    (name, stats.calls, stats.errors, stats.time,
+                     stats.time * 1000 / stats.calls,
+                     float(stats.statements) / stats.calls,
+                     stats.max_statements,
+                     float(stats.rows) / stats.calls,
+                     stats.latency.format()))
+            return lines
+
+    def report_model(self):
+        return with_default_views.ModelWithDefaultViews(
+            self.report(),
+            text_view=lambda model: '\n'.join(self.format_report()))
+
+    def log_report(self):
+        for line in self.format_report():
+            LOG.info(_LI('DB API statistics: %s'), line)
+
+    def reset(self):
+        with self._lock:
+            self._calls = {}
+            self._pools = {}
+
+
+class InstrumentedBackend(object):
+    """DB API backend recording the statistics of the calls of the functions
+    of the backend module.
+    """
+
+    def __init__(self, backend, stats):
+        self._backend = backend
+        self._stats = stats
+        self._wrapped = {}
+
+    def __getattr__(self, key):
+        attr = getattr(self._backend, key)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+        wrapped = self._wrapped.get(key)
+        if wrapped is None:
+            wrapped = self._wrapped[key] = self._stats.wrap(key, attr)
+        return wrapped
+
+
+STATS = DBStats()
@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from oslo_log import log as logging
 
 from nova.i18n import _LI
@@ -48,6 +50,33 @@ class BaseFilter(object):
     # for each request rather than for each instance
     run_filter_once_per_request = False
 
+    # Set to true in a subclass implementing filter_arrays()
+    vectorized = False
+
+    # Set to true in a subclass whose _filter_one() is CPU intensive enough to
+    # be worth running in other processes, see BaseFilterHandler.worker_pool
+    parallelizable = False
+
+    def filter_arrays(self, obj_arrays, spec_obj):
+        """Return a boolean array telling which objects pass the filter.
+
+        Only used by the handlers providing a columnar view of the objects to
+        filter (see BaseFilterHandler.arrays_class), in which case it is
+        called instead of filter_all() for the filters which are vectorized.
+        """
+        raise NotImplementedError()
+
+    def cache_key(self, spec_obj):
+        """Return a hashable key identifying the attributes of spec_obj the
+        filter depends on, or None if its results can't be cached.
+
+        Only override this in a subclass implementing _filter_one() whose
+        results only depend on these attributes and on attributes of the
+        objects which don't change while they are cached (see
+        BaseFilterHandler.result_cache).
+        """
+        return None
+
     def run_filter_for_index(self, index):
         """Return True if the filter needs to be run for the "index-th"
         instance in a request.  Only need to override this if a filter
@@ -65,9 +94,31 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
+    # Can be set in a subclass to a class building a columnar view of the
+    # objects to filter, for running the vectorized filters
+    arrays_class = None
+
+    # Can be set to an object caching the results of the filters returning a
+    # cache key, providing a filter_all(filter_, objs, spec_obj, cache_key)
+    # method
+    result_cache = None
+
+    # Can be set to an object running the parallelizable filters in other
+    # processes, providing a filter_all(filter_, objs, spec_obj) method
+    worker_pool = None
+
+    # Can be set to an object collecting the time taken by each filter and
+    # the number of objects it removed, providing a
+    # record_filter(name, elapsed, start_count, end_count) method
+    stats = None
+
     def get_filtered_objects(self, filters, objs, spec_obj, index=0):
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
+        obj_arrays = None
+        if self.arrays_class is not None and any(
+                filter_.vectorized for filter_ in filters):
+            obj_arrays = self.arrays_class(list_objs)
         # Track the hosts as they are removed. The 'full_filter_results' list
         # contains the host/nodename info for every host that passes each
         # filter, while the 'part_filter_results' list just tracks the number
@@ -82,12 +133,35 @@ class BaseFilterHandler(loadables.BaseLoader):
             if filter_.run_filter_for_index(index):
                 cls_name = filter_.__class__.__name__
                 start_count = len(list_objs)
-                objs = filter_.filter_all(list_objs, spec_obj)
-                if objs is None:
-                    LOG.debug("Filter %s says to stop filtering", cls_name)
-                    return
-                list_objs = list(objs)
+                start_time = time.time()
+                if obj_arrays is not None and filter_.vectorized:
+                    obj_arrays = obj_arrays.select(
+                        filter_.filter_arrays(obj_arrays, spec_obj))
+                    list_objs = obj_arrays.objs
+                else:
+                    cache_key = None
+                    if self.result_cache is not None:
+                        cache_key = filter_.cache_key(spec_obj)
+                    if cache_key is not None:
+                        objs = self.result_cache.filter_all(
+                            filter_, list_objs, spec_obj, cache_key)
+                    elif (self.worker_pool is not None and
+                            filter_.parallelizable):
+                        objs = self.worker_pool.filter_all(
+                            filter_, list_objs, spec_obj)
+                    else:
+                        objs = filter_.filter_all(list_objs, spec_obj)
+                    if objs is None:
+                        LOG.debug("Filter %s says to stop filtering", cls_name)
+                        return
+                    list_objs = list(objs)
+                    if obj_arrays is not None:
+                        obj_arrays = obj_arrays.restrict(list_objs)
                 end_count = len(list_objs)
+                if self.stats is not None:
+                    self.stats.record_filter(cls_name,
+                                             time.time() - start_time,
+                                             start_count, end_count)
                 part_filter_results.append(log_msg % {"cls_name": cls_name,
                         "start": start_count, "end": end_count})
                 if list_objs:
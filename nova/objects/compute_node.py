@@ -328,15 +328,19 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
     def save(self, prune_stats=False):
         # NOTE(belliott) ignore prune_stats param, no longer relevant
 
+        updates = self.get_db_updates()
+        db_compute = db.compute_node_update(self._context, self.id, updates)
+        self._from_db_object(self._context, self, db_compute)
+
+    def get_db_updates(self):
+        """Return the changed fields in the format of the database record."""
         updates = self.obj_get_changes()
         updates.pop('id', None)
         self._convert_stats_to_db_format(updates)
         self._convert_host_ip_to_db_format(updates)
         self._convert_supported_instances_to_db_format(updates)
         self._convert_pci_stats_to_db_format(updates)
-
-        db_compute = db.compute_node_update(self._context, self.id, updates)
-        self._from_db_object(self._context, self, db_compute)
+        return updates
 
     @base.remotable
     def destroy(self):
@@ -380,14 +384,35 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.12 ComputeNode version 1.12
     # Version 1.13 ComputeNode version 1.13
     # Version 1.14 ComputeNode version 1.14
-    VERSION = '1.14'
+    # Version 1.15 Added get_all_changed_since()
+    # Version 1.16 Added use_slave to get_all() and get_all_changed_since()
+    VERSION = '1.16'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
 
+    @staticmethod
+    @db.select_db_reader_mode
+    def _db_compute_node_get_all(context, use_slave=False):
+        return db.compute_node_get_all(context)
+
+    @base.remotable_classmethod
+    def get_all(cls, context, use_slave=False):
+        db_computes = cls._db_compute_node_get_all(context,
+                                                   use_slave=use_slave)
+        return base.obj_make_list(context, cls(context), objects.ComputeNode,
+                                  db_computes)
+
+    @staticmethod
+    @db.select_db_reader_mode
+    def _db_compute_node_get_all_changed_since(context, changed_since,
+                                               use_slave=False):
+        return db.compute_node_get_all_changed_since(context, changed_since)
+
     @base.remotable_classmethod
-    def get_all(cls, context):
-        db_computes = db.compute_node_get_all(context)
+    def get_all_changed_since(cls, context, changed_since, use_slave=False):
+        db_computes = cls._db_compute_node_get_all_changed_since(
+            context, changed_since, use_slave=use_slave)
         return base.obj_make_list(context, cls(context), objects.ComputeNode,
                                   db_computes)
 
@@ -82,13 +82,29 @@ def _expected_cols(expected_attrs):
 _NO_DATA_SENTINEL = object()
 
 
+def _load_json(blob, parsed_blobs=None):
+    """Deserialize a JSON blob of instance_extra.
+
+    If parsed_blobs is given, it caches the deserialized blobs so that the
+    identical blobs of a list of instances are deserialized only once. The
+    cached values must not be modified.
+    """
+    if parsed_blobs is None:
+        return jsonutils.loads(blob)
+    parsed = parsed_blobs.get(blob)
+    if parsed is None:
+        parsed = parsed_blobs[blob] = jsonutils.loads(blob)
+    return parsed
+
+
 # TODO(berrange): Remove NovaObjectDictCompat
 @base.NovaObjectRegistry.register
 class Instance(base.NovaPersistentObject, base.NovaObject,
                base.NovaObjectDictCompat):
     # Version 2.0: Initial version
     # Version 2.1: Added services
-    VERSION = '2.1'
+    # Version 2.2: Partial instances keep their unset columns lazy-loadable
+    VERSION = '2.2'
 
     fields = {
         'id': fields.IntegerField(),
@@ -196,9 +212,21 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         target_version = versionutils.convert_version_to_tuple(target_version)
         if target_version < (2, 1) and 'services' in primitive:
             del primitive['services']
+        if target_version < (2, 2) and self._is_partial():
+            # NOTE: Older versions can't lazy-load the columns which were not
+            # loaded with a partial instance, so send them all
+            self._load_columns()
+            for field in self.fields:
+                if (field not in INSTANCE_OPTIONAL_ATTRS and
+                        field not in primitive):
+                    primitive[field] = self.fields[field].to_primitive(
+                        self, field, self[field])
 
     def __init__(self, *args, **kwargs):
         super(Instance, self).__init__(*args, **kwargs)
+        # Whether the instance was loaded from the database with only some of
+        # its column fields, see _from_db_columns()
+        self._partial = False
         self._reset_metadata_tracking()
 
     @property
@@ -227,10 +255,20 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             changes.add('system_metadata')
         return changes
 
+    def obj_to_primitive(self, target_version=None, version_manifest=None):
+        primitive = super(Instance, self).obj_to_primitive(
+            target_version=target_version, version_manifest=version_manifest)
+        if self._partial and not self._has_all_columns():
+            # NOTE: Keep the unset columns of a partial instance lazy-loadable
+            # once it is sent over RPC
+            primitive[self._obj_primitive_key('partial')] = True
+        return primitive
+
     @classmethod
     def _obj_from_primitive(cls, context, objver, primitive):
         self = super(Instance, cls)._obj_from_primitive(context, objver,
                                                         primitive)
+        self._partial = cls._obj_primitive_field(primitive, 'partial', False)
         self._reset_metadata_tracking()
         return self
 
@@ -240,6 +278,10 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             base_name = CONF.instance_name_template % self.id
         except TypeError:
             # Support templates like "uuid-%(uuid)s", etc.
+            if self._is_partial():
+                # NOTE: The template may use the columns which were not
+                # loaded with a partial instance
+                self._load_columns()
             info = {}
             # NOTE(russellb): Don't use self.iteritems() here, as it will
             # result in infinite recursion on the name property.
@@ -257,10 +299,10 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 base_name = self.uuid
         return base_name
 
-    def _flavor_from_db(self, db_flavor):
+    def _flavor_from_db(self, db_flavor, parsed_blobs=None):
         """Load instance flavor information from instance_extra."""
 
-        flavor_info = jsonutils.loads(db_flavor)
+        flavor_info = _load_json(db_flavor, parsed_blobs)
 
         self.flavor = objects.Flavor.obj_from_primitive(flavor_info['cur'])
         if flavor_info['old']:
@@ -276,10 +318,13 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         self.obj_reset_changes(['flavor', 'old_flavor', 'new_flavor'])
 
     @staticmethod
-    def _from_db_object(context, instance, db_inst, expected_attrs=None):
+    def _from_db_object(context, instance, db_inst, expected_attrs=None,
+                        parsed_blobs=None):
         """Method to help with migration to objects.
 
-        Converts a database entity to a formal object.
+        Converts a database entity to a formal object. parsed_blobs is the
+        cache of the deserialized instance_extra blobs shared by a list of
+        instances, if any.
         """
         instance._context = context
         if expected_attrs is None:
@@ -310,22 +355,26 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             instance['fault'] = (
                 objects.InstanceFault.get_latest_for_instance(
                     context, instance.uuid))
+        # NOTE: The NULL columns of the instance_extra record are not loaded
+        # again from the database one instance at a time, they are empty.
         if 'numa_topology' in expected_attrs:
-            if have_extra:
+            if have_extra and db_inst['extra'].get('numa_topology'):
                 instance._load_numa_topology(
-                    db_inst['extra'].get('numa_topology'))
+                    db_inst['extra']['numa_topology'])
             else:
                 instance.numa_topology = None
         if 'pci_requests' in expected_attrs:
             if have_extra:
-                instance._load_pci_requests(
-                    db_inst['extra'].get('pci_requests'))
+                instance.pci_requests = (
+                    objects.InstancePCIRequests.obj_from_db(
+                        context, instance.uuid,
+                        db_inst['extra'].get('pci_requests')))
             else:
                 instance.pci_requests = None
         if 'vcpu_model' in expected_attrs:
-            if have_extra:
-                instance._load_vcpu_model(
-                    db_inst['extra'].get('vcpu_model'))
+            if have_extra and db_inst['extra'].get('vcpu_model'):
+                instance._load_vcpu_model(db_inst['extra']['vcpu_model'],
+                                          parsed_blobs=parsed_blobs)
             else:
                 instance.vcpu_model = None
         if 'ec2_ids' in expected_attrs:
@@ -352,7 +401,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                                               'old_flavor',
                                               'new_flavor')]):
             if have_extra and db_inst['extra'].get('flavor'):
-                instance._flavor_from_db(db_inst['extra']['flavor'])
+                instance._flavor_from_db(db_inst['extra']['flavor'],
+                                         parsed_blobs=parsed_blobs)
 
         # TODO(danms): If we are updating these on a backlevel instance,
         # we'll end up sending back new versions of these objects (see
@@ -383,6 +433,26 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         instance.obj_reset_changes()
         return instance
 
+    @staticmethod
+    def _from_db_columns(context, instance, db_inst):
+        """Converts some of the columns of a database entity to a partial
+        object.
+
+        The other column fields are all loaded at once the first time one of
+        them is accessed, and the optional ones are lazy-loaded as usual.
+        """
+        instance._context = context
+        instance._partial = True
+        for field, value in db_inst.items():
+            if field == 'deleted':
+                instance.deleted = value == db_inst['id']
+            elif field == 'cleaned':
+                instance.cleaned = value == 1
+            else:
+                instance[field] = value
+        instance.obj_reset_changes()
+        return instance
+
     @staticmethod
     @db.select_db_reader_mode
     def _db_instance_get_by_uuid(context, uuid, columns_to_join,
@@ -739,14 +809,43 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         # expected_attrs properly)
         current._context = None
 
+        partial = self._is_partial()
         for field in self.fields:
             if self.obj_attr_is_set(field):
                 if field == 'info_cache':
                     self.info_cache.refresh()
                 elif self[field] != current[field]:
                     self[field] = current[field]
+            elif partial and field not in INSTANCE_OPTIONAL_ATTRS:
+                # NOTE: Fill the columns missing from a partial instance,
+                # now that they were loaded anyway
+                self[field] = current[field]
         self.obj_reset_changes()
 
+    def _is_partial(self):
+        """Return whether the instance was loaded from the database with only
+        some of its column fields.
+        """
+        return (self._partial and self._context is not None and
+                not self._has_all_columns())
+
+    def _has_all_columns(self):
+        return all(self.obj_attr_is_set(field)
+                   for field in self.fields
+                   if field not in INSTANCE_OPTIONAL_ATTRS)
+
+    def _load_columns(self):
+        instance = self.__class__.get_by_uuid(self._context,
+                                              uuid=self.uuid,
+                                              expected_attrs=[])
+        loaded = []
+        for field in self.fields:
+            if (field not in INSTANCE_OPTIONAL_ATTRS and
+                    not self.obj_attr_is_set(field)):
+                self[field] = instance[field]
+                loaded.append(field)
+        self.obj_reset_changes(loaded)
+
     def _load_generic(self, attrname):
         instance = self.__class__.get_by_uuid(self._context,
                                               uuid=self.uuid,
@@ -805,12 +904,12 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         instance.system_metadata.update(self.get('system_metadata', {}))
         self.system_metadata = instance.system_metadata
 
-    def _load_vcpu_model(self, db_vcpu_model=None):
+    def _load_vcpu_model(self, db_vcpu_model=None, parsed_blobs=None):
         if db_vcpu_model is None:
             self.vcpu_model = objects.VirtCPUModel.get_by_instance_uuid(
                 self._context, self.uuid)
         else:
-            db_vcpu_model = jsonutils.loads(db_vcpu_model)
+            db_vcpu_model = _load_json(db_vcpu_model, parsed_blobs)
             self.vcpu_model = objects.VirtCPUModel.obj_from_primitive(
                 db_vcpu_model)
 
@@ -880,7 +979,10 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self.numa_topology = numa_topology.clear_host_pinning()
 
     def obj_load_attr(self, attrname):
-        if attrname not in INSTANCE_OPTIONAL_ATTRS:
+        # NOTE: The column fields are only lazy-loadable on the partial
+        # instances loaded from the database with some of their columns.
+        if attrname not in INSTANCE_OPTIONAL_ATTRS and not (
+                attrname in self.fields and self._partial):
             raise exception.ObjectActionError(
                 action='obj_load_attr',
                 reason='attribute %s not lazy-loadable' % attrname)
@@ -915,6 +1017,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self._load_pci_devices()
         elif 'flavor' in attrname:
             self._load_flavor()
+        elif attrname not in INSTANCE_OPTIONAL_ATTRS:
+            self._load_columns()
         elif attrname == 'services' and self.deleted:
             # NOTE(mriedem): The join in the data model for instances.services
             # filters on instances.deleted == 0, so if the instance is deleted
@@ -1015,11 +1119,14 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
 
     inst_cls = objects.Instance
 
+    # The instances often share the same flavors, so deserialize their
+    # identical instance_extra blobs only once
+    parsed_blobs = {}
     inst_list.objects = []
     for db_inst in db_inst_list:
         inst_obj = inst_cls._from_db_object(
                 context, inst_cls(context), db_inst,
-                expected_attrs=expected_attrs)
+                expected_attrs=expected_attrs, parsed_blobs=parsed_blobs)
         if get_fault:
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
@@ -1027,10 +1134,20 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     return inst_list
 
 
+def _make_partial_instance_list(context, inst_list, db_inst_list):
+    inst_cls = objects.Instance
+    inst_list.objects = [
+        inst_cls._from_db_columns(context, inst_cls(context), db_inst)
+        for db_inst in db_inst_list]
+    inst_list.obj_reset_changes()
+    return inst_list
+
+
 @base.NovaObjectRegistry.register
 class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 2.0: Initial Version
-    VERSION = '2.0'
+    # Version 2.1: Add columns to get_by_filters() and get_by_host()
+    VERSION = '2.1'
 
     fields = {
         'objects': fields.ListOfObjectsField('Instance'),
@@ -1041,7 +1158,13 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     def _get_by_filters_impl(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
                        marker=None, expected_attrs=None, use_slave=False,
-                       sort_keys=None, sort_dirs=None):
+                       sort_keys=None, sort_dirs=None, columns=None):
+        if columns is not None:
+            db_inst_list = db.instance_get_all_by_filters_sort(
+                context, filters, limit=limit, marker=marker,
+                sort_keys=sort_keys or [sort_key],
+                sort_dirs=sort_dirs or [sort_dir], columns=columns)
+            return _make_partial_instance_list(context, cls(), db_inst_list)
         if sort_keys or sort_dirs:
             db_inst_list = db.instance_get_all_by_filters_sort(
                 context, filters, limit=limit, marker=marker,
@@ -1058,24 +1181,43 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
                        marker=None, expected_attrs=None, use_slave=False,
-                       sort_keys=None, sort_dirs=None):
+                       sort_keys=None, sort_dirs=None, columns=None):
+        """Get the instances matching the filters.
+
+        If columns is given, only these column fields of the instances are
+        loaded, along with their id and uuid, and expected_attrs is
+        ignored. The other fields are loaded on demand.
+        """
         return cls._get_by_filters_impl(
             context, filters, sort_key=sort_key, sort_dir=sort_dir,
             limit=limit, marker=marker, expected_attrs=expected_attrs,
-            use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs)
+            use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs,
+            columns=columns)
 
     @staticmethod
     @db.select_db_reader_mode
     def _db_instance_get_all_by_host(context, host, columns_to_join,
-                                     use_slave=False):
+                                     use_slave=False, columns=None):
+        if columns is not None:
+            return db.instance_get_all_by_host(context, host,
+                                               columns=columns)
         return db.instance_get_all_by_host(context, host,
                                            columns_to_join=columns_to_join)
 
     @base.remotable_classmethod
-    def get_by_host(cls, context, host, expected_attrs=None, use_slave=False):
+    def get_by_host(cls, context, host, expected_attrs=None, use_slave=False,
+                    columns=None):
+        """Get the instances of a host.
+
+        If columns is given, only these column fields of the instances are
+        loaded, along with their id and uuid, and expected_attrs is
+        ignored. The other fields are loaded on demand.
+        """
         db_inst_list = cls._db_instance_get_all_by_host(
             context, host, columns_to_join=_expected_cols(expected_attrs),
-            use_slave=use_slave)
+            use_slave=use_slave, columns=columns)
+        if columns is not None:
+            return _make_partial_instance_list(context, cls(), db_inst_list)
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
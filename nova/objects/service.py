@@ -379,7 +379,9 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
     # Version 1.16: Service version 1.18
     # Version 1.17: Service version 1.19
     # Version 1.18: Added include_disabled parameter to get_by_binary()
-    VERSION = '1.18'
+    # Version 1.19: Added changed_since parameter to get_by_binary()
+    # Version 1.20: Added use_slave parameter to get_by_binary()
+    VERSION = '1.20'
 
     fields = {
         'objects': fields.ListOfObjectsField('Service'),
@@ -391,12 +393,25 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.Service,
                                   db_services)
 
+    @staticmethod
+    @db.select_db_reader_mode
+    def _db_service_get_all_by_binary(context, binary, include_disabled,
+                                      changed_since, use_slave=False):
+        if changed_since is None:
+            return db.service_get_all_by_binary(
+                context, binary, include_disabled=include_disabled)
+        return db.service_get_all_by_binary(
+            context, binary, include_disabled=include_disabled,
+            changed_since=changed_since)
+
     # NOTE(paul-carlton2): In v2.0 of the object the include_disabled flag
     # will be removed so both enabled and disabled hosts are returned
     @base.remotable_classmethod
-    def get_by_binary(cls, context, binary, include_disabled=False):
-        db_services = db.service_get_all_by_binary(
-            context, binary, include_disabled=include_disabled)
+    def get_by_binary(cls, context, binary, include_disabled=False,
+                      changed_since=None, use_slave=False):
+        db_services = cls._db_service_get_all_by_binary(
+            context, binary, include_disabled, changed_since,
+            use_slave=use_slave)
         return base.obj_make_list(context, cls(context), objects.Service,
                                   db_services)
 
@@ -14,8 +14,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import copy
-
 from oslo_config import cfg
 from oslo_log import log as logging
 import six
@@ -59,6 +57,9 @@ class PciDeviceStats(object):
 
     pool_keys = ['product_id', 'vendor_id', 'numa_node', 'dev_type']
 
+    # Properties of the pools by which they are indexed
+    index_keys = ('vendor_id', 'product_id', 'dev_type', 'numa_node')
+
     def __init__(self, stats=None, dev_filter=None):
         super(PciDeviceStats, self).__init__()
         # NOTE(sbauza): Stats are a PCIDevicePoolList object
@@ -67,6 +68,54 @@ class PciDeviceStats(object):
         self.pools.sort(key=lambda item: len(item))
         self.dev_filter = dev_filter or whitelist.Whitelist(
             CONF.pci_passthrough_whitelist)
+        self._index_pools()
+
+    def _index_pools(self):
+        """Index the pools by their index_keys properties.
+
+        Must be called each time a pool is added to or removed from the
+        pools, as it also drops the pools matching each request spec which
+        were cached by _get_pools_for_spec().
+        """
+        self._pool_index = {}
+        for pool in self.pools:
+            key = tuple(pool.get(k) for k in self.index_keys)
+            self._pool_index.setdefault(key, []).append(pool)
+        self._spec_pools = {}
+
+    def _get_indexed_pools(self, spec):
+        """Return the pools whose index_keys properties match the spec."""
+        if all(k in spec for k in self.index_keys):
+            return self._pool_index.get(
+                tuple(spec[k] for k in self.index_keys), [])
+        return [pool
+                for key, pools in six.iteritems(self._pool_index)
+                if all(spec.get(k, value) == value
+                       for k, value in zip(self.index_keys, key))
+                for pool in pools]
+
+    def _get_pools_for_spec(self, request_specs):
+        """Return the pools matching any of the request specs, in the order
+        of the pools.
+
+        The result is cached for each request spec until the pools change.
+        """
+        try:
+            spec_key = tuple(tuple(sorted(six.iteritems(spec)))
+                             for spec in request_specs)
+            pools = self._spec_pools.get(spec_key)
+        except TypeError:
+            # Unhashable values in the spec
+            return self._filter_pools_for_spec(self.pools, request_specs)
+        if pools is None:
+            matching = set()
+            for spec in request_specs:
+                matching.update(
+                    id(pool) for pool in self._get_indexed_pools(spec)
+                    if utils.pci_device_prop_match(pool, [spec]))
+            pools = [pool for pool in self.pools if id(pool) in matching]
+            self._spec_pools[spec_key] = pools
+        return pools
 
     def _equal_properties(self, dev, entry, matching_keys):
         return all(dev.get(prop) == entry.get(prop)
@@ -74,7 +123,8 @@ class PciDeviceStats(object):
 
     def _find_pool(self, dev_pool):
         """Return the first pool that matches dev."""
-        for pool in self.pools:
+        for pool in self._pool_index.get(
+                tuple(dev_pool.get(k) for k in self.index_keys), []):
             pool_keys = pool.copy()
             del pool_keys['count']
             del pool_keys['devices']
@@ -109,6 +159,7 @@ class PciDeviceStats(object):
                 dev_pool['devices'] = []
                 self.pools.append(dev_pool)
                 self.pools.sort(key=lambda item: len(item))
+                self._index_pools()
                 pool = dev_pool
             pool['count'] += 1
             pool['devices'].append(dev)
@@ -136,7 +187,10 @@ class PciDeviceStats(object):
                 raise exception.PciDevicePoolEmpty(
                     compute_node_id=dev.compute_node_id, address=dev.address)
             pool['devices'].remove(dev)
+            num_pools = len(self.pools)
             self._decrease_pool_count(self.pools, pool)
+            if len(self.pools) != num_pools:
+                self._index_pools()
 
     def get_free_devs(self):
         free_devs = []
@@ -151,7 +205,7 @@ class PciDeviceStats(object):
             spec = request.spec
             # For now, keep the same algorithm as during scheduling:
             # a spec may be able to match multiple pools.
-            pools = self._filter_pools_for_spec(self.pools, spec)
+            pools = self._get_pools_for_spec(spec)
             if numa_cells:
                 pools = self._filter_pools_for_numa_cells(pools, numa_cells)
             pools = self._filter_non_requested_pfs(request, pools)
@@ -222,11 +276,9 @@ class PciDeviceStats(object):
         # that case None is reported in pci_device.numa_node, by adding None
         # to numa_cells we allow assigning those devices to instances with
         # numa topology
-        numa_cells = [None] + [cell.id for cell in numa_cells]
+        numa_cells = set([None] + [cell.id for cell in numa_cells])
         # filter out pools which numa_node is not included in numa_cells
-        return [pool for pool in pools if any(utils.pci_device_prop_match(
-                                pool, [{'numa_node': cell}])
-                                              for cell in numa_cells)]
+        return [pool for pool in pools if pool.get('numa_node') in numa_cells]
 
     def _filter_non_requested_pfs(self, request, matching_pools):
         # Remove SRIOV_PFs from pools, unless it has been explicitly requested
@@ -242,24 +294,42 @@ class PciDeviceStats(object):
         return [pool for pool in pools
                 if not pool.get('dev_type') == fields.PciDeviceType.SRIOV_PF]
 
-    def _apply_request(self, pools, request, numa_cells=None):
+    def _apply_request(self, request, numa_cells=None, counts=None):
+        """Consume a request from the pools.
+
+        If counts is given, the pools are left untouched and the number of
+        devices remaining in each of them is tracked in counts instead, keyed
+        by the id of the pools.
+        """
         # NOTE(vladikr): This code maybe open to race conditions.
         # Two concurrent requests may succeed when called support_requests
         # because this method does not remove related devices from the pools
         count = request.count
-        matching_pools = self._filter_pools_for_spec(pools, request.spec)
+        matching_pools = self._get_pools_for_spec(request.spec)
         if numa_cells:
             matching_pools = self._filter_pools_for_numa_cells(matching_pools,
                                                           numa_cells)
         matching_pools = self._filter_non_requested_pfs(request,
                                                         matching_pools)
-        if sum([pool['count'] for pool in matching_pools]) < count:
-            return False
+        if counts is None:
+            available = [pool['count'] for pool in matching_pools]
         else:
-            for pool in matching_pools:
-                count = self._decrease_pool_count(pools, pool, count)
-                if not count:
-                    break
+            available = [counts.get(id(pool), pool['count'])
+                         for pool in matching_pools]
+        if sum(available) < count:
+            return False
+        num_pools = len(self.pools)
+        for pool, pool_count in zip(matching_pools, available):
+            if counts is None:
+                count = self._decrease_pool_count(self.pools, pool, count)
+            else:
+                num_alloc = min(pool_count, count)
+                counts[id(pool)] = pool_count - num_alloc
+                count -= num_alloc
+            if not count:
+                break
+        if len(self.pools) != num_pools:
+            self._index_pools()
         return True
 
     def support_requests(self, requests, numa_cells=None):
@@ -273,8 +343,8 @@ class PciDeviceStats(object):
         """
         # note (yjiang5): this function has high possibility to fail,
         # so no exception should be triggered for performance reason.
-        pools = copy.deepcopy(self.pools)
-        return all([self._apply_request(pools, r, numa_cells)
+        counts = {}
+        return all([self._apply_request(r, numa_cells, counts)
                         for r in requests])
 
     def apply_requests(self, requests, numa_cells=None):
@@ -285,7 +355,7 @@ class PciDeviceStats(object):
         If numa_cells is provided then only devices contained in
         those nodes are considered.
         """
-        if not all([self._apply_request(self.pools, r, numa_cells)
+        if not all([self._apply_request(r, numa_cells)
                                             for r in requests]):
             raise exception.PciDeviceRequestFailed(requests=requests)
 
@@ -300,6 +370,7 @@ class PciDeviceStats(object):
     def clear(self):
         """Clear all the stats maintained."""
         self.pools = []
+        self._index_pools()
 
     def __eq__(self, other):
         return cmp(self.pools, other.pools) == 0
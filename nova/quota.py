@@ -96,6 +96,20 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.BoolOpt('quota_optimistic_reservations',
+                default=False,
+                help='Reserve the quotas without locking the quota usages, '
+                     'by updating them only if they did not change since '
+                     'they were checked, which avoids serializing the '
+                     'concurrent reservations of a project. The usage '
+                     'refreshes triggered by until_refresh and max_age are '
+                     'then done by a periodic task of the scheduler rather '
+                     'than on the reservations.'),
+    cfg.IntOpt('quota_reconcile_interval',
+               default=60,
+               help='Number of seconds between the runs of the scheduler '
+                    'periodic task refreshing the quota usages, when '
+                    'quota_optimistic_reservations is enabled'),
     ]
 
 CONF = cfg.CONF
@@ -577,10 +591,13 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
-        return db.quota_reserve(context, resources, quotas, user_quotas,
-                                deltas, expire,
-                                CONF.until_refresh, CONF.max_age,
-                                project_id=project_id, user_id=user_id)
+        if CONF.quota_optimistic_reservations:
+            reserve = db.quota_reserve_optimistic
+        else:
+            reserve = db.quota_reserve
+        return reserve(context, resources, quotas, user_quotas, deltas,
+                       expire, CONF.until_refresh, CONF.max_age,
+                       project_id=project_id, user_id=user_id)
 
     def commit(self, context, reservations, project_id=None, user_id=None):
         """Commit reservations.
@@ -689,6 +706,20 @@ class DbQuotaDriver(object):
 
         db.reservation_expire(context)
 
+    def reconcile(self, context, resources):
+        """Resync the quota usages which are out of sync or due for a
+        refresh.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resources.
+        """
+        resources = {key: resource for key, resource in resources.items()
+                     if hasattr(resource, 'sync')}
+        refreshed = db.quota_usage_reconcile(context, resources,
+                                             CONF.until_refresh)
+        if refreshed:
+            LOG.debug('Refreshed %d quota usages', refreshed)
+
 
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
@@ -962,6 +993,15 @@ class NoopQuotaDriver(object):
         """
         pass
 
+    def reconcile(self, context, resources):
+        """Resync the quota usages which are out of sync or due for a
+        refresh.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resources.
+        """
+        pass
+
 
 class BaseResource(object):
     """Describe a single resource for quota checking."""
@@ -1443,6 +1483,15 @@ class QuotaEngine(object):
 
         self._driver.expire(context)
 
+    def reconcile(self, context):
+        """Resync the quota usages which are out of sync or due for a
+        refresh.
+
+        :param context: The request context, for access checks.
+        """
+
+        self._driver.reconcile(context, self._resources)
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
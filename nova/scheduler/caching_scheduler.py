@@ -13,7 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_utils import timeutils
+
+import nova.conf
 from nova.scheduler import filter_scheduler
+from nova.scheduler import shared_claims
+
+CONF = nova.conf.CONF
 
 
 class CachingScheduler(filter_scheduler.FilterScheduler):
@@ -43,7 +49,9 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     Please note, the way this works, each scheduler worker has its own
     copy of the cache. So if you run multiple schedulers, you will get
     more retries, because the data stored on any additional scheduler will
-    be more out of date, than if it was fetched from the database.
+    be more out of date, than if it was fetched from the database. The
+    workers running on the same node can reduce this by sharing the
+    resources they consume through the scheduler_shared_claims_file.
 
     In a similar way, if you have a high number of server deletes, the
     extra capacity from those deletes will not show up until the cache is
@@ -53,6 +61,10 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     def __init__(self, *args, **kwargs):
         super(CachingScheduler, self).__init__(*args, **kwargs)
         self.all_host_states = None
+        self.shared_claims = None
+        if CONF.scheduler_shared_claims_file:
+            self.shared_claims = shared_claims.SharedClaims(
+                CONF.scheduler_shared_claims_file)
 
     def run_periodic_tasks(self, context):
         """Called from a periodic tasks in the manager."""
@@ -61,6 +73,9 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
         # a user request, so no user requests have to wait while we
         # fetch the list of hosts.
         self.all_host_states = self._get_up_hosts(elevated)
+        if self.shared_claims is not None:
+            self.shared_claims.reset(self.all_host_states)
+            self.shared_claims.compact()
 
     def _get_all_host_states(self, context):
         """Called from the filter scheduler, in a template pattern."""
@@ -69,9 +84,21 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
             # comes in before the first run of the periodic task.
             # Rather than raise an error, we fetch the list of hosts.
             self.all_host_states = self._get_up_hosts(context)
+            if self.shared_claims is not None:
+                self.shared_claims.reset(self.all_host_states)
+        elif self.shared_claims is not None:
+            self.shared_claims.apply(self.all_host_states)
 
         return self.all_host_states
 
+    def select_destinations(self, context, spec_obj):
+        claim_time = timeutils.utcnow()
+        dests = super(CachingScheduler, self).select_destinations(context,
+                                                                  spec_obj)
+        if self.shared_claims is not None:
+            self.shared_claims.publish(spec_obj, dests, claim_time)
+        return dests
+
     def _get_up_hosts(self, context):
         all_hosts_iterator = self.host_manager.get_all_host_states(context)
         return list(all_hosts_iterator)
@@ -0,0 +1,79 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cache of the results of the scheduler filters which only depend on static
+attributes of the request and of the hosts.
+"""
+
+# Maximum number of results kept for a host, all the results of a host are
+# dropped when it is reached
+MAX_RESULTS_PER_HOST = 256
+
+
+class FilterResultCache(object):
+    """Per host results of the filters which have a cache key.
+
+    The result of a filter for a host is cached under the cache key returned
+    by the filter for the request (see BaseFilter.cache_key()), and is only
+    reused while the capabilities_signature of the host doesn't change. The
+    results depending on the aggregates of the hosts must be dropped by
+    calling clear() when the aggregates are updated.
+    """
+
+    def __init__(self):
+        # Tuples of the capabilities signature and of the dict of the results
+        # keyed by filter name and cache key, keyed by host and node
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get_host_results(self, host_state):
+        key = (host_state.host, host_state.nodename)
+        signature = host_state.capabilities_signature
+        entry = self._results.get(key)
+        if (entry is None or entry[0] != signature or
+                len(entry[1]) >= MAX_RESULTS_PER_HOST):
+            entry = (signature, {})
+            self._results[key] = entry
+        return entry[1]
+
+    def filter_all(self, filter_, host_states, spec_obj, cache_key):
+        """Yield the host states passing the filter, only running the filter
+        for the hosts which have no cached result for the cache key.
+        """
+        result_key = (filter_.__class__.__name__, cache_key)
+        for host_state in host_states:
+            results = self._get_host_results(host_state)
+            passes = results.get(result_key)
+            if passes is None:
+                self.misses += 1
+                passes = filter_._filter_one(host_state, spec_obj)
+                results[result_key] = passes
+            else:
+                self.hits += 1
+            if passes:
+                yield host_state
+
+    def clear(self):
+        """Drop all the cached results."""
+        self._results.clear()
+
+    def get_stats(self):
+        """Return the number of hits and misses and the hit rate."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': 100.0 * self.hits / lookups if lookups else 0.0}
@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo_log import log as logging
@@ -107,6 +108,13 @@ class FilterScheduler(driver.Scheduler):
         num_instances = spec_obj.num_instances
         # NOTE(sbauza): Adding one field for any out-of-tree need
         spec_obj.config_options = config_options
+        # NOTE: The server group of the request is updated each time a host
+        # is selected, which can change the result of the filters and
+        # weighers for all the hosts, not only the selected one.
+        if (CONF.scheduler_batch_placement and num_instances > 1 and
+                spec_obj.instance_group is None):
+            return self._schedule_batch(hosts, spec_obj)
+
         for num in range(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -140,6 +148,63 @@ class FilterScheduler(driver.Scheduler):
                 spec_obj.instance_group.obj_reset_changes(['hosts'])
         return selected_hosts
 
+    def _schedule_batch(self, hosts, spec_obj):
+        """Select the hosts for all the instances of a request at once.
+
+        The hosts are filtered and weighed for the first instance only. As
+        consuming the resources of the chosen host doesn't change the other
+        hosts, only the chosen host is filtered and weighed again for the
+        next instance, and the hosts are kept in a heap ordered by weight.
+        """
+        selected_hosts = []
+        hosts = self.host_manager.get_filtered_hosts(hosts, spec_obj, index=0)
+        if not hosts:
+            return selected_hosts
+
+        LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
+
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts, spec_obj)
+
+        LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
+
+        # NOTE: Ties between equal weights are broken by the position of the
+        # hosts in the filtered list, like the stable sort of the weigher
+        # handler does, so the hosts themselves are never compared.
+        positions = {id(host): i for i, host in enumerate(hosts)}
+        heap = [(-weighed_host.weight, positions[id(weighed_host.obj)],
+                 weighed_host)
+                for weighed_host in weighed_hosts]
+        heapq.heapify(heap)
+
+        scheduler_host_subset_size = max(1, CONF.scheduler_host_subset_size)
+        for num in range(spec_obj.num_instances):
+            if not heap:
+                # Can't get any more locally.
+                break
+
+            best_hosts = [heapq.heappop(heap) for i in
+                          range(min(scheduler_host_subset_size, len(heap)))]
+            chosen = random.choice(best_hosts)
+            for entry in best_hosts:
+                if entry is not chosen:
+                    heapq.heappush(heap, entry)
+            chosen_host = chosen[2]
+
+            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources so the filter/weights
+            # will change for the next instance.
+            chosen_host.obj.consume_from_request(spec_obj)
+            if not self.host_manager.host_passes_filters(
+                    chosen_host.obj, spec_obj, index=num + 1):
+                continue
+            weighed_host = self.host_manager.reweigh_host(chosen_host.obj,
+                                                          spec_obj)
+            heapq.heappush(heap, (-weighed_host.weight, chosen[1],
+                                  weighed_host))
+        return selected_hosts
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
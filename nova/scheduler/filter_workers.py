@@ -0,0 +1,266 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pool of processes running the CPU intensive scheduler filters in parallel.
+
+Each process keeps replicas of the host states of its shard of the hosts.
+The scheduler only sends the host states whose generation changed since
+they were last sent, along with the keys of the hosts to filter.
+"""
+
+import os
+import subprocess
+import sys
+
+from eventlet import greenthread
+from eventlet import hubs
+from eventlet import semaphore
+from oslo_log import log as logging
+from oslo_utils import importutils
+from six.moves import cPickle as pickle
+
+import nova.conf
+from nova.i18n import _LW
+from nova import objects
+
+LOG = logging.getLogger(__name__)
+
+CONF = nova.conf.CONF
+
+# NOTE: Below this number of hosts per worker, sending the hosts to the
+# workers costs more than running the filter in the scheduler itself.
+MIN_HOSTS_PER_WORKER = 20
+
+# Seconds given to a process to exit once its input is closed before it is
+# killed
+STOP_TIMEOUT = 5
+
+
+def _run(requests, results):
+    """Run the filters sent by the scheduler until its input is closed."""
+    filters = {}
+    # Host states by host and node
+    replicas = {}
+    while True:
+        try:
+            filter_path, spec_primitive, updates, discarded, keys = (
+                pickle.load(requests))
+        except EOFError:
+            return
+        replicas.update(updates)
+        for key in discarded:
+            replicas.pop(key, None)
+        try:
+            filter_ = filters.get(filter_path)
+            if filter_ is None:
+                filter_ = importutils.import_class(filter_path)()
+                filters[filter_path] = filter_
+            spec_obj = objects.RequestSpec.obj_from_primitive(spec_primitive)
+            shard_results = []
+            for key in keys:
+                host_state = replicas[key]
+                # Only return the limits set by the filter for this request
+                host_state.limits = {}
+                if filter_._filter_one(host_state, spec_obj):
+                    shard_results.append((True, host_state.limits))
+                else:
+                    shard_results.append((False, None))
+            response = (True, shard_results)
+        except Exception as e:
+            response = (False, '%s: %s' % (e.__class__.__name__, e))
+        pickle.dump(response, results, pickle.HIGHEST_PROTOCOL)
+        results.flush()
+
+
+def main():
+    """Entry point of the worker processes started by FilterWorkerPool."""
+    CONF(sys.argv[1:], project='nova')
+    objects.register_all()
+    requests = os.fdopen(os.dup(0), 'rb')
+    results = os.fdopen(os.dup(1), 'wb')
+    # Anything printed by the filters must not corrupt the results
+    os.dup2(2, 1)
+    _run(requests, results)
+
+
+class _Worker(object):
+    """A worker process and the state of the replicas it keeps."""
+
+    def __init__(self, args):
+        # NOTE: The process runs a new interpreter rather than being forked
+        # from the scheduler, so that it doesn't inherit the eventlet monkey
+        # patching, hub and locks of the scheduler.
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', __name__] + args, bufsize=-1,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True)
+        # Generation of the replica of each host state, by host and node
+        self.generations = {}
+        # Keys of the replicas to drop with the next request
+        self.discarded = set()
+
+    def send(self, message):
+        pickle.dump(message, self.process.stdin, pickle.HIGHEST_PROTOCOL)
+        self.process.stdin.flush()
+
+    def recv(self):
+        # Don't block the other greenthreads while the worker runs the filter
+        hubs.trampoline(self.process.stdout.fileno(), read=True)
+        return pickle.load(self.process.stdout)
+
+    def stop(self):
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except (IOError, OSError):
+                pass
+        # The process exits once its input is closed
+        for i in range(STOP_TIMEOUT * 10):
+            if self.process.poll() is not None:
+                return
+            greenthread.sleep(0.1)
+        self.process.kill()
+        self.process.wait()
+
+
+class FilterWorkerPool(object):
+    """Processes running the filters which have parallelizable set on shards
+    of the hosts.
+
+    Each host is assigned to one process the first time it is filtered, and
+    the process keeps a replica of its host state which is only sent again
+    when its generation changes. The processes are started the first time
+    they are used.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._workers = None
+        # Index of the worker keeping the replica of each host state, by host
+        # and node
+        self._assignments = {}
+        self._next_worker = 0
+        # Only one request can use the processes at a time
+        self._semaphore = semaphore.Semaphore()
+
+    def _start(self):
+        args = []
+        for config_file in CONF.config_file:
+            args += ['--config-file', config_file]
+        if CONF.config_dir:
+            args += ['--config-dir', CONF.config_dir]
+        self._workers = [_Worker(args) for i in range(self.workers)]
+        self._assignments = {}
+
+    def _assign(self, key):
+        index = self._assignments.get(key)
+        if index is None:
+            index = self._assignments[key] = self._next_worker
+            self._next_worker = (self._next_worker + 1) % self.workers
+        return index
+
+    def _filter_shards(self, filter_, host_states, spec_obj):
+        if self._workers is None:
+            self._start()
+        filter_path = '%s.%s' % (filter_.__class__.__module__,
+                                 filter_.__class__.__name__)
+        spec_primitive = spec_obj.obj_to_primitive()
+        keys = [(host_state.host, host_state.nodename)
+                for host_state in host_states]
+        # Positions in host_states of the hosts of each worker
+        shards = [[] for worker in self._workers]
+        for i, key in enumerate(keys):
+            shards[self._assign(key)].append(i)
+
+        for worker, positions in zip(self._workers, shards):
+            if not positions:
+                continue
+            updates = {}
+            for i in positions:
+                host_state = host_states[i]
+                if worker.generations.get(keys[i]) != host_state.generation:
+                    updates[keys[i]] = host_state
+                    worker.generations[keys[i]] = host_state.generation
+            discarded, worker.discarded = worker.discarded, set()
+            worker.send((filter_path, spec_primitive, updates, discarded,
+                         [keys[i] for i in positions]))
+
+        results = [None] * len(host_states)
+        errors = []
+        for worker, positions in zip(self._workers, shards):
+            if not positions:
+                continue
+            success, shard_results = worker.recv()
+            if success:
+                for i, result in zip(positions, shard_results):
+                    results[i] = result
+            else:
+                errors.append(shard_results)
+        if errors:
+            raise RuntimeError(', '.join(errors))
+
+        passing = []
+        for host_state, (passes, limits) in zip(host_states, results):
+            if passes:
+                host_state.limits.update(limits)
+                passing.append(host_state)
+        return passing
+
+    def filter_all(self, filter_, host_states, spec_obj):
+        """Return the host states passing the filter, running it in the
+        worker processes when there are enough hosts.
+        """
+        host_states = list(host_states)
+        if len(host_states) < self.workers * MIN_HOSTS_PER_WORKER:
+            return list(filter_.filter_all(host_states, spec_obj))
+        with self._semaphore:
+            try:
+                return self._filter_shards(filter_, host_states, spec_obj)
+            except Exception as e:
+                LOG.warning(_LW("Running filter %(filter)s in the worker "
+                                "processes failed, running it in the "
+                                "scheduler: %(error)s"),
+                            {'filter': filter_.__class__.__name__,
+                             'error': e})
+                # The state of the processes is unknown, start new ones the
+                # next time
+                self._stop()
+        return list(filter_.filter_all(host_states, spec_obj))
+
+    def discard(self, key):
+        """Drop the replica of the host state of a removed host.
+
+        :param key: tuple of the host and node of the host state
+        """
+        index = self._assignments.pop(key, None)
+        if index is not None and self._workers is not None:
+            worker = self._workers[index]
+            if worker.generations.pop(key, None) is not None:
+                worker.discarded.add(key)
+
+    def _stop(self):
+        if self._workers is not None:
+            workers, self._workers = self._workers, None
+            for worker in workers:
+                worker.stop()
+
+    def stop(self):
+        """Stop the worker processes, they are started again when needed."""
+        with self._semaphore:
+            self._stop()
+
+
+if __name__ == '__main__':
+    main()
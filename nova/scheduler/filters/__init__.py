@@ -16,7 +16,15 @@
 """
 Scheduler host filters
 """
+from oslo_log import log as logging
+
+import nova.conf
 from nova import filters
+from nova.i18n import _LW
+from nova.scheduler import host_arrays
+
+CONF = nova.conf.CONF
+LOG = logging.getLogger(__name__)
 
 
 class BaseHostFilter(filters.BaseFilter):
@@ -35,6 +43,13 @@ class BaseHostFilter(filters.BaseFilter):
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
+        if CONF.scheduler_use_vectorized_filters:
+            if host_arrays.numpy is None:
+                LOG.warning(_LW("The scheduler_use_vectorized_filters option "
+                                "is set but NumPy is not installed, all "
+                                "filters will be run for each host."))
+            else:
+                self.arrays_class = host_arrays.HostStateArrays
 
 
 def all_filters():
@@ -31,6 +31,14 @@ class AggregateImagePropertiesIsolation(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    def cache_key(self, spec_obj):
+        if not spec_obj.image:
+            return ()
+        image_props = spec_obj.image.properties
+        return tuple(sorted((key, str(image_props.get(key)))
+                            for key in image_props.obj_fields
+                            if image_props.obj_attr_is_set(key)))
+
     def host_passes(self, host_state, spec_obj):
         """Checks a host in an aggregate that metadata key/value match
         with image properties.
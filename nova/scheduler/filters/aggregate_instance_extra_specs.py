@@ -33,6 +33,9 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    def cache_key(self, spec_obj):
+        return utils.extra_specs_cache_key(spec_obj.flavor)
+
     def host_passes(self, host_state, spec_obj):
         """Return a list of hosts that can create instance_type
 
@@ -35,6 +35,9 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
     # Availability zones do not change within a request
     run_filter_once_per_request = True
 
+    def cache_key(self, spec_obj):
+        return spec_obj.availability_zone
+
     def host_passes(self, host_state, spec_obj):
         availability_zone = spec_obj.availability_zone
 
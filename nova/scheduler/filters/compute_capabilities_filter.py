@@ -19,6 +19,7 @@ import six
 
 from nova.scheduler import filters
 from nova.scheduler.filters import extra_specs_ops
+from nova.scheduler.filters import utils
 
 
 LOG = logging.getLogger(__name__)
@@ -30,6 +31,30 @@ class ComputeCapabilitiesFilter(filters.BaseHostFilter):
     # Instance type and host capabilities do not change within a request
     run_filter_once_per_request = True
 
+    # Attributes of the HostState which are part of its capabilities
+    # signature
+    _STATIC_CAPABILITIES = ('host_ip', 'hypervisor_type', 'hypervisor_version',
+                            'hypervisor_hostname', 'cpu_info',
+                            'supported_instances')
+
+    def cache_key(self, spec_obj):
+        instance_type = spec_obj.flavor
+        if 'extra_specs' not in instance_type:
+            return ()
+        # NOTE: The extra specs can match any attribute of the HostState,
+        # including the resources consumed by the requests and the stats
+        # counters, so the results can only be cached if they only look at
+        # the host capabilities.
+        for key in instance_type.extra_specs:
+            scope = key.split(':')
+            if len(scope) > 1:
+                if scope[0] != "capabilities":
+                    continue
+                del scope[0]
+            if scope[0] not in self._STATIC_CAPABILITIES:
+                return None
+        return utils.extra_specs_cache_key(instance_type)
+
     def _get_capabilities(self, host_state, scope):
         cap = host_state
         for index in range(0, len(scope)):
@@ -72,9 +72,30 @@ class BaseCoreFilter(filters.BaseHostFilter):
 class CoreFilter(BaseCoreFilter):
     """CoreFilter filters based on CPU core utilization."""
 
+    vectorized = True
+
     def _get_cpu_allocation_ratio(self, host_state, spec_obj):
         return host_state.cpu_allocation_ratio
 
+    def filter_arrays(self, host_arrays, spec_obj):
+        """Vectorized version of host_passes()."""
+        instance_vcpus = spec_obj.vcpus
+        vcpus_total = host_arrays['vcpus_total']
+
+        # Fail safe
+        not_set = vcpus_total == 0
+        if not_set.any():
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+
+        vcpus_limit = vcpus_total * host_arrays['cpu_allocation_ratio']
+        has_limit = ~not_set & (vcpus_limit > 0)
+        host_arrays.set_limits(has_limit, 'vcpu', vcpus_limit)
+
+        free_vcpus = vcpus_limit - host_arrays['vcpus_used']
+        passes = ((free_vcpus >= instance_vcpus) &
+                  ~(has_limit & (vcpus_total < instance_vcpus)))
+        return not_set | passes
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
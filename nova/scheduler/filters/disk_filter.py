@@ -28,9 +28,27 @@ CONF = nova.conf.CONF
 class DiskFilter(filters.BaseHostFilter):
     """Disk Filter with over subscription flag."""
 
+    vectorized = True
+
     def _get_disk_allocation_ratio(self, host_state, spec_obj):
         return host_state.disk_allocation_ratio
 
+    def filter_arrays(self, host_arrays, spec_obj):
+        """Vectorized version of host_passes()."""
+        requested_disk = (1024 * (spec_obj.root_gb +
+                                  spec_obj.ephemeral_gb) +
+                          spec_obj.swap)
+        total_usable_disk_mb = host_arrays['total_usable_disk_gb'] * 1024
+
+        disk_mb_limit = (total_usable_disk_mb *
+                         host_arrays['disk_allocation_ratio'])
+        used_disk_mb = total_usable_disk_mb - host_arrays['free_disk_mb']
+        usable_disk_mb = disk_mb_limit - used_disk_mb
+        passes = usable_disk_mb >= requested_disk
+
+        host_arrays.set_limits(passes, 'disk_gb', disk_mb_limit / 1024)
+        return passes
+
     def host_passes(self, host_state, spec_obj):
         """Filter based on disk usage."""
         requested_disk = (1024 * (spec_obj.root_gb +
@@ -67,6 +85,8 @@ class AggregateDiskFilter(DiskFilter):
     found.
     """
 
+    vectorized = False
+
     def _get_disk_allocation_ratio(self, host_state, spec_obj):
         aggregate_vals = utils.aggregate_values_from_key(
             host_state,
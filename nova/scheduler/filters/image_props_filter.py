@@ -41,6 +41,12 @@ class ImagePropertiesFilter(filters.BaseHostFilter):
     # a request
     run_filter_once_per_request = True
 
+    def cache_key(self, spec_obj):
+        image_props = spec_obj.image.properties if spec_obj.image else {}
+        return tuple(image_props.get(prop) for prop in (
+            'hw_architecture', 'img_hv_type', 'hw_vm_mode',
+            'img_hv_requested_version'))
+
     def _instance_supported(self, host_state, image_props,
                             hypervisor_version):
         img_arch = image_props.get('hw_architecture')
@@ -28,6 +28,8 @@ CONF = nova.conf.CONF
 class NumInstancesFilter(filters.BaseHostFilter):
     """Filter out hosts with too many instances."""
 
+    vectorized = True
+
     def _get_max_instances_per_host(self, host_state, spec_obj):
         return CONF.max_instances_per_host
 
@@ -43,6 +45,10 @@ class NumInstancesFilter(filters.BaseHostFilter):
                          'max_instances': max_instances})
         return passes
 
+    def filter_arrays(self, host_arrays, spec_obj):
+        """Vectorized version of host_passes()."""
+        return host_arrays['num_instances'] < CONF.max_instances_per_host
+
 
 class AggregateNumInstancesFilter(NumInstancesFilter):
     """AggregateNumInstancesFilter with per-aggregate the max num instances.
@@ -51,6 +57,8 @@ class AggregateNumInstancesFilter(NumInstancesFilter):
     found.
     """
 
+    vectorized = False
+
     def _get_max_instances_per_host(self, host_state, spec_obj):
         aggregate_vals = utils.aggregate_values_from_key(
             host_state,
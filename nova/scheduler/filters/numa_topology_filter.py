@@ -23,6 +23,8 @@ LOG = logging.getLogger(__name__)
 class NUMATopologyFilter(filters.BaseHostFilter):
     """Filter on requested NUMA topology."""
 
+    parallelizable = True
+
     def _satisfies_cpu_policy(self, host_state, extra_specs, image_props):
         """Check that the host_state provided satisfies any available
         CPU policy requirements.
@@ -78,6 +80,18 @@ class NUMATopologyFilter(filters.BaseHostFilter):
             limits = objects.NUMATopologyLimits(
                 cpu_allocation_ratio=cpu_ratio,
                 ram_allocation_ratio=ram_ratio)
+            # Reject the hosts which obviously can't fit the instance without
+            # trying all the permutations of their cells
+            if not hardware.numa_summary_can_fit(
+                    host_state.get_numa_fit_summary(), requested_topology,
+                    limits=limits):
+                LOG.debug("%(host)s, %(node)s fails NUMA topology "
+                          "requirements. No cell of this host has enough "
+                          "free resources for the instance.",
+                          {'host': host_state.host,
+                           'node': host_state.nodename},
+                          instance_uuid=spec_obj.instance_uuid)
+                return False
             instance_topology = (hardware.numa_fit_instance_to_host(
                         host_topology, requested_topology,
                         limits=limits,
@@ -67,9 +67,26 @@ class BaseRamFilter(filters.BaseHostFilter):
 class RamFilter(BaseRamFilter):
     """Ram Filter with over subscription flag."""
 
+    vectorized = True
+
     def _get_ram_allocation_ratio(self, host_state, spec_obj):
         return host_state.ram_allocation_ratio
 
+    def filter_arrays(self, host_arrays, spec_obj):
+        """Vectorized version of host_passes()."""
+        requested_ram = spec_obj.memory_mb
+        total_usable_ram_mb = host_arrays['total_usable_ram_mb']
+
+        memory_mb_limit = (total_usable_ram_mb *
+                           host_arrays['ram_allocation_ratio'])
+        used_ram_mb = total_usable_ram_mb - host_arrays['free_ram_mb']
+        usable_ram = memory_mb_limit - used_ram_mb
+        passes = ((total_usable_ram_mb >= requested_ram) &
+                  (usable_ram >= requested_ram))
+
+        host_arrays.set_limits(passes, 'memory_mb', memory_mb_limit)
+        return passes
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
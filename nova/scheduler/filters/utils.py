@@ -96,3 +96,12 @@ def other_types_on_host(host_state, instance_type_id):
     host_types = set([inst.instance_type_id for inst in host_instances])
     inst_set = set([instance_type_id])
     return bool(host_types - inst_set)
+
+
+def extra_specs_cache_key(instance_type):
+    """Return a hashable key of the extra specs of an instance_type, for the
+    filters only depending on them to use as cache key.
+    """
+    if not instance_type.obj_attr_is_set('extra_specs'):
+        return ()
+    return tuple(sorted(instance_type.extra_specs.items()))
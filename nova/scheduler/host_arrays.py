@@ -0,0 +1,98 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar view of HostStates used by the vectorized filters and weighers.
+"""
+
+from oslo_utils import importutils
+
+numpy = importutils.try_import('numpy')
+
+
+class HostStateArrays(object):
+    """Numeric fields of a list of HostStates stored as NumPy arrays.
+
+    The arrays are built lazily, the first time a field is accessed, and are
+    sliced along with the list of hosts when some of them are filtered out so
+    that each field is only read once from the HostState objects for a given
+    filtering or weighing run.
+    """
+
+    def __init__(self, hosts, columns=None):
+        self.objs = hosts
+        self._columns = columns or {}
+        self._positions = None
+
+    def __len__(self):
+        return len(self.objs)
+
+    def __getitem__(self, name):
+        """Return the array of values of the HostState field 'name'."""
+        column = self._columns.get(name)
+        if column is None:
+            column = numpy.array([getattr(host, name) for host in self.objs],
+                                 dtype=float)
+            self._columns[name] = column
+        return column
+
+    def _take(self, indexes):
+        hosts = [self.objs[i] for i in indexes]
+        columns = {name: column[indexes]
+                   for name, column in self._columns.items()}
+        return HostStateArrays(hosts, columns)
+
+    def select(self, mask):
+        """Return the arrays of the hosts for which the mask is True."""
+        if mask.all():
+            return self
+        return self._take(numpy.flatnonzero(mask))
+
+    def restrict(self, hosts):
+        """Return the arrays of the given hosts, which must be a subset of the
+        hosts in self.objs.
+        """
+        if len(hosts) == len(self.objs):
+            return self
+        if self._positions is None:
+            self._positions = {id(host): i
+                               for i, host in enumerate(self.objs)}
+        indexes = numpy.array([self._positions[id(host)] for host in hosts],
+                              dtype=int)
+        return self._take(indexes)
+
+    def set_limits(self, mask, key, values):
+        """Set the limits[key] of the hosts for which the mask is True to their
+        value in the values array.
+        """
+        values = values.tolist()
+        for i in numpy.flatnonzero(mask):
+            self.objs[i].limits[key] = values[i]
+
+    @staticmethod
+    def normalize(weights, minval=None, maxval=None):
+        """Vectorized version of nova.weights.normalize()."""
+        if maxval is None:
+            maxval = weights.max()
+        if minval is None:
+            minval = weights.min()
+
+        maxval = float(maxval)
+        minval = float(minval)
+
+        if minval == maxval:
+            return numpy.zeros(len(weights))
+
+        return (weights - minval) / (maxval - minval)
@@ -18,7 +18,9 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import functools
+import itertools
 import time
 try:
     from collections import UserDict as IterableUserDict   # Python 3
@@ -37,7 +39,10 @@ from nova import exception
 from nova.i18n import _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
+from nova.scheduler import filter_cache
+from nova.scheduler import filter_workers
 from nova.scheduler import filters
+from nova.scheduler import stats as scheduler_stats
 from nova.scheduler import weights
 from nova import utils
 from nova.virt import hardware
@@ -47,6 +52,14 @@ CONF = nova.conf.CONF
 
 LOG = logging.getLogger(__name__)
 HOST_INSTANCE_SEMAPHORE = "host_instance"
+# NOTE: The timestamps of the compute node and service records are set by the
+# services writing them, so the incremental refresh looks back a bit further
+# than the previous refresh in order to tolerate some clock skew and records
+# committed after they were stamped.
+HOST_STATE_REFRESH_OVERLAP = 10
+
+# Source of the generations of the host states, unique across all of them
+_GENERATIONS = itertools.count(1)
 
 
 class ReadOnlyDict(IterableUserDict):
@@ -107,6 +120,10 @@ class HostState(object):
     """
 
     def __init__(self, host, node):
+        # Changes each time the host state is updated or consumed while the
+        # filter worker processes are enabled, which tells them which of
+        # their replicas are out of date.
+        self.generation = next(_GENERATIONS)
         self.host = host
         self.nodename = node
         self._lock_name = (host, node)
@@ -122,6 +139,9 @@ class HostState(object):
         self.vcpus_used = 0
         self.pci_stats = None
         self.numa_topology = None
+        # Summary of the free resources of the NUMA cells, along with the
+        # numa_topology it was computed from
+        self._numa_fit_summary = None
 
         # Additional host information from the compute node stats:
         self.num_instances = 0
@@ -134,6 +154,7 @@ class HostState(object):
         self.hypervisor_hostname = None
         self.cpu_info = None
         self.supported_instances = None
+        self.capabilities_signature = None
 
         # Resource oversubscription values for the compute host:
         self.limits = {}
@@ -154,6 +175,13 @@ class HostState(object):
 
         self.updated = None
 
+    def increment_generation(self):
+        """Mark the replicas of the host state held by the filter worker
+        processes as out of date.
+        """
+        if CONF.scheduler_filter_workers:
+            self.generation = next(_GENERATIONS)
+
     def update(self, compute=None, service=None, aggregates=None,
             inst_dict=None):
         """Update all information about a host."""
@@ -164,26 +192,40 @@ class HostState(object):
             # message will be dispatched in it's own green thread. So the
             # shared host state should be updated in a consistent way to make
             # sure its data is valid under concurrent write operations.
+            changed = False
             if compute is not None:
                 LOG.debug("Update host state from compute node: %s", compute)
-                self._update_from_compute_node(compute)
+                changed = self._update_from_compute_node(compute)
             if aggregates is not None:
                 LOG.debug("Update host state with aggregates: %s", aggregates)
+                changed = changed or aggregates != self.aggregates
                 self.aggregates = aggregates
             if service is not None:
                 LOG.debug("Update host state with service dict: %s", service)
-                self.service = ReadOnlyDict(service)
+                service = ReadOnlyDict(service)
+                changed = changed or service != getattr(self, 'service', None)
+                self.service = service
             if inst_dict is not None:
                 LOG.debug("Update host state with instances: %s", inst_dict)
+                # NOTE: Only the instances added or removed change the
+                # generation, the filters run by the filter worker processes
+                # don't look at the instances themselves.
+                changed = changed or set(inst_dict) != set(self.instances)
                 self.instances = inst_dict
+            if changed:
+                self.increment_generation()
 
         return _locked_update(self, compute, service, aggregates, inst_dict)
 
     def _update_from_compute_node(self, compute):
-        """Update information about a host from a ComputeNode object."""
+        """Update information about a host from a ComputeNode object.
+
+        Return whether the ComputeNode is newer than the one applied before.
+        """
         if (self.updated and compute.updated_at
                 and self.updated > compute.updated_at):
-            return
+            return False
+        newer = self.updated != compute.updated_at
         all_ram_mb = compute.memory_mb
 
         # Assume virtual size is all consumed by instances if use qcow2 disk.
@@ -239,10 +281,37 @@ class HostState(object):
         # update metrics
         self.metrics = objects.MonitorMetricList.from_json(compute.metrics)
 
+        # Anything changing the result of the filters only looking at the
+        # capabilities of the host must be part of this signature, which
+        # invalidates their cached results when it changes. The stats are
+        # left out, they hold counters updated by most compute node updates.
+        self.capabilities_signature = (
+            self.host_ip, self.hypervisor_type, self.hypervisor_version,
+            self.hypervisor_hostname, self.cpu_info,
+            self.supported_instances)
+
         # update allocation ratios given by the ComputeNode object
         self.cpu_allocation_ratio = compute.cpu_allocation_ratio
         self.ram_allocation_ratio = compute.ram_allocation_ratio
         self.disk_allocation_ratio = compute.disk_allocation_ratio
+        return newer
+
+    def get_numa_fit_summary(self):
+        """Return the summary of the free resources of the NUMA cells of the
+        host for hardware.numa_summary_can_fit(), or None if the host has no
+        NUMA topology.
+
+        The summary is only computed again when the numa_topology changes.
+        """
+        if self.numa_topology is None:
+            return None
+        if (self._numa_fit_summary is None or
+                self._numa_fit_summary[0] is not self.numa_topology):
+            host_topology, _fmt = (
+                hardware.host_topology_and_format_from_host(self))
+            self._numa_fit_summary = (self.numa_topology,
+                                      hardware.numa_fit_summary(host_topology))
+        return self._numa_fit_summary[1]
 
     def consume_from_request(self, spec_obj):
         """Incrementally update host state from a RequestSpec object."""
@@ -256,7 +325,9 @@ class HostState(object):
             # sure its data is valid under concurrent write operations.
             self._locked_consume_from_request(spec_obj)
 
-        return _locked(self, spec_obj)
+        return_value = _locked(self, spec_obj)
+        self.increment_generation()
+        return return_value
 
     def _locked_consume_from_request(self, spec_obj):
         disk_mb = (spec_obj.root_gb +
@@ -334,16 +405,39 @@ class HostManager(object):
         self.filter_cls_map = {cls.__name__: cls for cls in filter_classes}
         self.filter_obj_map = {}
         self.default_filters = self._choose_host_filters(self._load_filters())
+        self.filter_cache = None
+        if CONF.scheduler_cache_filter_results:
+            self.filter_cache = filter_cache.FilterResultCache()
+            self.filter_handler.result_cache = self.filter_cache
+        if CONF.scheduler_filter_workers:
+            self.filter_handler.worker_pool = filter_workers.FilterWorkerPool(
+                CONF.scheduler_filter_workers)
         self.weight_handler = weights.HostWeightHandler()
         weigher_classes = self.weight_handler.get_matching_classes(
                 CONF.scheduler_weight_classes)
         self.weighers = [cls() for cls in weigher_classes]
+        self.stats = None
+        if CONF.scheduler_stats_interval or CONF.scheduler_statsd_address:
+            emitter = None
+            if CONF.scheduler_statsd_address:
+                emitter = scheduler_stats.StatsdEmitter(
+                    CONF.scheduler_statsd_address,
+                    CONF.scheduler_statsd_prefix)
+            self.stats = scheduler_stats.SchedulerStats(emitter)
+            self.filter_handler.stats = self.stats
+            self.weight_handler.stats = self.stats
         # Dict of aggregates keyed by their ID
         self.aggs_by_id = {}
         # Dict of set of aggregate IDs keyed by the name of the host belonging
         # to those aggregates
         self.host_aggregates_map = collections.defaultdict(set)
         self._init_aggregates()
+        # Compute nodes keyed by their ID and nova-compute services keyed by
+        # their host, kept between requests for the incremental refresh
+        self._compute_nodes = {}
+        self._services = {}
+        self._last_refresh = None
+        self._last_full_refresh = None
         self.tracks_instance_changes = CONF.scheduler_tracks_instance_changes
         # Dict of instances and status, keyed by host
         self._instance_info = {}
@@ -370,6 +464,8 @@ class HostManager(object):
             self._update_aggregate(aggregates)
 
     def _update_aggregate(self, aggregate):
+        if self.filter_cache is not None:
+            self.filter_cache.clear()
         self.aggs_by_id[aggregate.id] = aggregate
         for host in aggregate.hosts:
             self.host_aggregates_map[host].add(aggregate.id)
@@ -383,6 +479,8 @@ class HostManager(object):
     def delete_aggregate(self, aggregate):
         """Deletes internal HostManager information about a specific aggregate.
         """
+        if self.filter_cache is not None:
+            self.filter_cache.clear()
         if aggregate.id in self.aggs_by_id:
             del self.aggs_by_id[aggregate.id]
         for host in aggregate.hosts:
@@ -535,25 +633,47 @@ class HostManager(object):
                     return []
             hosts = six.itervalues(name_to_cls_map)
 
-        return self.filter_handler.get_filtered_objects(filters,
+        filtered_hosts = self.filter_handler.get_filtered_objects(filters,
                 hosts, spec_obj, index)
+        if self.filter_cache is not None:
+            LOG.debug("Filter result cache: %(hits)d hits, %(misses)d "
+                      "misses, %(hit_rate).1f%% hit rate",
+                      self.filter_cache.get_stats())
+        return filtered_hosts
+
+    def host_passes_filters(self, host, spec_obj, index=0):
+        """Check a single host which already passed get_filtered_hosts()
+        against the filters again, e.g. after it consumed resources.
+        """
+        for filter_ in self.default_filters:
+            if (filter_.run_filter_for_index(index) and
+                    not list(filter_.filter_all([host], spec_obj) or [])):
+                LOG.debug("Host %(host)s fails filter %(filter)s",
+                          {'host': host,
+                           'filter': filter_.__class__.__name__})
+                return False
+        return True
 
     def get_weighed_hosts(self, hosts, spec_obj):
         """Weigh the hosts."""
         return self.weight_handler.get_weighed_objects(self.weighers,
                 hosts, spec_obj)
 
+    def reweigh_host(self, host, spec_obj):
+        """Weigh again a host whose state changed since it was weighed with
+        get_weighed_hosts().
+        """
+        return self.weight_handler.reweigh_object(self.weighers, host,
+                                                  spec_obj)
+
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
         the HostManager knows about. Also, each of the consumable resources
         in HostState are pre-populated and adjusted based on data in the db.
         """
-
-        service_refs = {service.host: service
-                        for service in objects.ServiceList.get_by_binary(
-                            context, 'nova-compute', include_disabled=True)}
-        # Get resource usage across the available compute nodes:
-        compute_nodes = objects.ComputeNodeList.get_all(context)
+        start_time = time.time()
+        service_refs, compute_nodes, changed_ids = (
+            self._get_computes_and_services(context))
         seen_nodes = set()
         for compute in compute_nodes:
             service = service_refs.get(compute.host)
@@ -567,13 +687,18 @@ class HostManager(object):
             node = compute.hypervisor_hostname
             state_key = (host, node)
             host_state = self.host_state_map.get(state_key)
+            compute_update = compute
             if not host_state:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
+            elif changed_ids is not None and compute.id not in changed_ids:
+                # The compute node record didn't change since the last
+                # refresh, so the host state is already up to date with it
+                compute_update = None
             # We force to update the aggregates info each time a new request
             # comes in, because some changes on the aggregates could have been
             # happening after setting this field for the first time
-            host_state.update(compute,
+            host_state.update(compute_update,
                               dict(service),
                               self._get_aggregates_info(host),
                               self._get_instance_info(context, compute))
@@ -587,9 +712,80 @@ class HostManager(object):
             LOG.info(_LI("Removing dead compute node %(host)s:%(node)s "
                          "from scheduler"), {'host': host, 'node': node})
             del self.host_state_map[state_key]
+            if self.filter_handler.worker_pool is not None:
+                self.filter_handler.worker_pool.discard(state_key)
 
+        if self.stats is not None:
+            self.stats.record_phase('get_all_host_states',
+                                    time.time() - start_time)
         return six.itervalues(self.host_state_map)
 
+    def stop_filter_workers(self):
+        """Stop the filter worker processes, if any. They are started again
+        by the next request using them.
+        """
+        if self.filter_handler.worker_pool is not None:
+            self.filter_handler.worker_pool.stop()
+
+    def _get_computes_and_services(self, context):
+        """Returns the nova-compute services keyed by host, the compute nodes
+        and the set of IDs of the compute nodes which changed since the last
+        call, or None if all of them have to be considered as changed.
+
+        If the scheduler_host_state_full_refresh_interval option is set, only
+        the records created, updated or deleted since the last call are read
+        from the database and merged into the ones kept by the HostManager,
+        unless the last full read is older than the configured interval.
+        """
+        interval = CONF.scheduler_host_state_full_refresh_interval
+        now = timeutils.utcnow()
+        # NOTE: The records committed on the master but not replicated yet
+        # are only picked up by the incremental refresh if they are younger
+        # than the overlap, so the slave can't lag behind more than that.
+        use_slave = True if interval <= 0 else HOST_STATE_REFRESH_OVERLAP
+        if (interval <= 0 or self._last_full_refresh is None or
+                timeutils.is_older_than(self._last_full_refresh, interval)):
+            services = objects.ServiceList.get_by_binary(
+                context, 'nova-compute', include_disabled=True,
+                use_slave=use_slave)
+            compute_nodes = objects.ComputeNodeList.get_all(
+                context, use_slave=use_slave)
+            self._services = {service.host: service for service in services}
+            if interval <= 0:
+                # Nothing is kept between requests
+                return self._services, compute_nodes, None
+            self._compute_nodes = {compute.id: compute
+                                   for compute in compute_nodes}
+            self._last_refresh = self._last_full_refresh = now
+            return self._services, self._compute_nodes.values(), None
+
+        changed_since = self._last_refresh - datetime.timedelta(
+            seconds=HOST_STATE_REFRESH_OVERLAP)
+        services = objects.ServiceList.get_by_binary(
+            context, 'nova-compute', include_disabled=True,
+            changed_since=changed_since, use_slave=use_slave)
+        for service in services:
+            if not service.deleted:
+                self._services[service.host] = service
+            elif (service.host in self._services and
+                    self._services[service.host].id == service.id):
+                # A new service may already have replaced the deleted one
+                del self._services[service.host]
+        changed_ids = set()
+        for compute in objects.ComputeNodeList.get_all_changed_since(
+                context, changed_since, use_slave=use_slave):
+            if compute.deleted:
+                self._compute_nodes.pop(compute.id, None)
+            else:
+                self._compute_nodes[compute.id] = compute
+                changed_ids.add(compute.id)
+        LOG.debug("Refreshed %(services)d services and %(computes)d compute "
+                  "nodes changed since %(since)s",
+                  {'services': len(services), 'computes': len(changed_ids),
+                   'since': changed_since})
+        self._last_refresh = now
+        return self._services, self._compute_nodes.values(), changed_ids
+
     def _get_aggregates_info(self, host):
         return [self.aggs_by_id[agg_id] for agg_id in
                 self.host_aggregates_map[host]]
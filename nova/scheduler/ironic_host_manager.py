@@ -35,7 +35,11 @@ class IronicNodeState(host_manager.HostState):
     """
 
     def _update_from_compute_node(self, compute):
-        """Update information about a host from a ComputeNode object."""
+        """Update information about a host from a ComputeNode object.
+
+        Return whether the ComputeNode is newer than the one applied before.
+        """
+        newer = self.updated != compute.updated_at
         self.vcpus_total = compute.vcpus
         self.vcpus_used = compute.vcpus_used
 
@@ -62,6 +66,7 @@ class IronicNodeState(host_manager.HostState):
         self.disk_allocation_ratio = compute.disk_allocation_ratio
 
         self.updated = compute.updated_at
+        return newer
 
     def _locked_consume_from_request(self, spec_obj):
         """Consume nodes entire resources regardless of instance request."""
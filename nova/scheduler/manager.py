@@ -76,15 +76,34 @@ class SchedulerManager(manager.Manager):
         super(SchedulerManager, self).__init__(service_name='scheduler',
                                                *args, **kwargs)
 
+    def reset(self):
+        # The filter worker processes are started again with the new
+        # configuration by the next request using them
+        self.driver.host_manager.stop_filter_workers()
+
+    def cleanup_host(self):
+        self.driver.host_manager.stop_filter_workers()
+
     @periodic_task.periodic_task
     def _expire_reservations(self, context):
         QUOTAS.expire(context)
 
+    @periodic_task.periodic_task(spacing=CONF.quota_reconcile_interval)
+    def _reconcile_quota_usages(self, context):
+        if CONF.quota_optimistic_reservations:
+            QUOTAS.reconcile(context)
+
     @periodic_task.periodic_task(spacing=CONF.scheduler_driver_task_period,
                                  run_immediately=True)
     def _run_periodic_tasks(self, context):
         self.driver.run_periodic_tasks(context)
 
+    @periodic_task.periodic_task(spacing=CONF.scheduler_stats_interval)
+    def _dump_scheduler_stats(self, context):
+        stats = self.driver.host_manager.stats
+        if CONF.scheduler_stats_interval and stats is not None:
+            stats.dump()
+
     @messaging.expected_exceptions(exception.NoValidHost)
     def select_destinations(self, ctxt,
                             request_spec=None, filter_properties=None,
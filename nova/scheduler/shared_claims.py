@@ -0,0 +1,206 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Resource claims shared by the scheduler workers of a node through a file.
+"""
+
+import datetime
+import itertools
+import os
+
+import iso8601
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from nova.i18n import _LW
+from nova import utils
+
+LOG = logging.getLogger(__name__)
+
+# NOTE: Claims older than this number of seconds are assumed to be reflected
+# in the resources reported by the compute nodes, and are dropped when the
+# file is compacted.
+CLAIM_MAX_AGE = 300
+
+
+def _parse_time(timestr):
+    return timeutils.normalize_time(timeutils.parse_isotime(timestr))
+
+
+class SharedClaims(object):
+    """Claims of the hosts selected by all the workers sharing a file.
+
+    Each worker appends a line to the file for each host it selects, and
+    applies the lines appended by the other workers to its own cached
+    HostStates before scheduling a request, so that the workers don't keep
+    selecting hosts whose resources were consumed by their peers until the
+    next refresh of their cache.
+
+    Each claim is identified by the pid of the worker which published it and
+    a sequence number, and records the time it was published so that the
+    claims already reflected in the HostStates when they are refreshed are
+    skipped. Only the RAM, disk, vCPU, instance and I/O operation counts are
+    shared, the NUMA and PCI usage are not.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock_path = os.path.dirname(os.path.abspath(path))
+        self._lock_name = 'scheduler-claims-%s' % os.path.basename(path)
+        self._seq = itertools.count()
+        # Position in the file of the next claim to read and inode of the
+        # file, which changes when it is compacted
+        self._offset = 0
+        self._inode = None
+        # IDs of the claims already applied to the cached HostStates
+        self._applied = set()
+        # Time up to which the claims are reflected in each HostState,
+        # keyed by host and node
+        self._cutoffs = {}
+
+    def _locked(self, function, *args):
+        @utils.synchronized(self._lock_name, external=True,
+                            lock_path=self._lock_path)
+        def _locked_function():
+            return function(*args)
+        return _locked_function()
+
+    def publish(self, spec_obj, dests, claim_time):
+        """Append the claims of the hosts selected for a request.
+
+        The claim_time must be the time the request started to be scheduled,
+        before the resources were consumed from the selected HostStates.
+        """
+        claim_time = claim_time.isoformat()
+        claims = []
+        for dest in dests:
+            claim_id = '%d-%d' % (os.getpid(), next(self._seq))
+            self._applied.add(claim_id)
+            claims.append({
+                'id': claim_id,
+                'time': claim_time,
+                'host': dest['host'],
+                'node': dest['nodename'],
+                'ram_mb': spec_obj.memory_mb,
+                'disk_mb': (spec_obj.root_gb + spec_obj.ephemeral_gb) * 1024,
+                'vcpus': spec_obj.vcpus,
+            })
+        data = ''.join(jsonutils.dumps(claim) + '\n' for claim in claims)
+        try:
+            self._locked(self._append, data)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW("Unable to publish the scheduler claims to "
+                            "%(path)s: %(error)s"),
+                        {'path': self.path, 'error': e})
+
+    def _append(self, data):
+        with open(self.path, 'a') as f:
+            f.write(data)
+
+    def _read_new_claims(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # The file was compacted, the claims already applied are skipped
+            # using their IDs
+            self._inode = stat.st_ino
+            self._offset = 0
+        if stat.st_size == self._offset:
+            return []
+        with open(self.path) as f:
+            f.seek(self._offset)
+            lines = f.readlines()
+        claims = []
+        for line in lines:
+            if not line.endswith('\n'):
+                # Still being written, read it next time
+                break
+            self._offset += len(line)
+            claims.append(jsonutils.loads(line))
+        return claims
+
+    def apply(self, host_states):
+        """Consume the resources of the claims published by the other
+        workers since the last call from the given HostStates.
+        """
+        host_state_map = None
+        for claim in self._read_new_claims():
+            if claim['id'] in self._applied:
+                continue
+            self._applied.add(claim['id'])
+            if host_state_map is None:
+                host_state_map = {(state.host, state.nodename): state
+                                  for state in host_states}
+            key = (claim['host'], claim['node'])
+            host_state = host_state_map.get(key)
+            if host_state is None:
+                continue
+            claim_time = _parse_time(claim['time'])
+            cutoff = self._cutoffs.get(key)
+            if cutoff is not None and claim_time <= cutoff:
+                continue
+            LOG.debug("Applying claim %(claim)s published by another "
+                      "scheduler worker", {'claim': claim})
+            host_state.free_ram_mb -= claim['ram_mb']
+            host_state.free_disk_mb -= claim['disk_mb']
+            host_state.vcpus_used += claim['vcpus']
+            host_state.num_instances += 1
+            host_state.num_io_ops += 1
+            # NOTE: Like for the resources consumed by the worker itself, the
+            # HostState is now more recent than the compute node
+            if (host_state.updated is None or
+                    timeutils.normalize_time(host_state.updated) <
+                    claim_time):
+                host_state.updated = claim_time.replace(
+                    tzinfo=iso8601.iso8601.Utc())
+            host_state.increment_generation()
+
+    def reset(self, host_states):
+        """Apply again all the claims which are not reflected in the given
+        refreshed HostStates.
+        """
+        self._offset = 0
+        self._inode = None
+        self._applied = set()
+        self._cutoffs = {(state.host, state.nodename):
+                             timeutils.normalize_time(state.updated)
+                         for state in host_states if state.updated}
+        self.apply(host_states)
+
+    def compact(self):
+        """Drop the claims older than CLAIM_MAX_AGE from the file."""
+        try:
+            self._locked(self._compact)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW("Unable to compact the scheduler claims file "
+                            "%(path)s: %(error)s"),
+                        {'path': self.path, 'error': e})
+
+    def _compact(self):
+        if not os.path.exists(self.path):
+            return
+        limit = timeutils.utcnow() - datetime.timedelta(seconds=CLAIM_MAX_AGE)
+        with open(self.path) as f:
+            lines = [line for line in f.readlines()
+                     if line.endswith('\n') and
+                     _parse_time(jsonutils.loads(line)['time']) >= limit]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(lines)
+        os.rename(tmp_path, self.path)
@@ -0,0 +1,141 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Timing statistics of the scheduler filters, weighers and host states loading.
+"""
+
+import socket
+
+from oslo_log import log as logging
+
+from nova.i18n import _LI
+
+LOG = logging.getLogger(__name__)
+
+
+class StatsdEmitter(object):
+    """Send metrics to a statsd compatible daemon over UDP.
+
+    Sending the metrics is best effort, the errors are only logged at the
+    debug level so that they never slow down or break the scheduling.
+    """
+
+    def __init__(self, address, prefix):
+        host, _sep, port = address.rpartition(':')
+        self.address = (host.strip('[]'), int(port))
+        self.prefix = prefix
+        self._socket = None
+
+    def _send(self, name, value, metric_type):
+        data = '%s.%s:%s|%s' % (self.prefix, name, value, metric_type)
+        try:
+            if self._socket is None:
+                family = socket.getaddrinfo(self.address[0], None)[0][0]
+                self._socket = socket.socket(family, socket.SOCK_DGRAM)
+            self._socket.sendto(data.encode('utf-8'), self.address)
+        except (socket.error, socket.gaierror) as e:
+            LOG.debug("Unable to send the metric %(data)s to %(address)s: "
+                      "%(error)s",
+                      {'data': data, 'address': self.address, 'error': e})
+
+    def timing(self, name, elapsed):
+        """Send a time, given in seconds."""
+        self._send(name, '%.3f' % (elapsed * 1000), 'ms')
+
+    def incr(self, name, count=1):
+        self._send(name, count, 'c')
+
+
+class SchedulerStats(object):
+    """Counters and times of the filters and weighers run by the scheduler,
+    and of the phases of the scheduling like loading the host states.
+
+    The statistics are accumulated until get_stats() is called with reset, and
+    are also sent to the emitter, if any, for each request.
+    """
+
+    def __init__(self, emitter=None):
+        self.emitter = emitter
+        self._stats = {'filter': {}, 'weigher': {}, 'phase': {}}
+
+    def _record(self, kind, name, elapsed, hosts=None, removed=None):
+        stats = self._stats[kind].get(name)
+        if stats is None:
+            stats = {'calls': 0, 'time': 0.0, 'max_time': 0.0}
+            if hosts is not None:
+                stats['hosts'] = 0
+            if removed is not None:
+                stats['removed'] = 0
+            self._stats[kind][name] = stats
+        stats['calls'] += 1
+        stats['time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        if hosts is not None:
+            stats['hosts'] += hosts
+        if removed is not None:
+            stats['removed'] += removed
+        if self.emitter is not None:
+            self.emitter.timing('%s.%s.time' % (kind, name), elapsed)
+            if removed is not None:
+                self.emitter.incr('%s.%s.removed' % (kind, name), removed)
+
+    def record_filter(self, name, elapsed, start_count, end_count):
+        """Record a filter run on start_count hosts and which let end_count
+        of them pass.
+        """
+        self._record('filter', name, elapsed, hosts=start_count,
+                     removed=start_count - end_count)
+
+    def record_weigher(self, name, elapsed, count):
+        """Record a weigher run on count hosts."""
+        self._record('weigher', name, elapsed, hosts=count)
+
+    def record_phase(self, name, elapsed):
+        """Record the time taken by a phase of the scheduling, like loading
+        the host states.
+        """
+        self._record('phase', name, elapsed)
+
+    def get_stats(self, reset=False):
+        """Return the statistics keyed by kind (filter, weigher or phase) and
+        by name.
+        """
+        stats = self._stats
+        if reset:
+            self._stats = {'filter': {}, 'weigher': {}, 'phase': {}}
+        else:
+            stats = {kind: {name: dict(values)
+                            for name, values in kind_stats.items()}
+                     for kind, kind_stats in stats.items()}
+        return stats
+
+    def dump(self):
+        """Log the statistics collected since the last dump and reset them."""
+        stats = self.get_stats(reset=True)
+        for kind in ('phase', 'filter', 'weigher'):
+            for name, values in sorted(stats[kind].items(),
+                                       key=lambda item: -item[1]['time']):
+                values = dict(values, kind=kind, name=name,
+                              average=values['time'] / values['calls'])
+                if 'removed' in values:
+                    LOG.info(_LI("Scheduler %(kind)s %(name)s: %(calls)d "
+                                 "calls, %(time).3fs total, %(average).3fs "
+                                 "average, %(max_time).3fs max, removed "
+                                 "%(removed)d of %(hosts)d hosts"), values)
+                else:
+                    LOG.info(_LI("Scheduler %(kind)s %(name)s: %(calls)d "
+                                 "calls, %(time).3fs total, %(average).3fs "
+                                 "average, %(max_time).3fs max"), values)
@@ -17,8 +17,12 @@
 Scheduler host weights
 """
 
+import nova.conf
+from nova.scheduler import host_arrays
 from nova import weights
 
+CONF = nova.conf.CONF
+
 
 class WeighedHost(weights.WeighedObject):
     def to_dict(self):
@@ -41,6 +45,9 @@ class HostWeightHandler(weights.BaseWeightHandler):
 
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
+        if (CONF.scheduler_use_vectorized_filters and
+                host_arrays.numpy is not None):
+            self.arrays_class = host_arrays.HostStateArrays
 
 
 def all_weighers():
@@ -19,6 +19,7 @@ import oslo_messaging as messaging
 from oslo_utils import timeutils
 import six
 
+from nova import context
 from nova.i18n import _, _LI, _LW, _LE
 from nova.servicegroup import api
 from nova.servicegroup.drivers import base
@@ -86,8 +87,8 @@ class DbDriver(base.Driver):
         """Update the state of this service in the datastore."""
 
         try:
-            service.service_ref.report_count += 1
-            service.service_ref.save()
+            service.conductor_api.report_service_state(
+                context.get_admin_context(), service.service_ref)
 
             # TODO(termie): make this pattern be more elegant.
             if getattr(service, 'model_disconnected', False):
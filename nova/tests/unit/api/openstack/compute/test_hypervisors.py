@@ -125,7 +125,7 @@ def fake_service_get_by_compute_host(context, host):
             return service
 
 
-def fake_compute_node_statistics(context):
+def fake_compute_node_statistics(context, use_slave=False):
     result = dict(
         count=0,
         vcpus=0,
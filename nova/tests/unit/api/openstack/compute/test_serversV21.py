@@ -702,7 +702,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             db_list = [fakes.stub_instance(100, uuid=server_uuid)]
             return instance_obj._make_instance_list(
                 context, objects.InstanceList(), db_list, FIELDS)
@@ -720,7 +721,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('image', search_opts)
             self.assertEqual(search_opts['image'], '12345')
@@ -863,7 +865,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('flavor', search_opts)
             # flavor is an integer ID
@@ -900,7 +903,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], [vm_states.ACTIVE])
@@ -921,7 +925,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('task_state', search_opts)
             self.assertEqual([task_states.REBOOT_PENDING,
@@ -946,7 +951,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'],
                              [vm_states.ACTIVE, vm_states.STOPPED])
@@ -980,7 +986,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], ['deleted'])
 
@@ -1017,9 +1024,10 @@ class ServersControllerTest(ControllerTest):
         expected_search_opts = {'deleted': True, 'project_id': 'fake'}
         mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
-            expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices'],
+            expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices',
+                            'security_groups'],
             marker=mock.ANY, want_objects=mock.ANY,
-            sort_keys=mock.ANY, sort_dirs=mock.ANY)
+            sort_keys=mock.ANY, sort_dirs=mock.ANY, only_expected_attrs=True)
 
     @mock.patch.object(compute_api.API, 'get_all')
     def test_get_servers_deleted_filter_invalid_str(self, mock_get_all):
@@ -1041,20 +1049,22 @@ class ServersControllerTest(ControllerTest):
         expected_search_opts = {'deleted': False, 'project_id': 'fake'}
         mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
-            expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices'],
+            expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices',
+                            'security_groups'],
             marker=mock.ANY, want_objects=mock.ANY,
-            sort_keys=mock.ANY, sort_dirs=mock.ANY)
+            sort_keys=mock.ANY, sort_dirs=mock.ANY, only_expected_attrs=True)
 
     def test_get_servers_allows_name(self):
         server_uuid = str(uuid.uuid4())
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('name', search_opts)
             self.assertEqual(search_opts['name'], 'whee.*')
-            self.assertEqual(['pci_devices'], expected_attrs)
+            self.assertEqual([], expected_attrs)
             return objects.InstanceList(
                 objects=[fakes.stub_instance_obj(100, uuid=server_uuid)])
 
@@ -1080,7 +1090,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('changes-since', search_opts)
             changes_since = datetime.datetime(2011, 1, 24, 17, 8, 1,
@@ -1113,7 +1124,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1143,7 +1155,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1172,7 +1185,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip', search_opts)
             self.assertEqual(search_opts['ip'], '10\..*')
@@ -1195,7 +1209,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1219,7 +1234,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1298,12 +1314,31 @@ class ServersControllerTest(ControllerTest):
             self.assertEqual(s['hostId'], host_ids[i % 2])
             self.assertEqual(s['name'], 'server%d' % (i + 1))
 
-    def test_get_servers_joins_pci_devices(self):
+    def test_get_servers_detail_joins_rendered_columns(self):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          limit=None, marker=None, want_objects=False,
-                         expected_attrs=None, sort_keys=None, sort_dirs=None):
-            self.assertEqual(['pci_devices'], expected_attrs)
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
+            self.assertEqual(['flavor', 'info_cache', 'metadata',
+                              'pci_devices'], expected_attrs)
+            self.assertTrue(only_expected_attrs)
+            return objects.InstanceList(objects=[])
+
+        self.flags(use_neutron=True)
+        self.stubs.Set(compute_api.API, 'get_all', fake_get_all)
+
+        req = self.req('/fake/servers/detail', use_admin_context=True)
+        self.assertIn('servers', self.controller.detail(req))
+
+    def test_get_servers_joins_nothing(self):
+
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None, sort_keys=None, sort_dirs=None,
+                         only_expected_attrs=False):
+            self.assertEqual([], expected_attrs)
+            self.assertTrue(only_expected_attrs)
             return []
 
         self.stubs.Set(compute_api.API, 'get_all', fake_get_all)
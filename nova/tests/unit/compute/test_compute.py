@@ -5749,11 +5749,12 @@ class ComputeTestCase(BaseTestCase):
                               'clear_events_for_instance'),
             mock.patch.object(self.compute, 'update_available_resource'),
             mock.patch.object(migration_obj, 'save'),
+            mock.patch.object(self.compute, '_get_resource_tracker'),
         ) as (
             post_live_migration, unfilter_instance,
             migrate_instance_start, post_live_migration_at_destination,
             post_live_migration_at_source, setup_networks_on_host,
-            clear_events, update_available_resource, mig_save
+            clear_events, update_available_resource, mig_save, get_rt
         ):
             self.compute._post_live_migration(c, instance, dest,
                                               migrate_data=migrate_data)
@@ -5773,6 +5774,9 @@ class ComputeTestCase(BaseTestCase):
             post_live_migration_at_source.assert_has_calls(
                 [mock.call(c, instance, [])])
             clear_events.assert_called_once_with(instance)
+            get_rt.assert_called_once_with(instance.node)
+            get_rt.return_value.release_instance_usage.assert_called_once_with(
+                c, instance)
             update_available_resource.assert_has_calls([mock.call(c)])
             self.assertEqual('completed', migration_obj.status)
             mig_save.assert_called_once_with()
@@ -6140,8 +6144,9 @@ class ComputeTestCase(BaseTestCase):
         self.compute._get_instances_on_driver(
             admin_context, {'deleted': True,
                             'soft_deleted': False,
-                            'host': self.compute.host}).AndReturn([instance1,
-                                                                   instance2])
+                            'host': self.compute.host},
+            columns=['host', 'deleted', 'deleted_at']).AndReturn(
+                [instance1, instance2])
         self.flags(running_deleted_instance_timeout=3600,
                    running_deleted_instance_action=action)
 
@@ -6237,7 +6242,8 @@ class ComputeTestCase(BaseTestCase):
         self.compute._get_instances_on_driver(
             admin_context, {'deleted': True,
                             'soft_deleted': False,
-                            'host': self.compute.host}).AndReturn([instance])
+                            'host': self.compute.host},
+            columns=['host', 'deleted', 'deleted_at']).AndReturn([instance])
 
         self.mox.StubOutWithMock(timeutils, 'is_older_than')
         timeutils.is_older_than(now,
@@ -7023,9 +7029,11 @@ class ComputeTestCase(BaseTestCase):
         self._create_fake_instance_obj({'host': self.compute.host})
         self._create_fake_instance_obj({'host': self.compute.host})
         self._create_fake_instance_obj({'host': self.compute.host})
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
         self.mox.StubOutWithMock(self.compute.driver, 'get_info')
         self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
 
+        self.compute.driver.get_power_states().AndRaise(NotImplementedError())
         # Check to make sure task continues on error.
         self.compute.driver.get_info(mox.IgnoreArg()).AndRaise(
             exception.InstanceNotFound(instance_id=uuids.instance))
@@ -10358,13 +10366,34 @@ class ComputeAPIIpFilterTestCase(test.NoDBTestCase):
 
     def test_ip_filtering_no_limit_to_db(self):
         c = context.get_admin_context()
-        # Limit is not supplied to the DB when using an IP filter
+        # Limit is not supplied to the DB when using an IP filter without
+        # a limit
         with mock.patch('nova.objects.InstanceList.get_by_filters') as m_get:
-            self.compute_api.get_all(c, search_opts={'ip': '.10'}, limit=1)
+            self.compute_api.get_all(c, search_opts={'ip': '.10'})
             self.assertEqual(1, m_get.call_count)
             kwargs = m_get.call_args[1]
             self.assertIsNone(kwargs['limit'])
 
+    @mock.patch.object(compute_api, 'IP_FILTER_PAGE_SIZE', 1)
+    def test_ip_filtering_pages_db(self):
+        c = context.get_admin_context()
+        instances = self._get_ip_filtering_instances()
+        for i, instance in enumerate(instances):
+            instance.uuid = getattr(uuids, 'instance%d' % i)
+        pages = [objects.InstanceList(objects=[instance])
+                 for instance in instances]
+        # The instances are fetched from the DB one page at a time until
+        # enough of them pass the IP filter
+        with mock.patch('nova.objects.InstanceList.get_by_filters',
+                        side_effect=pages) as m_get:
+            insts = self.compute_api.get_all(c, search_opts={'ip': '.*20'},
+                                             limit=1, want_objects=True)
+        self.assertEqual([2], [inst.id for inst in insts])
+        self.assertEqual(2, m_get.call_count)
+        self.assertEqual([(1, None), (1, uuids.instance0)],
+                         [(call[1]['limit'], call[1]['marker'])
+                          for call in m_get.call_args_list])
+
     def test_ip_filtering_pass_limit_to_db(self):
         c = context.get_admin_context()
         # No IP filter, verify that the limit is passed
@@ -10374,6 +10403,27 @@ class ComputeAPIIpFilterTestCase(test.NoDBTestCase):
             kwargs = m_get.call_args[1]
             self.assertEqual(1, kwargs['limit'])
 
+    def test_get_all_expected_attrs(self):
+        c = context.get_admin_context()
+        with mock.patch('nova.objects.InstanceList.get_by_filters') as m_get:
+            self.compute_api.get_all(c)
+            self.compute_api.get_all(c, expected_attrs=['flavor'])
+            self.compute_api.get_all(c, expected_attrs=[],
+                                     only_expected_attrs=True)
+            self.compute_api.get_all(c, search_opts={'ip': '.10'},
+                                     expected_attrs=['flavor'],
+                                     only_expected_attrs=True)
+        # The default attributes are loaded unless the caller opts in to
+        # only load the ones it needs
+        default_attrs = ['metadata', 'system_metadata', 'info_cache',
+                         'security_groups']
+        self.assertEqual([default_attrs,
+                          default_attrs + ['flavor'],
+                          [],
+                          ['flavor', 'info_cache']],
+                         [call[1]['expected_attrs']
+                          for call in m_get.call_args_list])
+
 
 def fake_rpc_method(context, method, **kwargs):
     pass
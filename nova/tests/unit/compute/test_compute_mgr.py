@@ -33,6 +33,7 @@ import nova
 from nova.compute import build_results
 from nova.compute import manager
 from nova.compute import power_state
+from nova.compute import power_state_tracker
 from nova.compute import task_states
 from nova.compute import utils as compute_utils
 from nova.compute import vm_states
@@ -119,6 +120,58 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             event_pwr_state=power_state.SHUTDOWN,
             current_pwr_state=power_state.RUNNING)
 
+    @mock.patch.object(manager.ComputeManager, '_get_power_state')
+    @mock.patch.object(manager.ComputeManager, '_sync_instance_power_state')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_handle_lifecycle_event_tracks_power_state(self, mock_get,
+                                                       mock_sync,
+                                                       mock_get_power_state):
+        self.compute._power_state_tracker = (
+            power_state_tracker.PowerStateTracker())
+        mock_get.return_value = objects.Instance(uuid=uuids.instance)
+        mock_get_power_state.return_value = power_state.RUNNING
+        event = virtevent.LifecycleEvent(uuids.instance,
+                                         virtevent.EVENT_LIFECYCLE_STOPPED)
+
+        self.compute.handle_lifecycle_event(event)
+
+        # The power state queried from the hypervisor is tracked, the event
+        # may be outdated
+        self.assertEqual(
+            {uuids.instance: power_state.RUNNING},
+            self.compute._power_state_tracker.get_power_states())
+        self.assertFalse(mock_sync.called)
+
+    @mock.patch.object(manager.ComputeManager, '_get_power_state')
+    @mock.patch.object(manager.ComputeManager, '_sync_instance_power_state')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_handle_lifecycle_event_tracks_power_state_outdated(
+            self, mock_get, mock_sync, mock_get_power_state):
+        tracker = power_state_tracker.PowerStateTracker()
+        self.compute._power_state_tracker = tracker
+        mock_get.return_value = objects.Instance(uuid=uuids.instance)
+
+        def _get_power_state(context, instance):
+            # Event handled while the power state is queried
+            tracker.update(uuids.instance, power_state.SHUTDOWN)
+            return power_state.RUNNING
+
+        mock_get_power_state.side_effect = _get_power_state
+        event = virtevent.LifecycleEvent(uuids.instance,
+                                         virtevent.EVENT_LIFECYCLE_STOPPED)
+
+        self.compute.handle_lifecycle_event(event)
+
+        # The power state queried later is kept
+        self.assertEqual({uuids.instance: power_state.SHUTDOWN},
+                         tracker.get_power_states())
+
+    def test_handle_events_lost(self):
+        self.compute._power_state_tracker = mock.Mock(
+            spec=power_state_tracker.PowerStateTracker)
+        self.compute.handle_events(virtevent.EventsLostEvent())
+        self.compute._power_state_tracker.events_lost.assert_called_once_with()
+
     def test_delete_instance_info_cache_delete_ordering(self):
         call_tracker = mock.Mock()
         call_tracker.clear_events_for_instance.return_value = None
@@ -486,6 +539,18 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                 mock.call(self.compute.handle_events), mock.call(None)])
             mock_driver.cleanup_host.assert_called_once_with(host='fake-mini')
 
+    def test_init_virt_events_track_power_states(self):
+        with mock.patch.object(self.compute.driver,
+                               'register_event_listener') as mock_register:
+            self.compute.init_virt_events()
+            self.assertIsNone(self.compute._power_state_tracker)
+
+            self.flags(track_power_states_from_events=True)
+            self.compute.init_virt_events()
+            self.assertIsInstance(self.compute._power_state_tracker,
+                                  power_state_tracker.PowerStateTracker)
+        mock_register.assert_called_with(self.compute.handle_events)
+
     def test_init_virt_events_disabled(self):
         self.flags(handle_virt_lifecycle_events=False, group='workarounds')
         with mock.patch.object(self.compute.driver,
@@ -1374,10 +1439,106 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                'spawn_n') as mock_spawn:
             self.compute._sync_power_states(mock.sentinel.context)
             mock_get.assert_called_with(mock.sentinel.context,
-                                        self.compute.host, expected_attrs=[],
-                                        use_slave=True)
+                                        self.compute.host, use_slave=True,
+                                        columns=['host', 'node', 'vm_state',
+                                                 'power_state', 'task_state'])
             mock_spawn.assert_called_once_with(mock.ANY, instance)
 
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk(self, mock_get):
+        instances = [
+            objects.Instance(uuid=uuids.synced, vm_state=vm_states.ACTIVE,
+                             power_state=power_state.RUNNING),
+            objects.Instance(uuid=uuids.stopped, vm_state=vm_states.ACTIVE,
+                             power_state=power_state.RUNNING),
+            objects.Instance(uuid=uuids.missing, vm_state=vm_states.ACTIVE,
+                             power_state=power_state.RUNNING)]
+        mock_get.return_value = instances
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value={
+                                  uuids.synced: power_state.RUNNING,
+                                  uuids.stopped: power_state.SHUTDOWN}),
+            mock.patch.object(self.compute.driver, 'get_num_instances'),
+            mock.patch.object(self.compute.driver, 'get_info'),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_states, mock_num, mock_info, mock_spawn):
+            self.compute._sync_power_states(mock.sentinel.context)
+            mock_states.assert_called_once_with()
+            self.assertFalse(mock_num.called)
+            self.assertFalse(mock_info.called)
+            # Only the instances whose power state differs are synchronized
+            self.assertEqual([mock.call(mock.ANY, instances[1]),
+                              mock.call(mock.ANY, instances[2])],
+                             mock_spawn.call_args_list)
+
+    def test_get_vm_power_states_tracked(self):
+        tracker = power_state_tracker.PowerStateTracker()
+        self.compute._power_state_tracker = tracker
+        with mock.patch.object(self.compute.driver, 'get_power_states',
+                               return_value={
+                                   uuids.running: power_state.RUNNING,
+                                   uuids.stopped: power_state.SHUTDOWN}
+                               ) as mock_states:
+            # The first sync queries the hypervisor
+            self.assertEqual({uuids.running: power_state.RUNNING,
+                              uuids.stopped: power_state.SHUTDOWN},
+                             self.compute._get_vm_power_states())
+            self.assertEqual(1, mock_states.call_count)
+
+            # The next ones use the power states tracked from the events
+            tracker.update(uuids.stopped, power_state.RUNNING)
+            self.assertEqual({uuids.running: power_state.RUNNING,
+                              uuids.stopped: power_state.RUNNING},
+                             self.compute._get_vm_power_states())
+            self.assertEqual(1, mock_states.call_count)
+
+            # Until events are lost
+            tracker.events_lost()
+            self.assertEqual({uuids.running: power_state.RUNNING,
+                              uuids.stopped: power_state.SHUTDOWN},
+                             self.compute._get_vm_power_states())
+            self.assertEqual(2, mock_states.call_count)
+
+    def test_get_vm_power_states_tracked_not_implemented(self):
+        self.compute._power_state_tracker = (
+            power_state_tracker.PowerStateTracker())
+        with mock.patch.object(self.compute.driver, 'get_power_states',
+                               side_effect=NotImplementedError):
+            self.assertIsNone(self.compute._get_vm_power_states())
+        self.assertIsNone(self.compute._power_state_tracker)
+
+    def test_power_state_needs_sync(self):
+        def _needs_sync(vm_state, db_power_state, vm_power_state):
+            instance = objects.Instance(vm_state=vm_state,
+                                        power_state=db_power_state)
+            return self.compute._power_state_needs_sync(instance,
+                                                        vm_power_state)
+
+        self.assertTrue(_needs_sync(vm_states.ACTIVE, power_state.RUNNING,
+                                    power_state.SHUTDOWN))
+        self.assertFalse(_needs_sync(vm_states.ACTIVE, power_state.RUNNING,
+                                     power_state.RUNNING))
+        # The vm_state is still inconsistent, e.g. the stop call failed
+        self.assertTrue(_needs_sync(vm_states.ACTIVE, power_state.SHUTDOWN,
+                                    power_state.SHUTDOWN))
+        self.assertFalse(_needs_sync(vm_states.STOPPED, power_state.SHUTDOWN,
+                                     power_state.SHUTDOWN))
+        self.assertTrue(_needs_sync(vm_states.STOPPED, power_state.RUNNING,
+                                    power_state.RUNNING))
+        self.assertFalse(_needs_sync(vm_states.PAUSED, power_state.PAUSED,
+                                     power_state.PAUSED))
+        self.assertTrue(_needs_sync(vm_states.PAUSED, power_state.CRASHED,
+                                    power_state.CRASHED))
+        self.assertFalse(_needs_sync(vm_states.SOFT_DELETED,
+                                     power_state.SHUTDOWN,
+                                     power_state.SHUTDOWN))
+        self.assertTrue(_needs_sync(vm_states.SOFT_DELETED,
+                                    power_state.RUNNING,
+                                    power_state.RUNNING))
+        self.assertFalse(_needs_sync(vm_states.ERROR, power_state.RUNNING,
+                                     power_state.RUNNING))
+
     def _get_sync_instance(self, power_state, vm_state, task_state=None,
                            shutdown_terminate=False):
         instance = objects.Instance()
@@ -1487,6 +1648,25 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                           power_state.NOSTATE,
                                                           use_slave=True)
 
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_sync_instance_power_state')
+    def test_query_driver_power_state_and_sync_tracked(
+            self, mock_sync_power_state):
+        tracker = power_state_tracker.PowerStateTracker()
+        tracker.resync(tracker.begin_query(),
+                       {uuids.db_instance: power_state.RUNNING})
+        self.compute._power_state_tracker = tracker
+        with mock.patch.object(self.compute.driver, 'get_info',
+                               return_value=hardware.InstanceInfo(
+                                   state=power_state.SHUTDOWN)):
+            db_instance = objects.Instance(uuid=uuids.db_instance,
+                                           task_state=None)
+            self.compute._query_driver_power_state_and_sync(self.context,
+                                                            db_instance)
+        # The power state queried again is tracked
+        self.assertEqual({uuids.db_instance: power_state.SHUTDOWN},
+                         tracker.get_power_states())
+
     def test_run_pending_deletes(self):
         self.flags(instance_delete_interval=10)
 
@@ -2938,8 +3118,7 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         mock_elevated.return_value = fake_elevated
         self.compute._sync_scheduler_instance_info(self.context)
         mock_get_by_host.assert_called_once_with(
-                fake_elevated, self.compute.host, expected_attrs=[],
-                use_slave=True)
+                fake_elevated, self.compute.host, use_slave=True, columns=[])
         mock_sync.assert_called_once_with(fake_elevated, self.compute.host,
                                           exp_uuids)
 
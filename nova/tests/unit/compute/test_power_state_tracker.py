@@ -0,0 +1,112 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the tracking of the power states from the lifecycle events."""
+
+import mock
+
+from nova.compute import power_state
+from nova.compute import power_state_tracker
+from nova import test
+from nova.tests import uuidsentinel as uuids
+
+
+class PowerStateTrackerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(PowerStateTrackerTestCase, self).setUp()
+        self.tracker = power_state_tracker.PowerStateTracker()
+
+    def test_resync(self):
+        self.assertTrue(self.tracker.needs_resync())
+
+        seq = self.tracker.begin_query()
+        self.tracker.resync(seq, {uuids.running: power_state.RUNNING,
+                                  uuids.paused: power_state.PAUSED})
+
+        self.assertFalse(self.tracker.needs_resync())
+        self.assertEqual({uuids.running: power_state.RUNNING,
+                          uuids.paused: power_state.PAUSED},
+                         self.tracker.get_power_states())
+
+    def test_update(self):
+        seq = self.tracker.begin_query()
+        self.tracker.resync(seq, {uuids.running: power_state.RUNNING,
+                                  uuids.deleted: power_state.RUNNING})
+
+        self.tracker.update(uuids.running, power_state.SHUTDOWN)
+        self.tracker.update(uuids.deleted, power_state.NOSTATE)
+        self.tracker.update(uuids.spawned, power_state.RUNNING)
+
+        self.assertEqual({uuids.running: power_state.SHUTDOWN,
+                          uuids.spawned: power_state.RUNNING},
+                         self.tracker.get_power_states())
+
+    def test_resync_keeps_later_events(self):
+        self.tracker.update(uuids.paused, power_state.RUNNING)
+        self.tracker.update(uuids.deleted, power_state.RUNNING)
+        seq = self.tracker.begin_query()
+        # Events received while the hypervisor is queried
+        self.tracker.update(uuids.paused, power_state.PAUSED)
+        self.tracker.update(uuids.deleted, power_state.NOSTATE)
+        self.tracker.resync(seq, {uuids.paused: power_state.RUNNING,
+                                  uuids.deleted: power_state.RUNNING,
+                                  uuids.running: power_state.RUNNING})
+
+        self.assertEqual({uuids.paused: power_state.PAUSED,
+                          uuids.running: power_state.RUNNING},
+                         self.tracker.get_power_states())
+
+    def test_update_outdated(self):
+        self.tracker.resync(self.tracker.begin_query(),
+                            {uuids.running: power_state.RUNNING})
+        seq = self.tracker.begin_query()
+        # Event received while the power state is queried
+        self.tracker.update(uuids.running, power_state.SHUTDOWN)
+        self.tracker.update(uuids.running, power_state.RUNNING, seq)
+        self.assertEqual({uuids.running: power_state.SHUTDOWN},
+                         self.tracker.get_power_states())
+
+    def test_update_before_resync(self):
+        seq = self.tracker.begin_query()
+        self.tracker.resync(self.tracker.begin_query(), {})
+        # The guest queried before the resync is gone
+        self.tracker.update(uuids.deleted, power_state.RUNNING, seq)
+        self.assertEqual({}, self.tracker.get_power_states())
+
+    def test_events_lost(self):
+        seq = self.tracker.begin_query()
+        self.tracker.resync(seq, {})
+        self.tracker.events_lost()
+        self.assertTrue(self.tracker.needs_resync())
+
+        self.tracker.resync(self.tracker.begin_query(), {})
+        self.assertFalse(self.tracker.needs_resync())
+
+    def test_events_lost_during_resync(self):
+        seq = self.tracker.begin_query()
+        self.tracker.events_lost()
+        self.tracker.resync(seq, {})
+        self.assertTrue(self.tracker.needs_resync())
+
+    @mock.patch('time.time')
+    def test_needs_resync_max_age(self, mock_time):
+        mock_time.return_value = 1000
+        self.tracker.resync(self.tracker.begin_query(), {})
+
+        mock_time.return_value = 1599
+        self.assertFalse(self.tracker.needs_resync(600))
+        self.assertFalse(self.tracker.needs_resync(0))
+
+        mock_time.return_value = 1600
+        self.assertTrue(self.tracker.needs_resync(600))
+        self.assertFalse(self.tracker.needs_resync(0))
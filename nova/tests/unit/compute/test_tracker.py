@@ -486,7 +486,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -531,7 +531,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -583,7 +583,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 1  # One active instance
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -655,7 +655,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             # as running VMs...
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -725,7 +725,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -792,7 +792,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -856,7 +856,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -931,11 +931,130 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 2
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, batched=True)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
 
+class TestResourceAudit(BaseTestCase):
+
+    def setUp(self):
+        super(TestResourceAudit, self).setUp()
+        self.flags(reserved_host_disk_mb=0,
+                   reserved_host_memory_mb=0,
+                   resource_audit_interval=3600)
+        self._setup_rt()
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_update_between_audits(self, get_mock, migr_mock, get_cn_mock):
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+
+        with mock.patch.object(self.rt, '_update') as update_mock:
+            self.rt.update_available_resource(mock.sentinel.ctx)
+            self.assertIsNotNone(self.rt.last_audit)
+            self.rt.update_available_resource(mock.sentinel.ctx)
+
+        # Only the first update audits the resources
+        self.driver_mock.get_available_resource.assert_called_once_with(
+            'fake-node')
+        get_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host',
+                                         'fake-node', expected_attrs=mock.ANY)
+        migr_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host',
+                                          'fake-node')
+        self.assertEqual([mock.call(mock.sentinel.ctx, batched=True)] * 2,
+                         update_mock.call_args_list)
+
+    @mock.patch('oslo_utils.timeutils.is_older_than', return_value=True)
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_audit_due(self, get_mock, migr_mock, get_cn_mock,
+                       older_mock):
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+
+        with mock.patch.object(self.rt, '_update'):
+            self.rt.update_available_resource(mock.sentinel.ctx)
+            self.rt.update_available_resource(mock.sentinel.ctx)
+
+        older_mock.assert_called_once_with(mock.ANY, 3600)
+        self.assertEqual(2,
+                         self.driver_mock.get_available_resource.call_count)
+        self.assertEqual(2, get_mock.call_count)
+
+    @mock.patch.object(resource_tracker.LOG, 'info')
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_audit_reports_drift(self, get_mock, migr_mock, get_cn_mock,
+                                 info_mock):
+        get_mock.return_value = _INSTANCE_FIXTURES
+        migr_mock.return_value = []
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt.compute_node.update({'vcpus_used': 3,
+                                     'memory_mb_used': 128,
+                                     'local_gb_used': 1,
+                                     'running_vms': 2})
+
+        with mock.patch.object(self.rt, '_update'):
+            self.rt.update_available_resource(mock.sentinel.ctx)
+
+        drift = [call[0][1]['drift'] for call in info_mock.call_args_list
+                 if 'drift' in call[0][1]]
+        self.assertEqual([{'vcpus_used': -2, 'running_vms': -1}], drift)
+
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid')
+    def test_update_usage_unclaimed_instance(self, pci_mock):
+        pci_mock.return_value = objects.InstancePCIRequests(requests=[])
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        instance = _INSTANCE_FIXTURES[0].obj_clone()
+        instance.host = 'fake-host'
+        instance.node = 'fake-node'
+
+        with mock.patch.object(self.rt, '_update') as update_mock:
+            self.rt.update_usage(mock.MagicMock(), instance)
+            self.assertTrue(update_mock.called)
+        self.assertIn(instance.uuid, self.rt.tracked_instances)
+        self.assertEqual(1, self.rt.compute_node.vcpus_used)
+        self.assertEqual(instance.memory_mb,
+                         self.rt.compute_node.memory_mb_used)
+
+        # Not without the periodic audits
+        self.flags(resource_audit_interval=0)
+        self.rt.tracked_instances.clear()
+        with mock.patch.object(self.rt, '_update') as update_mock:
+            self.rt.update_usage(mock.MagicMock(), instance)
+            self.assertFalse(update_mock.called)
+        self.assertNotIn(instance.uuid, self.rt.tracked_instances)
+
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid')
+    def test_release_instance_usage(self, pci_mock):
+        pci_mock.return_value = objects.InstancePCIRequests(requests=[])
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        instance = _INSTANCE_FIXTURES[0].obj_clone()
+        instance.host = 'fake-host'
+        instance.node = 'fake-node'
+        self.rt.update_usage(mock.MagicMock(), instance)
+
+        # The instance was live migrated away
+        with mock.patch.object(self.rt, '_update') as update_mock:
+            self.rt.release_instance_usage(mock.MagicMock(), instance)
+            self.assertTrue(update_mock.called)
+        self.assertNotIn(instance.uuid, self.rt.tracked_instances)
+        self.assertEqual(0, self.rt.compute_node.vcpus_used)
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+
+        # Nothing to release for the untracked instances
+        with mock.patch.object(self.rt, '_update') as update_mock:
+            self.rt.release_instance_usage(mock.MagicMock(), instance)
+            self.assertFalse(update_mock.called)
+
+
 class TestInitComputeNode(BaseTestCase):
 
     @mock.patch('nova.objects.ComputeNode.create')
@@ -1146,6 +1265,18 @@ class TestUpdateComputeNode(BaseTestCase):
         urs_mock = self.sched_client_mock.update_resource_stats
         urs_mock.assert_called_once_with(self.rt.compute_node)
 
+    def test_batched_update(self):
+        self.flags(batch_heartbeats=True, group='conductor')
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt.compute_node.vcpus_used = 3
+        with mock.patch.object(self.rt.conductor_api,
+                               'update_compute_node') as update_mock:
+            self.rt._update(mock.sentinel.ctx, batched=True)
+        update_mock.assert_called_once_with(mock.sentinel.ctx,
+                                            self.rt.compute_node)
+        self.assertFalse(self.sched_client_mock.update_resource_stats.called)
+
 
 class TestInstanceClaim(BaseTestCase):
 
@@ -192,6 +192,22 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         result = self.conductor.provider_fw_rule_get_all(self.context)
         self.assertEqual([], result)
 
+    @mock.patch.object(db, 'compute_node_update_batch')
+    @mock.patch.object(db, 'service_report_state_batch')
+    def test_flush_heartbeats(self, mock_report, mock_update):
+        compute_node = objects.ComputeNode(id=2, vcpus_used=3)
+        self.conductor.report_service_state(self.context, 1)
+        self.conductor.update_compute_node(self.context, compute_node)
+        self.assertFalse(mock_report.called)
+        self.assertFalse(mock_update.called)
+
+        self.conductor._flush_heartbeats(self.context)
+        mock_report.assert_called_once_with(
+            self.context, {1: {'count': 1, 'last_seen_up': mock.ANY}})
+        mock_update.assert_called_once_with(
+            self.context, {2: {'values': {'vcpus_used': 3},
+                               'reported_at': mock.ANY}})
+
 
 class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor RPC API Tests."""
@@ -243,6 +259,48 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
                                               mock_objinst,
                                               mock.sentinel.obj_versions)
 
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'report_service_state')
+    @mock.patch.object(objects.Service, 'save')
+    def test_report_service_state(self, mock_save, mock_report):
+        service = objects.Service(id=1, report_count=10)
+        self.conductor.report_service_state(self.context, service)
+        self.assertEqual(11, service.report_count)
+        mock_save.assert_called_once_with()
+        self.assertFalse(mock_report.called)
+
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'report_service_state')
+    @mock.patch.object(objects.Service, 'save')
+    def test_report_service_state_batched(self, mock_save, mock_report):
+        self.flags(batch_heartbeats=True, group='conductor')
+        service = objects.Service(id=1, report_count=10)
+        self.conductor.report_service_state(self.context, service)
+        mock_report.assert_called_once_with(self.context, 1)
+        self.assertFalse(mock_save.called)
+
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'update_compute_node')
+    @mock.patch.object(objects.ComputeNode, 'save')
+    def test_update_compute_node_batched(self, mock_save, mock_update):
+        self.flags(batch_heartbeats=True, group='conductor')
+        compute_node = objects.ComputeNode(id=1, vcpus_used=2)
+        self.conductor.update_compute_node(self.context, compute_node)
+        mock_update.assert_called_once_with(self.context, compute_node)
+        self.assertFalse(mock_save.called)
+        # The changes are saved by the next save() too
+        self.assertEqual({'id', 'vcpus_used'},
+                         compute_node.obj_what_changed())
+
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'update_compute_node')
+    @mock.patch.object(objects.ComputeNode, 'save')
+    def test_update_compute_node_batched_old_conductor(self, mock_save,
+                                                       mock_update):
+        self.flags(batch_heartbeats=True, group='conductor')
+        self.flags(conductor='3.0', group='upgrade_levels')
+        self.conductor = conductor_api.API()
+        compute_node = objects.ComputeNode(id=1, vcpus_used=2)
+        self.conductor.update_compute_node(self.context, compute_node)
+        mock_save.assert_called_once_with()
+        self.assertFalse(mock_update.called)
+
 
 class ConductorLocalAPITestCase(ConductorAPITestCase):
     """Conductor LocalAPI Tests."""
@@ -255,6 +313,29 @@ class ConductorLocalAPITestCase(ConductorAPITestCase):
         # Override test in ConductorAPITestCase
         pass
 
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'report_service_state')
+    @mock.patch.object(objects.Service, 'save')
+    def test_report_service_state_batched(self, mock_save, mock_report):
+        # The local conductor writes the state reports right away
+        self.flags(batch_heartbeats=True, group='conductor')
+        service = objects.Service(id=1, report_count=10)
+        self.conductor.report_service_state(self.context, service)
+        mock_save.assert_called_once_with()
+        self.assertFalse(mock_report.called)
+
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'update_compute_node')
+    @mock.patch.object(objects.ComputeNode, 'save')
+    def test_update_compute_node_batched(self, mock_save, mock_update):
+        self.flags(batch_heartbeats=True, group='conductor')
+        compute_node = objects.ComputeNode(id=1, vcpus_used=2)
+        self.conductor.update_compute_node(self.context, compute_node)
+        mock_save.assert_called_once_with()
+        self.assertFalse(mock_update.called)
+
+    def test_update_compute_node_batched_old_conductor(self):
+        # Override test in ConductorAPITestCase
+        pass
+
 
 class ConductorImportTest(test.NoDBTestCase):
     def test_import_conductor_local(self):
@@ -0,0 +1,93 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the batching of the heartbeats by the conductor."""
+
+import datetime
+
+import mock
+from oslo_db import exception as db_exc
+from oslo_utils import fixture as utils_fixture
+from oslo_utils import timeutils
+
+from nova.conductor import heartbeats
+from nova import context
+from nova import db
+from nova import test
+
+
+class HeartbeatBatcherTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HeartbeatBatcherTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.batcher = heartbeats.HeartbeatBatcher()
+        self.now = timeutils.utcnow()
+        self.time_fixture = self.useFixture(
+            utils_fixture.TimeFixture(self.now))
+
+    @mock.patch.object(db, 'compute_node_update_batch')
+    @mock.patch.object(db, 'service_report_state_batch')
+    def test_flush(self, mock_report, mock_update):
+        self.batcher.report_service_state(1)
+        self.batcher.update_compute_node(1, {'vcpus_used': 1,
+                                             'memory_mb_used': 512})
+        self.time_fixture.advance_time_seconds(2)
+        self.batcher.report_service_state(1)
+        self.batcher.report_service_state(2)
+        self.batcher.update_compute_node(1, {'vcpus_used': 2})
+
+        self.batcher.flush(self.context)
+
+        later = self.now + datetime.timedelta(seconds=2)
+        mock_report.assert_called_once_with(
+            self.context, {1: {'count': 2, 'last_seen_up': later},
+                           2: {'count': 1, 'last_seen_up': later}})
+        mock_update.assert_called_once_with(
+            self.context, {1: {'values': {'vcpus_used': 2,
+                                          'memory_mb_used': 512},
+                               'reported_at': later}})
+
+        # Nothing is left to write
+        mock_report.reset_mock()
+        mock_update.reset_mock()
+        self.batcher.flush(self.context)
+        self.assertFalse(mock_report.called)
+        self.assertFalse(mock_update.called)
+
+    @mock.patch.object(db, 'compute_node_update_batch')
+    @mock.patch.object(db, 'service_report_state_batch')
+    def test_flush_error(self, mock_report, mock_update):
+        mock_report.side_effect = db_exc.DBConnectionError()
+        mock_update.side_effect = db_exc.DBConnectionError()
+        self.batcher.report_service_state(1)
+        self.batcher.update_compute_node(1, {'vcpus_used': 1,
+                                             'memory_mb_used': 512})
+        self.batcher.flush(self.context)
+
+        # The failed writes are retried with the ones received since
+        mock_report.reset_mock()
+        mock_update.reset_mock()
+        mock_report.side_effect = None
+        mock_update.side_effect = None
+        self.time_fixture.advance_time_seconds(2)
+        self.batcher.report_service_state(1)
+        self.batcher.update_compute_node(1, {'vcpus_used': 2})
+        self.batcher.flush(self.context)
+
+        later = self.now + datetime.timedelta(seconds=2)
+        mock_report.assert_called_once_with(
+            self.context, {1: {'count': 2, 'last_seen_up': later}})
+        mock_update.assert_called_once_with(
+            self.context, {1: {'values': {'vcpus_used': 2,
+                                          'memory_mb_used': 512},
+                               'reported_at': later}})
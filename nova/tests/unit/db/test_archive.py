@@ -0,0 +1,136 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+import mock
+from oslo_db import exception as db_exc
+
+from nova import db
+from nova.db import archive
+from nova import test
+
+
+@mock.patch.object(db, 'archive_deleted_rows_table_levels',
+                   return_value=[['consoles', 'instance_extra'],
+                                 ['console_pools', 'instances']])
+@mock.patch.object(db, 'archive_deleted_rows_for_table')
+class DeletedRowsArchiverTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DeletedRowsArchiverTestCase, self).setUp()
+        self.path = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'checkpoint')
+        self.rows = {'consoles': [2, 2, 1], 'instance_extra': [],
+                     'console_pools': [2, 0], 'instances': [1]}
+
+    def _archive_for_table(self, tablename, max_rows):
+        rows = self.rows[tablename]
+        return rows.pop(0) if rows else 0
+
+    def test_run(self, mock_archive, mock_levels):
+        mock_archive.side_effect = self._archive_for_table
+        progress = mock.Mock()
+        archiver = archive.DeletedRowsArchiver(batch_size=2, workers=2,
+                                               checkpoint_path=self.path,
+                                               progress=progress)
+        result = archiver.run()
+
+        self.assertEqual({'consoles': 5, 'console_pools': 2, 'instances': 1},
+                         result)
+        self.assertEqual(
+            [mock.call('consoles', 2)] * 3,
+            [call for call in mock_archive.call_args_list
+             if call[0][0] == 'consoles'])
+        # The dependent tables are archived first
+        tables = [call[0][0] for call in mock_archive.call_args_list]
+        self.assertLess(max(tables.index('consoles'),
+                            tables.index('instance_extra')),
+                        min(tables.index('console_pools'),
+                            tables.index('instances')))
+        progress.assert_any_call('consoles', 5, mock.ANY)
+        # The checkpoint is removed once the archiving completes
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_run_resumes_from_checkpoint(self, mock_archive, mock_levels):
+        mock_archive.side_effect = self._archive_for_table
+        checkpoint = archive.ArchiveCheckpoint(self.path)
+        checkpoint.record('consoles', 5, done=True)
+        checkpoint.record('instance_extra', 0, done=True)
+
+        archiver = archive.DeletedRowsArchiver(batch_size=2,
+                                               checkpoint_path=self.path)
+        result = archiver.run()
+
+        self.assertEqual({'consoles': 5, 'console_pools': 2, 'instances': 1},
+                         result)
+        self.assertNotIn('consoles', [call[0][0] for call in
+                                      mock_archive.call_args_list])
+
+    def test_run_interrupted_saves_checkpoint(self, mock_archive,
+                                              mock_levels):
+        self.rows['console_pools'] = [2]
+        mock_archive.side_effect = [2, 1, 0, 2, test.TestingException()]
+        archiver = archive.DeletedRowsArchiver(batch_size=2,
+                                               checkpoint_path=self.path)
+        self.assertRaises(test.TestingException, archiver.run)
+
+        checkpoint = archive.ArchiveCheckpoint(self.path)
+        self.assertEqual({'consoles', 'instance_extra'}, checkpoint.done)
+        self.assertEqual({'consoles': 3, 'console_pools': 2},
+                         checkpoint.archived)
+
+    def test_run_blocked(self, mock_archive, mock_levels):
+        def _archive_for_table(tablename, max_rows):
+            if tablename == 'console_pools':
+                raise db_exc.DBReferenceError('consoles', 'fk', 'pool_id',
+                                              'console_pools')
+            return self._archive_for_table(tablename, max_rows)
+
+        mock_archive.side_effect = _archive_for_table
+        archiver = archive.DeletedRowsArchiver(batch_size=2,
+                                               checkpoint_path=self.path)
+        result = archiver.run()
+
+        self.assertEqual({'consoles': 5, 'instances': 1}, result)
+        self.assertEqual(['console_pools'], list(archiver.blocked))
+        # The blocked table is not done, a resumed run retries it
+        checkpoint = archive.ArchiveCheckpoint(self.path)
+        self.assertEqual({'consoles', 'instance_extra', 'instances'},
+                         checkpoint.done)
+
+    @mock.patch('eventlet.greenthread.sleep')
+    @mock.patch('time.time', return_value=100)
+    def test_run_throttled(self, mock_time, mock_sleep, mock_archive,
+                           mock_levels):
+        mock_archive.side_effect = self._archive_for_table
+        archiver = archive.DeletedRowsArchiver(batch_size=2,
+                                               max_rows_per_second=4)
+        archiver.run()
+        # Each batch waits for the total rows archived at 4 rows per second
+        self.assertEqual([mock.call(0.5), mock.call(1.0), mock.call(1.25),
+                          mock.call(1.75), mock.call(2.0)],
+                         mock_sleep.call_args_list)
+
+    @mock.patch('eventlet.greenthread.sleep')
+    @mock.patch.object(db, 'get_replication_lag', side_effect=[30, 5, None])
+    def test_run_waits_for_replication(self, mock_lag, mock_sleep,
+                                       mock_archive, mock_levels):
+        mock_levels.return_value = [['instances']]
+        mock_archive.side_effect = [2, 0]
+        archiver = archive.DeletedRowsArchiver(batch_size=2,
+                                               max_replication_lag=10)
+        self.assertEqual({'instances': 2}, archiver.run())
+        mock_sleep.assert_called_once_with(
+            archive.REPLICATION_LAG_POLL_INTERVAL)
+        self.assertEqual(3, mock_lag.call_count)
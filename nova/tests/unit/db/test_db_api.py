@@ -236,6 +236,83 @@ class DecoratorTestCase(test.TestCase):
         mock_clone.assert_called_once_with(mode=enginefacade._READER)
         mock_using.assert_called_once_with(ctxt)
 
+    @mock.patch.object(sqlalchemy_api, '_slave_is_fresh', return_value=False)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_select_db_reader_mode_stale_slave_select_sync(self, mock_clone,
+                                                           mock_using,
+                                                           mock_fresh):
+        self.flags(db_slave_max_staleness=20)
+
+        @db.select_db_reader_mode
+        def func(self, context, value, use_slave=False):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._READER)
+        ctxt = context.get_admin_context()
+        func(self, ctxt, 'some_value', use_slave=True)
+
+        mock_fresh.assert_called_once_with(20)
+        mock_clone.assert_called_once_with(mode=enginefacade._READER)
+        mock_using.assert_called_once_with(ctxt)
+
+    @mock.patch.object(sqlalchemy_api, '_slave_is_fresh', return_value=True)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_select_db_reader_mode_max_staleness_select_async(self,
+                                                              mock_clone,
+                                                              mock_using,
+                                                              mock_fresh):
+
+        @db.select_db_reader_mode
+        def func(self, context, value, use_slave=False):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._ASYNC_READER)
+        ctxt = context.get_admin_context()
+        func(self, ctxt, 'some_value', use_slave=10)
+
+        mock_fresh.assert_called_once_with(10)
+        mock_clone.assert_called_once_with(mode=enginefacade._ASYNC_READER)
+        mock_using.assert_called_once_with(ctxt)
+
+    @mock.patch.dict(sqlalchemy_api._slave_lag,
+                     {'lag': None, 'checked_at': None})
+    @mock.patch.object(sqlalchemy_api, 'get_replication_lag')
+    @mock.patch('time.time')
+    def test_slave_is_fresh(self, mock_time, mock_lag):
+        self.flags(slave_connection='mysql+pymysql://slave/nova',
+                   group='database')
+        mock_time.return_value = 1000
+        mock_lag.return_value = 15
+        self.assertTrue(sqlalchemy_api._slave_is_fresh(20))
+        # The lag is cached
+        self.assertFalse(sqlalchemy_api._slave_is_fresh(10))
+        mock_lag.assert_called_once_with()
+        # The lag may have grown since it was checked
+        mock_time.return_value = 1004
+        self.assertTrue(sqlalchemy_api._slave_is_fresh(19))
+        self.assertFalse(sqlalchemy_api._slave_is_fresh(18))
+        mock_lag.assert_called_once_with()
+        # No staleness accepted disables the check
+        self.assertTrue(sqlalchemy_api._slave_is_fresh(0))
+
+    @mock.patch.dict(sqlalchemy_api._slave_lag,
+                     {'lag': None, 'checked_at': None})
+    @mock.patch.object(sqlalchemy_api, 'get_replication_lag')
+    def test_slave_is_fresh_lag_unknown(self, mock_lag):
+        self.flags(slave_connection='mysql+pymysql://slave/nova',
+                   group='database')
+        mock_lag.side_effect = db_exc.DBConnectionError()
+        self.assertTrue(sqlalchemy_api._slave_is_fresh(10))
+
+    @mock.patch.object(sqlalchemy_api, 'get_replication_lag')
+    def test_slave_is_fresh_no_slave(self, mock_lag):
+        self.assertTrue(sqlalchemy_api._slave_is_fresh(10))
+        self.assertFalse(mock_lag.called)
+
 
 def _get_fake_aggr_values():
     return {'name': 'fake_aggregate'}
@@ -1088,16 +1165,33 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
         mock_create_facade.assert_called_once_with()
         mock_facade.get_engine.assert_called_once_with()
 
-    @mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid')
+    @mock.patch.object(sqlalchemy_api, 'model_query')
     @mock.patch.object(sqlalchemy_api, '_instances_fill_metadata')
     @mock.patch('oslo_db.sqlalchemy.utils.paginate_query')
     def test_instance_get_all_by_filters_paginated_allows_deleted_marker(
-            self, mock_paginate, mock_fill, mock_get):
+            self, mock_paginate, mock_fill, mock_query):
         ctxt = mock.MagicMock()
-        ctxt.elevated.return_value = mock.sentinel.elevated
+        mock_first = mock_query.return_value.filter_by.return_value.first
+        mock_first.return_value = (datetime.datetime(2016, 6, 1), 1)
         sqlalchemy_api.instance_get_all_by_filters_sort(ctxt, {}, marker='foo')
-        mock_get.assert_called_once_with(mock.sentinel.elevated, 'foo')
-        ctxt.elevated.assert_called_once_with(read_deleted='yes')
+        # Only the sort keys of the marker are loaded
+        mock_query.assert_called_once_with(
+            ctxt, models.Instance,
+            [models.Instance.created_at, models.Instance.id],
+            read_deleted='yes')
+        mock_query.return_value.filter_by.assert_called_once_with(uuid='foo')
+
+    def test_get_ip_like_pattern(self):
+        for regex, pattern in [('^10\\.0\\.0\\.1$', '%"10.0.0.1"%'),
+                               ('10.0', '%"10_0%'),
+                               ('fe80::', '%"fe80::%'),
+                               ('', '%"%'),
+                               ('.*10', None),
+                               ('10.0.0.[12]', None),
+                               ('10%', None),
+                               (10, None)]:
+            self.assertEqual(pattern,
+                             sqlalchemy_api._get_ip_like_pattern(regex))
 
 
 class SqlAlchemyDbApiTestCase(DbTestCase):
@@ -2217,16 +2311,69 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         instances = db.instance_get_all_by_filters_sort(self.ctxt, filters)
         self.assertEqual([], instances)
 
-    @mock.patch('nova.db.sqlalchemy.api.undefer')
-    @mock.patch('nova.db.sqlalchemy.api.joinedload')
-    def test_instance_get_all_by_filters_extra_columns(self,
-                                                       mock_joinedload,
-                                                       mock_undefer):
-        db.instance_get_all_by_filters_sort(
-            self.ctxt, {},
-            columns_to_join=['info_cache', 'extra.pci_requests'])
-        mock_joinedload.assert_called_once_with('info_cache')
-        mock_undefer.assert_called_once_with('extra.pci_requests')
+    def test_instance_get_all_by_filters_pci_devices_use_slave(self):
+        # The PCI devices are read within the asynchronous reader picked for
+        # use_slave
+        instance = self.create_instance_with_args()
+        instances = objects.InstanceList.get_by_filters(
+            self.ctxt, {}, expected_attrs=['pci_devices'], use_slave=True,
+            sort_keys=['created_at'], sort_dirs=['desc'])
+        self.assertEqual([instance['uuid']], [inst.uuid for inst in instances])
+        self.assertEqual(0, len(instances[0].pci_devices))
+
+    def test_instance_get_all_by_filters_extra_columns(self):
+        instance = self.create_instance_with_args(
+            extra={'pci_requests': '[]'})
+        with test.nested(
+                mock.patch.object(sqlalchemy_api, 'joinedload'),
+                mock.patch.object(sqlalchemy_api, 'undefer',
+                                  side_effect=sqlalchemy_api.undefer)
+                ) as (mock_joinedload, mock_undefer):
+            result = db.instance_get_all_by_filters_sort(
+                self.ctxt, {},
+                columns_to_join=['info_cache', 'extra.pci_requests'])
+        # The joined columns are read by side queries
+        self.assertFalse(mock_joinedload.called)
+        mock_undefer.assert_called_once_with('pci_requests')
+        self.assertEqual(instance['uuid'],
+                         result[0]['info_cache']['instance_uuid'])
+        self.assertEqual('[]', result[0]['extra']['pci_requests'])
+
+    @mock.patch.object(sqlalchemy_api, '_INSTANCE_FILL_CHUNK_SIZE', 2)
+    def test_instance_get_all_by_filters_side_queries(self):
+        instances = [self.create_instance_with_args(
+                         security_groups=['default'],
+                         extra={'flavor': 'flavor%d' % i})
+                     for i in range(5)]
+        side_query_mocks = []
+        for name in ('_instance_all_metadata_get_multi',
+                     '_instance_info_cache_get_multi',
+                     '_instance_security_groups_get_multi',
+                     '_instance_extra_get_multi'):
+            patcher = mock.patch.object(
+                sqlalchemy_api, name,
+                side_effect=getattr(sqlalchemy_api, name))
+            side_query_mocks.append(patcher.start())
+            self.addCleanup(patcher.stop)
+
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {}, sort_keys=['id'], sort_dirs=['asc'],
+            columns_to_join=['metadata', 'info_cache', 'security_groups',
+                             'extra.flavor'])
+        # Each side query reads the page by chunks of 2 instances
+        for side_query_mock in side_query_mocks:
+            self.assertEqual(3, side_query_mock.call_count)
+        self.assertEqual([inst['uuid'] for inst in instances],
+                         [inst['uuid'] for inst in result])
+        for i, inst in enumerate(result):
+            self.assertEqual(inst['uuid'],
+                             inst['info_cache']['instance_uuid'])
+            self.assertEqual(['default'],
+                             [group['name']
+                              for group in inst['security_groups']])
+            self.assertEqual('flavor%d' % i, inst['extra']['flavor'])
+        self.assertEqual(self.sample_data['metadata'],
+                         utils.metadata_to_dict(result[0]['metadata']))
 
     @mock.patch('nova.db.sqlalchemy.api.undefer')
     @mock.patch('nova.db.sqlalchemy.api.joinedload')
@@ -2295,6 +2442,44 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.mox.ReplayAll()
         sqlalchemy_api._instance_system_metadata_get_multi(self.ctxt, [])
 
+    def test_instance_all_metadata_get_multi(self):
+        uuids = [self.create_instance_with_args()['uuid'] for i in range(3)]
+        with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
+            rows = sqlalchemy_api._instance_all_metadata_get_multi(
+                self.ctxt, uuids, ['metadata', 'system_metadata']).all()
+        for uuid in uuids:
+            meta = {row.key: row.value for row in rows
+                    if row.instance_uuid == uuid and row.kind == 'metadata'}
+            sys_meta = {row.key: row.value for row in rows
+                        if row.instance_uuid == uuid and
+                        row.kind == 'system_metadata'}
+            self.assertEqual(self.sample_data['metadata'], meta)
+            self.assertEqual(self.sample_data['system_metadata'], sys_meta)
+
+    def test_instances_fill_metadata_single_query(self):
+        instance = self.create_instance_with_args()
+        db.instance_system_metadata_update(
+            self.ctxt, instance['uuid'], {'key': 'value'}, True)
+        with mock.patch.object(
+                sqlalchemy_api, '_instance_all_metadata_get_multi',
+                side_effect=sqlalchemy_api._instance_all_metadata_get_multi
+                ) as mock_get_multi:
+            with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
+                filled = sqlalchemy_api._instances_fill_metadata(
+                    self.ctxt, [instance])
+        mock_get_multi.assert_called_once_with(
+            self.ctxt, [instance['uuid']], ['metadata', 'system_metadata'])
+        self.assertEqual(self.sample_data['metadata'],
+                         utils.metadata_to_dict(filled[0]['metadata']))
+        # The deleted system metadata items are filled too
+        self.assertEqual(
+            dict(self.sample_data['system_metadata'], key='value'),
+            utils.metadata_to_dict(filled[0]['system_metadata'],
+                                   include_deleted=True))
+        self.assertEqual(
+            {'key': 'value'},
+            utils.metadata_to_dict(filled[0]['system_metadata']))
+
     def test_instance_get_all_by_filters_regex(self):
         i1 = self.create_instance_with_args(display_name='test1')
         i2 = self.create_instance_with_args(display_name='teeeest2')
@@ -2303,6 +2488,61 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                 {'display_name': 't.*st.'})
         self._assertEqualListsOfInstances(result, [i1, i2])
 
+    def test_instance_get_all_by_filters_ip(self):
+        instances = []
+        for address in ('10.0.0.1', '10.0.0.10', '10.1.0.1'):
+            instance = self.create_instance_with_args()
+            network_info = jsonutils.dumps(
+                [{'network': {'subnets': [{'ips': [{'address': address}]}]}}])
+            db.instance_info_cache_update(self.ctxt, instance['uuid'],
+                                          {'network_info': network_info})
+            instances.append(instance)
+        no_cache = self.create_instance_with_args()
+
+        # The filters are pushed down to the DB when they are plain
+        # addresses or prefixes of addresses, the others are left to the
+        # compute API
+        for ip, expected in [('^10\\.0\\.0\\.1$', instances[:1]),
+                             ('10.0.0.1', instances[:2]),
+                             ('10.', instances),
+                             ('.*0\\.1$', instances + [no_cache])]:
+            result = db.instance_get_all_by_filters(self.ctxt, {'ip': ip})
+            self._assertEqualListsOfInstances(expected, result)
+
+    def test_instance_get_all_by_filters_columns(self):
+        instance = self.create_instance_with_args(host='host1',
+                                                  vm_state='active')
+        self.create_instance_with_args(host='host2')
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {'host': 'host1'}, columns=['host', 'vm_state'])
+        self.assertEqual([{'id': instance['id'], 'uuid': instance['uuid'],
+                           'host': 'host1', 'vm_state': 'active'}], result)
+
+    def test_instance_get_all_by_filters_columns_invalid(self):
+        self.assertRaises(exception.InvalidInput,
+                          db.instance_get_all_by_filters_sort,
+                          self.ctxt, {}, columns=['metadata'])
+
+    def test_instance_get_all_by_host_columns(self):
+        instance = self.create_instance_with_args(host='host1')
+        self.create_instance_with_args(host='host2')
+        result = db.instance_get_all_by_host(self.ctxt, 'host1',
+                                             columns=['task_state'])
+        self.assertEqual([{'id': instance['id'], 'uuid': instance['uuid'],
+                           'task_state': None}], result)
+
+    def test_instance_get_all_by_filters_marker_sort_keys(self):
+        i1 = self.create_instance_with_args(host='host2')
+        i2 = self.create_instance_with_args(host='host1')
+        i3 = self.create_instance_with_args(host='host1')
+        self.create_instance_with_args(host=None)
+        for marker, expected in [(i1, [i3, i2]), (i3, [i2]), (i2, [])]:
+            result = db.instance_get_all_by_filters_sort(
+                self.ctxt, {}, marker=marker['uuid'], sort_keys=['host'],
+                sort_dirs=['desc'])
+            self.assertEqual([inst['uuid'] for inst in expected],
+                             [inst['uuid'] for inst in result])
+
     def test_instance_get_all_by_filters_changes_since(self):
         i1 = self.create_instance_with_args(updated_at=
                                             '2013-12-05T15:03:25.000000')
@@ -3354,6 +3594,23 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
 
+    def test_service_report_state_batch(self):
+        service1 = self._create_service({})
+        service2 = self._create_service({'host': 'fake_host2'})
+        seen1 = timeutils.utcnow().replace(microsecond=0)
+        seen2 = seen1 + datetime.timedelta(seconds=3)
+        db.service_report_state_batch(self.ctxt, {
+            service1['id']: {'count': 2, 'last_seen_up': seen1},
+            service2['id']: {'count': 1, 'last_seen_up': seen2}})
+
+        service1 = db.service_get(self.ctxt, service1['id'])
+        self.assertEqual(5, service1['report_count'])
+        self.assertEqual(seen1, service1['last_seen_up'])
+        self.assertIsNotNone(service1['updated_at'])
+        service2 = db.service_get(self.ctxt, service2['id'])
+        self.assertEqual(4, service2['report_count'])
+        self.assertEqual(seen2, service2['last_seen_up'])
+
     def test_service_update_with_set_forced_down(self):
         service = self._create_service({})
         db.service_update(self.ctxt, service['id'], {'forced_down': True})
@@ -3469,6 +3726,43 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                             include_disabled=True)
         self._assertEqualListsOfObjects(expected, real)
 
+    def test_service_get_all_by_binary_changed_since(self):
+        now = timeutils.utcnow()
+        time_fixture = self.useFixture(utils_fixture.TimeFixture(now))
+        self._create_service({'host': 'host1', 'binary': 'b1'})
+        service = self._create_service({'host': 'host2', 'binary': 'b1'})
+        time_fixture.advance_time_seconds(10)
+        changed_since = now + datetime.timedelta(seconds=5)
+        updated = db.service_update(self.ctxt, service['id'],
+                                    {'report_count': 2})
+        created = self._create_service({'host': 'host3', 'binary': 'b1'})
+        self._create_service({'host': 'host4', 'binary': 'b2'})
+        expected = [updated, created]
+        real = db.service_get_all_by_binary(self.ctxt, 'b1',
+                                            changed_since=changed_since)
+        self._assertEqualListsOfObjects(expected, real)
+
+        db.service_destroy(self.ctxt, created['id'])
+        real = db.service_get_all_by_binary(self.ctxt, 'b1',
+                                            changed_since=changed_since)
+        self.assertEqual([(updated['id'], 0), (created['id'], created['id'])],
+                         sorted((s['id'], s['deleted']) for s in real))
+        self.assertEqual(2, len(db.service_get_all_by_binary(self.ctxt,
+                                                             'b1')))
+
+    def test_service_get_all_by_binary_use_slave(self):
+        # The asynchronous reader picked for use_slave must not be upgraded
+        # to a synchronous reader by the db api function
+        service = self._create_service({'host': 'host1', 'binary': 'b1'})
+        self._create_service({'host': 'host2', 'binary': 'b2'})
+        services = objects.ServiceList.get_by_binary(self.ctxt, 'b1',
+                                                     use_slave=True)
+        self.assertEqual([service['id']], [s.id for s in services])
+        services = objects.ServiceList.get_by_binary(
+            self.ctxt, 'b1', changed_since=service['created_at'],
+            use_slave=True)
+        self.assertEqual([service['id']], [s.id for s in services])
+
     def test_service_get_all_by_host(self):
         values = [
             {'host': 'host1', 'topic': 't11', 'binary': 'b11'},
@@ -7107,6 +7401,120 @@ class QuotaTestCase(test.TestCase, ModelsObjectComparatorMixin):
         for key, value in expected.items():
             self.assertEqual(value, quota_usage[key])
 
+    def _reserve_optimistic(self, deltas, max_age=None):
+        resources = {res: quota.ReservableResource(res, '_sync_%s' % res)
+                     for res in deltas}
+        quotas = db.quota_get_all_by_project(self.ctxt, 'p1')
+        user_quotas = db.quota_get_all_by_project_and_user(self.ctxt, 'p1',
+                                                           'u1')
+        return db.quota_reserve_optimistic(
+            self.ctxt, resources, quotas, dict(quotas, **user_quotas), deltas,
+            timeutils.utcnow(), None, max_age, 'p1', 'u1')
+
+    def test_quota_reserve_optimistic(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve') as mock_lock:
+            reservations = self._reserve_optimistic({'resource0': 1,
+                                                     'resource1': -1})
+        self.assertFalse(mock_lock.called)
+
+        self.assertEqual(2, len(reservations))
+        self.assertEqual({'resource0': 1, 'resource1': -1},
+                         {r.resource: r.delta for r in
+                          [_reservation_get(self.ctxt, reservation)
+                           for reservation in reservations]})
+        usages = db.quota_usage_get_all_by_project_and_user(self.ctxt, 'p1',
+                                                            'u1')
+        self.assertEqual({'in_use': 0, 'reserved': 1}, usages['resource0'])
+        self.assertEqual({'in_use': 1, 'reserved': 1}, usages['resource1'])
+
+        self.assertRaises(exception.OverQuota, self._reserve_optimistic,
+                          {'resource0': 1})
+
+    def test_quota_reserve_optimistic_max_age(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        now = timeutils.utcnow()
+        with sqlalchemy_api.main_context_manager.writer.using(self.ctxt):
+            query = self.ctxt.session.query(models.QuotaUsage).\
+                filter_by(project_id='p1', user_id='u1')
+            # Last updated more than a day ago
+            query.filter_by(resource='resource0').update(
+                {'updated_at': now - datetime.timedelta(days=2, seconds=10)},
+                synchronize_session=False)
+            # Never updated since created
+            query.filter_by(resource='resource1').update(
+                {'created_at': now - datetime.timedelta(seconds=120),
+                 'updated_at': None},
+                synchronize_session=False)
+
+        self._reserve_optimistic({'resource0': 1, 'resource1': -1},
+                                 max_age=60)
+
+        for resource in ('resource0', 'resource1'):
+            usage = db.quota_usage_get(self.ctxt, 'p1', resource, 'u1')
+            self.assertEqual(0, usage.until_refresh)
+
+    def test_quota_reserve_optimistic_missing_usages(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve',
+                               return_value=['resv']) as mock_lock:
+            self.assertEqual(['resv'],
+                             self._reserve_optimistic({'resource3': 1}))
+        self.assertTrue(mock_lock.called)
+
+    def test_quota_reserve_optimistic_usages_changed(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        get_usages = sqlalchemy_api._get_project_user_quota_usages_unlocked
+        db.quota_usage_update(self.ctxt, 'p1', 'u1', 'resource0', reserved=1)
+
+        def fake_get_usages(context, project_id, user_id):
+            project_usages, user_usages, other_usages = get_usages(
+                context, project_id, user_id)
+            if mock_get_usages.call_count == 1:
+                # The usages were read before another reservation
+                user_usages['resource0']['reserved'] = 0
+                user_usages['resource0']['total'] = 0
+                project_usages['resource0']['total'] = 0
+            return project_usages, user_usages, other_usages
+
+        with mock.patch.object(
+                sqlalchemy_api, '_get_project_user_quota_usages_unlocked',
+                side_effect=fake_get_usages) as mock_get_usages:
+            self.assertRaises(exception.OverQuota, self._reserve_optimistic,
+                              {'resource0': 1})
+        self.assertEqual(2, mock_get_usages.call_count)
+        usages = db.quota_usage_get_all_by_project_and_user(self.ctxt, 'p1',
+                                                            'u1')
+        self.assertEqual({'in_use': 0, 'reserved': 1}, usages['resource0'])
+
+    @mock.patch.object(sqlalchemy_api, 'quota_reserve', return_value=['resv'])
+    @mock.patch.object(sqlalchemy_api, '_quota_reserve_optimistic',
+                       side_effect=sqlalchemy_api._QuotaUsagesChanged)
+    def test_quota_reserve_optimistic_falls_back(self, mock_optimistic,
+                                                 mock_lock):
+        self.assertEqual(['resv'], self._reserve_optimistic({'resource0': 1}))
+        self.assertTrue(mock_lock.called)
+
+    def test_quota_usage_reconcile(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        db.quota_usage_update(self.ctxt, 'p1', 'u1', 'resource0', in_use=5,
+                              until_refresh=0)
+        db.quota_usage_update(self.ctxt, 'p1', 'u1', 'resource1', in_use=5,
+                              until_refresh=3)
+        resources = {res: quota.ReservableResource(res, '_sync_%s' % res)
+                     for res in ('resource0', 'resource1')}
+
+        self.assertEqual(1, db.quota_usage_reconcile(self.ctxt, resources,
+                                                     None))
+
+        resource0 = db.quota_usage_get(self.ctxt, 'p1', 'resource0', 'u1')
+        self.assertEqual(0, resource0.in_use)
+        self.assertIsNone(resource0.until_refresh)
+        resource1 = db.quota_usage_get(self.ctxt, 'p1', 'resource1', 'u1')
+        self.assertEqual(5, resource1.in_use)
+        self.assertEqual(0, db.quota_usage_reconcile(self.ctxt, resources,
+                                                     None))
+
     def test_quota_create_exists(self):
         db.quota_create(self.ctxt, 'project1', 'resource1', 41)
         self.assertRaises(exception.QuotaExists, db.quota_create, self.ctxt,
@@ -7420,6 +7828,34 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         new_stats = jsonutils.loads(node['stats'])
         self.assertEqual(self.stats, new_stats)
 
+    def test_compute_node_get_all_changed_since(self):
+        now = timeutils.utcnow() + datetime.timedelta(hours=1)
+        time_fixture = self.useFixture(utils_fixture.TimeFixture(now))
+        self.assertEqual(
+            [], db.compute_node_get_all_changed_since(self.ctxt, now))
+
+        db.compute_node_update(self.ctxt, self.item['id'], {'vcpus_used': 1})
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, now)
+        self.assertEqual([self.item['id']], [node['id'] for node in nodes])
+        self.assertEqual(1, nodes[0]['vcpus_used'])
+
+        # Deleted compute nodes are returned too so that callers can drop them
+        time_fixture.advance_time_seconds(10)
+        changed_since = now + datetime.timedelta(seconds=5)
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, changed_since)
+        self.assertEqual([self.item['id']], [node['id'] for node in nodes])
+        self.assertNotEqual(0, nodes[0]['deleted'])
+
+    def test_compute_node_get_all_use_slave(self):
+        # The asynchronous reader picked for use_slave must not be upgraded
+        # to a synchronous reader by the db api functions
+        nodes = objects.ComputeNodeList.get_all(self.ctxt, use_slave=True)
+        self.assertEqual([self.item['id']], [node.id for node in nodes])
+        nodes = objects.ComputeNodeList.get_all_changed_since(
+            self.ctxt, self.item['created_at'], use_slave=True)
+        self.assertEqual([self.item['id']], [node.id for node in nodes])
+
     def test_compute_node_select_schema(self):
         # We here test that compute nodes that have inventory and allocation
         # entries under the new resource-providers schema return non-None
@@ -7701,6 +8137,39 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         new_stats = jsonutils.loads(item_updated['stats'])
         self.assertEqual(stats, new_stats)
 
+    def test_compute_node_update_batch(self):
+        compute_node_id = self.item['id']
+        compute_node_dict = dict(self.compute_node_dict,
+                                 hypervisor_hostname='node2',
+                                 uuid=uuidsentinel.fake_compute_node2)
+        compute_node2 = db.compute_node_create(self.ctxt, compute_node_dict)
+        reported_at = timeutils.utcnow()
+        db.compute_node_update_batch(self.ctxt, {
+            compute_node_id: {'values': {'vcpus_used': 1,
+                                         'memory_mb_used': 512},
+                              'reported_at': reported_at},
+            compute_node2['id']: {'values': {'vcpus_used': 2},
+                                  'reported_at': reported_at}})
+
+        node = db.compute_node_get(self.ctxt, compute_node_id)
+        self.assertEqual(1, node['vcpus_used'])
+        self.assertEqual(512, node['memory_mb_used'])
+        self.assertEqual(reported_at, node['updated_at'])
+        node2 = db.compute_node_get(self.ctxt, compute_node2['id'])
+        self.assertEqual(2, node2['vcpus_used'])
+        self.assertEqual(0, node2['memory_mb_used'])
+
+    def test_compute_node_update_batch_updated_since(self):
+        compute_node_id = self.item['id']
+        reported_at = timeutils.utcnow() - datetime.timedelta(seconds=10)
+        db.compute_node_update(self.ctxt, compute_node_id, {'vcpus_used': 1})
+        db.compute_node_update_batch(self.ctxt, {
+            compute_node_id: {'values': {'vcpus_used': 2},
+                              'reported_at': reported_at}})
+        # The compute node was updated after the batched update was received
+        node = db.compute_node_get(self.ctxt, compute_node_id)
+        self.assertEqual(1, node['vcpus_used'])
+
     def test_compute_node_delete(self):
         compute_node_id = self.item['id']
         db.compute_node_delete(self.ctxt, compute_node_id)
@@ -8749,6 +9218,10 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
         num = sqlalchemy_api._archive_deleted_rows_for_table("console_pools",
                                                              max_rows=None)
         self.assertEqual(num, 0)
+        # The archiving of the batches reports the failure
+        self.assertRaises(db_exc.DBReferenceError,
+                          db.archive_deleted_rows_for_table, "console_pools",
+                          max_rows=None)
         # Then archiving consoles should work.
         num = sqlalchemy_api._archive_deleted_rows_for_table("consoles",
                                                              max_rows=None)
@@ -8762,6 +9235,33 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'shadow_consoles'
         )
 
+    def test_archive_deleted_rows_table_levels(self):
+        levels = db.archive_deleted_rows_table_levels()
+
+        def level(tablename):
+            for i, tables in enumerate(levels):
+                if tablename in tables:
+                    return i
+        # consoles.pool_id depends on console_pools.id
+        self.assertLess(level('consoles'), level('console_pools'))
+        self.assertLess(level('instance_extra'), level('instances'))
+        self.assertIsNone(level('migrate_version'))
+        self.assertIsNone(level('shadow_instances'))
+
+    def test_get_replication_lag_no_slave(self):
+        self.assertIsNone(db.get_replication_lag())
+
+    def test_archive_deleted_rows_for_table(self):
+        for uuidstr in self.uuidstrs:
+            self.conn.execute(self.instance_id_mappings.insert().values(
+                uuid=uuidstr, deleted=1))
+        self.assertEqual(4, db.archive_deleted_rows_for_table(
+            'instance_id_mappings', 4))
+        self.assertEqual(2, db.archive_deleted_rows_for_table(
+            'instance_id_mappings', 4))
+        self._assert_shadow_tables_empty_except(
+            'shadow_instance_id_mappings')
+
     def test_archive_deleted_rows_2_tables(self):
         # Add 6 rows to each table
         for uuidstr in self.uuidstrs:
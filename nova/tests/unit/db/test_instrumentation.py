@@ -0,0 +1,190 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the instrumentation of the DB API."""
+
+import mock
+import sqlalchemy
+
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import instrumentation
+from nova import exception
+from nova import test
+
+
+class HistogramTestCase(test.NoDBTestCase):
+
+    def test_add(self):
+        histogram = instrumentation.Histogram((1, 10))
+        for value in (0, 1, 2, 10, 11, 100):
+            histogram.add(value)
+        self.assertEqual({'<=1': 2, '<=10': 2, '>10': 2},
+                         histogram.to_dict())
+        self.assertEqual('<=1:2 <=10:2 >10:2', histogram.format())
+
+
+class DBStatsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DBStatsTestCase, self).setUp()
+        self.stats = instrumentation.DBStats()
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.stats.instrument_engine(self.engine)
+
+    def _query(self, statements):
+        with self.engine.connect() as conn:
+            for i in range(statements):
+                conn.execute('SELECT 1')
+        return [1] * statements
+
+    def test_calls(self):
+        get_one = self.stats.wrap('get_one', self._query)
+        get_one(1)
+        get_one(3)
+
+        calls = self.stats.report()['calls']
+        self.assertEqual(['get_one'], list(calls))
+        self.assertEqual(2, calls['get_one']['calls'])
+        self.assertEqual(0, calls['get_one']['errors'])
+        self.assertEqual(4, calls['get_one']['rows'])
+        self.assertEqual(4, calls['get_one']['statements'])
+        self.assertEqual(3, calls['get_one']['max_statements'])
+        self.assertEqual(2, sum(calls['get_one']['latency'].values()))
+
+    def test_nested_calls(self):
+        get_one = self.stats.wrap('get_one', self._query)
+
+        def _get_many():
+            return get_one(1) + get_one(2) + self._query(1)
+
+        self.stats.wrap('get_many', _get_many)()
+
+        calls = self.stats.report()['calls']
+        self.assertEqual(3, calls['get_one']['statements'])
+        # The statements of the nested calls are counted for the caller too
+        self.assertEqual(4, calls['get_many']['statements'])
+        self.assertEqual(4, calls['get_many']['rows'])
+
+    def test_errors(self):
+        def _get_one():
+            raise exception.NotFound()
+
+        get_one = self.stats.wrap('get_one', _get_one)
+        self.assertRaises(exception.NotFound, get_one)
+
+        calls = self.stats.report()['calls']
+        self.assertEqual(1, calls['get_one']['calls'])
+        self.assertEqual(1, calls['get_one']['errors'])
+        self.assertEqual(0, calls['get_one']['rows'])
+
+    def test_pools(self):
+        self._query(3)
+        self._query(1)
+        with self.engine.connect():
+            pass
+
+        pools = self.stats.report()['pools']
+        stats = pools[repr(self.engine.url)]
+        self.assertEqual(3, stats['checkouts'])
+        self.assertEqual(2, stats['transactions'])
+        self.assertEqual(4, stats['statements'])
+        self.assertEqual({'<=1': 1, '<=2': 0, '<=5': 1, '<=10': 0,
+                          '<=20': 0, '<=50': 0, '<=100': 0, '>100': 0},
+                         stats['statements_per_transaction'])
+        self.assertEqual(3, sum(stats['checkout_latency'].values()))
+
+    def test_reset(self):
+        self.stats.wrap('get_one', self._query)(1)
+        self.stats.reset()
+        self.assertEqual({'calls': {}, 'pools': {}}, self.stats.report())
+
+        self._query(1)
+        self.assertEqual(1, self.stats.report()['pools'][
+            repr(self.engine.url)]['transactions'])
+
+    @mock.patch.object(instrumentation.LOG, 'info')
+    def test_log_report(self, mock_info):
+        self.stats.wrap('get_one', self._query)(2)
+        self.stats.log_report()
+
+        self.assertEqual(2, mock_info.call_count)
+        lines = [call[0][1] for call in mock_info.call_args_list]
+        self.assertIn('1 transactions, 2.0 statements/transaction', lines[0])
+        self.assertTrue(lines[1].startswith('get_one: 1 calls, 0 errors'))
+        self.assertIn('2.0 statements/call (max 2), 2.0 rows/call', lines[1])
+
+    @mock.patch('oslo_reports.guru_meditation_report.TextGuruMeditation.'
+                'register_section')
+    @mock.patch('oslo_service.loopingcall.FixedIntervalLoopingCall')
+    def test_start(self, mock_loop, mock_register):
+        self.stats.start(60)
+        self.stats.start(60)
+
+        mock_register.assert_called_once_with('DB API',
+                                              self.stats.report_model)
+        mock_loop.assert_called_once_with(self.stats.log_report)
+        mock_loop.return_value.start.assert_called_once_with(
+            interval=60, initial_delay=60)
+
+        self.stats.wrap('get_one', self._query)(1)
+        model = self.stats.report_model()
+        model.set_current_view_type('text')
+        self.assertEqual('\n'.join(self.stats.format_report()), str(model))
+
+    @mock.patch('oslo_service.loopingcall.FixedIntervalLoopingCall')
+    def test_start_no_log(self, mock_loop):
+        with mock.patch('oslo_reports.guru_meditation_report.'
+                        'TextGuruMeditation.register_section'):
+            self.stats.start(0)
+        self.assertFalse(mock_loop.called)
+
+
+class InstrumentedBackendTestCase(test.NoDBTestCase):
+
+    def test_get_backend(self):
+        self.assertIs(sqlalchemy_api, sqlalchemy_api.get_backend())
+
+        self.flags(db_instrumentation=True)
+        backend = sqlalchemy_api.get_backend()
+        self.assertIsInstance(backend, instrumentation.InstrumentedBackend)
+        self.assertIs(sqlalchemy_api.PER_PROJECT_QUOTAS,
+                      backend.PER_PROJECT_QUOTAS)
+        self.assertIs(backend.instance_get, backend.instance_get)
+        self.assertEqual('instance_get', backend.instance_get.__name__)
+
+    def test_calls(self):
+        stats = instrumentation.DBStats()
+        module = mock.Mock(spec=['instance_get'])
+        module.instance_get.return_value = {'id': 1}
+        module.instance_get.__name__ = 'instance_get'
+        backend = instrumentation.InstrumentedBackend(module, stats)
+
+        self.assertEqual({'id': 1}, backend.instance_get('ctxt', 1))
+
+        module.instance_get.assert_called_once_with('ctxt', 1)
+        calls = stats.report()['calls']
+        self.assertEqual(1, calls['instance_get']['calls'])
+        self.assertEqual(1, calls['instance_get']['rows'])
+
+    @mock.patch.object(instrumentation.STATS, 'start')
+    @mock.patch.object(instrumentation.STATS, 'instrument_engine')
+    def test_instrument_engine(self, mock_instrument, mock_start):
+        engine = mock.sentinel.engine
+        sqlalchemy_api._instrument_engine(engine)
+        self.assertFalse(mock_instrument.called)
+        self.assertFalse(mock_start.called)
+
+        self.flags(db_instrumentation=True,
+                   db_instrumentation_log_interval=30)
+        sqlalchemy_api._instrument_engine(engine)
+        mock_instrument.assert_called_once_with(engine)
+        mock_start.assert_called_once_with(30)
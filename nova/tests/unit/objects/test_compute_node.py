@@ -381,6 +381,18 @@ class _TestComputeNodeObject(object):
                          subs=self.subs(),
                          comparators=self.comparators())
 
+    @mock.patch.object(db, 'compute_node_get_all_changed_since')
+    def test_get_all_changed_since(self, mock_get):
+        mock_get.return_value = [fake_compute_node]
+        changed_since = timeutils.utcnow()
+        computes = compute_node.ComputeNodeList.get_all_changed_since(
+            self.context, changed_since)
+        self.assertEqual(1, len(computes))
+        self.compare_obj(computes[0], fake_compute_node,
+                         subs=self.subs(),
+                         comparators=self.comparators())
+        mock_get.assert_called_once_with(self.context, changed_since)
+
     def test_get_by_hypervisor(self):
         self.mox.StubOutWithMock(db, 'compute_node_search_by_hypervisor')
         db.compute_node_search_by_hypervisor(self.context, 'hyper').AndReturn(
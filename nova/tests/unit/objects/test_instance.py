@@ -235,6 +235,47 @@ class _TestInstanceObject(object):
         self.assertRaises(exception.ObjectActionError,
                           inst.obj_load_attr, 'foo')
 
+    def test_load_column_not_partial(self):
+        # The columns are only lazy-loadable on instances from the database
+        inst = objects.Instance(context=self.context, uuid=uuids.instance)
+        self.assertRaises(exception.ObjectActionError,
+                          inst.obj_load_attr, 'host')
+
+    def test_load_column_full_instance(self):
+        # The unset columns of the other instances aren't lazy-loadable
+        inst = objects.Instance(context=self.context, id=1,
+                                uuid=uuids.instance)
+        inst.obj_reset_changes()
+        self.assertRaises(exception.ObjectActionError,
+                          inst.obj_load_attr, 'host')
+
+    @mock.patch.object(db, 'instance_get_by_uuid')
+    def test_name_partial_instance(self, mock_get):
+        self.flags(instance_name_template='%(hostname)s')
+        mock_get.return_value = dict(self.fake_instance, hostname='foo')
+        inst = objects.Instance._from_db_columns(
+            self.context, objects.Instance(),
+            {'id': 1, 'uuid': uuids.instance})
+        # The columns used by the template are loaded
+        self.assertEqual('foo', inst.name)
+        self.assertEqual(1, mock_get.call_count)
+
+    @mock.patch.object(db, 'instance_get_by_uuid')
+    def test_backport_v2_2_partial_instance(self, mock_get):
+        mock_get.return_value = dict(self.fake_instance, host='foo')
+        inst = objects.Instance._from_db_columns(
+            self.context, objects.Instance(),
+            {'id': 1, 'uuid': uuids.instance})
+        primitive = inst.obj_to_primitive()
+        self.assertTrue(primitive['nova_object.partial'])
+        self.assertNotIn('host', primitive['nova_object.data'])
+        # The older versions get all the columns
+        primitive = inst.obj_to_primitive(target_version='2.1')
+        self.assertNotIn('nova_object.partial', primitive)
+        self.assertEqual('foo', primitive['nova_object.data']['host'])
+        self.assertNotIn('metadata', primitive['nova_object.data'])
+        self.assertEqual(1, mock_get.call_count)
+
     def test_get_remote(self):
         # isotime doesn't have microseconds and is always UTC
         self.mox.StubOutWithMock(db, 'instance_get_by_uuid')
@@ -1479,6 +1520,45 @@ class _TestInstanceListObject(object):
             self.assertEqual(self.context, inst_list.objects[i]._context)
         self.assertEqual(set(), inst_list.obj_what_changed())
 
+    @mock.patch.object(db, 'instance_get_by_uuid')
+    @mock.patch.object(db, 'instance_get_all_by_host')
+    def test_get_by_host_columns(self, mock_get_all, mock_get):
+        fake_inst = self.fake_instance(1, updates={'deleted': 2})
+        mock_get_all.return_value = [
+            {'id': 2, 'uuid': fake_inst['uuid'], 'task_state': None,
+             'deleted': 2}]
+        mock_get.return_value = fake_inst
+        inst_list = objects.InstanceList.get_by_host(self.context, 'foo',
+                                                     columns=['task_state'])
+        mock_get_all.assert_called_once_with(self.context, 'foo',
+                                             columns=['task_state'])
+
+        inst = inst_list[0]
+        self.assertTrue(inst.deleted)
+        self.assertIsNone(inst.task_state)
+        self.assertFalse(inst.obj_attr_is_set('host'))
+        self.assertEqual(set(), inst.obj_what_changed())
+        # The missing columns are loaded at once on demand
+        self.assertEqual(fake_inst['host'], inst.host)
+        self.assertEqual(fake_inst['vm_state'], inst.vm_state)
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual(set(), inst.obj_what_changed())
+        self.assertFalse(inst.obj_attr_is_set('metadata'))
+
+    @mock.patch.object(db, 'instance_get_all_by_filters_sort')
+    def test_get_by_filters_columns(self, mock_get_all):
+        fake_inst = self.fake_instance(1)
+        mock_get_all.return_value = [
+            {'id': 2, 'uuid': fake_inst['uuid'], 'deleted_at': None}]
+        inst_list = objects.InstanceList.get_by_filters(
+            self.context, {'foo': 'bar'}, limit=10, columns=['deleted_at'])
+        mock_get_all.assert_called_once_with(
+            self.context, {'foo': 'bar'}, limit=10, marker=None,
+            sort_keys=['created_at'], sort_dirs=['desc'],
+            columns=['deleted_at'])
+        self.assertEqual(fake_inst['uuid'], inst_list[0].uuid)
+        self.assertIsNone(inst_list[0].deleted_at)
+
     def test_get_by_host_and_node(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2)]
@@ -1642,6 +1722,44 @@ class _TestInstanceListObject(object):
         self.assertTrue(instances[0].obj_attr_is_set('system_metadata'))
         self.assertEqual({'foo': 'bar'}, instances[0].system_metadata)
 
+    @mock.patch.object(objects.VirtCPUModel, 'get_by_instance_uuid')
+    @mock.patch.object(objects.InstancePCIRequests, 'get_by_instance_uuid')
+    @mock.patch.object(objects.InstanceNUMATopology, 'get_by_instance_uuid')
+    @mock.patch.object(db, 'instance_get_all_by_filters')
+    def test_get_all_by_filters_extra(self, mock_get_all, mock_get_numa,
+                                      mock_get_pci, mock_get_vcpu):
+        flavor = objects.Flavor(id=1, name='m1.small', memory_mb=2048,
+                                vcpus=1, root_gb=20, ephemeral_gb=0,
+                                flavorid='2', swap=0, rxtx_factor=1.0,
+                                vcpu_weight=None, disabled=False,
+                                is_public=True, extra_specs={})
+        mock_get_all.return_value = [
+            fake_instance.fake_db_instance(id=i, instance_type=flavor)
+            for i in range(3)]
+
+        with mock.patch.object(jsonutils, 'loads',
+                               side_effect=jsonutils.loads) as mock_loads:
+            inst_list = objects.InstanceList.get_by_filters(
+                self.context, {}, expected_attrs=['flavor', 'numa_topology',
+                                                  'pci_requests',
+                                                  'vcpu_model'])
+
+        # The identical flavor blobs are deserialized only once
+        self.assertEqual(1, mock_loads.call_count)
+        self.assertEqual(3, len(inst_list))
+        for inst in inst_list:
+            self.assertEqual('m1.small', inst.flavor.name)
+            self.assertIsNone(inst.numa_topology)
+            self.assertEqual([], inst.pci_requests.requests)
+            self.assertIsNone(inst.vcpu_model)
+        # The flavors are not shared between the instances
+        inst_list[0].flavor.memory_mb = 4096
+        self.assertEqual(2048, inst_list[1].flavor.memory_mb)
+        # The NULL instance_extra columns are not loaded again
+        self.assertFalse(mock_get_numa.called)
+        self.assertFalse(mock_get_pci.called)
+        self.assertFalse(mock_get_vcpu.called)
+
     def test_get_by_grantee_security_group_ids(self):
         fake_instances = [
             fake_instance.fake_db_instance(id=1),
@@ -222,6 +222,27 @@ class _TestServiceObject(object):
                                          'fake-binary',
                                          include_disabled=True)
 
+    @mock.patch('nova.db.service_get_all_by_binary')
+    def test_get_by_binary_changed_since(self, mock_get):
+        mock_get.return_value = [fake_service]
+        changed_since = timeutils.utcnow()
+        services = service.ServiceList.get_by_binary(
+            self.context, 'fake-binary', changed_since=changed_since)
+        self.assertEqual(1, len(services))
+        mock_get.assert_called_once_with(self.context,
+                                         'fake-binary',
+                                         include_disabled=False,
+                                         changed_since=changed_since)
+
+    @mock.patch('nova.db.sqlalchemy.api._slave_is_fresh', return_value=True)
+    @mock.patch('nova.db.service_get_all_by_binary')
+    def test_get_by_binary_use_slave(self, mock_get, mock_fresh):
+        mock_get.return_value = [fake_service]
+        services = service.ServiceList.get_by_binary(
+            self.context, 'fake-binary', use_slave=10)
+        self.assertEqual(1, len(services))
+        mock_fresh.assert_called_once_with(10)
+
     def test_get_by_host(self):
         self.mox.StubOutWithMock(db, 'service_get_all_by_host')
         db.service_get_all_by_host(self.context, 'fake-host').AndReturn(
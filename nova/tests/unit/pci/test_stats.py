@@ -154,6 +154,41 @@ class PciDeviceStatsTestCase(test.NoDBTestCase):
             self.pci_stats.apply_requests,
             pci_requests_multiple)
 
+    def test_support_requests_same_pool(self):
+        # The devices consumed by the first request can't satisfy the second
+        requests = [objects.InstancePCIRequest(count=2,
+                        spec=[{'vendor_id': 'v1'}]),
+                    objects.InstancePCIRequest(count=1,
+                        spec=[{'vendor_id': 'v1'}])]
+        self.assertFalse(self.pci_stats.support_requests(requests))
+        self.assertTrue(self.pci_stats.support_requests(requests[:1]))
+        self.assertEqual(set([1, 2]), set(d['count'] for d in self.pci_stats))
+
+    def test_get_pools_for_spec_cached(self):
+        spec = [{'vendor_id': 'v1'}]
+        pools = self.pci_stats._get_pools_for_spec(spec)
+        self.assertEqual(['v1'], [pool['vendor_id'] for pool in pools])
+        with mock.patch.object(stats.utils,
+                               'pci_device_prop_match') as mock_match:
+            self.assertIs(pools, self.pci_stats._get_pools_for_spec(spec))
+        self.assertFalse(mock_match.called)
+
+    def test_get_pools_for_spec_all_index_keys(self):
+        spec = [{'vendor_id': 'v2', 'product_id': 'p2', 'numa_node': 1,
+                 'dev_type': fields.PciDeviceType.STANDARD}]
+        pools = self.pci_stats._get_pools_for_spec(spec)
+        self.assertEqual(['v2'], [pool['vendor_id'] for pool in pools])
+        spec[0]['numa_node'] = 0
+        self.assertEqual([], self.pci_stats._get_pools_for_spec(spec))
+
+    def test_get_pools_for_spec_invalidated(self):
+        spec = [{'vendor_id': 'v2'}]
+        self.assertEqual(1, len(self.pci_stats._get_pools_for_spec(spec)))
+        self.pci_stats.remove_device(self.fake_dev_2)
+        self.assertEqual([], self.pci_stats._get_pools_for_spec(spec))
+        self.pci_stats.add_device(self.fake_dev_2)
+        self.assertEqual(1, len(self.pci_stats._get_pools_for_spec(spec)))
+
     def test_consume_requests(self):
         devs = self.pci_stats.consume_requests(pci_requests)
         self.assertEqual(2, len(devs))
@@ -13,11 +13,14 @@
 import itertools
 import uuid
 
+import mock
+
 from nova import objects
 from nova.objects import fields
 from nova.scheduler.filters import numa_topology_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
+from nova.virt import hardware
 
 
 class TestNUMATopologyFilter(test.NoDBTestCase):
@@ -223,3 +226,18 @@ class TestNUMATopologyFilter(test.NoDBTestCase):
                                     'cpu_allocation_ratio': 16.0,
                                     'ram_allocation_ratio': 1.5})
         self.assertFalse(self.filt_cls.host_passes(host, spec_obj))
+
+    @mock.patch.object(hardware, 'numa_fit_instance_to_host')
+    def test_numa_topology_filter_fail_summary(self, mock_fit):
+        instance_topology = objects.InstanceNUMATopology(
+            cells=[objects.InstanceNUMACell(id=0, cpuset=set([1]),
+                                            memory=4096)])
+        spec_obj = self._get_spec_obj(numa_topology=instance_topology)
+        host = fakes.FakeHostState('host1', 'node1',
+                                   {'numa_topology': fakes.NUMA_TOPOLOGY,
+                                    'pci_stats': None,
+                                    'cpu_allocation_ratio': 16.0,
+                                    'ram_allocation_ratio': 1.5})
+        self.assertFalse(self.filt_cls.host_passes(host, spec_obj))
+        # The permutations of the host cells were not tried
+        self.assertFalse(mock_fit.called)
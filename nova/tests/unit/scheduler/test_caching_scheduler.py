@@ -95,6 +95,44 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual(1, len(result))
         self.assertEqual(result[0]["host"], fake_host.host)
 
+    @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
+                return_value={'numa_topology': None,
+                              'pci_requests': None})
+    def test_select_destination_publishes_shared_claims(self, mock_get_extra):
+        spec_obj = self._get_fake_request_spec()
+        fake_host = self._get_fake_host_state()
+        self.driver.all_host_states = [fake_host]
+        self.driver.shared_claims = mock.Mock()
+
+        result = self._test_select_destinations(spec_obj)
+
+        self.driver.shared_claims.apply.assert_called_once_with([fake_host])
+        self.driver.shared_claims.publish.assert_called_once_with(
+            spec_obj, result, mock.ANY)
+
+    def test_shared_claims_not_configured(self):
+        self.assertIsNone(self.driver.shared_claims)
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    @mock.patch.object(caching_scheduler.CachingScheduler,
+                       "_get_up_hosts")
+    def test_run_periodic_tasks_resets_shared_claims(self, mock_up_hosts,
+                                                     mock_init_agg,
+                                                     mock_init_inst):
+        self.flags(scheduler_shared_claims_file='/tmp/claims')
+        driver = caching_scheduler.CachingScheduler()
+        self.assertEqual('/tmp/claims', driver.shared_claims.path)
+        mock_up_hosts.return_value = ["asdf"]
+
+        with mock.patch.object(driver.shared_claims, 'reset') as mock_reset:
+            with mock.patch.object(driver.shared_claims,
+                                   'compact') as mock_compact:
+                driver.run_periodic_tasks(mock.Mock())
+
+        mock_reset.assert_called_once_with(["asdf"])
+        mock_compact.assert_called_once_with()
+
     def _test_select_destinations(self, spec_obj):
         return self.driver.select_destinations(
                 self.context, spec_obj)
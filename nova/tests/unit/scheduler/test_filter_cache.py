@@ -0,0 +1,177 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler filter result cache.
+"""
+
+import mock
+
+from nova import objects
+from nova.scheduler import filter_cache
+from nova.scheduler import filters
+from nova.scheduler.filters import aggregate_image_properties_isolation
+from nova.scheduler.filters import aggregate_instance_extra_specs
+from nova.scheduler.filters import all_hosts_filter
+from nova.scheduler.filters import availability_zone_filter
+from nova.scheduler.filters import compute_capabilities_filter
+from nova.scheduler.filters import image_props_filter
+from nova.scheduler.filters import ram_filter
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+class FilterResultCacheTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(FilterResultCacheTestCase, self).setUp()
+        self.cache = filter_cache.FilterResultCache()
+        self.filt_cls = compute_capabilities_filter.ComputeCapabilitiesFilter()
+        self.hosts = [
+            fakes.FakeHostState('host1', 'node1',
+                                {'hypervisor_type': 'QEMU',
+                                 'capabilities_signature': ('QEMU',)}),
+            fakes.FakeHostState('host2', 'node2',
+                                {'hypervisor_type': 'xen',
+                                 'capabilities_signature': ('xen',)})]
+        self.spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(
+                extra_specs={'capabilities:hypervisor_type': 'QEMU'}))
+
+    def _filter(self):
+        key = self.filt_cls.cache_key(self.spec_obj)
+        return list(self.cache.filter_all(self.filt_cls, self.hosts,
+                                          self.spec_obj, key))
+
+    def test_filter_all(self):
+        with mock.patch.object(self.filt_cls, 'host_passes',
+                side_effect=self.filt_cls.host_passes) as mock_passes:
+            self.assertEqual([self.hosts[0]], self._filter())
+            self.assertEqual([self.hosts[0]], self._filter())
+        self.assertEqual(2, mock_passes.call_count)
+        self.assertEqual({'hits': 2, 'misses': 2, 'hit_rate': 50.0},
+                         self.cache.get_stats())
+
+    def test_filter_all_capabilities_changed(self):
+        self.assertEqual([self.hosts[0]], self._filter())
+        # The cached result is used while the signature doesn't change
+        self.hosts[1].hypervisor_type = 'QEMU'
+        self.assertEqual([self.hosts[0]], self._filter())
+        self.hosts[1].capabilities_signature = ('QEMU',)
+        self.assertEqual(self.hosts, self._filter())
+        self.assertEqual({'hits': 3, 'misses': 3, 'hit_rate': 50.0},
+                         self.cache.get_stats())
+
+    def test_filter_all_other_key(self):
+        self.assertEqual([self.hosts[0]], self._filter())
+        self.spec_obj.flavor.extra_specs = {
+            'capabilities:hypervisor_type': 'xen'}
+        self.assertEqual([self.hosts[1]], self._filter())
+        self.assertEqual(0, self.cache.hits)
+
+    def test_clear(self):
+        self._filter()
+        self.cache.clear()
+        self._filter()
+        self.assertEqual(0, self.cache.hits)
+
+    @mock.patch.object(filter_cache, 'MAX_RESULTS_PER_HOST', 1)
+    def test_max_results_per_host(self):
+        self._filter()
+        self.spec_obj.flavor.extra_specs = {
+            'capabilities:hypervisor_type': 'xen'}
+        self._filter()
+        self.spec_obj.flavor.extra_specs = {
+            'capabilities:hypervisor_type': 'QEMU'}
+        self._filter()
+        self.assertEqual(0, self.cache.hits)
+
+    def test_get_stats_empty(self):
+        self.assertEqual({'hits': 0, 'misses': 0, 'hit_rate': 0.0},
+                         self.cache.get_stats())
+
+    def test_handler_uses_cache_key(self):
+        handler = filters.HostFilterHandler()
+        handler.result_cache = self.cache
+        filt_clss = [self.filt_cls, all_hosts_filter.AllHostsFilter()]
+        with mock.patch.object(self.cache, 'filter_all',
+                               return_value=[self.hosts[0]]) as mock_filter:
+            result = handler.get_filtered_objects(filt_clss, self.hosts,
+                                                  self.spec_obj)
+        self.assertEqual([self.hosts[0]], result)
+        mock_filter.assert_called_once_with(
+            self.filt_cls, self.hosts, self.spec_obj,
+            (('capabilities:hypervisor_type', 'QEMU'),))
+
+
+class FilterCacheKeyTestCase(test.NoDBTestCase):
+
+    def test_base_filter(self):
+        self.assertIsNone(ram_filter.RamFilter().cache_key(
+            objects.RequestSpec()))
+
+    def test_availability_zone_filter(self):
+        filt_cls = availability_zone_filter.AvailabilityZoneFilter()
+        self.assertEqual('nova', filt_cls.cache_key(
+            objects.RequestSpec(availability_zone='nova')))
+
+    def test_image_props_filter(self):
+        filt_cls = image_props_filter.ImagePropertiesFilter()
+        image = objects.ImageMeta(properties=objects.ImageMetaProps(
+            hw_architecture='x86_64', img_hv_type='kvm'))
+        self.assertEqual(('x86_64', 'kvm', None, None),
+                         filt_cls.cache_key(objects.RequestSpec(image=image)))
+        self.assertEqual((None, None, None, None),
+                         filt_cls.cache_key(objects.RequestSpec(image=None)))
+
+    def test_aggregate_image_properties_isolation(self):
+        filt_cls = (aggregate_image_properties_isolation.
+                    AggregateImagePropertiesIsolation())
+        image = objects.ImageMeta(properties=objects.ImageMetaProps(
+            hw_vm_mode='hvm', hw_architecture='x86_64'))
+        self.assertEqual((('hw_architecture', 'x86_64'),
+                          ('hw_vm_mode', 'hvm')),
+                         filt_cls.cache_key(objects.RequestSpec(image=image)))
+        self.assertEqual((),
+                         filt_cls.cache_key(objects.RequestSpec(image=None)))
+
+    def test_aggregate_instance_extra_specs(self):
+        filt_cls = (aggregate_instance_extra_specs.
+                    AggregateInstanceExtraSpecsFilter())
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(extra_specs={'opt2': '2', 'opt1': '1'}))
+        self.assertEqual((('opt1', '1'), ('opt2', '2')),
+                         filt_cls.cache_key(spec_obj))
+        self.assertEqual((), filt_cls.cache_key(
+            objects.RequestSpec(flavor=objects.Flavor())))
+
+    def test_compute_capabilities_filter(self):
+        filt_cls = compute_capabilities_filter.ComputeCapabilitiesFilter()
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(extra_specs={
+                'capabilities:cpu_info:arch': 'x86_64',
+                'hw:cpu_policy': 'dedicated'}))
+        self.assertEqual((('capabilities:cpu_info:arch', 'x86_64'),
+                          ('hw:cpu_policy', 'dedicated')),
+                         filt_cls.cache_key(spec_obj))
+
+    def test_compute_capabilities_filter_not_cacheable(self):
+        filt_cls = compute_capabilities_filter.ComputeCapabilitiesFilter()
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(extra_specs={'free_ram_mb': '>= 1024'}))
+        self.assertIsNone(filt_cls.cache_key(spec_obj))
+
+    def test_compute_capabilities_filter_stats_not_cacheable(self):
+        filt_cls = compute_capabilities_filter.ComputeCapabilitiesFilter()
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(extra_specs={
+                'capabilities:stats:num_instances': '<= 10'}))
+        self.assertIsNone(filt_cls.cache_key(spec_obj))
@@ -21,9 +21,11 @@ import mock
 from nova import exception
 from nova import objects
 from nova.scheduler import filter_scheduler
+from nova.scheduler.filters import ram_filter
 from nova.scheduler import host_manager
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
+from nova.scheduler.weights import ram
 from nova import test  # noqa
 from nova.tests.unit.scheduler import fakes
 from nova.tests.unit.scheduler import test_scheduler
@@ -331,3 +333,91 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 # Make sure that the consumed hosts have chance to be reverted.
                 for host in consumed_hosts:
                     self.assertIsNone(host.obj.updated)
+
+    def _get_batch_hosts(self):
+        return [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                    {'free_ram_mb': free_ram_mb,
+                                     'total_usable_ram_mb': 4096,
+                                     'ram_allocation_ratio': 1.0})
+                for i, free_ram_mb in enumerate([4096, 1024, 3072, 512])]
+
+    def _schedule_batch_hosts(self, num_instances, batch_placement):
+        self.flags(scheduler_batch_placement=batch_placement,
+                   scheduler_host_subset_size=1)
+        self.driver.host_manager.default_filters = [ram_filter.RamFilter()]
+        self.driver.host_manager.weighers = [ram.RAMWeigher()]
+
+        spec_obj = objects.RequestSpec(
+            num_instances=num_instances,
+            flavor=objects.Flavor(memory_mb=1024,
+                                  root_gb=0,
+                                  ephemeral_gb=0,
+                                  vcpus=1),
+            project_id=1,
+            uuid='fake-uuid',
+            pci_requests=None,
+            numa_topology=None,
+            instance_group=None,
+            instance_uuid='fake-uuid',
+            ignore_hosts=None,
+            force_hosts=None,
+            force_nodes=None)
+
+        with mock.patch.object(self.driver, '_get_all_host_states',
+                               return_value=iter(self._get_batch_hosts())):
+            return [weighed_host.obj.host for weighed_host in
+                    self.driver._schedule(self.context, spec_obj)]
+
+    def test_schedule_batch_placement(self):
+        expected = self._schedule_batch_hosts(8, False)
+        with mock.patch.object(self.driver, '_schedule_batch',
+                side_effect=self.driver._schedule_batch) as mock_batch:
+            self.assertEqual(expected, self._schedule_batch_hosts(8, True))
+            self.assertTrue(mock_batch.called)
+        self.assertEqual(['host0', 'host0', 'host2', 'host0', 'host2',
+                          'host0', 'host1', 'host2'], expected)
+
+    def test_schedule_batch_placement_not_enough_hosts(self):
+        self.assertEqual(self._schedule_batch_hosts(12, False),
+                         self._schedule_batch_hosts(12, True))
+
+    def test_schedule_batch_placement_refilters_chosen_host_only(self):
+        host_manager = self.driver.host_manager
+        with test.nested(
+            mock.patch.object(host_manager, 'get_filtered_hosts',
+                              side_effect=host_manager.get_filtered_hosts),
+            mock.patch.object(host_manager, 'host_passes_filters',
+                              side_effect=host_manager.host_passes_filters)
+        ) as (mock_filter, mock_passes):
+            self.assertEqual(['host0', 'host0', 'host2'],
+                             self._schedule_batch_hosts(3, True))
+        self.assertEqual(1, mock_filter.call_count)
+        self.assertEqual(['host0', 'host0', 'host2'],
+                         [call[0][0].host
+                          for call in mock_passes.call_args_list])
+
+    def test_schedule_batch_placement_skipped_for_server_groups(self):
+        self.flags(scheduler_batch_placement=True)
+        spec_obj = objects.RequestSpec(
+            num_instances=2,
+            flavor=objects.Flavor(memory_mb=512,
+                                  root_gb=0,
+                                  ephemeral_gb=0,
+                                  vcpus=1),
+            project_id=1,
+            pci_requests=None,
+            numa_topology=None,
+            ignore_hosts=None,
+            force_hosts=None,
+            force_nodes=None,
+            instance_uuid='fake-uuid',
+            instance_group=objects.InstanceGroup(hosts=[]))
+
+        with test.nested(
+            mock.patch.object(self.driver, '_get_all_host_states',
+                              return_value=iter([])),
+            mock.patch.object(self.driver, '_schedule_batch')
+        ) as (mock_get_hosts, mock_batch):
+            self.assertEqual([], self.driver._schedule(self.context,
+                                                       spec_obj))
+        self.assertFalse(mock_batch.called)
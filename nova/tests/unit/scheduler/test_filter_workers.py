@@ -0,0 +1,165 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler filter worker processes.
+"""
+
+import mock
+from oslo_serialization import jsonutils
+
+from nova import objects
+from nova.scheduler import filter_workers
+from nova.scheduler import filters
+from nova.scheduler.filters import json_filter
+from nova.scheduler.filters import ram_filter
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+class FailingFilter(filters.BaseHostFilter):
+    parallelizable = True
+
+    def host_passes(self, host_state, spec_obj):
+        raise ValueError('fail')
+
+
+class FilterWorkerPoolTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(FilterWorkerPoolTestCase, self).setUp()
+        self.pool = filter_workers.FilterWorkerPool(2)
+        self.addCleanup(self.pool.stop)
+        self.filt_cls = json_filter.JsonFilter()
+        self.hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                          {'free_ram_mb': 256 * i,
+                                           'limits': {'vcpu': i}})
+                      for i in range(7)]
+        query = jsonutils.dumps(['>=', '$free_ram_mb', 512])
+        self.spec_obj = objects.RequestSpec(
+            scheduler_hints={'query': [query]},
+            instance_uuid='fake-uuid')
+
+    @mock.patch.object(filter_workers, 'MIN_HOSTS_PER_WORKER', 1)
+    def test_filter_all(self):
+        with mock.patch.object(self.filt_cls, 'host_passes') as mock_passes:
+            result = self.pool.filter_all(self.filt_cls, self.hosts,
+                                          self.spec_obj)
+            # The filter was run in the worker processes
+            self.assertFalse(mock_passes.called)
+
+        self.assertEqual(self.hosts[2:], result)
+        self.assertEqual([{'vcpu': i} for i in range(2, 7)],
+                         [host.limits for host in result])
+
+    @mock.patch.object(filter_workers, 'MIN_HOSTS_PER_WORKER', 1)
+    def test_filter_all_updates_limits(self):
+        self.filt_cls = ram_filter.RamFilter()
+        for host in self.hosts:
+            host.total_usable_ram_mb = 2048
+            host.ram_allocation_ratio = 1.5
+        self.spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(memory_mb=512))
+
+        result = self.pool.filter_all(self.filt_cls, self.hosts,
+                                      self.spec_obj)
+
+        self.assertEqual(self.hosts, result)
+        for host in result:
+            self.assertEqual(3072, host.limits['memory_mb'])
+
+    @mock.patch.object(filter_workers, 'MIN_HOSTS_PER_WORKER', 1)
+    def test_filter_all_sends_changed_hosts(self):
+        self.pool.filter_all(self.filt_cls, self.hosts, self.spec_obj)
+        workers = self.pool._workers
+        self.assertEqual([4, 3], [len(worker.generations)
+                                  for worker in workers])
+
+        # Only the changed host state is sent again
+        self.flags(scheduler_filter_workers=2)
+        self.hosts[0].free_ram_mb = 1024
+        self.hosts[0].increment_generation()
+        with mock.patch.object(filter_workers._Worker, 'send',
+                               autospec=True,
+                               side_effect=filter_workers._Worker.send) as (
+                mock_send):
+            result = self.pool.filter_all(self.filt_cls, self.hosts,
+                                          self.spec_obj)
+        self.assertEqual([self.hosts[0]] + self.hosts[2:], result)
+        updates = [call[0][1][2] for call in mock_send.call_args_list]
+        self.assertEqual([['host0'], []],
+                         [[key[0] for key in update] for update in updates])
+        self.assertIs(workers, self.pool._workers)
+
+    @mock.patch.object(filter_workers, 'MIN_HOSTS_PER_WORKER', 1)
+    def test_discard(self):
+        self.pool.filter_all(self.filt_cls, self.hosts, self.spec_obj)
+        self.pool.discard(('host0', 'node0'))
+        worker = self.pool._workers[0]
+        self.assertEqual(set([('host0', 'node0')]), worker.discarded)
+        self.assertNotIn(('host0', 'node0'), worker.generations)
+
+        result = self.pool.filter_all(self.filt_cls, self.hosts[1:],
+                                      self.spec_obj)
+        self.assertEqual(self.hosts[2:], result)
+        self.assertEqual(set(), worker.discarded)
+
+    @mock.patch.object(filter_workers, 'MIN_HOSTS_PER_WORKER', 1)
+    def test_stop(self):
+        self.pool.filter_all(self.filt_cls, self.hosts, self.spec_obj)
+        processes = [worker.process for worker in self.pool._workers]
+        self.pool.stop()
+        self.assertIsNone(self.pool._workers)
+        for process in processes:
+            self.assertIsNotNone(process.returncode)
+
+    def test_filter_all_not_enough_hosts(self):
+        with mock.patch.object(self.pool, '_filter_shards') as mock_shards:
+            result = self.pool.filter_all(self.filt_cls, self.hosts,
+                                          self.spec_obj)
+        self.assertFalse(mock_shards.called)
+        self.assertEqual(self.hosts[2:], result)
+
+    @mock.patch.object(filter_workers, 'MIN_HOSTS_PER_WORKER', 1)
+    def test_filter_all_error(self):
+        filt_cls = FailingFilter()
+        with mock.patch.object(filt_cls, 'host_passes',
+                               return_value=True) as mock_passes:
+            with mock.patch.object(filter_workers.LOG,
+                                   'warning') as mock_warning:
+                result = self.pool.filter_all(filt_cls, self.hosts,
+                                              self.spec_obj)
+        self.assertTrue(mock_warning.called)
+        # The filter was run in the scheduler
+        self.assertEqual(self.hosts, result)
+        self.assertEqual(7, mock_passes.call_count)
+        self.assertIsNone(self.pool._workers)
+
+    def test_handler_uses_worker_pool(self):
+        handler = filters.HostFilterHandler()
+        handler.worker_pool = mock.Mock()
+        handler.worker_pool.filter_all.return_value = self.hosts[2:]
+        result = handler.get_filtered_objects([self.filt_cls], self.hosts,
+                                              self.spec_obj)
+        self.assertEqual(self.hosts[2:], result)
+        handler.worker_pool.filter_all.assert_called_once_with(
+            self.filt_cls, self.hosts, self.spec_obj)
+
+    def test_handler_not_parallelizable_filter(self):
+        handler = filters.HostFilterHandler()
+        handler.worker_pool = mock.Mock()
+        filt_cls = ram_filter.RamFilter()
+        with mock.patch.object(filt_cls, 'filter_all',
+                               return_value=[]) as mock_filter_all:
+            handler.get_filtered_objects([filt_cls], self.hosts,
+                                         self.spec_obj)
+        self.assertTrue(mock_filter_all.called)
+        self.assertFalse(handler.worker_pool.filter_all.called)
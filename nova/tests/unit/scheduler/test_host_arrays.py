@@ -0,0 +1,235 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the vectorized scheduler filters and weighers.
+"""
+
+import mock
+import testtools
+
+from nova import objects
+from nova.scheduler import filters
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_arrays
+from nova.scheduler import weights
+from nova.scheduler.weights import disk
+from nova.scheduler.weights import io_ops
+from nova.scheduler.weights import ram
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+def _get_all_hosts():
+    host_values = [
+        ('host1', 'node1', {'free_ram_mb': 512, 'total_usable_ram_mb': 1024,
+                            'ram_allocation_ratio': 1.0,
+                            'free_disk_mb': 20 * 1024,
+                            'total_usable_disk_gb': 20,
+                            'disk_allocation_ratio': 1.0,
+                            'vcpus_total': 4, 'vcpus_used': 3,
+                            'cpu_allocation_ratio': 1.0,
+                            'num_io_ops': 0, 'num_instances': 3}),
+        ('host2', 'node2', {'free_ram_mb': -1024, 'total_usable_ram_mb': 2048,
+                            'ram_allocation_ratio': 2.0,
+                            'free_disk_mb': 1024,
+                            'total_usable_disk_gb': 10,
+                            'disk_allocation_ratio': 2.0,
+                            'vcpus_total': 4, 'vcpus_used': 7,
+                            'cpu_allocation_ratio': 2.0,
+                            'num_io_ops': 8, 'num_instances': 50}),
+        ('host3', 'node3', {'free_ram_mb': 3072, 'total_usable_ram_mb': 4096,
+                            'ram_allocation_ratio': 1.5,
+                            'free_disk_mb': 512,
+                            'total_usable_disk_gb': 5,
+                            'disk_allocation_ratio': 1.0,
+                            'vcpus_total': 0, 'vcpus_used': 0,
+                            'cpu_allocation_ratio': 16.0,
+                            'num_io_ops': 7, 'num_instances': 49}),
+        ('host4', 'node4', {'free_ram_mb': 8192, 'total_usable_ram_mb': 8192,
+                            'ram_allocation_ratio': 1.0,
+                            'free_disk_mb': 100 * 1024,
+                            'total_usable_disk_gb': 100,
+                            'disk_allocation_ratio': 1.0,
+                            'vcpus_total': 1, 'vcpus_used': 0,
+                            'cpu_allocation_ratio': 16.0,
+                            'num_io_ops': 2, 'num_instances': 0}),
+    ]
+    return [fakes.FakeHostState(host, node, values)
+            for host, node, values in host_values]
+
+
+def _get_spec_obj(**flavor_values):
+    values = {'memory_mb': 1024, 'root_gb': 1, 'ephemeral_gb': 1,
+              'swap': 512, 'vcpus': 2}
+    values.update(flavor_values)
+    return objects.RequestSpec(flavor=objects.Flavor(**values))
+
+
+@testtools.skipIf(host_arrays.numpy is None, 'NumPy is not installed')
+class HostStateArraysTestCase(test.NoDBTestCase):
+
+    def test_getitem(self):
+        hosts = _get_all_hosts()
+        arrays = host_arrays.HostStateArrays(hosts)
+        self.assertEqual([512, -1024, 3072, 8192],
+                         arrays['free_ram_mb'].tolist())
+        self.assertIs(arrays['free_ram_mb'], arrays['free_ram_mb'])
+
+    def test_select(self):
+        hosts = _get_all_hosts()
+        arrays = host_arrays.HostStateArrays(hosts)
+        arrays['free_ram_mb']
+        mask = host_arrays.numpy.array([True, False, True, False])
+        selected = arrays.select(mask)
+        self.assertEqual([hosts[0], hosts[2]], selected.objs)
+        self.assertEqual([512, 3072], selected['free_ram_mb'].tolist())
+        self.assertIs(arrays, arrays.select(mask | True))
+
+    def test_restrict(self):
+        hosts = _get_all_hosts()
+        arrays = host_arrays.HostStateArrays(hosts)
+        arrays['num_io_ops']
+        restricted = arrays.restrict([hosts[3], hosts[1]])
+        self.assertEqual([hosts[3], hosts[1]], restricted.objs)
+        self.assertEqual([2, 8], restricted['num_io_ops'].tolist())
+        self.assertIs(arrays, arrays.restrict(list(hosts)))
+
+    def test_normalize(self):
+        numpy = host_arrays.numpy
+        normalize = host_arrays.HostStateArrays.normalize
+        self.assertEqual([0.0, 0.5, 1.0],
+                         normalize(numpy.array([1.0, 2.0, 3.0])).tolist())
+        self.assertEqual([0.0, 0.0],
+                         normalize(numpy.array([2.0, 2.0])).tolist())
+        self.assertEqual([0.5, 1.0],
+                         normalize(numpy.array([2.0, 4.0]),
+                                   minval=0).tolist())
+
+
+@testtools.skipIf(host_arrays.numpy is None, 'NumPy is not installed')
+class VectorizedFiltersTestCase(test.NoDBTestCase):
+    """Check that the vectorized filters give the same results as their per
+    host version.
+    """
+
+    def setUp(self):
+        super(VectorizedFiltersTestCase, self).setUp()
+        self.flags(max_io_ops_per_host=8, max_instances_per_host=50)
+
+    def _test_filter(self, filt_cls, spec_obj):
+        hosts = _get_all_hosts()
+        expected = [filt_cls.host_passes(host, spec_obj) for host in hosts]
+        expected_limits = [dict(host.limits) for host in hosts]
+
+        hosts = _get_all_hosts()
+        arrays = host_arrays.HostStateArrays(hosts)
+        passes = filt_cls.filter_arrays(arrays, spec_obj)
+
+        self.assertEqual(expected, passes.tolist())
+        self.assertEqual(expected_limits, [host.limits for host in hosts])
+
+    def test_ram_filter(self):
+        for memory_mb in (512, 1024, 2048, 4096):
+            self._test_filter(ram_filter.RamFilter(),
+                              _get_spec_obj(memory_mb=memory_mb))
+
+    def test_core_filter(self):
+        for vcpus in (1, 2, 4):
+            self._test_filter(core_filter.CoreFilter(),
+                              _get_spec_obj(vcpus=vcpus))
+
+    def test_disk_filter(self):
+        for root_gb in (0, 1, 10, 40):
+            self._test_filter(disk_filter.DiskFilter(),
+                              _get_spec_obj(root_gb=root_gb))
+
+    def test_io_ops_filter(self):
+        self._test_filter(io_ops_filter.IoOpsFilter(), _get_spec_obj())
+
+    def test_num_instances_filter(self):
+        self._test_filter(num_instances_filter.NumInstancesFilter(),
+                          _get_spec_obj())
+
+    def test_aggregate_filters_not_vectorized(self):
+        self.assertFalse(ram_filter.AggregateRamFilter.vectorized)
+        self.assertFalse(core_filter.AggregateCoreFilter.vectorized)
+        self.assertFalse(disk_filter.AggregateDiskFilter.vectorized)
+        self.assertFalse(io_ops_filter.AggregateIoOpsFilter.vectorized)
+        self.assertFalse(
+            num_instances_filter.AggregateNumInstancesFilter.vectorized)
+
+    def test_handler_mixes_vectorized_and_per_host_filters(self):
+        self.flags(scheduler_use_vectorized_filters=True)
+        handler = filters.HostFilterHandler()
+        self.assertEqual(host_arrays.HostStateArrays, handler.arrays_class)
+        filt_clss = [ram_filter.RamFilter(),
+                     io_ops_filter.AggregateIoOpsFilter(),
+                     num_instances_filter.NumInstancesFilter()]
+        hosts = _get_all_hosts()
+        spec_obj = _get_spec_obj(memory_mb=512)
+
+        with mock.patch.object(ram_filter.RamFilter, 'host_passes') as hp:
+            result = handler.get_filtered_objects(filt_clss, hosts, spec_obj)
+            self.assertFalse(hp.called)
+
+        self.assertEqual([hosts[0], hosts[2], hosts[3]], result)
+
+    def test_handler_not_vectorized_by_default(self):
+        self.assertIsNone(filters.HostFilterHandler().arrays_class)
+
+    @mock.patch.object(host_arrays, 'numpy', None)
+    def test_handler_without_numpy(self):
+        self.flags(scheduler_use_vectorized_filters=True)
+        self.assertIsNone(filters.HostFilterHandler().arrays_class)
+        self.assertIsNone(weights.HostWeightHandler().arrays_class)
+
+
+@testtools.skipIf(host_arrays.numpy is None, 'NumPy is not installed')
+class VectorizedWeighersTestCase(test.NoDBTestCase):
+    """Check that the vectorized weighers give the same results as their per
+    host version.
+    """
+
+    def _get_weighed_hosts(self, weighers, vectorized):
+        self.flags(scheduler_use_vectorized_filters=vectorized)
+        handler = weights.HostWeightHandler()
+        return [(weighed.obj.host, weighed.weight)
+                for weighed in handler.get_weighed_objects(
+                    weighers, _get_all_hosts(), {})]
+
+    def _test_weighers(self, weigher_classes):
+        expected = self._get_weighed_hosts(
+            [cls() for cls in weigher_classes], False)
+        result = self._get_weighed_hosts(
+            [cls() for cls in weigher_classes], True)
+        self.assertEqual([host for host, weight in expected],
+                         [host for host, weight in result])
+        for (host, expected_weight), (host, weight) in zip(expected, result):
+            self.assertAlmostEqual(expected_weight, weight)
+
+    def test_ram_weigher(self):
+        self._test_weighers([ram.RAMWeigher])
+
+    def test_disk_weigher(self):
+        self._test_weighers([disk.DiskWeigher])
+
+    def test_io_ops_weigher(self):
+        self._test_weighers([io_ops.IoOpsWeigher])
+
+    def test_multiple_weighers(self):
+        self.flags(ram_weight_multiplier=2.0, io_ops_weight_multiplier=-1.0)
+        self._test_weighers([ram.RAMWeigher, disk.DiskWeigher,
+                             io_ops.IoOpsWeigher])
@@ -21,6 +21,8 @@ import datetime
 
 import mock
 from oslo_serialization import jsonutils
+from oslo_utils import fixture as utils_fixture
+from oslo_utils import timeutils
 from oslo_utils import versionutils
 import six
 
@@ -40,6 +42,7 @@ from nova.tests.unit import fake_instance
 from nova.tests.unit import matchers
 from nova.tests.unit.scheduler import fakes
 from nova.tests import uuidsentinel as uuids
+from nova.virt import hardware
 
 CONF = nova.conf.CONF
 
@@ -176,6 +179,18 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual({'fake-host': set([])},
                          self.host_manager.host_aggregates_map)
 
+    def test_update_aggregates_clears_filter_cache(self):
+        self.host_manager.filter_cache = mock.Mock()
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'])
+        self.host_manager.update_aggregates([fake_agg])
+        self.host_manager.filter_cache.clear.assert_called_once_with()
+
+    def test_delete_aggregate_clears_filter_cache(self):
+        self.host_manager.filter_cache = mock.Mock()
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'])
+        self.host_manager.delete_aggregate(fake_agg)
+        self.host_manager.filter_cache.clear.assert_called_once_with()
+
     def test_choose_host_filters_not_found(self):
         self.assertRaises(exception.SchedulerHostFilterNotFound,
                           self.host_manager._choose_host_filters,
@@ -786,6 +801,21 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 4)
 
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_get_all_host_states_records_stats(self, mock_get_by_host,
+                                               mock_get_all,
+                                               mock_get_by_binary):
+        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_all.return_value = fakes.COMPUTE_NODES
+        mock_get_by_binary.return_value = fakes.SERVICES
+        self.host_manager.stats = mock.Mock()
+
+        self.host_manager.get_all_host_states('fake_context')
+        self.host_manager.stats.record_phase.assert_called_once_with(
+            'get_all_host_states', mock.ANY)
+
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
     @mock.patch('nova.objects.InstanceList.get_by_host')
@@ -831,6 +861,98 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 0)
 
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_get_all_host_states_no_incremental_refresh(self,
+                                                        mock_get_by_host,
+                                                        mock_get_all,
+                                                        mock_get_changed,
+                                                        mock_get_by_binary):
+        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_all.return_value = fakes.COMPUTE_NODES
+        mock_get_by_binary.return_value = fakes.SERVICES
+        context = 'fake_context'
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, mock_get_all.call_count)
+        self.assertFalse(mock_get_changed.called)
+        self.assertEqual({}, self.host_manager._compute_nodes)
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_get_all_host_states_incremental_refresh(self, mock_get_by_host,
+                                                     mock_get_all,
+                                                     mock_get_changed,
+                                                     mock_get_by_binary):
+        self.flags(scheduler_host_state_full_refresh_interval=300)
+        now = timeutils.utcnow()
+        self.useFixture(utils_fixture.TimeFixture(now))
+        updated_node = fakes.COMPUTE_NODES[0].obj_clone()
+        updated_node.free_ram_mb = 256
+        updated_node.deleted = False
+        deleted_node = fakes.COMPUTE_NODES[3].obj_clone()
+        deleted_node.deleted = True
+        services = [service.obj_clone() for service in fakes.SERVICES]
+        for service_id, service in enumerate(services, 1):
+            service.id = service_id
+        deleted_service = services[3].obj_clone()
+        deleted_service.deleted = True
+        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_all.return_value = fakes.COMPUTE_NODES
+        mock_get_changed.return_value = [updated_node, deleted_node]
+        mock_get_by_binary.side_effect = [services, [deleted_service]]
+        context = 'fake_context'
+
+        # first call: all nodes
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(4, len(host_states_map))
+
+        # second call: only the changed nodes
+        with mock.patch.object(host_manager.HostState,
+                               '_update_from_compute_node') as mock_update:
+            self.host_manager.get_all_host_states(context)
+        mock_update.assert_called_once_with(updated_node)
+        self.assertEqual(3, len(host_states_map))
+        self.assertNotIn(('host4', 'node4'), host_states_map)
+        self.assertNotIn('host4', self.host_manager._services)
+        overlap = host_manager.HOST_STATE_REFRESH_OVERLAP
+        mock_get_all.assert_called_once_with(context, use_slave=overlap)
+        changed_since = now - datetime.timedelta(seconds=overlap)
+        mock_get_changed.assert_called_once_with(context, changed_since,
+                                                 use_slave=overlap)
+        mock_get_by_binary.assert_called_with(context, 'nova-compute',
+                                              include_disabled=True,
+                                              changed_since=changed_since,
+                                              use_slave=overlap)
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_get_all_host_states_incremental_refresh_expired(
+            self, mock_get_by_host, mock_get_all, mock_get_changed,
+            mock_get_by_binary):
+        self.flags(scheduler_host_state_full_refresh_interval=300)
+        time_fixture = self.useFixture(
+            utils_fixture.TimeFixture(timeutils.utcnow()))
+        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_all.return_value = fakes.COMPUTE_NODES
+        mock_get_by_binary.return_value = fakes.SERVICES
+        context = 'fake_context'
+
+        self.host_manager.get_all_host_states(context)
+        time_fixture.advance_time_seconds(301)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, mock_get_all.call_count)
+        self.assertFalse(mock_get_changed.called)
+        self.assertEqual(4, len(self.host_manager.host_state_map))
+
 
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
@@ -838,6 +960,57 @@ class HostStateTestCase(test.NoDBTestCase):
     # update_from_compute_node() and consume_from_request() are tested
     # in HostManagerTestCase.test_get_all_host_states()
 
+    def test_generation(self):
+        self.flags(scheduler_filter_workers=2)
+        host = host_manager.HostState("fakehost", "fakenode")
+        other = host_manager.HostState("otherhost", "othernode")
+        self.assertNotEqual(host.generation, other.generation)
+
+        host.update(aggregates=[], service={'disabled': False})
+        generation = host.generation
+        # Nothing changed
+        host.update(aggregates=[], service={'disabled': False},
+                    inst_dict=host.instances)
+        self.assertEqual(generation, host.generation)
+
+        host.update(service={'disabled': True})
+        self.assertGreater(host.generation, generation)
+
+        generation = host.generation
+        host.consume_from_request(objects.RequestSpec(
+            flavor=objects.Flavor(root_gb=0, ephemeral_gb=0, memory_mb=512,
+                                  vcpus=1),
+            pci_requests=None, numa_topology=None))
+        self.assertGreater(host.generation, generation)
+
+    @mock.patch.object(host_manager.HostState, '_update_from_compute_node')
+    def test_generation_compute_and_instances(self, mock_update_from_cn):
+        self.flags(scheduler_filter_workers=2)
+        host = host_manager.HostState("fakehost", "fakenode")
+        host.update(inst_dict={uuids.instance1: mock.sentinel.instance1})
+        generation = host.generation
+
+        # The compute node applied before and the same instances, read again
+        mock_update_from_cn.return_value = False
+        host.update(compute=mock.sentinel.compute,
+                    inst_dict={uuids.instance1: mock.sentinel.instance1})
+        self.assertEqual(generation, host.generation)
+
+        mock_update_from_cn.return_value = True
+        host.update(compute=mock.sentinel.compute)
+        self.assertGreater(host.generation, generation)
+
+        generation = host.generation
+        host.update(inst_dict={uuids.instance1: mock.sentinel.instance1,
+                               uuids.instance2: mock.sentinel.instance2})
+        self.assertGreater(host.generation, generation)
+
+    def test_generation_without_workers(self):
+        host = host_manager.HostState("fakehost", "fakenode")
+        generation = host.generation
+        host.update(aggregates=['agg'], service={'disabled': True})
+        self.assertEqual(generation, host.generation)
+
     @mock.patch('nova.utils.synchronized',
                 side_effect=lambda a: lambda f: lambda *args: f(*args))
     def test_stat_consumption_from_compute_node(self, sync_mock):
@@ -882,6 +1055,9 @@ class HostStateTestCase(test.NoDBTestCase):
         self.assertEqual('cpu_info', host.cpu_info)
         self.assertEqual([], host.supported_instances)
         self.assertEqual(hyper_ver_int, host.hypervisor_version)
+        self.assertEqual((host.host_ip, 'htype', hyper_ver_int, 'hostname',
+                          'cpu_info', []),
+                         host.capabilities_signature)
 
     def test_stat_consumption_from_compute_node_non_pci(self):
         stats = {
@@ -1116,3 +1292,21 @@ class HostStateTestCase(test.NoDBTestCase):
         self.assertEqual({'0': 10, '1': 43},
                          host.metrics[1].numa_membw_values)
         self.assertIsInstance(host.numa_topology, six.string_types)
+
+    def test_get_numa_fit_summary(self):
+        host = host_manager.HostState("fakehost", "fakenode")
+        self.assertIsNone(host.get_numa_fit_summary())
+
+        host.numa_topology = fakes.NUMA_TOPOLOGY._to_json()
+        with mock.patch.object(hardware, 'numa_fit_summary',
+                               side_effect=hardware.numa_fit_summary
+                               ) as mock_summary:
+            summary = host.get_numa_fit_summary()
+            self.assertEqual(len(fakes.NUMA_TOPOLOGY.cells), len(summary))
+            self.assertIs(summary, host.get_numa_fit_summary())
+            self.assertEqual(1, mock_summary.call_count)
+
+            # The summary is computed again once the topology changed
+            host.numa_topology = fakes.NUMA_TOPOLOGY._to_json()
+            self.assertIsNot(summary, host.get_numa_fit_summary())
+            self.assertEqual(2, mock_summary.call_count)
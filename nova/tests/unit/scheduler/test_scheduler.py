@@ -115,6 +115,16 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
         manager = self.manager
         self.assertIsInstance(manager.driver, self.driver_cls)
 
+    @mock.patch.object(host_manager.HostManager, 'stop_filter_workers')
+    def test_cleanup_host(self, mock_stop):
+        self.manager.cleanup_host()
+        mock_stop.assert_called_once_with()
+
+    @mock.patch.object(host_manager.HostManager, 'stop_filter_workers')
+    def test_reset(self, mock_stop):
+        self.manager.reset()
+        mock_stop.assert_called_once_with()
+
     def test_select_destination(self):
         fake_spec = objects.RequestSpec()
         with mock.patch.object(self.manager.driver, 'select_destinations'
@@ -133,6 +143,28 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                              filter_properties='fake_props')
             select_destinations.assert_called_once_with(None, fake_spec)
 
+    def test_dump_scheduler_stats(self):
+        self.flags(scheduler_stats_interval=60)
+        self.manager.driver.host_manager.stats = mock.Mock()
+        self.manager._dump_scheduler_stats(self.context)
+        self.manager.driver.host_manager.stats.dump.assert_called_once_with()
+
+    def test_dump_scheduler_stats_disabled(self):
+        self.manager.driver.host_manager.stats = mock.Mock()
+        self.manager._dump_scheduler_stats(self.context)
+        self.assertFalse(self.manager.driver.host_manager.stats.dump.called)
+
+    @mock.patch.object(manager.QUOTAS, 'reconcile')
+    def test_reconcile_quota_usages(self, mock_reconcile):
+        self.flags(quota_optimistic_reservations=True)
+        self.manager._reconcile_quota_usages(self.context)
+        mock_reconcile.assert_called_once_with(self.context)
+
+    @mock.patch.object(manager.QUOTAS, 'reconcile')
+    def test_reconcile_quota_usages_disabled(self, mock_reconcile):
+        self.manager._reconcile_quota_usages(self.context)
+        self.assertFalse(mock_reconcile.called)
+
     def test_update_aggregates(self):
         with mock.patch.object(self.manager.driver.host_manager,
                                'update_aggregates'
@@ -0,0 +1,148 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the resource claims shared by the scheduler workers.
+"""
+
+import datetime
+import os
+
+import fixtures
+import iso8601
+import mock
+from oslo_utils import fixture as utils_fixture
+
+from nova import objects
+from nova.scheduler import shared_claims
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+NOW = datetime.datetime(2016, 6, 1, 12, 0, 0)
+
+
+class SharedClaimsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(SharedClaimsTestCase, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.path = os.path.join(self.tempdir, 'claims')
+        # Two workers sharing the same file
+        self.claims = shared_claims.SharedClaims(self.path)
+        self.peer_claims = shared_claims.SharedClaims(self.path)
+        self.spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(memory_mb=512, root_gb=1, ephemeral_gb=1,
+                                  vcpus=2))
+
+    def _get_hosts(self, updated=None):
+        return [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                    {'free_ram_mb': 1024,
+                                     'free_disk_mb': 4096,
+                                     'vcpus_used': 0,
+                                     'num_instances': 0,
+                                     'num_io_ops': 0,
+                                     'updated': updated})
+                for i in range(2)]
+
+    def _publish(self, claims, host, claim_time=NOW):
+        claims.publish(self.spec_obj, [{'host': host, 'nodename':
+                                        host.replace('host', 'node')}],
+                       claim_time)
+
+    def test_apply_peer_claims(self):
+        hosts = self._get_hosts()
+        self._publish(self.peer_claims, 'host1')
+        self.claims.apply(hosts)
+
+        self.assertEqual(1024, hosts[0].free_ram_mb)
+        self.assertEqual(512, hosts[1].free_ram_mb)
+        self.assertEqual(2048, hosts[1].free_disk_mb)
+        self.assertEqual(2, hosts[1].vcpus_used)
+        self.assertEqual(1, hosts[1].num_instances)
+        self.assertEqual(1, hosts[1].num_io_ops)
+        self.assertEqual(NOW.replace(tzinfo=iso8601.iso8601.Utc()),
+                         hosts[1].updated)
+
+        # Claims are only applied once
+        self.claims.apply(hosts)
+        self.assertEqual(512, hosts[1].free_ram_mb)
+
+    def test_apply_skips_own_claims(self):
+        hosts = self._get_hosts()
+        self._publish(self.claims, 'host1')
+        self.claims.apply(hosts)
+        self.assertEqual(1024, hosts[1].free_ram_mb)
+
+    def test_apply_no_file(self):
+        hosts = self._get_hosts()
+        self.claims.apply(hosts)
+        self.assertEqual(1024, hosts[1].free_ram_mb)
+
+    def test_apply_unknown_host(self):
+        hosts = self._get_hosts()
+        self.peer_claims.publish(self.spec_obj,
+                                 [{'host': 'other', 'nodename': 'other'}],
+                                 NOW)
+        self.claims.apply(hosts)
+        self.assertEqual([1024, 1024], [host.free_ram_mb for host in hosts])
+
+    def test_reset(self):
+        self._publish(self.claims, 'host0',
+                      NOW - datetime.timedelta(seconds=10))
+        self._publish(self.peer_claims, 'host1',
+                      NOW - datetime.timedelta(seconds=10))
+        self._publish(self.peer_claims, 'host1',
+                      NOW + datetime.timedelta(seconds=10))
+
+        # The refreshed host states reflect the claims made before NOW
+        hosts = self._get_hosts(
+            updated=NOW.replace(tzinfo=iso8601.iso8601.Utc()))
+        self.claims.reset(hosts)
+
+        self.assertEqual(1024, hosts[0].free_ram_mb)
+        self.assertEqual(512, hosts[1].free_ram_mb)
+
+    def test_reset_reapplies_own_claims(self):
+        self._publish(self.claims, 'host0')
+        hosts = self._get_hosts()
+        self.claims.reset(hosts)
+        self.assertEqual(512, hosts[0].free_ram_mb)
+
+    def test_compact(self):
+        self.useFixture(utils_fixture.TimeFixture(NOW))
+        self._publish(self.peer_claims, 'host0',
+                      NOW - datetime.timedelta(
+                          seconds=shared_claims.CLAIM_MAX_AGE + 1))
+        self._publish(self.peer_claims, 'host1')
+        self.claims.compact()
+
+        with open(self.path) as f:
+            self.assertEqual(1, len(f.readlines()))
+
+        hosts = self._get_hosts()
+        self.claims.apply(hosts)
+        self.assertEqual([1024, 512], [host.free_ram_mb for host in hosts])
+
+    def test_apply_after_compact(self):
+        hosts = self._get_hosts()
+        self._publish(self.peer_claims, 'host1')
+        self.claims.apply(hosts)
+        self.peer_claims.compact()
+        self._publish(self.peer_claims, 'host0')
+        self.claims.apply(hosts)
+        self.assertEqual([512, 512], [host.free_ram_mb for host in hosts])
+
+    def test_publish_error(self):
+        self.claims.path = os.path.join(self.tempdir, 'missing', 'claims')
+        with mock.patch.object(shared_claims.LOG, 'warning') as mock_warning:
+            self._publish(self.claims, 'host0')
+        self.assertTrue(mock_warning.called)
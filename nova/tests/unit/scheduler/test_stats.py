@@ -0,0 +1,135 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler timing statistics.
+"""
+
+import socket
+
+import mock
+
+from nova import objects
+from nova.scheduler import filters
+from nova.scheduler.filters import all_hosts_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import stats
+from nova.scheduler import weights
+from nova.scheduler.weights import ram
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+class SchedulerStatsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(SchedulerStatsTestCase, self).setUp()
+        self.emitter = mock.Mock(spec=stats.StatsdEmitter)
+        self.stats = stats.SchedulerStats(self.emitter)
+
+    def test_record_filter(self):
+        self.stats.record_filter('RamFilter', 0.5, 10, 7)
+        self.stats.record_filter('RamFilter', 1.5, 5, 5)
+        self.assertEqual({'calls': 2, 'time': 2.0, 'max_time': 1.5,
+                          'hosts': 15, 'removed': 3},
+                         self.stats.get_stats()['filter']['RamFilter'])
+        self.emitter.timing.assert_has_calls(
+            [mock.call('filter.RamFilter.time', 0.5),
+             mock.call('filter.RamFilter.time', 1.5)])
+        self.emitter.incr.assert_has_calls(
+            [mock.call('filter.RamFilter.removed', 3),
+             mock.call('filter.RamFilter.removed', 0)])
+
+    def test_record_weigher(self):
+        self.stats.record_weigher('RAMWeigher', 0.5, 10)
+        self.assertEqual({'calls': 1, 'time': 0.5, 'max_time': 0.5,
+                          'hosts': 10},
+                         self.stats.get_stats()['weigher']['RAMWeigher'])
+        self.emitter.timing.assert_called_once_with('weigher.RAMWeigher.time',
+                                                    0.5)
+        self.assertFalse(self.emitter.incr.called)
+
+    def test_record_phase(self):
+        self.stats.record_phase('get_all_host_states', 2.0)
+        self.assertEqual({'calls': 1, 'time': 2.0, 'max_time': 2.0},
+                         self.stats.get_stats()['phase'][
+                             'get_all_host_states'])
+
+    def test_get_stats_reset(self):
+        self.stats.record_phase('get_all_host_states', 2.0)
+        self.assertEqual(1, len(self.stats.get_stats(reset=True)['phase']))
+        self.assertEqual({'filter': {}, 'weigher': {}, 'phase': {}},
+                         self.stats.get_stats())
+
+    @mock.patch.object(stats.LOG, 'info')
+    def test_dump(self, mock_info):
+        self.stats.record_filter('RamFilter', 0.5, 10, 7)
+        self.stats.record_weigher('RAMWeigher', 0.5, 10)
+        self.stats.dump()
+        self.assertEqual(2, mock_info.call_count)
+        self.assertEqual({'filter': {}, 'weigher': {}, 'phase': {}},
+                         self.stats.get_stats())
+
+
+class StatsdEmitterTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(StatsdEmitterTestCase, self).setUp()
+        self.emitter = stats.StatsdEmitter('127.0.0.1:8125', 'nova.scheduler')
+        self.emitter._socket = mock.Mock()
+
+    def test_timing(self):
+        self.emitter.timing('filter.RamFilter.time', 0.0125)
+        self.emitter._socket.sendto.assert_called_once_with(
+            b'nova.scheduler.filter.RamFilter.time:12.500|ms',
+            ('127.0.0.1', 8125))
+
+    def test_incr(self):
+        self.emitter.incr('filter.RamFilter.removed', 3)
+        self.emitter._socket.sendto.assert_called_once_with(
+            b'nova.scheduler.filter.RamFilter.removed:3|c',
+            ('127.0.0.1', 8125))
+
+    def test_send_error(self):
+        self.emitter._socket.sendto.side_effect = socket.error
+        # The errors are ignored
+        self.emitter.incr('filter.RamFilter.removed', 3)
+
+
+class HandlerStatsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HandlerStatsTestCase, self).setUp()
+        self.stats = mock.Mock(spec=stats.SchedulerStats)
+        self.hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                          {'free_ram_mb': 512 * i,
+                                           'total_usable_ram_mb': 2048,
+                                           'ram_allocation_ratio': 1.0})
+                      for i in range(3)]
+
+    def test_filter_handler(self):
+        handler = filters.HostFilterHandler()
+        handler.stats = self.stats
+        spec_obj = objects.RequestSpec(flavor=objects.Flavor(memory_mb=512))
+        filt_clss = [all_hosts_filter.AllHostsFilter(),
+                     ram_filter.RamFilter()]
+        result = handler.get_filtered_objects(filt_clss, self.hosts, spec_obj)
+        self.assertEqual(self.hosts[1:], result)
+        self.stats.record_filter.assert_has_calls(
+            [mock.call('AllHostsFilter', mock.ANY, 3, 3),
+             mock.call('RamFilter', mock.ANY, 3, 2)])
+
+    def test_weight_handler(self):
+        handler = weights.HostWeightHandler()
+        handler.stats = self.stats
+        handler.get_weighed_objects([ram.RAMWeigher()], self.hosts, {})
+        self.stats.record_weigher.assert_called_once_with('RAMWeigher',
+                                                          mock.ANY, 3)
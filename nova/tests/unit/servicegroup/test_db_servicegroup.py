@@ -18,6 +18,8 @@ import oslo_messaging as messaging
 from oslo_utils import fixture as utils_fixture
 from oslo_utils import timeutils
 
+from nova import conductor
+from nova.conductor import rpcapi as conductor_rpcapi
 from nova import objects
 from nova import servicegroup
 from nova import test
@@ -77,20 +79,37 @@ class DBServiceGroupTestCase(test.NoDBTestCase):
         service_ref = objects.Service(host='fake-host', topic='compute',
                                       report_count=10)
         service = mock.MagicMock(model_disconnected=False,
-                                 service_ref=service_ref)
+                                 service_ref=service_ref,
+                                 conductor_api=conductor.API())
         fn = self.servicegroup_api._driver._report_state
         fn(service)
         upd_mock.assert_called_once_with()
         self.assertEqual(11, service_ref.report_count)
         self.assertFalse(service.model_disconnected)
 
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, 'report_service_state')
+    @mock.patch.object(objects.Service, 'save')
+    def test_report_state_batched(self, upd_mock, report_mock):
+        self.flags(batch_heartbeats=True, group='conductor')
+        service_ref = objects.Service(id=1, host='fake-host',
+                                      topic='compute', report_count=10)
+        service = mock.MagicMock(model_disconnected=False,
+                                 service_ref=service_ref,
+                                 conductor_api=conductor.API())
+        fn = self.servicegroup_api._driver._report_state
+        fn(service)
+        report_mock.assert_called_once_with(mock.ANY, 1)
+        self.assertFalse(upd_mock.called)
+        self.assertFalse(service.model_disconnected)
+
     @mock.patch.object(objects.Service, 'save')
     def _test_report_state_error(self, exc_cls, upd_mock):
         upd_mock.side_effect = exc_cls("service save failed")
         service_ref = objects.Service(host='fake-host', topic='compute',
                                       report_count=10)
         service = mock.MagicMock(model_disconnected=False,
-                                 service_ref=service_ref)
+                                 service_ref=service_ref,
+                                 conductor_api=conductor.API())
         fn = self.servicegroup_api._driver._report_state
         fn(service)  # fail if exception not caught
         self.assertTrue(service.model_disconnected)
@@ -424,6 +424,40 @@ class DBCommandsTestCase(test.NoDBTestCase):
         output = sys.stdout.getvalue()
         self.assertIn('Nothing was archived.', output)
 
+    @mock.patch('nova.db.archive.DeletedRowsArchiver')
+    def test_archive_deleted_rows_until_complete(self, mock_archiver):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        mock_archiver.return_value.run.return_value = dict(instances=10)
+        self.commands.archive_deleted_rows(20, verbose=True,
+                                           until_complete=True, workers=2,
+                                           max_rows_per_second=100,
+                                           max_replication_lag=30,
+                                           checkpoint='/tmp/checkpoint')
+        mock_archiver.assert_called_once_with(
+            batch_size=20, workers=2, max_rows_per_second=100,
+            max_replication_lag=30, checkpoint_path='/tmp/checkpoint',
+            progress=mock.ANY)
+        progress = mock_archiver.call_args[1]['progress']
+        progress('instances', 10, 2.5)
+        output = sys.stdout.getvalue()
+        self.assertIn('Archived 10 rows from instances, 2.5 rows/s', output)
+        self.assertIn('| instances | 10', output)
+
+    @mock.patch('nova.db.archive.DeletedRowsArchiver')
+    def test_archive_deleted_rows_until_complete_blocked(self,
+                                                         mock_archiver):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        mock_archiver.return_value.run.return_value = dict(consoles=10)
+        mock_archiver.return_value.blocked = {'console_pools': 'fk error'}
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            20, until_complete=True))
+        output = sys.stdout.getvalue()
+        self.assertIn('The archiving of console_pools is incomplete', output)
+
+    def test_archive_deleted_rows_until_complete_no_workers(self):
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            20, until_complete=True, workers=0))
+
     @mock.patch.object(migration, 'db_null_instance_uuid_scan',
                        return_value={'foo': 0})
     def test_null_instance_uuid_scan_no_records_found(self, mock_scan):
@@ -343,6 +343,9 @@ class FakeDriver(object):
     def expire(self, context):
         self.called.append(('expire', context))
 
+    def reconcile(self, context, resources):
+        self.called.append(('reconcile', context, resources))
+
 
 class BaseResourceTestCase(test.TestCase):
     def test_no_flag(self):
@@ -799,6 +802,16 @@ class QuotaEngineTestCase(test.TestCase):
                 ('expire', context),
                 ])
 
+    def test_reconcile(self):
+        context = FakeContext(None, None)
+        driver = FakeDriver()
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.reconcile(context)
+
+        self.assertEqual(driver.called, [
+                ('reconcile', context, quota_obj._resources),
+                ])
+
     def test_resources(self):
         quota_obj = self._make_quota_obj(None)
 
@@ -2318,6 +2331,49 @@ class DbQuotaDriverTestCase(test.TestCase):
                 ])
         self.assertEqual(result, ['resv-1', 'resv-2', 'resv-3'])
 
+    def test_reserve_optimistic(self):
+        self._stub_get_project_quotas()
+        self.flags(quota_optimistic_reservations=True)
+
+        def fake_quota_reserve_optimistic(context, resources, quotas,
+                                          user_quotas, deltas, expire,
+                                          until_refresh, max_age,
+                                          project_id=None, user_id=None):
+            self.calls.append(('quota_reserve_optimistic', expire,
+                               until_refresh, max_age))
+            return ['resv-1']
+        self.stub_out('nova.db.quota_reserve_optimistic',
+                      fake_quota_reserve_optimistic)
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=120)
+        result = self.driver.reserve(FakeContext('test_project', 'test_class'),
+                                     quota.QUOTAS._resources,
+                                     dict(instances=2), expire=expire)
+
+        self.assertEqual(self.calls, [
+                'get_project_quotas',
+                ('quota_reserve_optimistic', expire, 0, 0),
+                ])
+        self.assertEqual(result, ['resv-1'])
+
+    def test_reconcile(self):
+        def fake_quota_usage_reconcile(context, resources, until_refresh,
+                                       limit=None):
+            self.calls.append(('quota_usage_reconcile', sorted(resources),
+                               until_refresh))
+            return 2
+        self.stub_out('nova.db.quota_usage_reconcile',
+                      fake_quota_usage_reconcile)
+        self.flags(until_refresh=5)
+        self.driver.reconcile(FakeContext('test_project', 'test_class'),
+                              quota.QUOTAS._resources)
+
+        reservable = sorted(key for key, resource
+                            in quota.QUOTAS._resources.items()
+                            if isinstance(resource, quota.ReservableResource))
+        self.assertEqual(self.calls, [
+                ('quota_usage_reconcile', reservable, 5),
+                ])
+
     def test_usage_reset(self):
         calls = []
 
@@ -72,3 +72,25 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def test_reweigh_object(self):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 1024}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [ram.RAMWeigher()]
+        weighed_hosts = weight_handler.get_weighed_objects(weighers,
+                                                           hostinfo, {})
+        self.assertEqual(1.0, weighed_hosts[0].weight)
+
+        # The weight is normalized with the maximum of the first weighing
+        hostinfo[1].free_ram_mb = 256
+        weighed_host = weight_handler.reweigh_object(weighers, hostinfo[1],
+                                                     {})
+        self.assertIsNot(weighed_hosts[0], weighed_host)
+        self.assertEqual(hostinfo[1], weighed_host.obj)
+        self.assertEqual(0.25, weighed_host.weight)
@@ -143,6 +143,13 @@ VIR_DOMAIN_BLOCK_REBASE_RELATIVE = 8
 
 VIR_CONNECT_LIST_DOMAINS_ACTIVE = 1
 VIR_CONNECT_LIST_DOMAINS_INACTIVE = 2
+VIR_CONNECT_LIST_DOMAINS_RUNNING = 16
+VIR_CONNECT_LIST_DOMAINS_PAUSED = 32
+VIR_CONNECT_LIST_DOMAINS_SHUTOFF = 64
+VIR_CONNECT_LIST_DOMAINS_OTHER = 128
+
+# virConnectGetAllDomainStats stats
+VIR_DOMAIN_STATS_STATE = 1
 
 # secret type
 VIR_SECRET_USAGE_TYPE_NONE = 0
@@ -904,15 +911,45 @@ class Connection(object):
 
     def listAllDomains(self, flags):
         vms = []
-        for vm in self._vms:
+        for vm in self._vms.values():
+            state = vm._state
             if flags & VIR_CONNECT_LIST_DOMAINS_ACTIVE:
-                if vm.state != VIR_DOMAIN_SHUTOFF:
+                if state != VIR_DOMAIN_SHUTOFF:
                     vms.append(vm)
             if flags & VIR_CONNECT_LIST_DOMAINS_INACTIVE:
-                if vm.state == VIR_DOMAIN_SHUTOFF:
+                if state == VIR_DOMAIN_SHUTOFF:
+                    vms.append(vm)
+            if flags & VIR_CONNECT_LIST_DOMAINS_RUNNING:
+                if state == VIR_DOMAIN_RUNNING:
+                    vms.append(vm)
+            if flags & VIR_CONNECT_LIST_DOMAINS_PAUSED:
+                if state == VIR_DOMAIN_PAUSED:
+                    vms.append(vm)
+            if flags & VIR_CONNECT_LIST_DOMAINS_SHUTOFF:
+                if state == VIR_DOMAIN_SHUTOFF:
+                    vms.append(vm)
+            if flags & VIR_CONNECT_LIST_DOMAINS_OTHER:
+                if state not in (VIR_DOMAIN_RUNNING, VIR_DOMAIN_PAUSED,
+                                 VIR_DOMAIN_SHUTOFF):
                     vms.append(vm)
         return vms
 
+    def getAllDomainStats(self, stats, flags=0):
+        if self.fakeLibVersion < 1002008:
+            raise make_libvirtError(
+                    libvirtError,
+                    'this function is not supported by the connection driver',
+                    error_code=VIR_ERR_NO_SUPPORT,
+                    error_domain=VIR_FROM_QEMU)
+        records = []
+        for vm in self._vms.values():
+            record = {}
+            if stats & VIR_DOMAIN_STATS_STATE:
+                record['state.state'] = vm._state
+                record['state.reason'] = 0
+            records.append((vm, record))
+        return records
+
     def _emit_lifecycle(self, dom, event, detail):
         if VIR_DOMAIN_EVENT_ID_LIFECYCLE not in self._event_callbacks:
             return
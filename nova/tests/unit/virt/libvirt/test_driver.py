@@ -84,6 +84,7 @@ from nova.virt import block_device as driver_block_device
 from nova.virt import configdrive
 from nova.virt.disk import api as disk
 from nova.virt import driver
+from nova.virt import event as virtevent
 from nova.virt import fake
 from nova.virt import firewall as base_firewall
 from nova.virt import hardware
@@ -1273,6 +1274,20 @@ class LibvirtConnTestCase(test.NoDBTestCase):
             db_mock.side_effect = exception.NovaException
             drvr._set_host_enabled(False)
 
+    @mock.patch.object(libvirt_driver.LibvirtDriver, '_set_host_enabled')
+    def test_handle_conn_event_emits_events_lost(self, mock_set_enabled):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        with mock.patch.object(drvr, 'emit_event') as mock_emit:
+            drvr._handle_conn_event(True, None)
+            self.assertFalse(mock_emit.called)
+
+            drvr._handle_conn_event(False, 'Connection to libvirt lost')
+            mock_set_enabled.assert_called_with(False,
+                                                'Connection to libvirt lost')
+            self.assertEqual(1, mock_emit.call_count)
+            self.assertIsInstance(mock_emit.call_args[0][0],
+                                  virtevent.EventsLostEvent)
+
     @mock.patch.object(fakelibvirt.virConnect, "nodeDeviceLookupByName")
     def test_prepare_pci_device(self, mock_lookup):
 
@@ -10827,6 +10842,55 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         filters = {'uuid': instance_uuids}
         mock_get.assert_called_once_with(mock.ANY, filters, use_slave=True)
         mock_bdms.assert_called_with(mock.ANY, instance_uuids)
+        for call in mock_info.call_args_list:
+            self.assertTrue(call[1]['use_cache'])
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(objects.BlockDeviceMappingList, "bdms_by_instance_uuid")
+    @mock.patch.object(objects.InstanceList, "get_by_filters")
+    def test_disk_over_committed_size_total_prunes_cache(self, mock_get,
+                                                         mock_bdms,
+                                                         mock_list):
+        mock_list.return_value = []
+        mock_get.return_value = []
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        drvr._disk_info_cache['/somepath/disk1'] = ((1, 2), ('', 3))
+
+        self.assertEqual(0, drvr._get_disk_over_committed_size_total())
+        self.assertEqual({}, drvr._disk_info_cache)
+
+    @mock.patch('nova.virt.disk.api.get_disk_size')
+    @mock.patch.object(fake_libvirt_utils, 'get_disk_backing_file')
+    @mock.patch('os.stat')
+    def test_get_qcow2_disk_info_cached(self, mock_stat, mock_backing,
+                                        mock_size):
+        mock_stat.return_value = mock.Mock(st_mtime=1, st_size=2)
+        mock_backing.return_value = 'base'
+        mock_size.return_value = 10
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        self.assertEqual(('base', 10), drvr._get_qcow2_disk_info('/p/disk'))
+        self.assertEqual(('base', 10), drvr._get_qcow2_disk_info('/p/disk'))
+        self.assertEqual(1, mock_backing.call_count)
+        self.assertEqual(1, mock_size.call_count)
+
+        # The file was written, qemu-img is run again
+        mock_stat.return_value = mock.Mock(st_mtime=3, st_size=2)
+        mock_size.return_value = 20
+        self.assertEqual(('base', 20), drvr._get_qcow2_disk_info('/p/disk'))
+        self.assertEqual(2, mock_size.call_count)
+
+    def test_invalidate_disk_info_cache(self):
+        instance = objects.Instance(**self.test_instance)
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        inst_base = fake_libvirt_utils.get_instance_path(instance)
+        other_disk = os.path.join(inst_base + '_resize', 'disk')
+        drvr._disk_info_cache = {
+            os.path.join(inst_base, 'disk'): ((1, 2), ('', 3)),
+            other_disk: ((1, 2), ('', 3))}
+
+        drvr._invalidate_disk_info_cache(instance)
+        self.assertEqual([other_disk], list(drvr._disk_info_cache))
 
     @mock.patch.object(host.Host, "list_instance_domains")
     @mock.patch.object(objects.BlockDeviceMappingList, "bdms_by_instance_uuid")
@@ -10871,7 +10935,7 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                         'disk_size': '10737418240',
                         'over_committed_disk_size': '21474836480'}]}
 
-        def side_effect(name, dom, block_device_info):
+        def side_effect(name, dom, block_device_info, use_cache):
             if name == 'instance0000001':
                 self.assertEqual('/dev/vda',
                                  block_device_info['root_device_name'])
@@ -13795,6 +13859,7 @@ class LibvirtDriverTestCase(test.NoDBTestCase):
     """Test for nova.virt.libvirt.libvirt_driver.LibvirtDriver."""
     def setUp(self):
         super(LibvirtDriverTestCase, self).setUp()
+        self.flags(instances_path=self.useFixture(fixtures.TempDir()).path)
         self.drvr = libvirt_driver.LibvirtDriver(
             fake.FakeVirtAPI(), read_only=True)
         self.context = context.get_admin_context()
@@ -131,6 +131,36 @@ class GuestTestCase(test.NoDBTestCase):
         self.domain.XMLDesc.return_value = "<bad xml>"
         self.assertEqual([], self.guest.get_interfaces())
 
+    def test_get_config_cached(self):
+        self.domain.XMLDesc.return_value = """<domain>
+  <devices>
+    <disk type="file" device="disk">
+      <source file="/path/to/disk"/>
+      <target dev="vda" bus="virtio"/>
+    </disk>
+    <interface type="network">
+      <target dev="vnet0"/>
+    </interface>
+  </devices>
+</domain>"""
+        config = self.guest.get_config()
+        self.assertIs(config, self.guest.get_config())
+        self.assertEqual(["vnet0"], self.guest.get_interfaces())
+        self.assertEqual("/path/to/disk",
+                         self.guest.get_disk("vda").source_path)
+        self.assertIsNone(self.guest.get_disk("vdb"))
+        self.domain.XMLDesc.assert_called_once_with(0)
+
+        conf = mock.Mock(spec=vconfig.LibvirtConfigGuestDevice)
+        conf.to_xml.return_value = "</xml>"
+        self.guest.detach_device(conf)
+        self.assertIsNot(config, self.guest.get_config())
+        self.assertEqual(2, self.domain.XMLDesc.call_count)
+
+        self.guest.invalidate_config()
+        self.guest.get_config()
+        self.assertEqual(3, self.domain.XMLDesc.call_count)
+
     def test_poweroff(self):
         self.guest.poweroff()
         self.domain.destroy.assert_called_once_with()
@@ -22,6 +22,7 @@ import mock
 import six
 
 from nova.compute import arch
+from nova.compute import power_state
 from nova import exception
 from nova import objects
 from nova import test
@@ -606,6 +607,76 @@ class HostTestCase(test.NoDBTestCase):
         self.assertEqual(doms[2].name(), vm2.name())
         mock_list.assert_called_with(True)
 
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats")
+    def test_get_power_states_stats(self, mock_stats):
+        vm0 = FakeVirtDomain(id=0, name="Domain-0")  # Xen dom-0
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002")
+        vm3 = FakeVirtDomain(id=17, name="instance00000003")
+        mock_stats.return_value = [
+            (vm0, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING}),
+            (vm1, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING}),
+            (vm2, {'state.state': fakelibvirt.VIR_DOMAIN_SHUTOFF}),
+            (vm3, {'state.state': fakelibvirt.VIR_DOMAIN_PAUSED})]
+
+        states = self.host.get_power_states()
+
+        mock_stats.assert_called_once_with(
+            fakelibvirt.VIR_DOMAIN_STATS_STATE)
+        self.assertEqual({vm1.UUIDString(): power_state.RUNNING,
+                          vm2.UUIDString(): power_state.SHUTDOWN,
+                          vm3.UUIDString(): power_state.PAUSED}, states)
+
+        states = self.host.get_power_states(only_guests=False)
+        self.assertEqual(power_state.RUNNING, states[vm0.UUIDString()])
+
+    @mock.patch.object(fakelibvirt.Connection, "listAllDomains")
+    def test_get_power_states_list(self, mock_list_all):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(id=17, name="instance00000002")
+        vm3 = FakeVirtDomain(name="instance00000003")
+        vm4 = mock.Mock(spec=fakelibvirt.virDomain)
+        vm4.ID.return_value = 18
+        vm4.UUIDString.return_value = 'vm4-uuid'
+        vm4.info.return_value = [fakelibvirt.VIR_DOMAIN_CRASHED]
+
+        def fake_list_all(flags):
+            return {fakelibvirt.VIR_CONNECT_LIST_DOMAINS_RUNNING: [vm1],
+                    fakelibvirt.VIR_CONNECT_LIST_DOMAINS_PAUSED: [vm2],
+                    fakelibvirt.VIR_CONNECT_LIST_DOMAINS_SHUTOFF: [vm3],
+                    fakelibvirt.VIR_CONNECT_LIST_DOMAINS_OTHER: [vm4]}[flags]
+
+        mock_list_all.side_effect = fake_list_all
+
+        states = self.host._get_domain_states_list()
+
+        self.assertEqual(4, mock_list_all.call_count)
+        self.assertEqual([(vm1, fakelibvirt.VIR_DOMAIN_RUNNING),
+                          (vm2, fakelibvirt.VIR_DOMAIN_PAUSED),
+                          (vm3, fakelibvirt.VIR_DOMAIN_SHUTOFF),
+                          (vm4, fakelibvirt.VIR_DOMAIN_CRASHED)], states)
+        vm4.info.assert_called_once_with()
+
+    @mock.patch.object(host.Host, "_get_domain_states_list")
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats")
+    def test_get_power_states_fallback(self, mock_stats, mock_list):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        mock_stats.side_effect = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError,
+            "API is not supported",
+            error_code=fakelibvirt.VIR_ERR_NO_SUPPORT)
+        mock_list.return_value = [(vm1, fakelibvirt.VIR_DOMAIN_RUNNING)]
+
+        self.assertEqual({vm1.UUIDString(): power_state.RUNNING},
+                         self.host.get_power_states())
+        self.assertEqual({vm1.UUIDString(): power_state.RUNNING},
+                         self.host.get_power_states())
+
+        # The bulk domain stats API is not tried again
+        mock_stats.assert_called_once_with(
+            fakelibvirt.VIR_DOMAIN_STATS_STATE)
+        self.assertEqual(2, mock_list.call_count)
+
     @mock.patch.object(host.Host, "list_instance_domains")
     def test_list_guests(self, mock_list_domains):
         dom0 = mock.Mock(spec=fakelibvirt.virDomain)
@@ -816,6 +816,76 @@ class VCPUTopologyTest(test.NoDBTestCase):
             self.assertEqual(topo_test["expect"][1], topology.cores)
             self.assertEqual(topo_test["expect"][2], topology.threads)
 
+            hw._cpu_topology_cache.clear()
+            topology = hw.get_best_cpu_topology(
+                topo_test["flavor"],
+                image_meta,
+                topo_test["allow_threads"],
+                topo_test.get("numa_topology"))
+
+            self.assertEqual(topo_test["expect"][0], topology.sockets)
+            self.assertEqual(topo_test["expect"][1], topology.cores)
+            self.assertEqual(topo_test["expect"][2], topology.threads)
+
+    def test_desirable_topologies_cached(self):
+        hw._cpu_topology_cache.clear()
+        self.addCleanup(hw._cpu_topology_cache.clear)
+        flavor = objects.Flavor(vcpus=16, memory_mb=2048,
+                                extra_specs={"hw:cpu_max_threads": "2"})
+        image_meta = objects.ImageMeta.from_dict({"properties": {}})
+        with mock.patch.object(hw, '_get_possible_cpu_topologies',
+                               side_effect=hw._get_possible_cpu_topologies
+                               ) as mock_possible:
+            first = hw._get_desirable_cpu_topologies(flavor, image_meta)
+            second = hw._get_desirable_cpu_topologies(flavor, image_meta)
+        self.assertEqual(1, mock_possible.call_count)
+        self.assertEqual([(t.sockets, t.cores, t.threads) for t in first],
+                         [(t.sockets, t.cores, t.threads) for t in second])
+        # The callers get their own objects
+        self.assertIsNot(first[0], second[0])
+        # The best topology is taken from the cached list
+        with mock.patch.object(hw, '_find_best_cpu_topology') as mock_find:
+            best = hw.get_best_cpu_topology(flavor, image_meta)
+        self.assertFalse(mock_find.called)
+        self.assertEqual((16, 1, 1), (best.sockets, best.cores, best.threads))
+
+    def test_best_topology_cached(self):
+        hw._cpu_topology_cache.clear()
+        self.addCleanup(hw._cpu_topology_cache.clear)
+        flavor = objects.Flavor(vcpus=64, memory_mb=2048,
+                                extra_specs={"hw:cpu_sockets": "2"})
+        image_meta = objects.ImageMeta.from_dict({"properties": {}})
+        with mock.patch.object(hw, '_find_best_cpu_topology',
+                               side_effect=hw._find_best_cpu_topology
+                               ) as mock_find:
+            for i in range(2):
+                best = hw.get_best_cpu_topology(flavor, image_meta)
+                self.assertEqual((2, 32, 1),
+                                 (best.sockets, best.cores, best.threads))
+        self.assertEqual(1, mock_find.call_count)
+
+    def test_best_topology_impossible(self):
+        hw._cpu_topology_cache.clear()
+        self.addCleanup(hw._cpu_topology_cache.clear)
+        flavor = objects.Flavor(vcpus=8, memory_mb=2048,
+                                extra_specs={"hw:cpu_max_sockets": "2",
+                                             "hw:cpu_max_cores": "1"})
+        image_meta = objects.ImageMeta.from_dict({"properties": {}})
+        self.assertRaises(exception.ImageVCPULimitsRangeImpossible,
+                          hw.get_best_cpu_topology, flavor, image_meta,
+                          allow_threads=False)
+
+    def test_lru_cache(self):
+        cache = hw._LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        # 'b' was the least recently used item
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
 
 class NUMATopologyTest(test.NoDBTestCase):
 
@@ -2600,3 +2670,115 @@ class CPURealtimeTestCase(test.NoDBTestCase):
         self.assertRaises(
             exception.RealtimeMaskNotFoundOrInvalid,
             hw.vcpus_realtime_topology, set([0, 1, 2]), flavor, image)
+
+
+class NUMAFitSummaryTestCase(test.NoDBTestCase):
+    def _host_topology(self, pinned_cpus=None, siblings=None,
+                       memory_usage=0, cpu_usage=0, mempages=None):
+        cells = []
+        for i in range(2):
+            cells.append(objects.NUMACell(
+                id=i, cpuset=set(range(4 * i, 4 * i + 4)), memory=2048,
+                cpu_usage=cpu_usage, memory_usage=memory_usage,
+                pinned_cpus=set(pinned_cpus or []) & set(
+                    range(4 * i, 4 * i + 4)),
+                siblings=[set([4 * i + 2 * j, 4 * i + 2 * j + 1])
+                          for j in range(2)] if siblings else [],
+                mempages=mempages or []))
+        return objects.NUMATopology(cells=cells)
+
+    def _instance_topology(self, cpus, memory=512, cells=1, **kwargs):
+        return objects.InstanceNUMATopology(cells=[
+            objects.InstanceNUMACell(id=i, cpuset=set(range(cpus)),
+                                     memory=memory, **kwargs)
+            for i in range(cells)])
+
+    def test_numa_fit_summary(self):
+        host = self._host_topology(pinned_cpus=[0, 2, 3], siblings=True,
+                                   memory_usage=1024, mempages=[
+                                       objects.NUMAPagesTopology(
+                                           size_kb=4, total=262144, used=0),
+                                       objects.NUMAPagesTopology(
+                                           size_kb=2048, total=512,
+                                           used=256)])
+        summary = hw.numa_fit_summary(host)
+        self.assertEqual(2, len(summary))
+        self.assertEqual((1,), summary[0].free_sibling_sizes)
+        self.assertEqual((2, 2), summary[1].free_sibling_sizes)
+        self.assertEqual(2, summary[0].threads_per_core)
+        self.assertEqual(1, summary[0].avail_cpus)
+        self.assertEqual(1024, summary[0].avail_memory)
+        self.assertEqual(((2048, 524288), (4, 1048576)), summary[0].pages)
+
+    def test_not_enough_cells(self):
+        summary = hw.numa_fit_summary(self._host_topology())
+        self.assertFalse(hw.numa_summary_can_fit(
+            summary, self._instance_topology(1, cells=3)))
+
+    def test_not_enough_free_pinned_cpus(self):
+        summary = hw.numa_fit_summary(self._host_topology(
+            pinned_cpus=[0, 1, 2, 4, 5, 6]))
+        dedicated = fields.CPUAllocationPolicy.DEDICATED
+        self.assertTrue(hw.numa_summary_can_fit(
+            summary, self._instance_topology(1, cpu_policy=dedicated)))
+        self.assertFalse(hw.numa_summary_can_fit(
+            summary, self._instance_topology(2, cpu_policy=dedicated)))
+
+    def test_limits(self):
+        summary = hw.numa_fit_summary(self._host_topology(cpu_usage=4))
+        limits = objects.NUMATopologyLimits(cpu_allocation_ratio=1.5,
+                                            ram_allocation_ratio=1.0)
+        self.assertTrue(hw.numa_summary_can_fit(
+            summary, self._instance_topology(2), limits=limits))
+        self.assertFalse(hw.numa_summary_can_fit(
+            summary, self._instance_topology(3), limits=limits))
+
+    def test_pagesize(self):
+        summary = hw.numa_fit_summary(self._host_topology(mempages=[
+            objects.NUMAPagesTopology(size_kb=4, total=262144, used=0),
+            objects.NUMAPagesTopology(size_kb=2048, total=512, used=512)]))
+        self.assertTrue(hw.numa_summary_can_fit(
+            summary, self._instance_topology(1, pagesize=hw.MEMPAGES_ANY)))
+        self.assertFalse(hw.numa_summary_can_fit(
+            summary, self._instance_topology(1, pagesize=hw.MEMPAGES_LARGE)))
+        self.assertFalse(hw.numa_summary_can_fit(
+            summary, self._instance_topology(1, pagesize=1048576)))
+
+    def test_consistent_with_numa_fit_instance_to_host(self):
+        # The summary must never reject a host on which the instance fits
+        dedicated = fields.CPUAllocationPolicy.DEDICATED
+        policies = [None] + list(fields.CPUThreadAllocationPolicy.ALL)
+        mempages = [
+            objects.NUMAPagesTopology(size_kb=4, total=262144, used=131072),
+            objects.NUMAPagesTopology(size_kb=2048, total=512, used=256)]
+        limits = objects.NUMATopologyLimits(cpu_allocation_ratio=1.5,
+                                            ram_allocation_ratio=1.5)
+        hosts = []
+        for pinned_cpus in ([], [0], [0, 2], [0, 1, 4], [0, 2, 4, 6],
+                            [0, 1, 2, 4, 5, 6]):
+            for siblings in (False, True):
+                hosts.append(self._host_topology(
+                    pinned_cpus=pinned_cpus, siblings=siblings,
+                    memory_usage=1024, cpu_usage=len(pinned_cpus),
+                    mempages=mempages))
+        for host in hosts:
+            summary = hw.numa_fit_summary(host)
+            for cpus in range(1, 5):
+                for cells in (1, 2):
+                    for policy in policies:
+                        for pagesize in (None, hw.MEMPAGES_SMALL,
+                                         hw.MEMPAGES_LARGE):
+                            kwargs = {'pagesize': pagesize}
+                            if policy:
+                                kwargs.update(cpu_policy=dedicated,
+                                              cpu_thread_policy=policy)
+                            fitted = hw.numa_fit_instance_to_host(
+                                host, self._instance_topology(
+                                    cpus, cells=cells, **kwargs),
+                                limits=limits)
+                            can_fit = hw.numa_summary_can_fit(
+                                summary, self._instance_topology(
+                                    cpus, cells=cells, **kwargs),
+                                limits=limits)
+                            if fitted is not None:
+                                self.assertTrue(can_fit)
@@ -26,6 +26,7 @@ from oslo_utils import timeutils
 import six
 
 from nova.compute import manager
+from nova.compute import power_state
 from nova.console import type as ctype
 from nova import context
 from nova import exception
@@ -560,6 +561,12 @@ class _VirtDriverTestCase(_FakeDriverBackendTestCase):
         info = self.connection.get_info(instance_ref)
         self.assertIsInstance(info, hardware.InstanceInfo)
 
+    @catch_notimplementederror
+    def test_get_power_states(self):
+        instance_ref, network_info = self._get_running_instance()
+        states = self.connection.get_power_states()
+        self.assertEqual({instance_ref['uuid']: power_state.RUNNING}, states)
+
     @catch_notimplementederror
     def test_get_info_for_unknown_instance(self):
         fake_instance = test_utils.get_test_instance(obj=True)
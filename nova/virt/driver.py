@@ -165,6 +165,18 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Get the power states of all the virtual machines at once.
+
+        This lets the periodic power state sync query the hypervisor once
+        rather than calling get_info() for each instance of the host.
+
+        :returns: dict of nova.compute.power_state values by instance uuid,
+                  for all the virtual machines that the hypervisor knows
+                  about
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
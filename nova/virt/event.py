@@ -115,3 +115,13 @@ class LifecycleEvent(InstanceEvent):
             self.timestamp,
             self.uuid,
             self.get_name())
+
+
+class EventsLostEvent(Event):
+    """Class for the loss of the events of a hypervisor.
+
+    When some events of the hypervisor may have been missed,
+    for example while the connection to the hypervisor was
+    lost, an event of this class is emitted. The state of the
+    instances must then be queried from the hypervisor again.
+    """
@@ -38,6 +38,38 @@ MEMPAGES_SMALL = -1
 MEMPAGES_LARGE = -2
 MEMPAGES_ANY = -3
 
+# Maximum number of lists of CPU topologies kept by the cache of
+# _get_desirable_cpu_topologies() and get_best_cpu_topology()
+CPU_TOPOLOGY_CACHE_SIZE = 256
+
+
+class _LRUCache(object):
+    """Dictionary keeping the most recently used items only."""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = collections.OrderedDict()
+
+    def get(self, key):
+        value = self._items.pop(key, None)
+        if value is not None:
+            self._items[key] = value
+        return value
+
+    def set(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+# Sorted tuples of (sockets, cores, threads), keyed by the vCPU count, the
+# maximum and preferred topologies and the threads wanted by the NUMA cells
+_cpu_topology_cache = _LRUCache(CPU_TOPOLOGY_CACHE_SIZE)
+
 
 def get_vcpu_pin_set():
     """Parsing vcpu_pin_set config.
@@ -399,6 +431,33 @@ def _get_cpu_topology_constraints(flavor, image_meta):
                                     threads=maxthreads))
 
 
+def _iter_cpu_topologies(vcpus, maxsockets, maxcores, maxthreads):
+    """Generate the possible topologies for a vCPU count
+
+    :param vcpus: total number of CPUs for guest instance
+    :param maxsockets: maximum number of sockets
+    :param maxcores: maximum number of cores per socket
+    :param maxthreads: maximum number of threads per core
+
+    Only the divisors of the vCPU count are considered, and the
+    topologies are generated in order of preference, that is
+    minimizing threads (ie larger sockets * cores is best) and
+    then preferring sockets over cores.
+
+    :returns: generator of (sockets, cores, threads) tuples
+    """
+    for t in range(1, maxthreads + 1):
+        if vcpus % t:
+            continue
+        sockets_cores = vcpus // t
+        for s in range(min(maxsockets, sockets_cores), 0, -1):
+            if sockets_cores % s:
+                continue
+            c = sockets_cores // s
+            if c <= maxcores:
+                yield s, c, t
+
+
 def _get_possible_cpu_topologies(vcpus, maxtopology,
                                  allow_threads):
     """Get a list of possible topologies for a vCPU count
@@ -432,30 +491,9 @@ def _get_possible_cpu_topologies(vcpus, maxtopology,
               {"vcpus": vcpus, "maxsockets": maxsockets,
                "maxcores": maxcores, "maxthreads": maxthreads})
 
-    # Figure out all possible topologies that match
-    # the required vcpus count and satisfy the declared
-    # limits. If the total vCPU count were very high
-    # it might be more efficient to factorize the vcpu
-    # count and then only iterate over its factors, but
-    # that's overkill right now
-    possible = []
-    for s in range(1, maxsockets + 1):
-        for c in range(1, maxcores + 1):
-            for t in range(1, maxthreads + 1):
-                if (t * c * s) != vcpus:
-                    continue
-                possible.append(
-                    objects.VirtCPUTopology(sockets=s,
-                                            cores=c,
-                                            threads=t))
-
-    # We want to
-    #  - Minimize threads (ie larger sockets * cores is best)
-    #  - Prefer sockets over cores
-    possible = sorted(possible, reverse=True,
-                      key=lambda x: (x.sockets * x.cores,
-                                     x.sockets,
-                                     x.threads))
+    possible = [objects.VirtCPUTopology(sockets=s, cores=c, threads=t)
+                for s, c, t in _iter_cpu_topologies(vcpus, maxsockets,
+                                                    maxcores, maxthreads)]
 
     LOG.debug("Got %d possible topologies", len(possible))
     if len(possible) == 0:
@@ -543,6 +581,46 @@ def _sort_possible_cpu_topologies(possible, wanttopology):
     return desired
 
 
+def _get_cpu_topology_request(flavor, image_meta, allow_threads,
+                              numa_topology):
+    """Get the inputs the desired CPU topologies depend on
+
+    :returns: a hashable tuple of the vCPU count, the maximum
+              topology, the preferred topology and the number of
+              threads wanted by the NUMA topology, or None
+    """
+    preferred, maximum = _get_cpu_topology_constraints(flavor, image_meta)
+    LOG.debug("Topology preferred %(preferred)s, maximum %(maximum)s",
+              {"preferred": preferred, "maximum": maximum})
+
+    specified_threads = None
+    if numa_topology:
+        min_requested_threads = None
+        cell_topologies = [cell.cpu_topology for cell in numa_topology.cells
+                           if cell.cpu_topology]
+        if cell_topologies:
+            min_requested_threads = min(
+                    topo.threads for topo in cell_topologies)
+
+        if min_requested_threads:
+            if preferred.threads != -1:
+                min_requested_threads = min(preferred.threads,
+                                            min_requested_threads)
+
+            specified_threads = max(1, min_requested_threads)
+
+    maxthreads = maximum.threads if allow_threads else 1
+    return (flavor.vcpus,
+            (maximum.sockets, maximum.cores, maxthreads),
+            (preferred.sockets, preferred.cores, preferred.threads),
+            specified_threads)
+
+
+def _topologies_from_tuples(topologies):
+    return [objects.VirtCPUTopology(sockets=s, cores=c, threads=t)
+            for s, c, t in topologies]
+
+
 def _get_desirable_cpu_topologies(flavor, image_meta, allow_threads=True,
                                   numa_topology=None):
     """Get desired CPU topologies according to settings
@@ -559,6 +637,9 @@ def _get_desirable_cpu_topologies(flavor, image_meta, allow_threads=True,
     valid CPU topologies that can be used in the guest. Then
     return this list sorted in order of preference.
 
+    The sorted lists are cached, keyed by the values they
+    depend on.
+
     :returns: sorted list of nova.objects.VirtCPUTopology instances
     """
 
@@ -567,40 +648,76 @@ def _get_desirable_cpu_topologies(flavor, image_meta, allow_threads=True,
               {"flavor": flavor, "image_meta": image_meta,
                "threads": allow_threads})
 
-    preferred, maximum = _get_cpu_topology_constraints(flavor, image_meta)
-    LOG.debug("Topology preferred %(preferred)s, maximum %(maximum)s",
-              {"preferred": preferred, "maximum": maximum})
-
-    possible = _get_possible_cpu_topologies(flavor.vcpus,
-                                            maximum,
-                                            allow_threads)
+    request = _get_cpu_topology_request(flavor, image_meta, allow_threads,
+                                        numa_topology)
+    desired = _cpu_topology_cache.get(request)
+    if desired is None:
+        desired = _build_desirable_cpu_topologies(*request)
+        _cpu_topology_cache.set(request, desired)
+    return _topologies_from_tuples(desired)
+
+
+def _build_desirable_cpu_topologies(vcpus, maximum, preferred,
+                                    specified_threads):
+    maximum = objects.VirtCPUTopology(sockets=maximum[0], cores=maximum[1],
+                                      threads=maximum[2])
+    preferred = objects.VirtCPUTopology(sockets=preferred[0],
+                                        cores=preferred[1],
+                                        threads=preferred[2])
+    possible = _get_possible_cpu_topologies(vcpus, maximum, True)
     LOG.debug("Possible topologies %s", possible)
 
-    if numa_topology:
-        min_requested_threads = None
-        cell_topologies = [cell.cpu_topology for cell in numa_topology.cells
-                           if cell.cpu_topology]
-        if cell_topologies:
-            min_requested_threads = min(
-                    topo.threads for topo in cell_topologies)
+    if specified_threads:
+        LOG.debug("Filtering topologies best for %d threads",
+                  specified_threads)
 
-        if min_requested_threads:
-            if preferred.threads != -1:
-                min_requested_threads = min(preferred.threads,
-                                            min_requested_threads)
-
-            specified_threads = max(1, min_requested_threads)
-            LOG.debug("Filtering topologies best for %d threads",
-                      specified_threads)
-
-            possible = _filter_for_numa_threads(possible,
-                                                specified_threads)
-            LOG.debug("Remaining possible topologies %s",
-                      possible)
+        possible = _filter_for_numa_threads(possible,
+                                            specified_threads)
+        LOG.debug("Remaining possible topologies %s",
+                  possible)
 
     desired = _sort_possible_cpu_topologies(possible, preferred)
     LOG.debug("Sorted desired topologies %s", desired)
-    return desired
+    return tuple((topology.sockets, topology.cores, topology.threads)
+                 for topology in desired)
+
+
+def _find_best_cpu_topology(vcpus, maximum, preferred):
+    """Find the best topology without building the list of all
+    the possible topologies
+
+    The topologies are generated in order of preference and the
+    first one matching all the preferred values stops the
+    search, otherwise the first one with the highest score is
+    returned, as _sort_possible_cpu_topologies() would.
+
+    :returns: the best (sockets, cores, threads) tuple
+    """
+    maxsockets, maxcores, maxthreads = [min(vcpus, value)
+                                        for value in maximum]
+    wanttopology = objects.VirtCPUTopology(sockets=preferred[0],
+                                           cores=preferred[1],
+                                           threads=preferred[2])
+    best_score = len([value for value in preferred if value != -1])
+    best = None
+    score = -1
+    for s, c, t in _iter_cpu_topologies(vcpus, maxsockets, maxcores,
+                                        maxthreads):
+        topology_score = _score_cpu_topology(
+            objects.VirtCPUTopology(sockets=s, cores=c, threads=t),
+            wanttopology)
+        if topology_score > score:
+            best = (s, c, t)
+            score = topology_score
+            if score == best_score:
+                break
+
+    if best is None:
+        raise exception.ImageVCPULimitsRangeImpossible(vcpus=vcpus,
+                                                       sockets=maxsockets,
+                                                       cores=maxcores,
+                                                       threads=maxthreads)
+    return best
 
 
 def get_best_cpu_topology(flavor, image_meta, allow_threads=True,
@@ -622,8 +739,21 @@ def get_best_cpu_topology(flavor, image_meta, allow_threads=True,
     :returns: a nova.objects.VirtCPUTopology instance for best topology
     """
 
-    return _get_desirable_cpu_topologies(flavor, image_meta,
-                                         allow_threads, numa_topology)[0]
+    request = _get_cpu_topology_request(flavor, image_meta, allow_threads,
+                                        numa_topology)
+    desired = _cpu_topology_cache.get(request)
+    if desired is None and request[3] is None:
+        # Without threads wanted by the NUMA topology, the best
+        # topology can be found without sorting all of them
+        best_request = request + ('best',)
+        desired = _cpu_topology_cache.get(best_request)
+        if desired is None:
+            desired = (_find_best_cpu_topology(*request[:3]),)
+            _cpu_topology_cache.set(best_request, desired)
+    if desired is None:
+        return _get_desirable_cpu_topologies(flavor, image_meta,
+                                             allow_threads, numa_topology)[0]
+    return _topologies_from_tuples(desired[:1])[0]
 
 
 def _numa_cell_supports_pagesize_request(host_cell, inst_cell):
@@ -1389,6 +1519,134 @@ def instance_topology_from_instance(instance):
     return instance_numa_topology
 
 
+# Summary of the free resources of a host NUMA cell used for rejecting the
+# hosts which can't fit an instance before trying the permutations of cells
+NUMACellFitSummary = collections.namedtuple('NUMACellFitSummary', [
+    'cpus', 'memory', 'cpu_usage', 'memory_usage', 'avail_cpus',
+    'avail_memory', 'free_sibling_sizes', 'threads_per_core', 'pages'])
+
+
+def numa_fit_summary(host_topology):
+    """Summarize the free resources of each cell of a host NUMA topology
+
+    :param host_topology: objects.NUMATopology object
+
+    :returns: a tuple of NUMACellFitSummary, one per host cell, with the
+              number of free CPUs of each sibling set, and the page sizes
+              with the free memory they provide, by descending size.
+    """
+    summary = []
+    for cell in host_topology.cells:
+        if cell.siblings:
+            free_sets = cell.free_siblings
+            threads_per_core = max(map(len, cell.siblings))
+        else:
+            free_sets = [cell.free_cpus]
+            threads_per_core = 1
+        summary.append(NUMACellFitSummary(
+            cpus=len(cell.cpuset),
+            memory=cell.memory,
+            cpu_usage=cell.cpu_usage,
+            memory_usage=cell.memory_usage,
+            avail_cpus=cell.avail_cpus,
+            avail_memory=cell.avail_memory,
+            free_sibling_sizes=tuple(sorted(
+                (len(free_set) for free_set in free_sets if free_set),
+                reverse=True)),
+            threads_per_core=threads_per_core,
+            pages=tuple(sorted(((page.size_kb, page.free_kb)
+                                for page in cell.mempages or []),
+                               reverse=True))))
+    return tuple(summary)
+
+
+def _numa_summary_can_pin(cell_summary, instance_cell):
+    """Mirror the packing done by _pack_instance_onto_cores, only looking at
+    the number of free CPUs of each sibling set.
+    """
+    if (cell_summary.avail_cpus < len(instance_cell.cpuset) or
+            cell_summary.avail_memory < instance_cell.memory):
+        return False
+    sizes = cell_summary.free_sibling_sizes
+    if not sizes:
+        return False
+
+    def _sets_with(threads_no):
+        return len([size for size in sizes if size >= threads_no])
+
+    if (instance_cell.cpu_thread_policy ==
+            fields.CPUThreadAllocationPolicy.ISOLATE):
+        threads_per_core = cell_summary.threads_per_core
+        return (sizes[0] >= threads_per_core and
+                _sets_with(threads_per_core) >= len(instance_cell.cpuset))
+    min_threads = 1
+    if (instance_cell.cpu_thread_policy ==
+            fields.CPUThreadAllocationPolicy.REQUIRE):
+        min_threads = 2
+    return any(threads_no * _sets_with(threads_no) >= len(instance_cell.cpuset)
+               for threads_no in range(min_threads, sizes[0] + 1))
+
+
+def _numa_summary_can_fit_pages(cell_summary, instance_cell):
+    """Mirror _numa_cell_supports_pagesize_request."""
+    sizes = [size_kb for size_kb, free_kb in cell_summary.pages]
+    if instance_cell.pagesize == MEMPAGES_SMALL:
+        sizes = sizes[-1:]
+    elif instance_cell.pagesize == MEMPAGES_LARGE:
+        sizes = sizes[:-1]
+    elif instance_cell.pagesize != MEMPAGES_ANY:
+        sizes = [instance_cell.pagesize]
+    memory = instance_cell.memory * units.Ki
+    free = dict(cell_summary.pages)
+    return any(size_kb in free and memory <= free[size_kb] and
+               memory % size_kb == 0 for size_kb in sizes)
+
+
+def _numa_summary_can_fit_cell(cell_summary, instance_cell, limits=None):
+    """Mirror _numa_fit_instance_cell."""
+    if (instance_cell.memory > cell_summary.memory or
+            len(instance_cell.cpuset) > cell_summary.cpus):
+        return False
+    if instance_cell.cpu_pinning_requested:
+        if not _numa_summary_can_pin(cell_summary, instance_cell):
+            return False
+    elif limits:
+        memory_usage = cell_summary.memory_usage + instance_cell.memory
+        cpu_usage = cell_summary.cpu_usage + len(instance_cell.cpuset)
+        if (memory_usage > cell_summary.memory * limits.ram_allocation_ratio
+                or cpu_usage > cell_summary.cpus *
+                limits.cpu_allocation_ratio):
+            return False
+    if instance_cell.pagesize:
+        return _numa_summary_can_fit_pages(cell_summary, instance_cell)
+    return True
+
+
+def numa_summary_can_fit(summary, instance_topology, limits=None):
+    """Quickly check whether an instance topology may fit on a host
+
+    :param summary: the summary of the host topology from numa_fit_summary()
+    :param instance_topology: objects.InstanceNUMATopology to be fitted
+    :param limits: objects.NUMATopologyLimits that defines limits
+
+    Checks that the host has enough cells, and that each instance cell fits
+    on at least one of them when taken alone. This never rejects a host on
+    which numa_fit_instance_to_host() would fit the instance, but may accept
+    hosts on which it won't, as the instance cells must fit on distinct host
+    cells and the PCI requests are not considered.
+
+    :returns: False if the instance can't fit on the host
+    """
+    if len(summary) < len(instance_topology):
+        return False
+    for instance_cell in instance_topology.cells:
+        if not any(_numa_summary_can_fit_cell(cell_summary, instance_cell,
+                                              limits)
+                   for cell_summary in summary):
+            return False
+    return True
+
+
 # TODO(ndipanov): Remove when all code paths are using objects
 def host_topology_and_format_from_host(host):
     """Convenience method for getting the numa_topology out of hosts
@@ -90,6 +90,7 @@ from nova.virt import diagnostics
 from nova.virt.disk import api as disk
 from nova.virt.disk.vfs import guestfs
 from nova.virt import driver
+from nova.virt import event as virtevent
 from nova.virt import firewall
 from nova.virt import hardware
 from nova.virt.image import model as imgmodel
@@ -536,6 +537,9 @@ class LibvirtDriver(driver.ComputeDriver):
         self.image_backend = imagebackend.Backend(CONF.use_cow_images)
 
         self.disk_cachemodes = {}
+        # Backing file and virtual size of the qcow2 disk files, with the
+        # modification time and size of the files they were read at, by path
+        self._disk_info_cache = {}
 
         self.valid_cachemodes = ["default",
                                  "none",
@@ -627,6 +631,10 @@ class LibvirtDriver(driver.ComputeDriver):
         LOG.info(_LI("Connection event '%(enabled)d' reason '%(reason)s'"),
                  {'enabled': enabled, 'reason': reason})
         self._set_host_enabled(enabled, reason)
+        if not enabled:
+            # The lifecycle events are not received until a new connection
+            # is opened
+            self.emit_event(virtevent.EventsLostEvent())
 
     def _version_to_string(self, version):
         return '.'.join([str(x) for x in version])
@@ -866,6 +874,9 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return uuids
 
+    def get_power_states(self):
+        return self._host.get_power_states()
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
@@ -6885,13 +6896,41 @@ class LibvirtDriver(driver.ComputeDriver):
                                   write_to_disk=True)
         self._host.write_instance_config(xml)
 
+    def _get_qcow2_disk_info(self, path):
+        """Return the backing file and the virtual size of a qcow2 disk
+        file, only inspecting it with qemu-img again when its modification
+        time or size changed.
+        """
+        st = os.stat(path)
+        key = (st.st_mtime, st.st_size)
+        cached = self._disk_info_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        info = (libvirt_utils.get_disk_backing_file(path),
+                disk.get_disk_size(path))
+        self._disk_info_cache[path] = (key, info)
+        return info
+
+    def _invalidate_disk_info_cache(self, instance):
+        """Forget the cached information of the disks of an instance, which
+        is about to be created or changed.
+        """
+        inst_base = os.path.join(libvirt_utils.get_instance_path(instance),
+                                 '')
+        for path in list(self._disk_info_cache):
+            if path.startswith(inst_base):
+                del self._disk_info_cache[path]
+
     def _get_instance_disk_info(self, instance_name, xml,
-                                block_device_info=None):
+                                block_device_info=None, use_cache=False):
         """Get the non-volume disk information from the domain xml
 
         :param str instance_name: the name of the instance (domain)
         :param str xml: the libvirt domain xml for the instance
         :param dict block_device_info: block device info for BDMs
+        :param bool use_cache: whether the information of the qcow2 disk
+                               files which did not change since the last
+                               call can be taken from the cache
         :returns disk_info: list of dicts with keys:
 
           * 'type': the disk type (str)
@@ -6937,6 +6976,7 @@ class LibvirtDriver(driver.ComputeDriver):
 
             # get the real disk size or
             # raise a localized error if image is unavailable
+            cacheable = use_cache and disk_type == 'file'
             if disk_type == 'file':
                 dk_size = int(os.path.getsize(path))
             elif disk_type == 'block' and block_device_info:
@@ -6948,7 +6988,10 @@ class LibvirtDriver(driver.ComputeDriver):
                 continue
 
             disk_type = driver_nodes[cnt].get('type')
-            if disk_type == "qcow2":
+            if disk_type == "qcow2" and cacheable:
+                backing_file, virt_size = self._get_qcow2_disk_info(path)
+                over_commit_size = int(virt_size) - dk_size
+            elif disk_type == "qcow2":
                 backing_file = libvirt_utils.get_disk_backing_file(path)
                 virt_size = disk.get_disk_size(path)
                 over_commit_size = int(virt_size) - dk_size
@@ -6991,6 +7034,7 @@ class LibvirtDriver(driver.ComputeDriver):
         disk_over_committed_size = 0
         instance_domains = self._host.list_instance_domains()
         if not instance_domains:
+            self._disk_info_cache = {}
             return disk_over_committed_size
 
         # Get all instance uuids
@@ -7015,6 +7059,7 @@ class LibvirtDriver(driver.ComputeDriver):
         bdms = objects.BlockDeviceMappingList.bdms_by_instance_uuid(
             ctx, instance_uuids)
 
+        disk_paths = set()
         for dom in instance_domains:
             try:
                 guest = libvirt_guest.Guest(dom)
@@ -7027,9 +7072,11 @@ class LibvirtDriver(driver.ComputeDriver):
                         local_instances[guest.uuid], bdms[guest.uuid])
 
                 disk_infos = self._get_instance_disk_info(guest.name, xml,
-                                 block_device_info=block_device_info)
+                                 block_device_info=block_device_info,
+                                 use_cache=True)
 
                 for info in disk_infos:
+                    disk_paths.add(info['path'])
                     disk_over_committed_size += int(
                         info['over_committed_disk_size'])
             except libvirt.libvirtError as ex:
@@ -7066,6 +7113,10 @@ class LibvirtDriver(driver.ComputeDriver):
                           'error': e})
             # NOTE(gtt116): give other tasks a chance.
             greenthread.sleep(0)
+        # Forget the disks which are gone
+        for path in list(self._disk_info_cache):
+            if path not in disk_paths:
+                del self._disk_info_cache[path]
         return disk_over_committed_size
 
     def unfilter_instance(self, instance, network_info):
@@ -7324,6 +7375,8 @@ class LibvirtDriver(driver.ComputeDriver):
                          network_info, image_meta, resize_instance,
                          block_device_info=None, power_on=True):
         LOG.debug("Starting finish_migration", instance=instance)
+        # The disks are copied from the source host and may be resized
+        self._invalidate_disk_info_cache(instance)
 
         block_disk_info = blockinfo.get_disk_info(CONF.libvirt.virt_type,
                                                   instance,
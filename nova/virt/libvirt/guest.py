@@ -27,7 +27,6 @@ higher level APIs around the raw libvirt API. These APIs are
 then used by all the other libvirt related classes
 """
 
-from lxml import etree
 from oslo_log import log as logging
 from oslo_service import loopingcall
 from oslo_utils import encodeutils
@@ -84,6 +83,8 @@ class Guest(object):
             libvirt = importutils.import_module('libvirt')
 
         self._domain = domain
+        # Parsed configuration of the domain, see get_config()
+        self._config = None
 
     def __repr__(self):
         return "<Guest %(id)d %(name)s %(uuid)s>" % {
@@ -133,6 +134,8 @@ class Guest(object):
         :param pause: Indicates whether to start and pause the guest
         """
         flags = pause and libvirt.VIR_DOMAIN_START_PAUSED or 0
+        # The devices are given their host side names when the guest starts
+        self.invalidate_config()
         try:
             return self._domain.createWithFlags(flags)
         except Exception:
@@ -143,6 +146,7 @@ class Guest(object):
 
     def poweroff(self):
         """Stops a running guest."""
+        self.invalidate_config()
         self._domain.destroy()
 
     def inject_nmi(self):
@@ -171,20 +175,10 @@ class Guest(object):
 
     def get_interfaces(self):
         """Returns a list of all network interfaces for this domain."""
-        doc = None
-
-        try:
-            doc = etree.fromstring(self._encoded_xml)
-        except Exception:
-            return []
-
-        interfaces = []
-
-        nodes = doc.findall('./devices/interface/target')
-        for target in nodes:
-            interfaces.append(target.get('dev'))
-
-        return interfaces
+        return [interface.target_dev
+                for interface in self.get_all_devices(
+                    vconfig.LibvirtConfigGuestInterface)
+                if interface.target_dev is not None]
 
     def get_interface_by_mac(self, mac):
         """Lookup a LibvirtConfigGuestInterface by the MAC address.
@@ -215,6 +209,7 @@ class Guest(object):
 
     def delete_configuration(self):
         """Undefines a domain from hypervisor."""
+        self.invalidate_config()
         try:
             self._domain.undefineFlags(
                 libvirt.VIR_DOMAIN_UNDEFINE_MANAGED_SAVE)
@@ -247,22 +242,38 @@ class Guest(object):
         """
         flags = persistent and libvirt.VIR_DOMAIN_AFFECT_CONFIG or 0
         flags |= live and libvirt.VIR_DOMAIN_AFFECT_LIVE or 0
+        self.invalidate_config()
         self._domain.attachDeviceFlags(conf.to_xml(), flags=flags)
 
+    def get_config(self):
+        """Returns the configuration of the guest
+
+        The domain XML is only fetched and parsed at the first call, the
+        configuration is then kept until it is changed through this object
+        or invalidate_config() is called.
+
+        :returns LibvirtConfigGuest: the configuration of the guest
+        """
+        if self._config is None:
+            config = vconfig.LibvirtConfigGuest()
+            config.parse_str(self._domain.XMLDesc(0))
+            self._config = config
+        return self._config
+
+    def invalidate_config(self):
+        """Drops the configuration cached by get_config(). To be called
+        when the domain is changed other than through this object.
+        """
+        self._config = None
+
     def get_disk(self, device):
         """Returns the disk mounted at device
 
         :returns LivirtConfigGuestDisk: mounted at device or None
         """
-        try:
-            doc = etree.fromstring(self._domain.XMLDesc(0))
-        except Exception:
-            return None
-        node = doc.find("./devices/disk/target[@dev='%s'].." % device)
-        if node is not None:
-            conf = vconfig.LibvirtConfigGuestDisk()
-            conf.parse_dom(node)
-            return conf
+        for disk in self.get_all_disks():
+            if disk.target_dev == device:
+                return disk
 
     def get_all_disks(self):
         """Returns all the disks for a guest
@@ -281,9 +292,7 @@ class Guest(object):
         """
 
         try:
-            config = vconfig.LibvirtConfigGuest()
-            config.parse_str(
-                self._domain.XMLDesc(0))
+            config = self.get_config()
         except Exception:
             return []
 
@@ -354,6 +363,7 @@ class Guest(object):
         """
         flags = persistent and libvirt.VIR_DOMAIN_AFFECT_CONFIG or 0
         flags |= live and libvirt.VIR_DOMAIN_AFFECT_LIVE or 0
+        self.invalidate_config()
         self._domain.detachDeviceFlags(conf.to_xml(), flags=flags)
 
     def get_xml_desc(self, dump_inactive=False, dump_sensitive=False,
@@ -460,6 +470,7 @@ class Guest(object):
         flags |= reuse_ext and (libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_REUSE_EXT
                                 or 0)
         flags |= quiesce and libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_QUIESCE or 0
+        self.invalidate_config()
         self._domain.snapshotCreateXML(conf.to_xml(), flags=flags)
 
     def shutdown(self):
@@ -497,6 +508,7 @@ class BlockDevice(object):
         """
         flags = async and libvirt.VIR_DOMAIN_BLOCK_JOB_ABORT_ASYNC or 0
         flags |= pivot and libvirt.VIR_DOMAIN_BLOCK_JOB_ABORT_PIVOT or 0
+        self._guest.invalidate_config()
         self._guest._domain.blockJobAbort(self._disk, flags=flags)
 
     def get_job_info(self):
@@ -525,6 +537,7 @@ class BlockDevice(object):
         flags |= reuse_ext and libvirt.VIR_DOMAIN_BLOCK_REBASE_REUSE_EXT or 0
         flags |= copy and libvirt.VIR_DOMAIN_BLOCK_REBASE_COPY or 0
         flags |= relative and libvirt.VIR_DOMAIN_BLOCK_REBASE_RELATIVE or 0
+        self._guest.invalidate_config()
         return self._guest._domain.blockRebase(
             self._disk, base, self.REBASE_DEFAULT_BANDWIDTH, flags=flags)
 
@@ -537,11 +550,13 @@ class BlockDevice(object):
         :param relative: Keep backing chain referenced using relative names
         """
         flags = relative and libvirt.VIR_DOMAIN_BLOCK_COMMIT_RELATIVE or 0
+        self._guest.invalidate_config()
         return self._guest._domain.blockCommit(
             self._disk, base, top, self.COMMIT_DEFAULT_BANDWIDTH, flags=flags)
 
     def resize(self, size_kb):
         """Resizes block device to Kib size."""
+        self._guest.invalidate_config()
         self._guest._domain.blockResize(self._disk, size_kb)
 
     def wait_for_job(self, abort_on_error=False, wait_for_job_clean=False):
@@ -569,6 +584,9 @@ class BlockDevice(object):
         else:
             job_ended = status.cur == status.end
 
+        if job_ended:
+            # The completion of the job changes the backing chain of the disk
+            self._guest.invalidate_config()
         return not job_ended
 
 
@@ -206,6 +206,7 @@ class Host(object):
         self._conn_event_handler = conn_event_handler
         self._lifecycle_event_handler = lifecycle_event_handler
         self._skip_list_all_domains = False
+        self._skip_domain_stats = False
         self._caps = None
         self._hostname = None
 
@@ -745,6 +746,59 @@ class Host(object):
 
         return doms
 
+    def _get_domain_states_stats(self):
+        # The modern (>= 1.2.8) fast way - 1 single API call for the state
+        # of all domains
+        stats = self.get_connection().getAllDomainStats(
+            libvirt.VIR_DOMAIN_STATS_STATE)
+        return [(dom, record['state.state']) for dom, record in stats]
+
+    def _get_domain_states_list(self):
+        # 1 API call per domain state, the domains in any other state than
+        # running, paused or shut off are queried one by one
+        conn = self.get_connection()
+        states = []
+        for flag, state in ((libvirt.VIR_CONNECT_LIST_DOMAINS_RUNNING,
+                             libvirt_guest.VIR_DOMAIN_RUNNING),
+                            (libvirt.VIR_CONNECT_LIST_DOMAINS_PAUSED,
+                             libvirt_guest.VIR_DOMAIN_PAUSED),
+                            (libvirt.VIR_CONNECT_LIST_DOMAINS_SHUTOFF,
+                             libvirt_guest.VIR_DOMAIN_SHUTOFF)):
+            states.extend((dom, state) for dom in conn.listAllDomains(flag))
+        for dom in conn.listAllDomains(
+                libvirt.VIR_CONNECT_LIST_DOMAINS_OTHER):
+            states.append((dom, dom.info()[0]))
+        return states
+
+    def get_power_states(self, only_guests=True):
+        """Get the power states of all the domains
+
+        :param only_guests: True to filter out any host domain (eg Dom-0)
+
+        Query libvirt for the state of all the domains, running or not,
+        with a single getAllDomainStats() call if it is supported, else
+        with one listAllDomains() call per domain state.
+
+        :returns: dict of nova.compute.power_state values by domain UUID
+        """
+
+        if not self._skip_domain_stats:
+            try:
+                states = self._get_domain_states_stats()
+            except (libvirt.libvirtError, AttributeError) as ex:
+                LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                             "falling back to listing the domains by "
+                             "state: %(ex)s"),
+                         {'ex': ex})
+                self._skip_domain_stats = True
+
+        if self._skip_domain_stats:
+            states = self._get_domain_states_list()
+
+        return {dom.UUIDString(): libvirt_guest.LIBVIRT_POWER_STATE[state]
+                for dom, state in states
+                if not (only_guests and dom.ID() == 0)}
+
     def get_online_cpus(self):
         """Get the set of CPUs that are online on the host
 
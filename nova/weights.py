@@ -18,6 +18,7 @@ Pluggable Weighing support
 """
 
 import abc
+import time
 
 import six
 
@@ -76,6 +77,9 @@ class BaseWeigher(object):
     minval = None
     maxval = None
 
+    # Set to true in a subclass implementing _weigh_arrays()
+    vectorized = False
+
     def weight_multiplier(self):
         """How weighted this weigher should be.
 
@@ -117,10 +121,45 @@ class BaseWeigher(object):
 
         return weights
 
+    def _weigh_arrays(self, obj_arrays, weight_properties):
+        """Return the array of weights of all the objects at once.
+
+        Override in a subclass for the weigher to be vectorized.
+        """
+        raise NotImplementedError()
+
+    def weigh_arrays(self, obj_arrays, weight_properties):
+        """Weigh multiple objects from their columnar view.
+
+        Only used by the handlers providing a columnar view of the objects to
+        weigh (see BaseWeightHandler.arrays_class), in which case it is called
+        instead of weigh_objects() for the weighers which are vectorized.
+        """
+        weights = self._weigh_arrays(obj_arrays, weight_properties)
+
+        # Record the min and max values like weigh_objects() does
+        if len(weights):
+            min_weight = weights.min()
+            max_weight = weights.max()
+            if self.minval is None or min_weight < self.minval:
+                self.minval = min_weight
+            if self.maxval is None or max_weight > self.maxval:
+                self.maxval = max_weight
+
+        return weights
+
 
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
+    # Can be set in a subclass to a class building a columnar view of the
+    # objects to weigh, for running the vectorized weighers
+    arrays_class = None
+
+    # Can be set to an object collecting the time taken by each weigher,
+    # providing a record_weigher(name, elapsed, count) method
+    stats = None
+
     def get_weighed_objects(self, weighers, obj_list, weighing_properties):
         """Return a sorted (descending), normalized list of WeighedObjects."""
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
@@ -128,7 +167,27 @@ class BaseWeightHandler(loadables.BaseLoader):
         if len(weighed_objs) <= 1:
             return weighed_objs
 
+        obj_arrays = None
+        vectorized_weights = None
+        if self.arrays_class is not None and any(
+                weigher.vectorized for weigher in weighers):
+            obj_arrays = self.arrays_class([obj.obj for obj in weighed_objs])
+
         for weigher in weighers:
+            start_time = time.time()
+            if obj_arrays is not None and weigher.vectorized:
+                weights = weigher.weigh_arrays(obj_arrays, weighing_properties)
+                weights = obj_arrays.normalize(weights,
+                                               minval=weigher.minval,
+                                               maxval=weigher.maxval)
+                weights = weights * weigher.weight_multiplier()
+                if vectorized_weights is None:
+                    vectorized_weights = weights
+                else:
+                    vectorized_weights += weights
+                self._record_weigher(weigher, start_time, len(weighed_objs))
+                continue
+
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -139,5 +198,33 @@ class BaseWeightHandler(loadables.BaseLoader):
             for i, weight in enumerate(weights):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
+            self._record_weigher(weigher, start_time, len(weighed_objs))
+
+        if vectorized_weights is not None:
+            for obj, weight in zip(weighed_objs, vectorized_weights.tolist()):
+                obj.weight += weight
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def _record_weigher(self, weigher, start_time, count):
+        if self.stats is not None:
+            self.stats.record_weigher(weigher.__class__.__name__,
+                                      time.time() - start_time, count)
+
+    def reweigh_object(self, weighers, obj, weighing_properties):
+        """Return a new WeighedObject for an object which was weighed with
+        get_weighed_objects() and has changed since.
+
+        The weights are normalized with the minimum and maximum values
+        recorded by the weighers when they weighed all the objects, so that
+        the returned weight can be compared to the ones of the other objects
+        without weighing them again.
+        """
+        weighed_obj = self.object_class(obj, 0.0)
+        for weigher in weighers:
+            weight = weigher._weigh_object(obj, weighing_properties)
+            weight = next(iter(normalize([weight],
+                                         minval=weigher.minval,
+                                         maxval=weigher.maxval)))
+            weighed_obj.weight += weigher.weight_multiplier() * weight
+        return weighed_obj
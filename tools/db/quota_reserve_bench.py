@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the concurrent quota reservations of a single project.
+
+Each thread reserves instances, cores and ram for the same project, as the
+bursts of boots of a tenant do, and rolls the reservation back, so that the
+project never runs out of quota. The number of reservations per second is
+printed for the locking and the optimistic reservations.
+
+The database is specified by providing a SQLAlchemy connection URL of a
+database with the nova schema, which is created if it is empty. SQLite locks
+the whole database on writes, so use MySQL or PostgreSQL:
+
+Run like:
+
+    ./tools/db/quota_reserve_bench.py mysql+pymysql://root@localhost/nova \
+                                      --threads 20 --reservations 50
+"""
+
+from __future__ import print_function
+
+import argparse
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_utils import uuidutils
+
+from nova import context
+from nova import db
+from nova.db.sqlalchemy import migration
+from nova import quota
+
+CONF = cfg.CONF
+
+
+def _run_thread(ctxt, reservations, errors):
+    for i in range(reservations):
+        try:
+            resvs = quota.QUOTAS.reserve(ctxt, instances=1, cores=1, ram=512)
+            quota.QUOTAS.rollback(ctxt, resvs)
+        except Exception as e:
+            errors.append(e)
+
+
+def run(threads, reservations, optimistic):
+    CONF.set_override('quota_optimistic_reservations', optimistic)
+    project_id = uuidutils.generate_uuid()
+    ctxt = context.RequestContext('bench', project_id)
+    # Create the usages before timing the reservations
+    quota.QUOTAS.rollback(
+        ctxt, quota.QUOTAS.reserve(ctxt, instances=1, cores=1, ram=512))
+
+    errors = []
+    workers = [threading.Thread(target=_run_thread,
+                                args=(ctxt, reservations, errors))
+               for i in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+
+    db.quota_destroy_all_by_project(context.get_admin_context(), project_id)
+    return threads * reservations / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('connection',
+                        help='SQLAlchemy URL of the nova database')
+    parser.add_argument('--threads', type=int, default=10,
+                        help='Number of concurrent reservers')
+    parser.add_argument('--reservations', type=int, default=20,
+                        help='Number of reservations of each reserver')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('connection', args.connection, 'database')
+    migration.db_sync()
+
+    for optimistic in (False, True):
+        rate, errors = run(args.threads, args.reservations, optimistic)
+        print('%s reservations: %.1f reservations/s, %d errors' %
+              ('Optimistic' if optimistic else 'Locking', rate, len(errors)))
+        for error in set(str(error) for error in errors):
+            print('  %s' % error)
+
+
+if __name__ == '__main__':
+    main()